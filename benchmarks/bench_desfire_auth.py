@@ -0,0 +1,100 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-21
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+
+Benchmark of DESFire authentication on the simulated reader, in authentications per second;
+Compares DESFireEx.authenticate (cached ciphers of DESFireCrypto) on each available crypto backend with the former
+authentication, which made new pyDes ciphers for the key and the session key; The EV1 ISO and AES authentications are
+measured too;
+The simulated card uses the cached ciphers in every case;
+
+Usage: python benchmarks/bench_desfire_auth.py [count]
+'''
+
+import os
+import sys
+import timeit
+import pyDes
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyResMan import SimInterface
+from pyResMan import DESFireCrypto
+from pyResMan.R502Device import R502Device
+from pyResMan.DESFireEx import DESFireEx, bytes
+
+
+def legacy_authenticate(desfire, key_id, private_key=[0x00] * 16):
+    apdu_command = desfire.wrap_command(0x0a, [key_id])
+    resp = desfire.communicate(apdu_command, "Authenticating key {:02X}".format(key_id), allow_continue_fallthrough=True)
+    random_b_encrypted = list(resp)
+    initial_value = b"\00" * 8
+    k = pyDes.triple_des(bytes(private_key), pyDes.CBC, initial_value, pad=None, padmode=pyDes.PAD_NORMAL)
+    decrypted_b = [ord(b) for b in (k.decrypt(bytes(random_b_encrypted)))]
+    shifted_b = decrypted_b[1:8] + [decrypted_b[0]]
+    random_a = [0x11, 0x22, 0x33, 0x44, 0x55, 0x66, 0x77, 0x88]
+    decrypted_a = [ord(b) for b in k.decrypt(bytes(random_a))]
+    xorred = []
+    for i in range(0, 8):
+        xorred.append(decrypted_a[i] ^ shifted_b[i])
+    decrypted_xorred = [ord(b) for b in k.decrypt(bytes(xorred))]
+    apdu_command = desfire.wrap_command(0xaf, decrypted_a + decrypted_xorred)
+    resp = desfire.communicate(apdu_command, "Authenticating continues with key {:02X}".format(key_id))
+    decrypted_check_a1 = [ord(b) for b in k.decrypt(bytes(resp))]
+    session_key = random_a[0 : 4] + decrypted_b[0 : 4] + random_a[4 : 8] + decrypted_b[4 : 8]
+    desfire.session_cipher = pyDes.triple_des(bytes(session_key), pyDes.CBC, initial_value, pad=None, padmode=pyDes.PAD_NORMAL)
+    return resp
+
+
+def bench(name, func, count, unit='auth/s'):
+    timeStart = timeit.default_timer()
+    for i in xrange(count):
+        func()
+    t = (timeit.default_timer() - timeStart) / count
+    print '  %-24s %10.3f ms %10.0f %s' %(name, t * 1000.0, 1.0 / t, unit)
+    return t
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    scInterface = SimInterface.SimInterface(SimInterface.SimDESFire())
+    scInterface.connect(SimInterface.SIM_READER_NAME, 3)
+    desfire = DESFireEx(R502Device(scInterface))
+
+    print 'DESFire authentication, %d times' %(count)
+    t_old = bench('legacy pyDes', lambda: legacy_authenticate(desfire, 0), count)
+    for name in DESFireCrypto.getBackendNames():
+        DESFireCrypto.setBackend(name)
+        t_new = bench('authenticate (%s)' %(name), lambda: desfire.authenticate(0), count)
+        print '  %-24s %10.1fx' %('speedup', t_old / t_new)
+
+    # EV1 authentications, to applications of 2K3DES and AES keys;
+    desfire.create_application(0x000001, 0x0F, 0x01)
+    desfire.create_application(0x000002, 0x0F, 0x81)
+    for name in DESFireCrypto.getBackendNames():
+        DESFireCrypto.setBackend(name)
+        desfire.select_application(0x000001)
+        bench('ISO 2K3DES (%s)' %(name), lambda: desfire.authenticate_iso(0), count)
+        desfire.select_application(0x000002)
+        # AES is not always run by the backend itself, e.g. pyDes has no AES;
+        bench('AES (%s)' %(DESFireCrypto.getBackendName(DESFireCrypto.CIPHER_AES)), lambda: desfire.authenticate_aes(0), count)
+        desfire.select_application(0x000000)
+
+    key = '\x01\x23\x45\x67\x89\xAB\xCD\xEF\xFE\xDC\xBA\x98\x76\x54\x32\x10'
+    block = '\x11\x22\x33\x44\x55\x66\x77\x88'
+    print '3DES decryption of one block, %d times' %(count * 10)
+    t_old = bench('new pyDes cipher', lambda: pyDes.triple_des(key, pyDes.CBC, b"\00" * 8).decrypt(block), count * 10, 'blocks/s')
+    for name in DESFireCrypto.getBackendNames():
+        DESFireCrypto.setBackend(name)
+        t_new = bench('cached cipher (%s)' %(name), lambda: DESFireCrypto.getCipher(key).decrypt(block), count * 10, 'blocks/s')
+        print '  %-24s %10.1fx' %('speedup', t_old / t_new)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-22
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+
+Benchmark of the DESFire inventory on the simulated reader, in apdus and milliseconds per walk;
+Compares the former inventory, one command per button with each on a new thread (the application is selected again for
+every file), with DESFireInventory: a full walk, a refresh after a write to one application and a refresh without change;
+
+Usage: python benchmarks/bench_desfire_inventory.py [applications] [files] [repeat]
+'''
+
+import os
+import sys
+import timeit
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyResMan import SimInterface
+from pyResMan.R502Device import R502Device
+from pyResMan.DESFireEx import DESFireEx
+from pyResMan.DESFireInventory import DESFireInventory, DESFireInventoryCache
+
+
+class CountingInterface(object):
+    '''
+    Counts the apdus sent to the interface;
+    '''
+
+    def __init__(self, scInterface):
+        self.__scInterface = scInterface
+        self.count = 0
+
+    def transmit(self, command):
+        self.count += 1
+        return self.__scInterface.transmit(command)
+
+
+def legacy_step(func, *args):
+    """Run one command on a new thread, as the controller did;"""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func(*args)))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def legacy_inventory(desfire):
+    tree = {'version' : legacy_step(desfire.get_version), 'applications' : {}}
+    legacy_step(desfire.select_application, 0)
+    tree['key_settings'] = legacy_step(desfire.get_key_settings)
+    for aid in legacy_step(desfire.get_applications):
+        legacy_step(desfire.select_application, aid)
+        application = {'key_settings' : legacy_step(desfire.get_key_settings), 'files' : {}}
+        for file_no in legacy_step(desfire.get_file_ids):
+            legacy_step(desfire.select_application, aid)
+            application['files'][file_no] = legacy_step(desfire.get_file_settings, file_no)
+        tree['applications'][aid] = application
+    return tree
+
+
+def bench(name, func, counter, repeat):
+    counter.count = 0
+    func()
+    apdus = counter.count
+    t = min(timeit.repeat(func, number=1, repeat=repeat))
+    print '  %-24s %10.3f ms %6d apdus' %(name, t * 1000.0, apdus)
+    return t, apdus
+
+
+def main():
+    applications = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    scInterface = SimInterface.SimInterface(SimInterface.SimDESFire())
+    scInterface.connect(SimInterface.SIM_READER_NAME, 3)
+    counter = CountingInterface(scInterface)
+    desfire = DESFireEx(R502Device(counter))
+    for aid in xrange(1, applications + 1):
+        desfire.select_application(0)
+        desfire.create_application(aid, 0x0F, 1)
+        desfire.select_application(aid)
+        for file_no in xrange(files):
+            desfire.create_std_data_file(file_no, 0, 0xEEEE, 32)
+    inventory = DESFireInventory(desfire, DESFireInventoryCache())
+
+    def write_and_refresh():
+        desfire.write_data(0, 0, 4, [1, 2, 3, 4])
+        inventory.walk()
+
+    print 'DESFire inventory of %d applications of %d files' %(applications, files)
+    t_old, apdus_old = bench('legacy step by step', lambda: legacy_inventory(desfire), counter, repeat)
+    t_new, apdus_new = bench('walk', lambda: inventory.walk(False), counter, repeat)
+    print '  %-24s %10.1fx %6.1fx' %('speedup', t_old / t_new, float(apdus_old) / apdus_new)
+    bench('refresh after a write', write_and_refresh, counter, repeat)
+    bench('refresh', lambda: inventory.walk(), counter, repeat)
+
+
+if __name__ == '__main__':
+    main()
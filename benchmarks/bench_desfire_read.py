@@ -0,0 +1,67 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-20
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+
+Benchmark of DESFire ReadData on the simulated reader;
+Compares the streamed read into a preallocated buffer with the former read through communicate(), which collects the
+frames in a list of ints;
+
+Usage: python benchmarks/bench_desfire_read.py [file size] [repeat]
+'''
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyResMan import SimInterface
+from pyResMan.R502Device import R502Device
+from pyResMan.DESFireEx import DESFireEx
+from pyResMan.Util import Util
+
+
+def legacy_read_data(desfire, file_id, offset, length):
+    parameters = [file_id] + Util.bytes3_to_byte_array(offset) + Util.bytes3_to_byte_array(length)
+    apdu_command = desfire.wrap_command(0xbd, parameters)
+    return desfire.communicate(apdu_command, "Reading data file {:02X}".format(file_id))
+
+
+def bench(name, func, number, repeat):
+    t = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+    print '  %-24s %10.3f ms' %(name, t * 1000.0)
+    return t
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 7000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    scInterface = SimInterface.SimInterface(SimInterface.SimDESFire())
+    scInterface.connect(SimInterface.SIM_READER_NAME, 3)
+    desfire = DESFireEx(R502Device(scInterface))
+    desfire.create_application(0x000001, 0x0F, 1)
+    desfire.select_application(0x000001)
+    desfire.create_std_data_file(1, 0, 0xEEEE, size)
+    data = [i & 0xFF for i in xrange(size)]
+    desfire.write_data(1, 0, size, data)
+
+    buf = bytearray(size)
+    assert legacy_read_data(desfire, 1, 0, size) == data
+    statistics = desfire.read_data_into(1, 0, size, buf)
+    assert buf == bytearray(data)
+
+    print 'ReadData of %d bytes, %d frames' %(size, statistics.frames)
+    t_old = bench('legacy communicate', lambda: legacy_read_data(desfire, 1, 0, size), 20, repeat)
+    t_new = bench('read_data_into', lambda: desfire.read_data_into(1, 0, size, buf), 20, repeat)
+    print '  %-24s %10.1fx' %('speedup', t_old / t_new)
+    bench('read_data', lambda: desfire.read_data(1, 0, size), 20, repeat)
+
+
+if __name__ == '__main__':
+    main()
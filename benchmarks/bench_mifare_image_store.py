@@ -0,0 +1,128 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-19
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+
+Benchmark of the Mifare card image store;
+Compares MifareImageStore with one raw image file per dump, read back to a list of hex strings like the card data grid;
+
+Usage: python benchmarks/bench_mifare_image_store.py [image count]
+'''
+
+import os
+import sys
+import random
+import shutil
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyResMan import MifareLayout
+from pyResMan.MifareImageStore import MifareImageStore
+
+
+def legacy_save(dirName, number, image):
+    with open(os.path.join(dirName, '%06d.bin' %(number)), 'wb') as f:
+        f.write(image)
+
+
+def legacy_load(dirName):
+    """Read every image file to the cells of a grid, one hex string per byte;"""
+    images = []
+    for fileName in sorted(os.listdir(dirName)):
+        with open(os.path.join(dirName, fileName), 'rb') as f:
+            images.append(['%02X' %(ord(b)) for b in f.read()])
+    return images
+
+
+def legacy_search(images, data):
+    cells = ['%02X' %(ord(b)) for b in data]
+    results = []
+    for number, image in enumerate(images):
+        for offset in xrange(len(image) - len(cells) + 1):
+            if image[offset : offset + len(cells)] == cells:
+                results.append((number, offset))
+    return results
+
+
+def legacy_diff(images, number1, number2):
+    image1 = images[number1]
+    image2 = images[number2]
+    return [block for block in xrange(len(image1) / 16) if image1[block * 16 : block * 16 + 16] != image2[block * 16 : block * 16 + 16]]
+
+
+def bench(name, func, number=1):
+    timeStart = timeit.default_timer()
+    for i in xrange(number):
+        result = func()
+    t = (timeit.default_timer() - timeStart) / number
+    print '  %-24s %10.3f ms' %(name, t * 1000.0)
+    return t, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rand = random.Random(0)
+    layout = MifareLayout.MIFARE_1K
+    base = bytearray(rand.getrandbits(8) for i in xrange(layout.imageSize))
+    pattern = '\xA5\x5A\xC3\x3C\xDE\xAD'
+
+    dirName = tempfile.mkdtemp()
+    try:
+        legacyDirName = os.path.join(dirName, 'legacy')
+        os.mkdir(legacyDirName)
+        storePathName = os.path.join(dirName, 'images.dat')
+        store = MifareImageStore(storePathName)
+        keys = [(sector, 0, '\xFF' * 6) for sector in xrange(layout.sectorCount)]
+        images = []
+        for number in xrange(count):
+            image = bytearray(base)
+            image[0 : 4] = '%04X' %(number & 0xFFFF)
+            # A few blocks differ between the dumps, a few dumps hold the pattern;
+            for i in xrange(3):
+                image[rand.randrange(16, layout.imageSize)] = rand.getrandbits(8)
+            if number % 100 == 7:
+                offset = rand.randrange(16, layout.imageSize - len(pattern))
+                image[offset : offset + len(pattern)] = pattern
+            images.append(str(image))
+        store.close()
+
+        print '%d Mifare 1K images' %(count)
+        bench('legacy save', lambda: [legacy_save(legacyDirName, number, image) for number, image in enumerate(images)])
+
+        def append():
+            store = MifareImageStore(storePathName)
+            for image in images:
+                store.append(layout, image, keys=keys)
+            store.close()
+        bench('store append', append)
+
+        t_old, legacy = bench('legacy load', lambda: legacy_load(legacyDirName))
+        t_new, store = bench('store open', lambda: MifareImageStore(storePathName))
+        print '  %-24s %10.1fx' %('speedup', t_old / t_new)
+
+        t_old, found_old = bench('legacy search', lambda: legacy_search(legacy, pattern))
+        t_new, found_new = bench('store search', lambda: store.search(pattern), 10)
+        assert found_old == found_new
+        print '  %-24s %10.1fx (%d found)' %('speedup', t_old / t_new, len(found_new))
+
+        pairs = [(rand.randrange(count), rand.randrange(count)) for i in xrange(1000)]
+        t_old, diff_old = bench('legacy diff x1000', lambda: [legacy_diff(legacy, a, b) for a, b in pairs])
+        t_new, diff_new = bench('store diff x1000', lambda: [store.diff(a, b) for a, b in pairs])
+        assert diff_old == diff_new
+        print '  %-24s %10.1fx' %('speedup', t_old / t_new)
+
+        t_new, found = bench('store findUID x1000', lambda: [store.findUID('%04X' %(number)) for number in xrange(1000)])
+        store.close()
+        print '  %-24s %10d bytes (%d bytes of images)' %('store file', os.path.getsize(storePathName), count * layout.imageSize)
+    finally:
+        shutil.rmtree(dirName)
+
+
+if __name__ == '__main__':
+    main()
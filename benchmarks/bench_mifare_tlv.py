@@ -0,0 +1,132 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-16
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+
+Micro-benchmark of the Mifare response TLV parser;
+Compares MifareResponseTLV with the former ord() / slicing implementation;
+
+Usage: python benchmarks/bench_mifare_tlv.py [repeat]
+'''
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyResMan.MifareTLV import MifareResponseTLV, split_responses
+
+
+class LegacyResponseTLV(object):
+    def __init__(self, data):
+        self.__data = data
+        self.__error = '\x00'
+        self.__block_data = ''
+        self.__desfire_data = ''
+        self.parse()
+
+    def parse(self):
+        if ord(self.__data[0]) != 0x7F:
+            raise Exception('Invalid response tag.')
+        tlv_data_len = ord(self.__data[2])
+        offset = 3
+        while True:
+            tag = ord(self.__data[offset])
+            value_len = ord(self.__data[offset + 1])
+            if tag == 0x80:
+                if value_len != 0x01:
+                    raise Exception('Invalid error length.')
+                self.__error = self.__data[offset + 2]
+                offset += 3
+            elif tag == 0x02:
+                offset += 1
+                value_len = ord(self.__data[offset])
+                offset += 1
+                self.__block_data = self.__data[offset : offset + value_len]
+                offset += value_len
+            elif tag == 0x08:
+                offset += 1
+                value_len = ord(self.__data[offset])
+                offset += 1
+                self.__desfire_data = self.__data[offset : offset + value_len]
+                offset += value_len
+            else:
+                raise Exception('Invalid tag value.')
+            if offset >= tlv_data_len:
+                break
+
+    def get_error(self):
+        return ord(self.__error)
+
+    def get_block_data(self):
+        return self.__block_data
+
+    def get_desfire_data(self):
+        return self.__desfire_data
+
+
+def response(error, block_data=None, desfire_data=None):
+    body = '\x80\x01' + chr(error)
+    if block_data != None:
+        body += '\x02' + chr(len(block_data)) + block_data
+    if desfire_data != None:
+        body += '\x08' + chr(len(desfire_data)) + desfire_data
+    return '\x7F\x00' + chr(len(body)) + body
+
+
+def legacy_split(data):
+    responses = []
+    while len(data) > 0:
+        end = 3 + ord(data[2])
+        responses.append(LegacyResponseTLV(data[ : end]))
+        data = data[end : ]
+    return responses
+
+
+def bench(name, func, number, repeat):
+    t = min(timeit.repeat(func, number=number, repeat=repeat))
+    print '  %-24s %10.3f us/call' %(name, t * 1000000.0 / number)
+    return t
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    # An authentication, a block read, a DESFire frame and a batch of 9 block reads;
+    status = response(0)
+    block = response(0, ''.join(chr(i) for i in range(16)))
+    desfire = response(0, desfire_data='\x00' + ''.join(chr(i) for i in range(59)))
+    batch = block * 9
+
+    for title, data, number in (('Status (%d bytes)' %(len(status)), status, 50000),
+                                ('Block read (%d bytes)' %(len(block)), block, 50000),
+                                ('DESFire frame (%d bytes)' %(len(desfire)), desfire, 50000),
+                                ('Batch of 9 reads (%d bytes)' %(len(batch)), batch, 5000)):
+        if data is batch:
+            assert [r.get_block_data() for r in split_responses(data)] == [r.get_block_data() for r in legacy_split(data)]
+            cases = (('legacy split', lambda: legacy_split(data)),
+                     ('split_responses', lambda: split_responses(data)))
+        else:
+            new = MifareResponseTLV(data)
+            old = LegacyResponseTLV(data)
+            assert (new.get_error(), new.get_block_data(), new.get_desfire_data()) == (old.get_error(), old.get_block_data(), old.get_desfire_data())
+            cases = (('legacy parse', lambda: LegacyResponseTLV(data).get_block_data()),
+                     ('parse', lambda: MifareResponseTLV(data).get_block_data()))
+
+        print title
+        t_old = None
+        for name, func in cases:
+            t = bench(name, func, number, repeat)
+            if t_old == None:
+                t_old = t
+            else:
+                print '  %-24s %10.1fx' %('speedup', t_old / t)
+
+
+if __name__ == '__main__':
+    main()
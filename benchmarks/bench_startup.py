@@ -0,0 +1,91 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-10
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+
+Startup benchmark; Imports each target module in a fresh interpreter and reports the import time by module;
+The time of a module includes the modules it imports first; Modules which can not be imported are reported too;
+
+Usage: python benchmarks/bench_startup.py [top count] [module ...]
+'''
+
+import os
+import sys
+import json
+import subprocess
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+DEFAULT_TARGETS = [
+    'pyResMan.pyResManController',
+    'pyResMan.pyResManCli',
+    'pyResMan.Dialogs.pyResManDialog',
+]
+
+# Runs in the child interpreter; Prints a json report on the last line;
+_CHILD_SCRIPT = '''
+import sys, json, timeit, __builtin__
+sys.path.insert(0, %(root)r)
+times = {}
+errors = {}
+originalImport = __builtin__.__import__
+def timedImport(name, globals=None, locals=None, fromlist=None, level=-1):
+    before = set(sys.modules)
+    timeStart = timeit.default_timer()
+    try:
+        return originalImport(name, globals, locals, fromlist, level)
+    except ImportError, e:
+        errors.setdefault(name, str(e))
+        raise
+    finally:
+        elapsed = timeit.default_timer() - timeStart
+        for moduleName in set(sys.modules) - before:
+            if (sys.modules[moduleName] != None) and (moduleName not in times):
+                times[moduleName] = elapsed
+__builtin__.__import__ = timedImport
+timeStart = timeit.default_timer()
+try:
+    __import__(%(target)r)
+    ok = True
+except Exception, e:
+    errors.setdefault(%(target)r, '%%s: %%s' %%(type(e).__name__, e))
+    ok = False
+total = timeit.default_timer() - timeStart
+print json.dumps({'ok' : ok, 'total' : total, 'times' : times, 'errors' : errors})
+'''
+
+
+def measure(target):
+    """Import the target in a child interpreter; Return the report dict;"""
+    script = _CHILD_SCRIPT % {'root' : ROOT_DIR, 'target' : target}
+    process = subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    lines = out.strip().splitlines()
+    if (process.returncode != 0) or (len(lines) == 0):
+        raise Exception('Benchmark of %s failed: %s' %(target, err.strip()))
+    return json.loads(lines[-1])
+
+
+def report(target, result, topCount):
+    print '%s: %s, %.1f ms' %(target, 'ok' if result['ok'] else 'FAILED', result['total'] * 1000)
+    times = sorted(result['times'].items(), key=lambda item: item[1], reverse=True)
+    for moduleName, elapsed in times[:topCount]:
+        print '    %8.1f ms  %s' %(elapsed * 1000, moduleName)
+    for moduleName, error in sorted(result['errors'].items()):
+        print '    not imported: %s (%s)' %(moduleName, error)
+    print
+
+
+def main():
+    topCount = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+    targets = sys.argv[2:] if len(sys.argv) > 2 else DEFAULT_TARGETS
+    for target in targets:
+        report(target, measure(target), topCount)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-4
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+
+Micro-benchmark of the hex codec in Util;
+Compares the current Util functions with the former per-character implementations;
+
+Usage: python benchmarks/bench_util_hex.py [repeat]
+'''
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyResMan.Util import Util
+
+HEXCHARS = '0123456789ABCDEFabcdef'
+
+
+def legacy_c2v(c):
+    cv = ord(c)
+    if ((cv >= ord('0')) and (cv <= ord('9'))):
+        return cv - ord('0')
+    elif ((cv >= ord('A')) and (cv <= ord('F'))):
+        return cv - ord('A') + 10
+    elif ((cv >= ord('a')) and (cv <= ord('f'))):
+        return cv - ord('a') + 10
+    else:
+        raise ValueError
+
+
+def legacy_removespace(s):
+    s = s.replace(' ', '')
+    s = s.replace('\t', '')
+    s = s.replace('\r', '')
+    s = s.replace('\n', '')
+    return s
+
+
+def legacy_s2vs(s):
+    s = legacy_removespace(s)
+    if (len(s) & 1) != 0:
+        raise ValueError()
+    for c in s:
+        if c not in HEXCHARS:
+            raise ValueError()
+    vs = ''
+    for i in xrange(0, len(s) / 2):
+        vs += chr(legacy_c2v(s[i * 2]) << 4 | legacy_c2v(s[i * 2 + 1]))
+    return vs
+
+
+def legacy_s2vl(s):
+    s = legacy_removespace(s)
+    if (len(s) & 1) != 0:
+        raise ValueError()
+    for c in s:
+        if c not in HEXCHARS:
+            raise ValueError()
+    vl = []
+    for i in xrange(0, len(s) / 2):
+        vl.append(legacy_c2v(s[i * 2]) << 4 | legacy_c2v(s[i * 2 + 1]))
+    return vl
+
+
+def legacy_vs2s(vs, pad=''):
+    return pad.join("%02X" %(ord(v)) for v in vs)
+
+
+def legacy_vl2s(vl, pad=''):
+    return pad.join("%02X" %(v) for v in vl)
+
+
+def bench(name, func, arg, number, repeat):
+    t = min(timeit.repeat(lambda: func(*arg), number=number, repeat=repeat))
+    print '  %-24s %10.3f us/call' %(name, t * 1000000.0 / number)
+    return t
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    # A short APDU, a spaced script line and a whole Mifare 1K image;
+    apdu = '00A4040008A000000003000000'
+    spaced = ' '.join(apdu[i:i + 2] for i in xrange(0, len(apdu), 2))
+    image = ''.join('%02X' %(i & 0xFF) for i in xrange(1024))
+
+    for title, text, number in (('APDU (%d bytes)' %(len(apdu) / 2), apdu, 20000),
+                                ('Spaced APDU (%d bytes)' %(len(apdu) / 2), spaced, 20000),
+                                ('Card image (%d bytes)' %(len(image) / 2), image, 200)):
+        vs = Util.s2vs(text)
+        vl = Util.s2vl(text)
+        assert vs == legacy_s2vs(text)
+        assert vl == legacy_s2vl(text)
+        assert Util.vs2s(vs, ' ') == legacy_vs2s(vs, ' ')
+        assert Util.vl2s(vl) == legacy_vl2s(vl)
+
+        print title
+        for name, new, old, arg in (('s2vs', Util.s2vs, legacy_s2vs, (text, )),
+                                    ('s2vl', Util.s2vl, legacy_s2vl, (text, )),
+                                    ('vs2s', Util.vs2s, legacy_vs2s, (vs, )),
+                                    ('vs2s (pad)', Util.vs2s, legacy_vs2s, (vs, ' ')),
+                                    ('vl2s', Util.vl2s, legacy_vl2s, (vl, ))):
+            t_old = bench('legacy ' + name, old, arg, number, repeat)
+            t_new = bench(name, new, arg, number, repeat)
+            print '  %-24s %10.1fx' %('speedup', t_old / t_new)
+
+
+if __name__ == '__main__':
+    main()
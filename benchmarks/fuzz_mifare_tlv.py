@@ -0,0 +1,105 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-16
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+
+Fuzzer of the Mifare response TLV parser;
+Mutates the responses of the corpus and parses them as str, bytearray and memoryview; The parser shall raise MifareTLVError only,
+give the same result for every input type, and never return a value out of the response;
+
+Usage: python benchmarks/fuzz_mifare_tlv.py [iterations] [seed]
+'''
+
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyResMan.Util import Util
+from pyResMan.MifareTLV import MifareTLVError, split_responses
+
+CORPUS_PATH_NAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus', 'mifare_tlv.txt')
+
+
+def loadCorpus(pathName=CORPUS_PATH_NAME):
+    corpus = []
+    with open(pathName, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if (len(line) > 0) and (not line.startswith('#')):
+                corpus.append(Util.s2vs(line))
+    return corpus
+
+
+def mutate(rnd, data):
+    data = bytearray(data)
+    for _ in range(rnd.randint(1, 4)):
+        choice = rnd.randint(0, 5)
+        position = rnd.randint(0, len(data)) if len(data) > 0 else 0
+        if (choice == 0) and (len(data) > 0):
+            # Flip a bit;
+            data[position % len(data)] ^= 1 << rnd.randint(0, 7)
+        elif (choice == 1) and (len(data) > 0):
+            # Set a byte, often a length or a tag;
+            data[position % len(data)] = rnd.choice((0x00, 0x01, 0x02, 0x03, 0x7F, 0x80, 0xFE, 0xFF, rnd.randint(0, 0xFF)))
+        elif choice == 2:
+            # Truncate;
+            del data[position : ]
+        elif choice == 3:
+            # Insert bytes;
+            data[position : position] = bytearray(rnd.randint(0, 0xFF) for _ in range(rnd.randint(1, 8)))
+        elif (choice == 4) and (len(data) > 0):
+            # Remove bytes;
+            del data[position : position + rnd.randint(1, 4)]
+        else:
+            # Append the start of another response;
+            data += data[ : rnd.randint(0, len(data))]
+    return str(data)
+
+
+def parse(data):
+    """Return the parsed responses as a list of tuples, or the MifareTLVError message;"""
+    try:
+        responses = split_responses(data)
+    except MifareTLVError, e:
+        return str(e)
+    result = []
+    size = 0
+    for response in responses:
+        size += response.size
+        result.append((response.get_error(), response.get_block_data(), response.get_desfire_data()))
+    if size != len(data):
+        raise AssertionError('Responses size %d, data size %d.' %(size, len(data)))
+    return result
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    rnd = random.Random(seed)
+    corpus = loadCorpus()
+    for data in corpus:
+        if isinstance(parse(data), str):
+            raise AssertionError('Corpus response rejected: %s' %(Util.vs2s(data)))
+    accepted = 0
+    for iteration in xrange(iterations):
+        data = mutate(rnd, rnd.choice(corpus))
+        try:
+            result = parse(data)
+            if (parse(bytearray(data)) != result) or (parse(memoryview(data)) != result):
+                raise AssertionError('Results differ by input type.')
+        except Exception:
+            print 'Iteration %d failed, input: %s' %(iteration, Util.vs2s(data))
+            raise
+        if not isinstance(result, str):
+            accepted += 1
+    print '%d inputs, %d accepted, %d rejected.' %(iterations, accepted, iterations - accepted)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-6
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import threading
+import time
+import timeit
+
+# Records are flushed to the viewer at most 25 times per second;
+DEFAULT_FLUSH_INTERVAL = 0.04
+
+RECORD_COMMAND = 0
+RECORD_RESPONSE = 1
+
+
+class APDUEventSink(object):
+    '''
+    Buffers the apdu command / response events of the controller and delivers them to the viewer in batches;
+    render(records) is called in the viewer thread with a list of records:
+        (RECORD_COMMAND, commandStr, None, timestamp, args)
+        (RECORD_RESPONSE, responseStr, transtime, timestamp, args)
+    schedule(delay, function) shall call function() in the viewer thread after delay seconds;
+    '''
+
+    def __init__(self, render, schedule, interval=DEFAULT_FLUSH_INTERVAL):
+        self.__render = render
+        self.__schedule = schedule
+        self.__interval = interval
+        self.__lock = threading.Lock()
+        self.__records = []
+        self.__flushScheduled = False
+        self.__lastFlushTime = 0.0
+        # Statistics;
+        self.__recordCount = 0
+        self.__flushCount = 0
+        self.__renderTime = 0.0
+
+    def addCommand(self, commandStr, args=tuple()):
+        self.__add((RECORD_COMMAND, commandStr, None, time.time(), args))
+
+    def addResponse(self, responseStr, transtime, args=tuple()):
+        self.__add((RECORD_RESPONSE, responseStr, transtime, time.time(), args))
+
+    def __add(self, record):
+        with self.__lock:
+            self.__records.append(record)
+            if self.__flushScheduled:
+                return
+            self.__flushScheduled = True
+            delay = self.__lastFlushTime + self.__interval - timeit.default_timer()
+        self.__schedule(max(delay, 0.0), self.flush)
+
+    def flush(self):
+        """Deliver the pending records to the viewer; Called in the viewer thread;"""
+        with self.__lock:
+            records = self.__records
+            self.__records = []
+            self.__flushScheduled = False
+            self.__lastFlushTime = timeit.default_timer()
+        if len(records) == 0:
+            return
+        timeStart = timeit.default_timer()
+        try:
+            self.__render(records)
+        finally:
+            self.__renderTime += timeit.default_timer() - timeStart
+            self.__recordCount += len(records)
+            self.__flushCount += 1
+
+    def getStatistics(self):
+        """Return (record count, flush count, render seconds per record);"""
+        recordCount = self.__recordCount
+        if recordCount == 0:
+            return (0, self.__flushCount, 0.0)
+        return (recordCount, self.__flushCount, self.__renderTime / recordCount)
@@ -0,0 +1,239 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-11
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import math
+import threading
+import timeit
+from array import array
+
+# Buckets are spaced logarithmically, BUCKETS_PER_OCTAVE per doubling of the time, from 1us to about 2^32us (71 minutes);
+# A percentile is reported as the upper bound of its bucket, so it is at most 9% higher than the measured time;
+BUCKETS_PER_OCTAVE = 8
+BUCKET_COUNT = 32 * BUCKETS_PER_OCTAVE
+_BUCKET_SCALE = BUCKETS_PER_OCTAVE / math.log(2)
+
+# Fields of a histogram key;
+KEY_FIELDS = ('reader', 'cla', 'ins', 'sw')
+
+LATENCY_FILE_VERSION = 1
+
+
+def bucketIndex(seconds):
+    """Return the bucket of a time in seconds;"""
+    us = seconds * 1000000.0
+    if us <= 1.0:
+        return 0
+    index = int(math.log(us) * _BUCKET_SCALE)
+    if index >= BUCKET_COUNT:
+        return BUCKET_COUNT - 1
+    return index
+
+
+def bucketUpperBound(index):
+    """Return the upper bound of the bucket in seconds;"""
+    return math.pow(2.0, float(index + 1) / BUCKETS_PER_OCTAVE) / 1000000.0
+
+
+class LatencyHistogram(object):
+    '''
+    Fixed bucket histogram of round-trip times;
+    '''
+
+    def __init__(self):
+        self.buckets = array('L', [0]) * BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.buckets[bucketIndex(seconds)] += 1
+        if (self.count == 0) or (seconds < self.min):
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.count += 1
+        self.total += seconds
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        buckets = self.buckets
+        for i, n in enumerate(other.buckets):
+            if n != 0:
+                buckets[i] += n
+        if (self.count == 0) or (other.min < self.min):
+            self.min = other.min
+        if other.max > self.max:
+            self.max = other.max
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, p):
+        """Return the time in seconds which p percent of the round-trips do not exceed;"""
+        if self.count == 0:
+            return 0.0
+        rank = int(math.ceil(self.count * p / 100.0))
+        if rank < 1:
+            rank = 1
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bucketUpperBound(i), self.max)
+        return self.max
+
+    def throughput(self):
+        """Return the round-trips per second of transmit time;"""
+        if self.total <= 0.0:
+            return 0.0
+        return self.count / self.total
+
+    def toDict(self):
+        return {
+            'count' : self.count,
+            'total' : self.total,
+            'min' : self.min,
+            'max' : self.max,
+            'buckets' : dict((str(i), n) for i, n in enumerate(self.buckets) if n != 0),
+        }
+
+    @staticmethod
+    def fromDict(values):
+        histogram = LatencyHistogram()
+        histogram.count = int(values['count'])
+        histogram.total = float(values['total'])
+        histogram.min = float(values['min'])
+        histogram.max = float(values['max'])
+        for i, n in values['buckets'].iteritems():
+            histogram.buckets[int(i)] = int(n)
+        return histogram
+
+
+class LatencyRecorder(object):
+    '''
+    Round-trip time histograms of apdus, keyed by (reader, cla, ins, sw);
+    cla, ins and sw are hex strings; sw is empty if the response is shorter than 2 bytes;
+    '''
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__histograms = {}
+
+    def record(self, readername, command, response, seconds):
+        """Record one round-trip; command and response are value strings;"""
+        cla = '%02X' %(ord(command[0])) if len(command) > 0 else ''
+        ins = '%02X' %(ord(command[1])) if len(command) > 1 else ''
+        sw = '%02X%02X' %(ord(response[-2]), ord(response[-1])) if len(response) > 1 else ''
+        key = (readername, cla, ins, sw)
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram == None:
+                histogram = LatencyHistogram()
+                self.__histograms[key] = histogram
+            histogram.record(seconds)
+
+    def clear(self):
+        with self.__lock:
+            self.__histograms = {}
+
+    def merge(self, other):
+        """Add the histograms of another recorder;"""
+        for key, histogram in other.getHistograms().iteritems():
+            with self.__lock:
+                own = self.__histograms.get(key)
+                if own == None:
+                    own = LatencyHistogram()
+                    self.__histograms[key] = own
+                own.merge(histogram)
+
+    def getHistograms(self, groupBy=KEY_FIELDS):
+        """Return {key: histogram}, merged by the fields in groupBy; The key is a tuple of the values of these fields;"""
+        for field in groupBy:
+            if field not in KEY_FIELDS:
+                raise ValueError('Invalid key field: %s.' %(field))
+        indexes = [KEY_FIELDS.index(field) for field in groupBy]
+        grouped = {}
+        with self.__lock:
+            for key, histogram in self.__histograms.iteritems():
+                groupKey = tuple(key[i] for i in indexes)
+                merged = grouped.get(groupKey)
+                if merged == None:
+                    merged = LatencyHistogram()
+                    grouped[groupKey] = merged
+                merged.merge(histogram)
+        return grouped
+
+    def getSummaries(self, groupBy=KEY_FIELDS):
+        """Return a list of dicts with the key fields, count, p50, p95, p99, max (seconds) and throughput (apdus per second), slowest p99 first;"""
+        summaries = []
+        for key, histogram in self.getHistograms(groupBy).iteritems():
+            summary = dict(zip(groupBy, key))
+            summary['count'] = histogram.count
+            summary['p50'] = histogram.percentile(50)
+            summary['p95'] = histogram.percentile(95)
+            summary['p99'] = histogram.percentile(99)
+            summary['max'] = histogram.max
+            summary['throughput'] = histogram.throughput()
+            summaries.append(summary)
+        summaries.sort(key=lambda summary: summary['p99'], reverse=True)
+        return summaries
+
+    def toDict(self):
+        with self.__lock:
+            entries = []
+            for key, histogram in self.__histograms.iteritems():
+                entry = histogram.toDict()
+                entry.update(zip(KEY_FIELDS, key))
+                entries.append(entry)
+        return {'version' : LATENCY_FILE_VERSION, 'entries' : entries}
+
+    @staticmethod
+    def fromDict(values):
+        if values.get('version') != LATENCY_FILE_VERSION:
+            raise ValueError('Invalid latency data version: %s.' %(values.get('version')))
+        recorder = LatencyRecorder()
+        for entry in values['entries']:
+            key = tuple(entry[field] for field in KEY_FIELDS)
+            recorder.__histograms[key] = LatencyHistogram.fromDict(entry)
+        return recorder
+
+
+class LatencyRecordingInterface(object):
+    '''
+    Wraps a GPInterface (or SimInterface) and records the round-trip time of every transmit;
+    The other methods are forwarded to the wrapped interface;
+    '''
+
+    def __init__(self, scInterface, recorder):
+        self.__scInterface = scInterface
+        self.__recorder = recorder
+        self.__readername = ''
+        self.__transmitCount = 0
+
+    def connect(self, readername, protocol):
+        result = self.__scInterface.connect(readername, protocol)
+        self.__readername = readername
+        return result
+
+    def transmit(self, command):
+        timeStart = timeit.default_timer()
+        response = self.__scInterface.transmit(command)
+        seconds = timeit.default_timer() - timeStart
+        self.__transmitCount += 1
+        self.__recorder.record(self.__readername, command, response, seconds)
+        return response
+
+    def getTransmitCount(self):
+        """Return the number of apdus transmitted;"""
+        return self.__transmitCount
+
+    def __getattr__(self, name):
+        return getattr(self.__scInterface, name)
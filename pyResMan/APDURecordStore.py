@@ -0,0 +1,142 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-8
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+from array import array
+
+# About 100 bytes per record with short apdus;
+DEFAULT_CAPACITY = 100000
+# First capacity of a store without limit (capacity None), it is doubled whenever the store is full;
+GROWING_CAPACITY = 1024
+
+# Record states;
+RECORD_LOADED = 0
+RECORD_SENT = 1
+RECORD_DONE = 2
+
+
+class APDURecordStore(object):
+    '''
+    Fixed capacity ring of apdu records, stored column by column;
+    Each record gets a sequence number when it is appended; Rows are numbered from the oldest record still in the store;
+    When the store is full, appending a record drops the oldest one; A store without capacity (None) grows instead, and
+    never drops a record: a script list must keep all its commands;
+    '''
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if (capacity != None) and (capacity <= 0):
+            raise Exception('Invalid capacity: %d.' %(capacity))
+        self.__growing = capacity == None
+        self.__allocate(GROWING_CAPACITY if self.__growing else capacity)
+        # Sequence number of the oldest record and of the next record;
+        self.__first = 0
+        self.__next = 0
+
+    def __allocate(self, capacity):
+        self.__capacity = capacity
+        self.__commands = [None] * capacity
+        self.__responses = [None] * capacity
+        self.__transtimes = array('d', [0.0]) * capacity
+        self.__timestamps = array('d', [0.0]) * capacity
+        self.__states = bytearray(capacity)
+
+    def __grow(self):
+        # Records are never dropped from a growing store, so record i is at index i, before and after;
+        capacity = self.__capacity
+        self.__capacity = capacity * 2
+        self.__commands.extend([None] * capacity)
+        self.__responses.extend([None] * capacity)
+        self.__transtimes.extend(array('d', [0.0]) * capacity)
+        self.__timestamps.extend(array('d', [0.0]) * capacity)
+        self.__states.extend(bytearray(capacity))
+
+    def getCapacity(self):
+        """Return the most records the store keeps, None if it grows;"""
+        if self.__growing:
+            return None
+        return self.__capacity
+
+    def __len__(self):
+        return self.__next - self.__first
+
+    def clear(self):
+        """Remove all records; The sequence numbers start from 0 again;"""
+        if self.__growing:
+            self.__allocate(GROWING_CAPACITY)
+        else:
+            for i in xrange(self.__capacity):
+                self.__commands[i] = None
+                self.__responses[i] = None
+        self.__first = 0
+        self.__next = 0
+
+    def rowToSequence(self, row):
+        return self.__first + row
+
+    def sequenceToRow(self, sequence):
+        """Return the row of the record, or -1 if it has been dropped;"""
+        if (sequence < self.__first) or (sequence >= self.__next):
+            return -1
+        return sequence - self.__first
+
+    def getLastSequence(self):
+        """Return the sequence number of the newest record, or -1 if the store is empty;"""
+        if self.__next == self.__first:
+            return -1
+        return self.__next - 1
+
+    def append(self, command, state=RECORD_LOADED, timestamp=0.0):
+        """Append one record and return its sequence number;"""
+        if (self.__next - self.__first) == self.__capacity:
+            if self.__growing:
+                self.__grow()
+            else:
+                self.__first += 1
+        sequence = self.__next
+        i = sequence % self.__capacity
+        self.__commands[i] = command
+        self.__responses[i] = None
+        self.__transtimes[i] = 0.0
+        self.__timestamps[i] = timestamp
+        self.__states[i] = state
+        self.__next += 1
+        return sequence
+
+    def setCommand(self, sequence, command, timestamp):
+        """Mark the record as sent again with the command; Return the row, or -1 if the record has been dropped;"""
+        row = self.sequenceToRow(sequence)
+        if row != -1:
+            i = sequence % self.__capacity
+            self.__commands[i] = command
+            self.__responses[i] = None
+            self.__transtimes[i] = 0.0
+            self.__timestamps[i] = timestamp
+            self.__states[i] = RECORD_SENT
+        return row
+
+    def setResponse(self, sequence, response, transtime):
+        """Set the response of the record; Return the row, or -1 if the record has been dropped;"""
+        row = self.sequenceToRow(sequence)
+        if row != -1:
+            i = sequence % self.__capacity
+            self.__responses[i] = response
+            self.__transtimes[i] = transtime
+            self.__states[i] = RECORD_DONE
+        return row
+
+    def getCommand(self, row):
+        return self.__commands[(self.__first + row) % self.__capacity]
+
+    def getRecord(self, row):
+        """Return (sequence, state, command, response, transtime, timestamp) of the row;"""
+        if (row < 0) or (row >= self.__next - self.__first):
+            raise IndexError('Invalid row: %d.' %(row))
+        sequence = self.__first + row
+        i = sequence % self.__capacity
+        return (sequence, self.__states[i], self.__commands[i], self.__responses[i], self.__transtimes[i], self.__timestamps[i])
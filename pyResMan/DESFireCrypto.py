@@ -0,0 +1,510 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-21
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import zlib
+import struct
+import threading
+import collections
+from pyResMan.PythonAES import PythonAES
+
+BLOCK_SIZE = 8
+
+CIPHER_DES = 'DES'
+CIPHER_AES = 'AES'
+
+# Key types of the EV1 authentications, as in the key settings of CreateApplication;
+KEY_TYPE_DES = 0x00
+KEY_TYPE_3K3DES = 0x40
+KEY_TYPE_AES = 0x80
+
+# Communication modes of the files (bits 0 and 1 of the communication settings);
+COMM_PLAIN = 0x00
+COMM_MACED = 0x01
+COMM_ENCIPHERED = 0x03
+
+# Bytes of the CMAC sent with a command or a response;
+CMAC_SIZE = 8
+
+# Ciphers kept by getCipher; A DESFire session uses the card key and one session key;
+CIPHER_CACHE_SIZE = 64
+
+_BLOCK = struct.Struct('>Q')
+_BLOCK16 = struct.Struct('>QQ')
+_CRC32 = struct.Struct('<I')
+
+
+def xorBlock(block1, block2):
+    """Return the exclusive or of two 8 or 16 byte strings;"""
+    if len(block1) == BLOCK_SIZE:
+        return _BLOCK.pack(_BLOCK.unpack(block1)[0] ^ _BLOCK.unpack(block2)[0])
+    a1, a2 = _BLOCK16.unpack(block1)
+    b1, b2 = _BLOCK16.unpack(block2)
+    return _BLOCK16.pack(a1 ^ b1, a2 ^ b2)
+
+
+def crc32(data, crc=0):
+    """Return the CRC32 of the EV1 secure messaging (4 bytes, little endian); crc is the zlib.crc32 of the data before;"""
+    return _CRC32.pack((zlib.crc32(data, crc) ^ 0xFFFFFFFF) & 0xFFFFFFFF)
+
+
+def _clearParity(key):
+    # DESFire keeps the key version in the parity bits of the DES keys;
+    return ''.join(chr(ord(b) & 0xFE) for b in key)
+
+
+def isSingleDES(key):
+    """Return True if the DES key of 8, 16 or 24 bytes is single DES (all its parts are the same but the parity bits);"""
+    key = _clearParity(key)
+    return key == key[0 : 8] * (len(key) / 8)
+
+
+def _desKeys(key):
+    """Return the keys of the DES stages of a DESFire key (8, 16 or 24 bytes); A key of which the halves are the same is
+    single DES, the former DESFire keys are all of that kind;"""
+    if len(key) not in (8, 16, 24):
+        raise Exception('Invalid key length.')
+    if isSingleDES(key):
+        return (key[0 : 8], )
+    if len(key) == 16:
+        return (key[0 : 8], key[8 : 16], key[0 : 8])
+    return (key[0 : 8], key[8 : 16], key[16 : 24])
+
+
+class _PyCryptoBackend(object):
+    '''
+    PyCrypto or PyCryptodome;
+    '''
+
+    name = 'pycrypto'
+    aesName = 'pycrypto'
+
+    def __init__(self):
+        from Crypto.Cipher import AES, DES, DES3
+        self.__AES = AES
+        self.__DES = DES
+        self.__DES3 = DES3
+
+    def newECB(self, algorithm, key):
+        if algorithm == CIPHER_AES:
+            c = self.__AES.new(key, self.__AES.MODE_ECB)
+        else:
+            keys = _desKeys(key)
+            if len(keys) == 1:
+                c = self.__DES.new(keys[0], self.__DES.MODE_ECB)
+            else:
+                c = self.__DES3.new(''.join(keys), self.__DES3.MODE_ECB)
+        return c.encrypt, c.decrypt
+
+
+class _CryptographyBackend(object):
+    '''
+    cryptography (OpenSSL);
+    '''
+
+    name = 'cryptography'
+    aesName = 'cryptography'
+
+    def __init__(self):
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        from cryptography.hazmat.backends import default_backend
+        self.__Cipher = Cipher
+        self.__algorithms = algorithms
+        self.__modes = modes
+        self.__backend = default_backend()
+
+    def newECB(self, algorithm, key):
+        if algorithm == CIPHER_AES:
+            c = self.__Cipher(self.__algorithms.AES(key), self.__modes.ECB(), backend=self.__backend)
+        else:
+            # Single DES is the triple DES of three same keys;
+            keys = _desKeys(key)
+            key = keys[0] * 3 if len(keys) == 1 else ''.join(keys)
+            c = self.__Cipher(self.__algorithms.TripleDES(key), self.__modes.ECB(), backend=self.__backend)
+        # ECB contexts keep no state between the blocks, they are not finalized;
+        return c.encryptor().update, c.decryptor().update
+
+
+class _PyDesBackend(object):
+    '''
+    pyDes, pure Python; AES is PythonAES;
+    '''
+
+    name = 'pyDes'
+    aesName = 'PythonAES'
+
+    def __init__(self):
+        import pyDes
+        self.__pyDes = pyDes
+
+    def newECB(self, algorithm, key):
+        if algorithm == CIPHER_AES:
+            c = PythonAES(key)
+        else:
+            keys = _desKeys(key)
+            if len(keys) == 1:
+                c = self.__pyDes.des(keys[0], self.__pyDes.ECB)
+            else:
+                c = self.__pyDes.triple_des(''.join(keys), self.__pyDes.ECB)
+        return c.encrypt, c.decrypt
+
+
+# Backends in the order of preference;
+_BACKEND_CLASSES = (_PyCryptoBackend, _CryptographyBackend, _PyDesBackend)
+
+_lock = threading.Lock()
+_backend = None
+_ciphers = collections.OrderedDict()
+
+
+def getBackendNames():
+    """Return the names of the backends which can be imported, the fastest first;"""
+    names = []
+    for backendClass in _BACKEND_CLASSES:
+        try:
+            backendClass()
+        except ImportError:
+            continue
+        names.append(backendClass.name)
+    return names
+
+
+def setBackend(name=None):
+    """Use the backend of the name, or the fastest available one if name is None; The cached ciphers are dropped;"""
+    global _backend
+    backend = None
+    for backendClass in _BACKEND_CLASSES:
+        if (name != None) and (backendClass.name != name):
+            continue
+        try:
+            backend = backendClass()
+        except ImportError:
+            if name != None:
+                raise Exception('DESFire crypto backend %s is not available.' %(name))
+            continue
+        break
+    if backend == None:
+        raise Exception('No DESFire crypto backend available.')
+    with _lock:
+        _backend = backend
+        _ciphers.clear()
+
+
+def getBackendName(algorithm=CIPHER_DES):
+    """Return the name of the backend, or of its AES implementation if algorithm is CIPHER_AES;"""
+    backend = _getBackend()
+    return backend.aesName if algorithm == CIPHER_AES else backend.name
+
+
+def _getBackend():
+    if _backend == None:
+        setBackend()
+    return _backend
+
+
+class DESFireCipher(object):
+    '''
+    DES, triple DES or AES of one key; The key schedule is made once, when the cipher is created;
+    encrypt() and decrypt() are CBC with a zero IV by default, like the pyDes ciphers the DESFire commands used before;
+    '''
+
+    def __init__(self, key, backend, algorithm=CIPHER_DES):
+        self.key = key
+        self.algorithm = algorithm
+        self.backend = backend.name
+        self.blockSize = 16 if algorithm == CIPHER_AES else BLOCK_SIZE
+        self.__lock = threading.Lock()
+        self.__encrypt, self.__decrypt = backend.newECB(algorithm, key)
+
+    def encryptECB(self, data):
+        with self.__lock:
+            return self.__encrypt(data)
+
+    def decryptECB(self, data):
+        with self.__lock:
+            return self.__decrypt(data)
+
+    def encrypt(self, data, iv=None):
+        blockSize = self.blockSize
+        if len(data) % blockSize != 0:
+            raise Exception('Invalid data length.')
+        if iv == None:
+            iv = '\x00' * blockSize
+        blocks = []
+        with self.__lock:
+            for offset in xrange(0, len(data), blockSize):
+                iv = self.__encrypt(xorBlock(data[offset : offset + blockSize], iv))
+                blocks.append(iv)
+        return ''.join(blocks)
+
+    def decrypt(self, data, iv=None):
+        blockSize = self.blockSize
+        if len(data) % blockSize != 0:
+            raise Exception('Invalid data length.')
+        if iv == None:
+            iv = '\x00' * blockSize
+        with self.__lock:
+            plain = self.__decrypt(data)
+        if len(data) == blockSize:
+            return xorBlock(plain, iv)
+        blocks = []
+        for offset in xrange(0, len(data), blockSize):
+            blocks.append(xorBlock(plain[offset : offset + blockSize], iv))
+            iv = data[offset : offset + blockSize]
+        return ''.join(blocks)
+
+
+def newCipher(key, algorithm=CIPHER_DES):
+    """Return a cipher of the key which is not cached, for the keys used once like the session keys;"""
+    return DESFireCipher(key, _getBackend(), algorithm)
+
+
+def getCipher(key, algorithm=CIPHER_DES):
+    """Return the cipher of the key (str), from the cache if it was used lately;"""
+    backend = _getBackend()
+    with _lock:
+        cipher = _ciphers.pop((algorithm, key), None)
+        if (cipher == None) or (cipher.backend != backend.name):
+            cipher = DESFireCipher(key, backend, algorithm)
+        if len(_ciphers) >= CIPHER_CACHE_SIZE:
+            _ciphers.popitem(False)
+        _ciphers[(algorithm, key)] = cipher
+        return cipher
+
+
+def keyCipher(keyType, key):
+    """Return the (cached) cipher of a card key of the key type; A DES key of 8 bytes is used as a 16 byte key;"""
+    if keyType == KEY_TYPE_AES:
+        if len(key) != 16:
+            raise Exception('Invalid AES key length.')
+        return getCipher(key, CIPHER_AES)
+    if len(key) == 8:
+        key = key * 2
+    if len(key) != (24 if keyType == KEY_TYPE_3K3DES else 16):
+        raise Exception('Invalid key length.')
+    return getCipher(key)
+
+
+def randomSize(keyType):
+    """Return the size of the random numbers of an EV1 authentication with the key type;"""
+    return 8 if keyType == KEY_TYPE_DES else 16
+
+
+def sessionKey(keyType, key, randomA, randomB):
+    """Return the session key of an EV1 (ISO or AES) authentication;"""
+    a = randomA
+    b = randomB
+    if keyType == KEY_TYPE_AES:
+        return a[0 : 4] + b[0 : 4] + a[12 : 16] + b[12 : 16]
+    if keyType == KEY_TYPE_3K3DES:
+        return a[0 : 4] + b[0 : 4] + a[6 : 10] + b[6 : 10] + a[12 : 16] + b[12 : 16]
+    if isSingleDES(key):
+        return a[0 : 4] + b[0 : 4] + a[0 : 4] + b[0 : 4]
+    return a[0 : 4] + b[0 : 4] + a[4 : 8] + b[4 : 8]
+
+
+def rotateLeft(data):
+    return data[1 : ] + data[0]
+
+
+def _subkeys(cipher):
+    """Return the CMAC subkeys K1 and K2 of the cipher;"""
+    blockSize = cipher.blockSize
+    bits = blockSize * 8
+    mask = (1 << bits) - 1
+    rb = 0x87 if blockSize == 16 else 0x1B
+    l = int(cipher.encryptECB('\x00' * blockSize).encode('hex'), 16)
+    subkeys = []
+    for i in xrange(2):
+        l = ((l << 1) & mask) ^ (rb if (l >> (bits - 1)) else 0)
+        subkeys.append(('%0*x' %(blockSize * 2, l)).decode('hex'))
+    return subkeys
+
+
+class DESFireCMAC(object):
+    '''
+    CMAC of one command or response of a session, computed while the data arrives; It starts from the IV of the session
+    and final() makes the CMAC the IV of the session;
+    '''
+
+    def __init__(self, session):
+        self.__session = session
+        self.__state = session.iv
+        self.__pending = ''
+
+    def update(self, data):
+        cipher = self.__session.cipher
+        data = self.__pending + data
+        # The last block is kept for final(), it is the one xored with a subkey;
+        size = ((len(data) - 1) / cipher.blockSize) * cipher.blockSize if len(data) > 0 else 0
+        if size > 0:
+            self.__state = cipher.encrypt(data[0 : size], self.__state)[-cipher.blockSize : ]
+        self.__pending = data[size : ]
+
+    def final(self):
+        session = self.__session
+        blockSize = session.cipher.blockSize
+        k1, k2 = session.subkeys
+        if len(self.__pending) == blockSize:
+            last = xorBlock(self.__pending, k1)
+        else:
+            last = xorBlock((self.__pending + '\x80').ljust(blockSize, '\x00'), k2)
+        cmac = session.cipher.encryptECB(xorBlock(last, self.__state))
+        session.iv = cmac
+        return cmac
+
+
+class _MACedResponse(object):
+    '''
+    Response of a plain or MACed command, the CMAC is the last 8 bytes;
+    '''
+
+    def __init__(self, session):
+        self.__cmac = DESFireCMAC(session)
+        self.__held = ''
+
+    def update(self, data):
+        data = self.__held + data
+        # Hold back the bytes which may be the CMAC;
+        data, self.__held = data[0 : -CMAC_SIZE], data[-CMAC_SIZE : ]
+        self.__cmac.update(data)
+        return data
+
+    def final(self, status):
+        if len(self.__held) != CMAC_SIZE:
+            raise Exception('The response has no CMAC.')
+        self.__cmac.update(chr(status))
+        if self.__cmac.final()[0 : CMAC_SIZE] != self.__held:
+            raise Exception('Invalid CMAC of the response.')
+        return ''
+
+
+class _EncipheredResponse(object):
+    '''
+    Response of an enciphered command: the data, the CRC32 of the data and the status, zeros; length is the size of the
+    data, it is required: the CRC32 can not be told from the data by searching it at the end of the response (a CRC32
+    which ends with zeros is taken for padding);
+    '''
+
+    def __init__(self, session, length):
+        if length == None:
+            raise Exception('The length of an enciphered response is required.')
+        self.__session = session
+        self.__length = length
+        self.__iv = session.iv
+        self.__pending = ''
+        self.__plain = ''
+        self.__crc = 0
+        self.__size = 0
+
+    def update(self, data):
+        cipher = self.__session.cipher
+        blockSize = cipher.blockSize
+        data = self.__pending + data
+        size = len(data) - len(data) % blockSize
+        if size > 0:
+            self.__plain += cipher.decrypt(data[0 : size], self.__iv)
+            self.__iv = data[size - blockSize : size]
+        self.__pending = data[size : ]
+        # Hold back the CRC32 and the padding;
+        count = min(len(self.__plain), self.__length - self.__size)
+        data = self.__plain[0 : count]
+        self.__plain = self.__plain[count : ]
+        self.__crc = zlib.crc32(data, self.__crc)
+        self.__size += len(data)
+        return data
+
+    def final(self, status):
+        if len(self.__pending) != 0:
+            raise Exception('Invalid length of the enciphered response.')
+        plain = self.__plain
+        size = self.__length - self.__size
+        if (len(plain) < size + 4) or (plain[size + 4 : ].strip('\x00') != ''):
+            raise Exception('Invalid padding of the enciphered response.')
+        if crc32(plain[0 : size] + chr(status), self.__crc) != plain[size : size + 4]:
+            raise Exception('Invalid CRC of the enciphered response.')
+        self.__session.iv = self.__iv
+        return plain[0 : size]
+
+
+class DESFireSession(object):
+    '''
+    Secure messaging of an EV1 (ISO or AES) authentication: the session key cipher, its CMAC subkeys and the IV, which is
+    chained through the commands and responses of the session;
+    The PCD sends commands with wrapCommand() and reads the responses with beginResponse() or unwrapResponse();
+    The PICC (the simulator) uses unwrapCommand() and wrapResponse();
+    '''
+
+    def __init__(self, keyType, keyNo, key):
+        self.keyType = keyType
+        self.keyNo = keyNo
+        self.cipher = newCipher(key, CIPHER_AES if keyType == KEY_TYPE_AES else CIPHER_DES)
+        self.subkeys = _subkeys(self.cipher)
+        self.iv = '\x00' * self.cipher.blockSize
+
+    def cmac(self, data):
+        cmac = DESFireCMAC(self)
+        cmac.update(data)
+        return cmac.final()
+
+    def encrypt(self, data):
+        """Encrypt the data, padded with zeros, in CBC mode from the IV;"""
+        blockSize = self.cipher.blockSize
+        if len(data) % blockSize != 0:
+            data += '\x00' * (blockSize - len(data) % blockSize)
+        data = self.cipher.encrypt(data, self.iv)
+        self.iv = data[-blockSize : ]
+        return data
+
+    def decrypt(self, data):
+        plain = self.cipher.decrypt(data, self.iv)
+        self.iv = data[-self.cipher.blockSize : ]
+        return plain
+
+    def wrapCommand(self, command, data='', mode=COMM_PLAIN):
+        """Return the data to send after the command (the command code and its parameters) in the communication mode;"""
+        if mode == COMM_ENCIPHERED:
+            return self.encrypt(data + crc32(command + data))
+        cmac = self.cmac(command + data)
+        if mode == COMM_MACED:
+            return data + cmac[0 : CMAC_SIZE]
+        return data
+
+    def beginResponse(self, mode=COMM_PLAIN, length=None):
+        """Return the reader of a response in the communication mode: update(data) returns the data checked so far and
+        final(status) returns the rest of it, it raises an exception if the CMAC or the CRC is not right; length is the
+        size of the data, required in COMM_ENCIPHERED;"""
+        if mode == COMM_ENCIPHERED:
+            return _EncipheredResponse(self, length)
+        return _MACedResponse(self)
+
+    def unwrapResponse(self, data, status, mode=COMM_PLAIN, length=None):
+        response = self.beginResponse(mode, length)
+        data = response.update(data)
+        return data + response.final(status)
+
+    def unwrapCommand(self, command, data, mode=COMM_PLAIN, length=0):
+        """Return the data of a command received in the communication mode, length is the size of enciphered data;"""
+        if mode == COMM_ENCIPHERED:
+            plain = self.decrypt(data)
+            if crc32(command + plain[0 : length]) != plain[length : length + 4]:
+                raise Exception('Invalid CRC of the enciphered command.')
+            return plain[0 : length]
+        if mode == COMM_MACED:
+            data, cmac = data[0 : -CMAC_SIZE], data[-CMAC_SIZE : ]
+            if self.cmac(command + data)[0 : CMAC_SIZE] != cmac:
+                raise Exception('Invalid CMAC of the command.')
+            return data
+        self.cmac(command + data)
+        return data
+
+    def wrapResponse(self, data, status, mode=COMM_PLAIN):
+        if mode == COMM_ENCIPHERED:
+            return self.encrypt(data + crc32(data + chr(status)))
+        return data + self.cmac(data + chr(status))[0 : CMAC_SIZE]
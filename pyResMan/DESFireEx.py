@@ -8,48 +8,15 @@ from desfire.protocol import DESFire, FILE_COMMUNICATION, FILE_TYPES,\
     DESFireCommunicationError
 from desfire.util import dword_to_byte_array, byte_array_to_human_readable_hex
 from pyResMan.Util import Util
-import pyDes
+import os
 import time
+import timeit
 
-AUTHENTICATE                = 0x0A
-AUTHENTICATE_ISO            = 0x1A
-AUTHENTICATE_AES            = 0xAA
-CHANGE_KEY_SETTINGS         = 0x54
-SET_CONFIGURATION           = 0x5C
-CHANGE_KEY                  = 0xC4
-GET_KEY_VERSION             = 0x64
-CREATE_APPLICATION          = 0xCA
-DELETE_APPLICATION          = 0xDA
-GET_APPLICATION_IDS         = 0x6A
-FREE_MEMORY                 = 0x6E
-GET_DF_NAMES                = 0x6D
-GET_KEY_SETTINGS            = 0x45
-SELECT_APPLICATION          = 0x5A
-FORMAT_PICC                 = 0xFC
-GET_VERSION                 = 0x60
-GET_CARD_UID                = 0x51
-GET_FILE_IDS                = 0x6F
-GET_FILE_SETTINGS           = 0xF5
-CHANGE_FILE_SETTINGS        = 0x5F
-CREATE_STDDATAFILE          = 0xCD
-CREATE_BACKUPDATAFILE       = 0xCB
-CREATE_VALUE_FILE           = 0xCC
-CREATE_LINEAR_RECORD_FILE   = 0xC1
-CREATE_CYCLIC_RECORD_FILE   = 0xC0
-DELETE_FILE                 = 0xDF
-GET_ISO_FILE_IDS            = 0x61
-READ_DATA                   = 0x8D
-WRITE_DATA                  = 0x3D
-GET_VALUE                   = 0x6C
-CREDIT                      = 0x0C
-DEBIT                       = 0xDC
-LIMITED_CREDIT              = 0x1C
-WRITE_RECORD                = 0x3B
-READ_RECORDS                = 0xBB
-CLEAR_RECORD_FILE           = 0xEB
-COMMIT_TRANSACTION          = 0xC7
-ABORT_TRANSACTION           = 0xA7
-CONTINUE                    = 0xAF
+# The command codes are defined in DESFireCommands, which can be imported without the desfire library;
+from pyResMan.DESFireCommands import *
+from pyResMan.DESFireFrames import DEFAULT_FRAME_DATA, MIN_FRAME_DATA, MAX_FRAME_DATA
+from pyResMan.DESFireCrypto import getCipher, newCipher, xorBlock, keyCipher, randomSize, sessionKey, rotateLeft, crc32,\
+    DESFireSession, KEY_TYPE_DES, KEY_TYPE_3K3DES, KEY_TYPE_AES, COMM_PLAIN, COMM_ENCIPHERED
 
 ERRORS = {
 #       0x00: 'OPERATION_OK Successful operation'
@@ -76,12 +43,40 @@ ERRORS = {
     , 0xF1: 'FILE_INTEGRITY_ERROR Unrecoverable error within file, file will be disabled'
 }
 
+# Commands which change the selected application (its keys, files or data), see DESFireEx.touched_applications;
+APPLICATION_WRITE_COMMANDS = frozenset([
+    CHANGE_KEY_SETTINGS, CHANGE_KEY, CHANGE_FILE_SETTINGS,
+    CREATE_STDDATAFILE, CREATE_BACKUPDATAFILE, CREATE_VALUE_FILE, CREATE_LINEAR_RECORD_FILE, CREATE_CYCLIC_RECORD_FILE, DELETE_FILE,
+    WRITE_DATA, CREDIT, DEBIT, LIMITED_CREDIT, WRITE_RECORD, CLEAR_RECORD_FILE, COMMIT_TRANSACTION,
+])
+# Commands which change the application list of the PICC;
+PICC_WRITE_COMMANDS = frozenset([CREATE_APPLICATION, DELETE_APPLICATION, FORMAT_PICC, SET_CONFIGURATION])
+
 import sys
 if sys.version_info[0] < 3:
     def bytes(l):
         return ''.join(chr(b) for b in l)
 
 
+class TransferStatistics(object):
+    '''
+    Bytes and frames of one streamed transfer and its duration;
+    '''
+
+    def __init__(self):
+        self.size = 0
+        self.frames = 0
+        self.duration = 0.0
+
+    def bytes_per_second(self):
+        if self.duration <= 0.0:
+            return 0.0
+        return self.size / self.duration
+
+    def __str__(self):
+        return '%d bytes in %d frames, %.1f ms, %.0f bytes/s' %(self.size, self.frames, self.duration * 1000, self.bytes_per_second())
+
+
 class DESFireEx(DESFire):
     '''
     Extended DESFire class.
@@ -94,9 +89,63 @@ class DESFireEx(DESFire):
         DESFire.__init__(self, device)
 
         self.session_cipher = None
+        # Secure messaging of an ISO or AES authentication, see DESFireCrypto.DESFireSession;
+        self.session = None
         self.key_id = 0
+        # Communication modes of the files of the selected application;
+        self.file_com_sets = {}
+        # Native data of one frame, the parameters of the first frame included;
+        self.frame_data = DEFAULT_FRAME_DATA
+        # Selected application, None if it is not known;
+        self.app_id = None
+        # Version of the card and its UID, read by get_version;
+        self.version_info = None
+        self.uid = None
+        # Applications changed since the last inventory (0 is the PICC level, None an unknown application), see
+        # DESFireInventory;
+        self.touched_applications = set()
+
+    def set_frame_data(self, frame_data):
+        """Set the native data one frame carries, see DESFireFrames;"""
+        if (frame_data < MIN_FRAME_DATA) or (frame_data > MAX_FRAME_DATA):
+            raise ValueError('Invalid frame data size: %d.' %(frame_data))
+        self.frame_data = frame_data
     
-    def communicate(self, apdu_cmd, description, allow_continue_fallthrough=False):
+    def reset_authentication(self):
+        """Forget the session; The card ends the authentication on an error or when an application is selected."""
+        self.session = None
+        self.session_cipher = None
+
+    def card_activated(self):
+        """The card was activated again: the PICC level is selected and the authentication ended."""
+        self.reset_authentication()
+        self.file_com_sets = {}
+        self.app_id = 0x000000
+
+    def forget_card(self):
+        """Forget what is known of the card, when another card is presented."""
+        self.reset_authentication()
+        self.file_com_sets = {}
+        self.app_id = None
+        self.version_info = None
+        self.uid = None
+        self.touched_applications = set()
+
+    def __touch(self, command):
+        """Note the application the command changes, see touched_applications."""
+        if command in PICC_WRITE_COMMANDS:
+            self.touched_applications.add(0x000000)
+        elif command in APPLICATION_WRITE_COMMANDS:
+            self.touched_applications.add(self.app_id)
+
+    @classmethod
+    def native_command(cls, apdu_cmd):
+        """Return the native command (command code and parameters, str) of a wrapped command."""
+        if len(apdu_cmd) > 5:
+            return bytes(apdu_cmd[1 : 2] + apdu_cmd[5 : -1])
+        return bytes(apdu_cmd[1 : 2])
+
+    def communicate(self, apdu_cmd, description, allow_continue_fallthrough=False, secure_messaging=True):
         """Communicate with a NFC tag.
 
         Send in outgoing request and waith for a card reply.
@@ -109,11 +158,29 @@ class DESFireEx(DESFire):
 
         :param allow_continue_fallthrough: If True 0xAF response (incoming more data, need mode data) is instantly returned to the called instead of trying to handle it internally
 
+        :param secure_messaging: If True and an ISO or AES authentication is done, the command is CMACed and the CMAC of the response is checked and removed
+
         :raise: :py:class:`desfire.protocol.DESFireCommunicationError` on any error
 
         :return: tuple(APDU response as list of bytes, bool if additional frames are inbound)
         """
 
+        # A command which fails may have changed the card too;
+        self.__touch(apdu_cmd[1])
+        session = self.session if secure_messaging else None
+        if session != None:
+            session.wrapCommand(self.native_command(apdu_cmd))
+
+        try:
+            result, status = self.__communicate(apdu_cmd, description, allow_continue_fallthrough)
+            if (session != None) and (status == 0x00):
+                result = [ord(b) for b in session.unwrapResponse(bytes(result), status)]
+        except Exception:
+            self.reset_authentication()
+            raise
+        return result
+
+    def __communicate(self, apdu_cmd, description, allow_continue_fallthrough):
         result = []
         additional_framing_needed = True
 
@@ -126,16 +193,7 @@ class DESFireEx(DESFire):
             resp = self.device.transceive(apdu_cmd)
             self.logger.debug("Received APDU response: %s", byte_array_to_human_readable_hex(resp))
 
-            if resp[-2] != 0x91:
-                raise DESFireCommunicationError("Received invalid response for command: {}".format(description), resp[-2:])
-
-            # Possible status words: https://github.com/jekkos/android-hce-desfire/blob/master/hceappletdesfire/src/main/java/net/jpeelaer/hce/desfire/DesfireStatusWord.java
-            status = resp[-1]
-
-            # Check for known error interpretation
-            error_msg = ERRORS.get(status)
-            if error_msg:
-                raise DESFireCommunicationError(error_msg, status)
+            status = self.check_status(resp[-2:], description)
 
             if status == 0xaf:
                 if allow_continue_fallthrough:
@@ -144,8 +202,6 @@ class DESFireEx(DESFire):
                     # Need to loop more cycles to fill in receive buffer
                     additional_framing_needed = True
                     apdu_cmd = self.wrap_command(0xaf)  # Continue
-            elif status != 0x00:
-                raise DESFireCommunicationError("Error {:02x} when communicating".format(status), status)
             else:
                 additional_framing_needed = False
 
@@ -154,62 +210,178 @@ class DESFireEx(DESFire):
             unframed = list(resp[0:-2])
             result += unframed
 
-        return result
+        return result, status
+
+    def check_status(self, sw, description):
+        """Check the status word (2 ints) of a response; Return the status (0x00 or 0xAF);
+
+        :raise: :py:class:`desfire.protocol.DESFireCommunicationError` if the status is an error
+        """
+        if sw[0] != 0x91:
+            raise DESFireCommunicationError("Received invalid response for command: {}".format(description), sw)
+
+        # Possible status words: https://github.com/jekkos/android-hce-desfire/blob/master/hceappletdesfire/src/main/java/net/jpeelaer/hce/desfire/DesfireStatusWord.java
+        status = sw[1]
+
+        # Check for known error interpretation
+        error_msg = ERRORS.get(status)
+        if error_msg:
+            raise DESFireCommunicationError(error_msg, status)
+        if (status != 0x00) and (status != 0xaf):
+            raise DESFireCommunicationError("Error {:02x} when communicating".format(status), status)
+        return status
+
+    def iter_frames(self, apdu_cmd, description, mode=COMM_PLAIN, length=None):
+        """Send the command, then a CONTINUE command for every 0xAF response;
+
+        The responses are not converted to lists of ints, the data of each frame is yielded as a str as soon as it arrives.
+        After an ISO or AES authentication the command is CMACed, and the response is checked (and deciphered if mode is
+        COMM_ENCIPHERED, length is then the size of the data, see read_length) while it arrives.
+
+        :raise: :py:class:`desfire.protocol.DESFireCommunicationError` on any error
+        """
+        transmit = self.device.transmit
+        command = bytes(apdu_cmd)
+        continue_command = bytes(self.wrap_command(0xaf))
+        response = None
+        if self.session != None:
+            self.session.wrapCommand(self.native_command(apdu_cmd))
+            response = self.session.beginResponse(mode, length)
+        try:
+            while True:
+                resp = transmit(command)
+                if len(resp) < 2:
+                    raise DESFireCommunicationError("Received invalid response for command: {}".format(description), [ord(c) for c in resp])
+                status = self.check_status([ord(resp[-2]), ord(resp[-1])], description)
+                data = resp[:-2]
+                if response != None:
+                    data = response.update(data)
+                    if status != 0xaf:
+                        data += response.final(status)
+                yield data
+                if status != 0xaf:
+                    return
+                command = continue_command
+        except Exception:
+            self.reset_authentication()
+            raise
 
     def authenticate(self, key_id, private_key=[0x00] * 16):
+        self.reset_authentication()
         apdu_command = self.wrap_command(0x0a, [key_id])
         resp = self.communicate(apdu_command, "Authenticating key {:02X}".format(key_id), allow_continue_fallthrough=True)
 
         # We get 8 bytes challenge
-        random_b_encrypted = list(resp)
+        random_b_encrypted = bytes(resp)
         assert len(random_b_encrypted) == 8
 
-        initial_value = b"\00" * 8
-        
-        k = pyDes.triple_des(bytes(private_key), pyDes.CBC, initial_value, pad=None, padmode=pyDes.PAD_NORMAL)
+        # The cipher of the key is cached, its key schedule is made only on the first authentication;
+        k = getCipher(bytes(private_key))
 
-        decrypted_b = [ord(b) for b in (k.decrypt(bytes(random_b_encrypted)))]
+        decrypted_b = k.decrypt(random_b_encrypted)
 
         # shift randB one byte left and get randB'
-        shifted_b = decrypted_b[1:8] + [decrypted_b[0]]
-
-        # Generate random_a
-        # NOT A REAL RANDOM NUMBER AND NOT IV XORRED
-#         random_a = [0x00] * 8
-        random_a = [0x11, 0x22, 0x33, 0x44, 0x55, 0x66, 0x77, 0x88]
-
-        decrypted_a = [ord(b) for b in k.decrypt(bytes(random_a))]
+        shifted_b = decrypted_b[1:8] + decrypted_b[0]
 
-        xorred = []
+        random_a = os.urandom(8)
 
-        for i in range(0, 8):
-            xorred.append(decrypted_a[i] ^ shifted_b[i])
+        decrypted_a = k.decrypt(random_a)
 
-        decrypted_xorred = [ord(b) for b in k.decrypt(bytes(xorred))]
+        decrypted_xorred = k.decrypt(xorBlock(decrypted_a, shifted_b))
 
-        final_bytes = decrypted_a + decrypted_xorred
+        final_bytes = [ord(b) for b in decrypted_a + decrypted_xorred]
         assert len(final_bytes) == 16
 
         apdu_command = self.wrap_command(0xaf, final_bytes)
         resp = self.communicate(apdu_command, "Authenticating continues with key {:02X}".format(key_id))
         assert len(resp) == 8
 
-        decrypted_check_a1 = [ord(b) for b in k.decrypt(bytes(resp))]
-        check_a1 = [random_a[-1]] + random_a[0 : len(random_a) - 1]
-        assert (decrypted_check_a1 != check_a1)
+        if k.decrypt(bytes(resp)) != rotateLeft(random_a):
+            raise Exception('Authentication failed, invalid card cryptogram.')
 
         self.logger.info("Received session key %s", byte_array_to_human_readable_hex(resp))
 
-        if random_a == decrypted_b:
-            self.session_key = random_a[0 : 4] + decrypted_b[0 : 4] + random_a[0 : 4] + decrypted_b[0 : 4]
-        else:
-            self.session_key = random_a[0 : 4] + decrypted_b[0 : 4] + random_a[4 : 8] + decrypted_b[4 : 8]
+        # A single DES key (both halves the same) makes a single DES session key;
+        session_key = sessionKey(KEY_TYPE_DES, k.key, random_a, decrypted_b)
+        self.session_key = [ord(b) for b in session_key]
 
-        initial_value = b"\00" * 8
-        self.session_cipher = pyDes.triple_des(bytes(self.session_key), pyDes.CBC, initial_value, pad=None, padmode=pyDes.PAD_NORMAL)
+        self.session_cipher = newCipher(session_key)
         self.key_id = key_id
         
         return resp
+
+    def authenticate_iso(self, key_id, private_key=[0x00] * 16):
+        """EV1 ISO authentication with a 2K3DES key (16 bytes) or a 3K3DES key (24 bytes);
+
+        The commands after it are CMACed, see :py:class:`pyResMan.DESFireCrypto.DESFireSession`.
+        """
+        key_type = KEY_TYPE_3K3DES if len(private_key) == 24 else KEY_TYPE_DES
+        return self.authenticate_ev1(AUTHENTICATE_ISO, key_type, key_id, private_key)
+
+    def authenticate_aes(self, key_id, private_key=[0x00] * 16):
+        """EV1 AES authentication with an AES key (16 bytes);
+
+        The commands after it are CMACed, see :py:class:`pyResMan.DESFireCrypto.DESFireSession`.
+        """
+        return self.authenticate_ev1(AUTHENTICATE_AES, KEY_TYPE_AES, key_id, private_key)
+
+    def authenticate_ev1(self, command, key_type, key_id, private_key):
+        self.reset_authentication()
+        key = bytes(private_key)
+        k = keyCipher(key_type, key)
+        block_size = k.blockSize
+
+        apdu_command = self.wrap_command(command, [key_id])
+        resp = self.communicate(apdu_command, "Authenticating key {:02X}".format(key_id), allow_continue_fallthrough=True)
+        random_b_encrypted = bytes(resp)
+        if len(random_b_encrypted) != randomSize(key_type):
+            raise Exception('Authentication failed, invalid challenge length: %d.' %(len(random_b_encrypted)))
+
+        # The IV is chained through the authentication: each cryptogram is enciphered from the last block received or sent;
+        random_b = k.decrypt(random_b_encrypted)
+        random_a = os.urandom(len(random_b))
+        token = k.encrypt(random_a + rotateLeft(random_b), random_b_encrypted[-block_size:])
+
+        apdu_command = self.wrap_command(0xaf, [ord(b) for b in token])
+        resp = self.communicate(apdu_command, "Authenticating continues with key {:02X}".format(key_id))
+        if k.decrypt(bytes(resp), token[-block_size:]) != rotateLeft(random_a):
+            raise Exception('Authentication failed, invalid card cryptogram.')
+
+        session_key = sessionKey(key_type, key, random_a, random_b)
+        self.session_key = [ord(b) for b in session_key]
+        self.session = DESFireSession(key_type, key_id, session_key)
+        self.key_id = key_id
+
+        return resp
+
+    def select_application(self, app_id):
+        # Selecting an application ends the authentication;
+        self.reset_authentication()
+        self.file_com_sets = {}
+        self.app_id = None
+        DESFire.select_application(self, app_id)
+        self.app_id = app_id
+
+    def read_length(self, file_id, offset, length, records=False):
+        """Return the size of the data a ReadData (or ReadRecords if records) of the file returns, length 0 reads up to the
+        end of the file; The size is needed to find the CRC of an enciphered response, the file settings are read if
+        length is 0 or records is True.
+        """
+        if (length > 0) and (not records):
+            return length
+        file_settings = self.get_file_settings(file_id)
+        if records:
+            count = length if length > 0 else file_settings["current_num_of_records"] - offset
+            return file_settings["record_size"] * count
+        return file_settings["file_size"] - offset
+
+    def get_file_com_set(self, file_id):
+        """Return the communication mode of a file of the selected application, the file settings are read only once;"""
+        com_set = self.file_com_sets.get(file_id)
+        if com_set == None:
+            self.get_file_settings(file_id)
+            com_set = self.file_com_sets[file_id]
+        return com_set
     
     def parse_version(self, version_data):
         version_info = {}
@@ -244,7 +416,14 @@ class DESFireEx(DESFire):
     def get_version(self):
         get_version = self.wrap_command(GET_VERSION)
         version_data = self.communicate(get_version, "Get version")
-        return self.parse_version(version_data)
+        self.version_info = self.parse_version(version_data)
+        self.uid = self.version_info['uid']
+        return self.version_info
+
+    def get_free_memory(self):
+        apdu_command = self.wrap_command(FREE_MEMORY)
+        resp = self.communicate(apdu_command, "Get free memory")
+        return Util.byte_array3_to_dword(resp[0:3])
     
     def delete_application(self, app_id):
         delete_application = self.wrap_command(DELETE_APPLICATION, [((app_id >> 16) & 0xFF), ((app_id >> 8) & 0xFF), ((app_id >> 0) & 0xFF)])
@@ -273,6 +452,7 @@ class DESFireEx(DESFire):
 
         apdu_command = self.wrap_command(CREATE_STDDATAFILE, parameters)
         self.communicate(apdu_command, "Creating std data file {:02X}".format(file_no))
+        self.file_com_sets[file_no] = com_set & 0x03
 
     def create_backup_data_file(self, file_no, com_set, access_rights, file_size):
         parameters = [file_no]
@@ -284,6 +464,7 @@ class DESFireEx(DESFire):
 
         apdu_command = self.wrap_command(CREATE_BACKUPDATAFILE, parameters)
         self.communicate(apdu_command, "Creating backup data file {:02X}".format(file_no))
+        self.file_com_sets[file_no] = com_set & 0x03
 
     def create_linear_record_file(self, file_no, com_set, access_rights, record_size, max_num_of_records):
         parameters = [file_no]
@@ -296,6 +477,7 @@ class DESFireEx(DESFire):
 
         apdu_command = self.wrap_command(CREATE_LINEAR_RECORD_FILE, parameters)
         self.communicate(apdu_command, "Creating linear record file {:02X}".format(file_no))
+        self.file_com_sets[file_no] = com_set & 0x03
 
     def create_cyclic_record_file(self, file_no, com_set, access_rights, record_size, max_num_of_records):
         parameters = [file_no]
@@ -308,6 +490,7 @@ class DESFireEx(DESFire):
 
         apdu_command = self.wrap_command(CREATE_CYCLIC_RECORD_FILE, parameters)
         self.communicate(apdu_command, "Creating cyclic record file {:02X}".format(file_no))
+        self.file_com_sets[file_no] = com_set & 0x03
 
     def get_file_settings(self, file_id):
 
@@ -315,6 +498,7 @@ class DESFireEx(DESFire):
         resp = self.communicate(apdu_command, "Reading file settings {:02X}".format(file_id))
 
         file_type = resp[0]
+        self.file_com_sets[file_id] = resp[1] & 0x03
 
         file_settings = {
             "type": file_type,
@@ -350,6 +534,8 @@ class DESFireEx(DESFire):
         return file_settings
 
     def change_key(self, cur_key_id, key_id, key, new_key):
+        if self.session != None:
+            return self.change_key_ev1(key_id, key, new_key)
         if len(key) != 16:
             raise Exception('Invalid key length.')
         if len(new_key) != 16:
@@ -372,6 +558,35 @@ class DESFireEx(DESFire):
         apdu_command = self.wrap_command(CHANGE_KEY, [key_id] + decrypted_data)
         self.communicate(apdu_command, "Change key")
 
+    def change_key_ev1(self, key_id, key, new_key, key_version=0x00):
+        """Change a key after an ISO or AES authentication; key is the current value of the key, key_version is kept with
+        AES keys (DES keys keep it in their parity bits);
+
+        Changing the key of the authentication ends the authentication.
+        """
+        session = self.session
+        key = bytes(key)
+        new_key = bytes(new_key)
+        command = chr(CHANGE_KEY) + chr(key_id)
+        version = chr(key_version) if session.keyType == KEY_TYPE_AES else ''
+        same_key = (key_id & 0x0F) == session.keyNo
+        if same_key:
+            cryptogram = new_key + version
+            cryptogram += crc32(command + cryptogram)
+        else:
+            if len(key) != len(new_key):
+                raise Exception('Invalid key length.')
+            cryptogram = ''.join(chr(ord(a) ^ ord(b)) for a, b in zip(key, new_key)) + version
+            cryptogram += crc32(command + cryptogram) + crc32(new_key)
+        cryptogram = session.encrypt(cryptogram)
+
+        apdu_command = self.wrap_command(CHANGE_KEY, [key_id] + [ord(b) for b in cryptogram])
+        resp = self.communicate(apdu_command, "Change key", secure_messaging=False)
+        if same_key:
+            self.reset_authentication()
+        else:
+            session.unwrapResponse(bytes(resp), 0x00)
+
     def get_key_settings(self):
         apdu_command = self.wrap_command(GET_KEY_SETTINGS)
         resp = self.communicate(apdu_command, "Get key settings")
@@ -389,49 +604,144 @@ class DESFireEx(DESFire):
         self.communicate(apdu_command, "Abort file changes")
         
     def read_data(self, file_id, offset, length):
+        data = bytearray()
+        statistics = TransferStatistics()
+        start_time = timeit.default_timer()
+        for frame in self.read_data_frames(file_id, offset, length):
+            data += frame
+            statistics.frames += 1
+        statistics.size = len(data)
+        statistics.duration = timeit.default_timer() - start_time
+        self.logger.debug("Finished reading %s", statistics)
+
+        return list(data)
+
+    def read_data_frames(self, file_id, offset, length):
+        """Read a data file frame by frame; Yield the data of each frame (str) as it arrives;
+
+        length 0 reads up to the end of the file. After an ISO or AES authentication the data is checked (or deciphered) in
+        the communication mode of the file.
+        """
         offset_bytes = Util.bytes3_to_byte_array(offset)
         length_bytes = Util.bytes3_to_byte_array(length)
         parameters = [file_id] + offset_bytes + length_bytes
 
-        start_time = time.time()
+        mode = self.get_file_com_set(file_id) if self.session != None else COMM_PLAIN
+        size = self.read_length(file_id, offset, length) if mode == COMM_ENCIPHERED else None
         apdu_command = self.wrap_command(0xbd, parameters)
+        return self.iter_frames(apdu_command, "Reading data file {:02X}".format(file_id), mode, size)
 
-        data = self.communicate(apdu_command, "Reading data file {:02X}".format(file_id))
+    def read_data_into(self, file_id, offset, length, buffer, buffer_offset=0, on_frame=None):
+        """Read a data file into the buffer (a bytearray, or a memoryview of one) from buffer_offset;
 
-        duration = time.time() - start_time
-        self.logger.debug("Finished reading %d bytes in %f seconds", len(data), duration)
+        on_frame(statistics) is called after each frame, statistics is the TransferStatistics so far.
 
-        return data
+        :raise: Exception if the data does not fit in the buffer
+
+        :return: TransferStatistics of the read
+        """
+        if (length > 0) and (buffer_offset + length > len(buffer)):
+            raise Exception('The buffer is too small: %d bytes, %d bytes required.' %(len(buffer) - buffer_offset, length))
+        statistics = TransferStatistics()
+        start_time = timeit.default_timer()
+        position = buffer_offset
+        for frame in self.read_data_frames(file_id, offset, length):
+            end = position + len(frame)
+            if end > len(buffer):
+                raise Exception('The buffer is too small: %d bytes, more data is read.' %(len(buffer) - buffer_offset))
+            buffer[position : end] = frame
+            position = end
+            statistics.size = position - buffer_offset
+            statistics.frames += 1
+            statistics.duration = timeit.default_timer() - start_time
+            if on_frame != None:
+                on_frame(statistics)
+        statistics.duration = timeit.default_timer() - start_time
+        self.logger.debug("Finished reading %s", statistics)
+        return statistics
+
+    def read_data_to_file(self, file_id, offset, length, f, chunk_size=4096, on_frame=None):
+        """Read a data file and write it to the file object f, every chunk_size bytes;
+
+        The frames are collected in one preallocated buffer of chunk_size bytes (at least one frame).
+
+        :return: TransferStatistics of the read
+        """
+        buffer = bytearray(chunk_size)
+        used = 0
+        statistics = TransferStatistics()
+        start_time = timeit.default_timer()
+        for frame in self.read_data_frames(file_id, offset, length):
+            if used + len(frame) > len(buffer):
+                f.write(buffer[0 : used])
+                used = 0
+                if len(frame) > len(buffer):
+                    buffer = bytearray(len(frame))
+            buffer[used : used + len(frame)] = frame
+            used += len(frame)
+            statistics.size += len(frame)
+            statistics.frames += 1
+            statistics.duration = timeit.default_timer() - start_time
+            if on_frame != None:
+                on_frame(statistics)
+        f.write(buffer[0 : used])
+        statistics.duration = timeit.default_timer() - start_time
+        self.logger.debug("Finished reading %s", statistics)
+        return statistics
     
     def write_data(self, file_id, offset, length, data):
+        return self.write_frames(WRITE_DATA, file_id, offset, length, data, "data")
+
+    def write_frames(self, command, file_id, offset, length, data, description):
+        """Send a WriteData / WriteRecord command and its CONTINUE frames, each frame filled up to frame_data bytes;
+
+        After an ISO or AES authentication the data is CMACed (or enciphered) in the communication mode of the file.
+
+        :return: TransferStatistics of the write
+        """
         offset_bytes = Util.bytes3_to_byte_array(offset)
         length_bytes = Util.bytes3_to_byte_array(length)
         parameters = [file_id] + offset_bytes + length_bytes
 
+        size = len(data)
+        session = self.session
+        if session != None:
+            mode = self.get_file_com_set(file_id)
+            data = [ord(b) for b in session.wrapCommand(bytes([command] + parameters), bytes(data), mode)]
+
         data_pointer = 0
-        max_apdu_write_length = 47  # Actual max value found by experimenting
-        command = 0x3d  # WRITE DATA
-        cycles = 0
-        start_time = time.time()
+        # The parameters take the place of data in the first frame;
+        max_apdu_write_length = self.frame_data - len(parameters)
+        statistics = TransferStatistics()
+        start_time = timeit.default_timer()
 
-        self.logger.debug("Attempting to write %d bytes to a data file %02x", len(data), file_id)
+        self.logger.debug("Attempting to write %d bytes to a %s file %02x, %d bytes per frame", len(data), description, file_id, self.frame_data)
 
         while data_pointer < len(data):
             chunk = data[data_pointer:data_pointer + max_apdu_write_length]
             parameters = parameters + chunk
             apdu_command = self.wrap_command(command, parameters)
-            self.communicate(apdu_command, "Writing line record file file {:02X}, current command {:02X} write pointer: {}".format(file_id, command, data_pointer), allow_continue_fallthrough=True)
+            resp = self.communicate(apdu_command, "Writing {} file {:02X}, current command {:02X} write pointer: {}".format(description, file_id, command, data_pointer), allow_continue_fallthrough=True, secure_messaging=False)
 
             data_pointer += max_apdu_write_length
 
             # Use different parameters for the 2nd ... nth write cycle
             command = 0xaf  # CONTINUE
-            max_apdu_write_length = 54
+            max_apdu_write_length = self.frame_data
             parameters = []
-            cycles += 1
-
-        duration = time.time() - start_time
-        self.logger.debug("Finished writing %d bytes in %d commands and %f seconds", len(data), cycles, duration)
+            statistics.frames += 1
+
+        if (session != None) and (statistics.frames > 0):
+            try:
+                session.unwrapResponse(bytes(resp), 0x00)
+            except Exception:
+                self.reset_authentication()
+                raise
+
+        statistics.size = size
+        statistics.duration = timeit.default_timer() - start_time
+        self.logger.debug("Finished writing %s", statistics)
+        return statistics
     
     def credit(self, file_id, value):
         self.credit_value(file_id, value)
@@ -446,39 +756,15 @@ class DESFireEx(DESFire):
         self.communicate(apdu_command, "Limited credit file {:02X} value {:08X}".format(file_id, value))
     
     def write_record(self, file_id, offset, length, data):
-        offset_bytes = Util.bytes3_to_byte_array(offset)
-        length_bytes = Util.bytes3_to_byte_array(length)
-        parameters = [file_id] + offset_bytes + length_bytes
-
-        data_pointer = 0
-        max_apdu_write_length = 47  # Actual max value found by experimenting
-        command = WRITE_RECORD  # WRITE DATA
-        cycles = 0
-        start_time = time.time()
-
-        self.logger.debug("Attempting to write %d bytes to a record file %02x", len(data), file_id)
-
-        while data_pointer < len(data):
-            chunk = data[data_pointer:data_pointer + max_apdu_write_length]
-            parameters = parameters + chunk
-            apdu_command = self.wrap_command(command, parameters)
-            self.communicate(apdu_command, "Writing line record file file {:02X}, current command {:02X} write pointer: {}".format(file_id, command, data_pointer), allow_continue_fallthrough=True)
-
-            data_pointer += max_apdu_write_length
-
-            # Use different parameters for the 2nd ... nth write cycle
-            command = 0xaf  # CONTINUE
-            max_apdu_write_length = 54
-            parameters = []
-            cycles += 1
-
-        duration = time.time() - start_time
-        self.logger.debug("Finished writing %d bytes in %d commands and %f seconds", len(data), cycles, duration)
+        return self.write_frames(WRITE_RECORD, file_id, offset, length, data, "record")
     
     def read_records(self, file_id, offset, length):
         offset_bytes = Util.bytes3_to_byte_array(offset)
         length_bytes = Util.bytes3_to_byte_array(length)
         parameters = [file_id] + offset_bytes + length_bytes
         
+        mode = self.get_file_com_set(file_id) if self.session != None else COMM_PLAIN
+        size = self.read_length(file_id, offset, length, True) if mode == COMM_ENCIPHERED else None
         apdu_command = self.wrap_command(READ_RECORDS, parameters)
-        return self.communicate(apdu_command, "Reading bytes from offset {} length {} in a line record file file {:02X}".format(offset, length, file_id))
+        data = ''.join(self.iter_frames(apdu_command, "Reading bytes from offset {} length {} in a line record file file {:02X}".format(offset, length, file_id), mode, size))
+        return [ord(b) for b in data]
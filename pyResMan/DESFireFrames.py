@@ -0,0 +1,129 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-20
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import os
+import json
+import tempfile
+import threading
+
+# Frame sizes (FSC) of the FSCI of the ATS, ISO14443-4; FSCI 9 to 15 are treated as 256;
+FSC_TABLE = (16, 24, 32, 40, 48, 64, 96, 128, 256)
+# FSCI of an ATS without format byte;
+DEFAULT_FSCI = 2
+
+# Bytes of a frame which do not carry native DESFire data: PCB, CID and CRC of the I-block, and the ISO7816 wrapping
+# (90 INS 00 00 Lc ... 00);
+FRAME_OVERHEAD = 4 + 6
+# Native data of one wrapped command, Lc is one byte;
+MAX_FRAME_DATA = 0xFF
+# Native data of a frame of a card with FSCI 5 (64 bytes), the former fixed write sizes are 54 - 7 and 54;
+DEFAULT_FRAME_DATA = 54
+MIN_FRAME_DATA = 8
+
+# The calibration probe is a GetVersion command padded with this many bytes; The card answers (with any 91 XX status)
+# only if the whole frame arrived;
+PROBE_COMMAND = 0x60
+
+DEFAULT_CALIBRATION_PATH_NAME = os.path.join(os.path.expanduser('~'), '.pyResMan', 'desfire_frames.json')
+
+CALIBRATION_VERSION = 1
+
+
+def fscFromATS(ats):
+    """Return the FSC of the card from its ATS (TL T0 ...);"""
+    if (len(ats) < 2) or ((ord(ats[1]) & 0x80) != 0):
+        fsci = DEFAULT_FSCI
+    else:
+        fsci = ord(ats[1]) & 0x0F
+    return FSC_TABLE[min(fsci, len(FSC_TABLE) - 1)]
+
+
+def frameDataFromFSC(fsc):
+    """Return the native data one frame carries to a card of this FSC;"""
+    return max(MIN_FRAME_DATA, min(fsc - FRAME_OVERHEAD, MAX_FRAME_DATA))
+
+
+def probeFrameData(transmit, low=MIN_FRAME_DATA, high=MAX_FRAME_DATA):
+    """Return the most native data (between low and high) the reader carries to the card in one wrapped command;
+    transmit(command) sends a command (str) and returns the response (str), it may raise an exception if the frame is lost;
+    Return low - 1 if no probe passes;"""
+    def passes(size):
+        command = '\x90%s\x00\x00%s%s\x00' %(chr(PROBE_COMMAND), chr(size), '\x00' * size)
+        try:
+            response = transmit(command)
+        except Exception:
+            return False
+        return (len(response) >= 2) and (response[-2] == '\x91')
+
+    # Binary search of the largest size which passes;
+    result = low - 1
+    while low <= high:
+        size = (low + high) / 2
+        if passes(size):
+            result = size
+            low = size + 1
+        else:
+            high = size - 1
+    return result
+
+
+class DESFireFrameCalibration(object):
+    '''
+    The most native data per frame measured on each reader, saved to a json file;
+    '''
+
+    def __init__(self, pathName=None):
+        """pathName is the calibration file, None to keep the results in memory only;"""
+        self.__pathName = pathName
+        self.__lock = threading.Lock()
+        self.__readers = {}
+        if (pathName != None) and os.path.isfile(pathName):
+            self.__load()
+
+    def getPathName(self):
+        return self.__pathName
+
+    def __load(self):
+        with open(self.__pathName, 'rb') as f:
+            values = json.load(f)
+        if values.get('version') != CALIBRATION_VERSION:
+            raise ValueError('Invalid DESFire frame calibration file: %s.' %(self.__pathName))
+        for readername, size in values['readers'].iteritems():
+            self.__readers[readername] = int(size)
+
+    def save(self):
+        if self.__pathName == None:
+            return
+        with self.__lock:
+            values = {'version' : CALIBRATION_VERSION, 'readers' : dict(self.__readers)}
+        dirName = os.path.dirname(self.__pathName)
+        if (len(dirName) > 0) and (not os.path.isdir(dirName)):
+            os.makedirs(dirName)
+        # Write a temporary file and rename it, so the file is never left half written;
+        fd, tempPathName = tempfile.mkstemp(suffix='.tmp', dir=dirName if len(dirName) > 0 else None)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                json.dump(values, f, sort_keys=True)
+            if os.path.exists(self.__pathName):
+                os.remove(self.__pathName)
+            os.rename(tempPathName, self.__pathName)
+        except Exception:
+            if os.path.exists(tempPathName):
+                os.remove(tempPathName)
+            raise
+
+    def getFrameData(self, readername):
+        """Return the native data per frame measured on the reader, None if it is not calibrated;"""
+        with self.__lock:
+            return self.__readers.get(readername)
+
+    def putFrameData(self, readername, size):
+        with self.__lock:
+            self.__readers[readername] = size
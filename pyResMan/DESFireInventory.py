@@ -0,0 +1,229 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-22
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import os
+import json
+import time
+import timeit
+import tempfile
+import threading
+
+DEFAULT_INVENTORY_PATH_NAME = os.path.join(os.path.expanduser('~'), '.pyResMan', 'desfire_inventory.json')
+
+INVENTORY_VERSION = 1
+
+PICC_AID = 0x000000
+
+
+def applicationKey(aid):
+    """Return the key of an application in the tree (json keys are strings);"""
+    return '%06X' %(aid)
+
+
+def fileKey(file_no):
+    return '%02X' %(file_no)
+
+
+class InventoryStatistics(object):
+    '''
+    Applications read from the card and taken from the cached tree by one walk, and its duration;
+    '''
+
+    def __init__(self):
+        self.read = 0
+        self.cached = 0
+        self.duration = 0.0
+
+    def __str__(self):
+        return '%d applications read, %d cached, %.1f ms' %(self.read, self.cached, self.duration * 1000)
+
+
+class DESFireInventoryCache(object):
+    '''
+    The inventory tree of each card (by UID), saved to a json file;
+    A tree is a dict: uid, version (see DESFireEx.parse_version), free_memory, key_settings ([key settings, number of keys])
+    and applications, by applicationKey(aid): aid, key_settings, files by fileKey(file_no) (see DESFireEx.get_file_settings),
+    and error if the application could not be read; stale lists the applications changed after the walk, see
+    DESFireInventory.forgetCard;
+    '''
+
+    def __init__(self, pathName=None):
+        """pathName is the inventory file, None to keep the trees in memory only;"""
+        self.__pathName = pathName
+        self.__lock = threading.Lock()
+        self.__trees = {}
+        if (pathName != None) and os.path.isfile(pathName):
+            self.__load()
+
+    def getPathName(self):
+        return self.__pathName
+
+    def __load(self):
+        with open(self.__pathName, 'rb') as f:
+            values = json.load(f)
+        if values.get('version') != INVENTORY_VERSION:
+            raise ValueError('Invalid DESFire inventory file: %s.' %(self.__pathName))
+        for uid, tree in values['cards'].iteritems():
+            self.__trees[str(uid)] = tree
+
+    def save(self):
+        if self.__pathName == None:
+            return
+        with self.__lock:
+            values = {'version' : INVENTORY_VERSION, 'cards' : dict(self.__trees)}
+        dirName = os.path.dirname(self.__pathName)
+        if (len(dirName) > 0) and (not os.path.isdir(dirName)):
+            os.makedirs(dirName)
+        # Write a temporary file and rename it, so the file is never left half written;
+        fd, tempPathName = tempfile.mkstemp(suffix='.tmp', dir=dirName if len(dirName) > 0 else None)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                json.dump(values, f, sort_keys=True)
+            if os.path.exists(self.__pathName):
+                os.remove(self.__pathName)
+            os.rename(tempPathName, self.__pathName)
+        except Exception:
+            if os.path.exists(tempPathName):
+                os.remove(tempPathName)
+            raise
+
+    def getUIDs(self):
+        with self.__lock:
+            return sorted(self.__trees.keys())
+
+    def getTree(self, uid):
+        """Return the inventory tree of the card, None if the card was not walked;"""
+        with self.__lock:
+            return self.__trees.get(uid)
+
+    def putTree(self, uid, tree):
+        with self.__lock:
+            self.__trees[uid] = tree
+
+    def removeTree(self, uid):
+        with self.__lock:
+            self.__trees.pop(uid, None)
+
+
+class DESFireInventory(object):
+    '''
+    Walks the PICC of a DESFireEx: version, free memory, key settings, applications and the settings of their files;
+    The tree of each card is kept in a DESFireInventoryCache; A refresh reads again only the applications changed since
+    the last walk (DESFireEx.touched_applications), without any command if nothing was changed;
+    The walk selects the applications, so it ends the authentication; The selected application is selected again at
+    the end;
+    '''
+
+    def __init__(self, desfire, cache=None):
+        self.__desfire = desfire
+        self.__cache = cache if cache != None else DESFireInventoryCache()
+
+    def getCache(self):
+        return self.__cache
+
+    def __select(self, aid):
+        if self.__desfire.app_id != aid:
+            self.__desfire.select_application(aid)
+
+    def __walkApplication(self, aid):
+        desfire = self.__desfire
+        application = {'aid' : aid, 'files' : {}}
+        try:
+            self.__select(aid)
+            application['key_settings'] = list(desfire.get_key_settings())
+            for file_no in desfire.get_file_ids():
+                file_settings = desfire.get_file_settings(file_no)
+                file_settings['file_no'] = file_no
+                application['files'][fileKey(file_no)] = file_settings
+        except Exception, e:
+            # Without the key, the card may refuse to list the files of the application; Go on with the others;
+            application['error'] = str(e)
+        return application
+
+    def walk(self, refresh=True):
+        """Walk the card; refresh reuses the applications of the cached tree which were not changed since the last walk,
+        otherwise every application is read again;
+        Return (tree, InventoryStatistics);"""
+        desfire = self.__desfire
+        statistics = InventoryStatistics()
+        start_time = timeit.default_timer()
+        selected = desfire.app_id
+        touched = set(desfire.touched_applications)
+
+        # The UID is known from the version read by the last walk, unless the card was changed since;
+        knownCard = desfire.version_info != None
+        version_info = desfire.version_info if knownCard else desfire.get_version()
+        uid = desfire.uid
+
+        cached = self.__cache.getTree(uid) if refresh else None
+        if cached != None:
+            touched.update(cached.get('stale', []))
+        full = (cached == None) or (None in touched)
+        if full:
+            cached = {'applications' : {}}
+
+        tree = {
+            'uid' : uid,
+            'version' : version_info,
+            'free_memory' : cached.get('free_memory'),
+            'key_settings' : cached.get('key_settings'),
+            'applications' : {},
+            'time' : time.time(),
+        }
+        if full or (not knownCard) or (PICC_AID in touched):
+            self.__select(PICC_AID)
+            tree['key_settings'] = list(desfire.get_key_settings())
+            app_ids = desfire.get_applications()
+        else:
+            app_ids = [application['aid'] for application in cached['applications'].itervalues()]
+        if full or (not knownCard) or (len(touched) > 0):
+            tree['free_memory'] = desfire.get_free_memory()
+            # The card was changed by another session if its free memory is not the cached one;
+            if (not knownCard) and (tree['free_memory'] != cached.get('free_memory')):
+                full = True
+
+        # Walk the selected application last, so it is still selected at the end;
+        app_ids = sorted(app_ids, key=lambda aid: aid == selected)
+        for aid in app_ids:
+            key = applicationKey(aid)
+            application = cached['applications'].get(key)
+            if full or (application == None) or (aid in touched):
+                application = self.__walkApplication(aid)
+                statistics.read += 1
+            else:
+                statistics.cached += 1
+            tree['applications'][key] = application
+
+        if (selected != None) and (desfire.app_id != selected):
+            try:
+                self.__select(selected)
+            except Exception:
+                # The application was deleted;
+                pass
+
+        desfire.touched_applications.difference_update(touched)
+        self.__cache.putTree(uid, tree)
+        self.__cache.save()
+        statistics.duration = timeit.default_timer() - start_time
+        return tree, statistics
+
+    def forgetCard(self):
+        """Keep the applications changed since the last walk in the cached tree (see walk), then forget the card; Call
+        it when another card is presented;"""
+        desfire = self.__desfire
+        touched = desfire.touched_applications
+        tree = self.__cache.getTree(desfire.uid) if desfire.uid != None else None
+        if (tree != None) and (len(touched) > 0):
+            if None in touched:
+                self.__cache.removeTree(desfire.uid)
+            else:
+                tree['stale'] = sorted(set(tree.get('stale', [])) | touched)
+            self.__cache.save()
+        desfire.forget_card()
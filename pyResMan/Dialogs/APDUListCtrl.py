@@ -0,0 +1,86 @@
+# -*- coding:utf-8 -*-
+
+'''
+Created on 2017-5-8
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import wx
+from datetime import datetime
+from pyResMan.Util import Util
+from pyResMan.APDURecordStore import RECORD_SENT, RECORD_DONE
+
+APDU_LIST_COL_INDEX = 0
+APDU_LIST_COL_COMMAND = 1
+APDU_LIST_COL_RESPONSE = 2
+APDU_LIST_COL_TIME = 3
+APDU_LIST_COL_DATETIME = 4
+
+
+class APDUListCtrl(wx.ListCtrl):
+    '''
+    Virtual list control showing the records of an APDURecordStore; The row texts are formatted when they are drawn;
+    '''
+
+    def __init__(self, parent, store, size=wx.DefaultSize):
+        wx.ListCtrl.__init__(self, parent, wx.ID_ANY, wx.DefaultPosition, size, wx.LC_REPORT | wx.LC_VIRTUAL)
+        self.__store = store
+        self.__dateTimeCache = (None, '')
+
+    @staticmethod
+    def replace(listCtrl, store):
+        """Replace a list control created by the dialog base with a virtual one at the same place; Return the new control;"""
+        apduListCtrl = APDUListCtrl(listCtrl.GetParent(), store, listCtrl.GetSize())
+        sizer = listCtrl.GetContainingSizer()
+        sizer.Replace(listCtrl, apduListCtrl)
+        listCtrl.Destroy()
+        sizer.Layout()
+        return apduListCtrl
+
+    def getStore(self):
+        return self.__store
+
+    def updateItemCount(self):
+        """Show the records added to the store;"""
+        self.SetItemCount(len(self.__store))
+        self.Refresh()
+
+    def DeleteAllItems(self):
+        self.__store.clear()
+        self.updateItemCount()
+        return True
+
+    def __getDateTimeStr(self, timestamp):
+        """Format the timestamp like datetime.now().strftime("%c"); The text is formatted once per second;"""
+        second = int(timestamp)
+        if second != self.__dateTimeCache[0]:
+            self.__dateTimeCache = (second, datetime.fromtimestamp(second).strftime("%c"))
+        return self.__dateTimeCache[1]
+
+    def OnGetItemText(self, item, column):
+        try:
+            sequence, state, command, response, transtime, timestamp = self.__store.getRecord(item)
+        except IndexError:
+            return ''
+        if column == APDU_LIST_COL_INDEX:
+            if state == RECORD_SENT:
+                return '> %d' % (sequence)
+            return '%d' % (sequence)
+        elif column == APDU_LIST_COL_COMMAND:
+            return Util.vs2s(command, ' ')
+        elif column == APDU_LIST_COL_RESPONSE:
+            if response == None:
+                return ''
+            return Util.vs2s(response, ' ')
+        elif column == APDU_LIST_COL_TIME:
+            if state != RECORD_DONE:
+                return ''
+            return Util.getTimeStr(transtime)
+        elif column == APDU_LIST_COL_DATETIME:
+            if timestamp == 0.0:
+                return ''
+            return self.__getDateTimeStr(timestamp)
+        return ''
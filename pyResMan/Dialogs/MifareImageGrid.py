@@ -0,0 +1,141 @@
+# -*- coding:utf-8 -*-
+
+'''
+Created on 2017-5-19
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import wx
+import wx.grid
+from pyResMan import MifareLayout
+
+# Bytes per grid row;
+ROW_SIZE = 0x10
+
+
+class MifareImageTable(wx.grid.PyGridTableBase):
+    '''
+    Grid table of a card image, 16 bytes per row; The image is a bytearray, the cell texts are formatted when they are drawn;
+    Bytes which are not read or loaded are shown empty and are 0 in the image;
+    '''
+
+    def __init__(self, layout=MifareLayout.MIFARE_1K):
+        wx.grid.PyGridTableBase.__init__(self)
+        self.layout = layout
+        self.image = bytearray(layout.imageSize)
+        self.shown = bytearray(layout.imageSize)
+
+    def GetNumberRows(self):
+        return len(self.image) / ROW_SIZE
+
+    def GetNumberCols(self):
+        return ROW_SIZE
+
+    def IsEmptyCell(self, row, col):
+        return self.shown[row * ROW_SIZE + col] == 0
+
+    def GetValue(self, row, col):
+        i = row * ROW_SIZE + col
+        if self.shown[i] == 0:
+            return ''
+        return '%02X' % (self.image[i])
+
+    def SetValue(self, row, col, value):
+        i = row * ROW_SIZE + col
+        value = value.strip()
+        if len(value) == 0:
+            self.image[i] = 0
+            self.shown[i] = 0
+            return
+        try:
+            b = int(value, 0x10)
+        except ValueError:
+            return
+        if (b >= 0) and (b <= 0xFF):
+            self.image[i] = b
+            self.shown[i] = 1
+
+    def GetRowLabelValue(self, row):
+        # Rows are labelled with the number of their first block (or Ultralight page);
+        return '%d' % (row * ROW_SIZE / self.layout.blockSize)
+
+    def GetColLabelValue(self, col):
+        return '%X' % (col)
+
+
+class MifareImageGrid(wx.grid.Grid):
+    '''
+    Grid showing the card image of a MifareImageTable; The image is the card data, the grid only renders it;
+    '''
+
+    def __init__(self, parent, size=wx.DefaultSize):
+        wx.grid.Grid.__init__(self, parent, wx.ID_ANY, wx.DefaultPosition, size, 0)
+        self.__table = MifareImageTable()
+        self.SetTable(self.__table, True)
+        self.EnableEditing(True)
+        self.EnableGridLines(True)
+        self.EnableDragGridSize(False)
+        self.SetMargins(0, 0)
+        self.EnableDragColMove(False)
+        self.EnableDragColSize(True)
+        self.SetColLabelSize(30)
+        self.SetColLabelAlignment(wx.ALIGN_CENTRE, wx.ALIGN_CENTRE)
+        self.EnableDragRowSize(True)
+        self.SetRowLabelSize(80)
+        self.SetRowLabelAlignment(wx.ALIGN_CENTRE, wx.ALIGN_CENTRE)
+        self.SetDefaultCellAlignment(wx.ALIGN_CENTRE, wx.ALIGN_CENTRE)
+        for col in range(ROW_SIZE):
+            self.SetColSize(col, 30)
+
+    @staticmethod
+    def replace(grid):
+        """Replace a grid created by the dialog base with an image grid at the same place; Return the new grid;"""
+        imageGrid = MifareImageGrid(grid.GetParent(), grid.GetSize())
+        sizer = grid.GetContainingSizer()
+        sizer.Replace(grid, imageGrid)
+        grid.Destroy()
+        sizer.Layout()
+        return imageGrid
+
+    def getLayout(self):
+        return self.__table.layout
+
+    def getImage(self):
+        """Return the card image; It is the buffer of the grid, copy it to keep it;"""
+        return self.__table.image
+
+    def setLayout(self, layout):
+        """Show an empty image of the layout;"""
+        table = self.__table
+        rowCount = table.GetNumberRows()
+        table.layout = layout
+        table.image = bytearray(layout.imageSize)
+        table.shown = bytearray(layout.imageSize)
+        newRowCount = table.GetNumberRows()
+        if newRowCount > rowCount:
+            self.ProcessTableMessage(wx.grid.GridTableMessage(table, wx.grid.GRIDTABLE_NOTIFY_ROWS_APPENDED, newRowCount - rowCount))
+        elif newRowCount < rowCount:
+            self.ProcessTableMessage(wx.grid.GridTableMessage(table, wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED, newRowCount, rowCount - newRowCount))
+        self.ForceRefresh()
+
+    def clear(self):
+        self.setLayout(self.__table.layout)
+
+    def setBlock(self, block, data):
+        """Show the data of a block (or Ultralight page);"""
+        table = self.__table
+        offset = block * table.layout.blockSize
+        table.image[offset : offset + len(data)] = data
+        table.shown[offset : offset + len(data)] = '\x01' * len(data)
+        self.Refresh()
+
+    def setImage(self, layout, image):
+        """Show a whole card image of the layout;"""
+        self.setLayout(layout)
+        table = self.__table
+        table.image[:] = image
+        table.shown[:] = '\x01' * len(image)
+        self.ForceRefresh()
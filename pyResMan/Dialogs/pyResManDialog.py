@@ -15,41 +15,50 @@ from pyResMan.pyResManController import pyResManController, APDUItem
 import os
 from pyResMan.Util import Util, HexValidator, IDCANCEL
 from datetime import datetime
-from pyResMan.Dialogs.pyResManInstallDialog import pyResManInstallDialog
 from pyResMan.BaseDialogs.pyResManDialogBase import pyResManDialogBase
 import wx
-from pyResMan.Dialogs.pyResManCommandDialog_Basic import CommandDialog_Basic
 from pyResMan.Util import IDOK
-from pyResMan.Dialogs.pyResManCommandDialog_AnticollisionSelect import CommandDialog_AnticollisionSelect
-from pyResMan.Dialogs.pyResManCommandDialog_RATS import CommandDialog_RATS
-from pyResMan.Dialogs.pyResManCommandDialog_REQBWUPB import CommandDialog_REQBWUPB
-from pyResMan.Dialogs.pyResManCommandDialog_SlotMarker import CommandDialog_SlotMarker
-from pyResMan.Dialogs.pyResManCommandDialog_PPS import CommandDialog_PPS
-from pyResMan.Dialogs.pyResManCommandDialog_ATTRIB import CommandDialog_ATTRIB
-from pyResMan.Dialogs.pyResManCommandDialog_HLTB import CommandDialog_HLTB
 from wx.grid import Grid
-from pyResMan.Dialogs.pyResManCommandDialog_IBlock import CommandDialog_IBlock
-from pyResMan.Dialogs.pyResManCommandDialog_RBlock import CommandDialog_RBlock
-from pyResMan.Dialogs.pyResManCommandDialog_SBlock import CommandDialog_SBlock
-from pyResMan.Dialogs.pyResManCommandDialog_MifareAuthentication import CommandDialog_MifareAuthentication
-from pyResMan.Dialogs.pyResManCommandDialog_MifareBlockRead import CommandDialog_MifareBlockRead
-from pyResMan.Dialogs.pyResManCommandDialog_MifareBlockWrite import CommandDialog_MifareBlockWrite
-from pyResMan.Dialogs.pyResManCommandDialog_MifareIncrement import CommandDialog_MifareIncrement
-from pyResMan.Dialogs.pyResManCommandDialog_MifareDecrement import CommandDialog_MifareDecrement
-from pyResMan.Dialogs.pyResManCommandDialog_MifareDecrementTransfer import CommandDialog_MifareDecrementTransfer
-from pyResMan.Dialogs.pyResManCommandDialog_MifareTransfer import CommandDialog_MifareTransfer
-from pyResMan.Dialogs.pyResManCommandDialog_MifareRestore import CommandDialog_MifareRestore
 from pyResMan import DebuggerUtils
 from pyResMan.DebuggerUtils import getErrorString
-import pyResMan.DESFireEx as DESFireEx
-from pyResMan.Dialogs.pyResManDialog_DESFireCreateApplication import DESFireDialog_CreateApplication
-from pyResMan.Dialogs.pyResManDialog_DESFireCreateFile import DESFireDialog_CreateFile
-from pyResMan.DESFireEx import CREATE_STDDATAFILE, CREATE_BACKUPDATAFILE,\
+import pyResMan.DESFireCommands as DESFireCommands
+from pyResMan.DESFireCommands import CREATE_STDDATAFILE, CREATE_BACKUPDATAFILE,\
     CREATE_VALUE_FILE, CREATE_LINEAR_RECORD_FILE, CREATE_CYCLIC_RECORD_FILE,\
     GET_KEY_SETTINGS, GET_VALUE, READ_DATA, WRITE_RECORD, LIMITED_CREDIT, DEBIT,\
     WRITE_DATA, CREDIT, READ_RECORDS
-from pyResMan.Dialogs.pyResManDialog_DESFireFileOperation import DESFireDialog_FileOperation
 from wx.lib import dialogs
+from pyResMan.APDUEventSink import APDUEventSink, RECORD_COMMAND
+from pyResMan.APDURecordStore import APDURecordStore
+from pyResMan.Dialogs.APDUListCtrl import APDUListCtrl
+from pyResMan.Dialogs.MifareImageGrid import MifareImageGrid
+from pyResMan.LazyImport import LazyCallable
+from pyResMan import MifareLayout
+from pyResMan.MifareEngine import MIFARE_ACTION_DUMPED, MIFARE_ACTION_WRITE, MIFARE_ACTION_READ, MIFARE_ACTION_LAYOUT, MIFARE_ACTION_CARD
+
+# The command, install and DESFire dialogs are imported when they are shown first;
+pyResManInstallDialog = LazyCallable('pyResMan.Dialogs.pyResManInstallDialog', 'pyResManInstallDialog')
+CommandDialog_Basic = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_Basic', 'CommandDialog_Basic')
+CommandDialog_AnticollisionSelect = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_AnticollisionSelect', 'CommandDialog_AnticollisionSelect')
+CommandDialog_RATS = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_RATS', 'CommandDialog_RATS')
+CommandDialog_REQBWUPB = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_REQBWUPB', 'CommandDialog_REQBWUPB')
+CommandDialog_SlotMarker = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_SlotMarker', 'CommandDialog_SlotMarker')
+CommandDialog_PPS = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_PPS', 'CommandDialog_PPS')
+CommandDialog_ATTRIB = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_ATTRIB', 'CommandDialog_ATTRIB')
+CommandDialog_HLTB = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_HLTB', 'CommandDialog_HLTB')
+CommandDialog_IBlock = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_IBlock', 'CommandDialog_IBlock')
+CommandDialog_RBlock = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_RBlock', 'CommandDialog_RBlock')
+CommandDialog_SBlock = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_SBlock', 'CommandDialog_SBlock')
+CommandDialog_MifareAuthentication = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_MifareAuthentication', 'CommandDialog_MifareAuthentication')
+CommandDialog_MifareBlockRead = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_MifareBlockRead', 'CommandDialog_MifareBlockRead')
+CommandDialog_MifareBlockWrite = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_MifareBlockWrite', 'CommandDialog_MifareBlockWrite')
+CommandDialog_MifareIncrement = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_MifareIncrement', 'CommandDialog_MifareIncrement')
+CommandDialog_MifareDecrement = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_MifareDecrement', 'CommandDialog_MifareDecrement')
+CommandDialog_MifareDecrementTransfer = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_MifareDecrementTransfer', 'CommandDialog_MifareDecrementTransfer')
+CommandDialog_MifareTransfer = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_MifareTransfer', 'CommandDialog_MifareTransfer')
+CommandDialog_MifareRestore = LazyCallable('pyResMan.Dialogs.pyResManCommandDialog_MifareRestore', 'CommandDialog_MifareRestore')
+DESFireDialog_CreateApplication = LazyCallable('pyResMan.Dialogs.pyResManDialog_DESFireCreateApplication', 'DESFireDialog_CreateApplication')
+DESFireDialog_CreateFile = LazyCallable('pyResMan.Dialogs.pyResManDialog_DESFireCreateFile', 'DESFireDialog_CreateFile')
+DESFireDialog_FileOperation = LazyCallable('pyResMan.Dialogs.pyResManDialog_DESFireFileOperation', 'DESFireDialog_FileOperation')
 
 COMMAND_LIST_COL_INDEX = 0
 COMMAND_LIST_COL_COMMAND_NAME = 1
@@ -70,6 +79,7 @@ class pyResManDialog (pyResManDialogBase):
                 self._comboReaderName.Select(0)
         except Exception, e:
             self._Log(str(e), wx.LOG_Info)
+        self.__apduEventSink = APDUEventSink(self.__renderAPDURecords, self.__scheduleUI)
         self.__controller = pyResManController(self)
         
         self._textctrlCLA.SetValue('00')
@@ -78,6 +88,13 @@ class pyResManDialog (pyResManDialogBase):
         self._textctrlP2.SetValue('00')
         self._textctrlLe.SetValue('00')
         
+        # The apdu list and script list show the records of stores in virtual mode; The apdu list keeps the latest records,
+        # the script list keeps every command of the script, however long it is;
+        self._listctrlScriptList = APDUListCtrl.replace(self._listctrlScriptList, APDURecordStore(None))
+        self._listctrlApduList = APDUListCtrl.replace(self._listctrlApduList, APDURecordStore())
+        # The card data grid renders the card image buffer;
+        self._gridCardData = MifareImageGrid.replace(self._gridCardData)
+        
         self._listctrlScriptList.InsertColumn(0, 'Index', width=50)
         self._listctrlScriptList.InsertColumn(1, 'Command', width=200)
         self._listctrlScriptList.InsertColumn(2, 'Response', width=300)
@@ -180,15 +197,12 @@ class pyResManDialog (pyResManDialogBase):
 
         self.__desfireDisableAllFileButtons()
     
+    def SetMifareLayout(self, layout):
+        """Resize the card data grid to the card image of the layout, 16 bytes per row;"""
+        self._gridCardData.setLayout(layout)
+    
     def ClearMifareCardData(self):
-        colCount = self._gridCardData.GetNumberCols()
-        rowCount = self._gridCardData.GetNumberRows()
-        for rowIndex in range(rowCount):
-            self._gridCardData.SetRowLabelValue(rowIndex, '%d' % (rowIndex))
-            for colIndex in range(colCount):
-                self._gridCardData.SetColSize(colIndex, 30)
-                self._gridCardData.SetColLabelValue(colIndex, '%X' % (colIndex))
-                self._gridCardData.SetCellValue(rowIndex, colIndex, '')
+        self._gridCardData.clear()
         
     # Virtual event handlers, overide them in your derived class
     def _buttonConnectOnButtonClick(self, event):
@@ -558,6 +572,8 @@ class pyResManDialog (pyResManDialogBase):
         key1 = Util.s2vs(self._textctrlKey1.GetValue())
         key2 = Util.s2vs(self._textctrlKey2.GetValue())
         key3 = Util.s2vs(self._textctrlKey3.GetValue())
+        if wx.CANCEL == wx.MessageBox('Make sure your new key has been stored well!', caption='Put key', style=wx.ICON_WARNING|wx.OK|wx.CANCEL|wx.CANCEL_DEFAULT):
+            return
         self.__controller.putKey(oldKVN, newKVN, key1, key2, key3)
 
     def _buttonDeleteKeyOnButtonClick(self, event):
@@ -570,6 +586,8 @@ class pyResManDialog (pyResManDialogBase):
             keyIndex = int(self._listctrlKeyData.GetItemText(i, 2), 0x10)
             keysInfo.append((kvn, keyIndex,))
             i = self._listctrlKeyData.GetNextSelected(i)
+        if wx.CANCEL == wx.MessageBox('Are you sure to do this operation?', caption='Delete key', style=wx.ICON_WARNING|wx.OK|wx.CANCEL|wx.CANCEL_DEFAULT):
+            return
         self.__controller.deleteKey(keysInfo)
 
     def _buttonGetKeyTemplateInfoOnButtonClick(self, event):
@@ -605,10 +623,9 @@ class pyResManDialog (pyResManDialogBase):
     def _buttonScriptRunOnButtonClick(self, event):
         event.Skip()
         apduItems = []
-        itemCount = self._listctrlScriptList.GetItemCount()
-        for itemIndex in xrange(itemCount):
-            listItem = self._listctrlScriptList.GetItem(itemIndex, 1)
-            apduItem = APDUItem(listItem.GetText(), (self._listctrlScriptList, listItem.GetId()))
+        store = self._listctrlScriptList.getStore()
+        for itemIndex in xrange(len(store)):
+            apduItem = APDUItem(Util.vs2s(store.getCommand(itemIndex)), (self._listctrlScriptList, store.rowToSequence(itemIndex)))
             apduItems.append(apduItem)
         
         t0AutoGetResponse = self._checkboxAutoGetResponse.GetValue()
@@ -659,10 +676,10 @@ class pyResManDialog (pyResManDialogBase):
     def _listCtrlRunSelectedItems(self, listCtrl):
         """Transmit selected items apdu in the apdu list view;"""
         apduItems = []
+        store = listCtrl.getStore()
         selectedItem = listCtrl.GetFirstSelected()
         while (selectedItem != -1):
-            listItem = listCtrl.GetItem(selectedItem, 1)
-            apduItem = APDUItem(listItem.GetText(), (listCtrl, selectedItem))
+            apduItem = APDUItem(Util.vs2s(store.getCommand(selectedItem)), (listCtrl, store.rowToSequence(selectedItem)))
             apduItems.append(apduItem)
             selectedItem = listCtrl.GetNextSelected(selectedItem)
         
@@ -742,76 +759,57 @@ class pyResManDialog (pyResManDialogBase):
         else:
             self.__controller.stopScript()
     
-    def __handleAPDUCommand(self, commandStr, args):
-        theListCtrl = args[0]
-
-        itemIndex = 0
+    def __displayAPDUCommand(self, theListCtrl, commandStr, timestamp, args):
+        store = theListCtrl.getStore()
+        if len(args) > 1:
+            # Run again an item of the list, args[1] is the sequence number of the record;
+            return store.setCommand(args[1], Util.s2vs(commandStr), timestamp)
+        store.append(Util.s2vs(commandStr), RECORD_SENT, timestamp)
+        return len(store) - 1
+    
+    def __displayAPDUResponse(self, theListCtrl, responseStr, transtime, args):
+        store = theListCtrl.getStore()
         if len(args) > 1:
-            itemIndex = args[1]
-            indexItem = ListItem()
-            indexItem.SetId(itemIndex)
-            indexItem.SetColumn(0)
-            indexItem.SetText('> %d' % (itemIndex))
-            theListCtrl.SetItem(indexItem)
+            sequence = args[1]
+        else:
+            sequence = store.getLastSequence()
+        return store.setResponse(sequence, Util.s2vs(responseStr), transtime)
+    
+    def __renderAPDURecords(self, records):
+        """Display a batch of apdu records from the event sink; Each list control is redrawn once per batch;"""
+        lastItems = {}
+        try:
+            for recordType, text, transtime, timestamp, args in records:
+                # The apdus of script file have no list control argument;
+                theListCtrl = args[0] if len(args) > 0 else self._listctrlApduList
+                if theListCtrl not in lastItems:
+                    theListCtrl.Freeze()
+                if recordType == RECORD_COMMAND:
+                    lastItems[theListCtrl] = self.__displayAPDUCommand(theListCtrl, text, timestamp, args)
+                else:
+                    lastItems[theListCtrl] = self.__displayAPDUResponse(theListCtrl, text, transtime, args)
+        finally:
+            for theListCtrl, itemIndex in lastItems.iteritems():
+                theListCtrl.updateItemCount()
+                if itemIndex >= 0:
+                    theListCtrl.EnsureVisible(itemIndex)
+                theListCtrl.Thaw()
+    
+    def __scheduleUI(self, delay, function):
+        """Call function in the GUI thread after delay seconds; Called by the event sink from any thread;"""
+        milliseconds = int(delay * 1000)
+        if milliseconds <= 0:
+            wx.CallAfter(function)
         else:
-            itemIndex = theListCtrl.GetItemCount()
-            indexItem = ListItem()
-            indexItem.SetId(itemIndex)
-            indexItem.SetColumn(0)
-            indexItem.SetText('> %d' % (itemIndex))
-            theListCtrl.InsertItem(indexItem)
-         
-        commandItem = ListItem()
-        commandItem.SetId(itemIndex)
-        commandItem.SetColumn(1)
-        commandItem.SetText(commandStr)
-        theListCtrl.SetItem(commandItem)
- 
-        datetimeItem = ListItem()
-        datetimeItem.SetId(itemIndex)
-        datetimeItem.SetColumn(4)
-        datetimeItem.SetText(datetime.now().strftime("%c"))
-        theListCtrl.SetItem(datetimeItem)
-         
-        theListCtrl.EnsureVisible(itemIndex)
+            wx.CallAfter(wx.CallLater, milliseconds, function)
     
     def handleAPDUCommand(self, commandStr, args=tuple()):
         """Handle controller's apdu command event, to display apdu command;"""
-        wx.CallAfter(self.__handleAPDUCommand, commandStr, args)
-    
-    def __handleAPDUResponse(self, responseStr, transtime, args):
-        theListCtrl = args[0]
-
-        itemIndex = 0
-        if len(args) > 1:
-            itemIndex = args[1]
-        else:
-            itemIndex = theListCtrl.GetItemCount() - 1
-        
-        responseItem = ListItem()
-        responseItem.SetId(itemIndex)
-        responseItem.SetColumn(2)
-        responseItem.SetText(responseStr)
-        theListCtrl.SetItem(responseItem)
- 
-        timeItem = ListItem()
-        timeItem.SetId(itemIndex)
-        timeItem.SetColumn(3)
-        timeItem.SetText(Util.getTimeStr(transtime))
-        theListCtrl.SetItem(timeItem)
- 
-        indexItem = ListItem()
-        indexItem.SetId(itemIndex)
-        indexItem.SetColumn(0)
-        indexItem.SetText('%d' % (itemIndex))
-        theListCtrl.SetItem(indexItem)
-        theListCtrl.Refresh()
- 
-        theListCtrl.EnsureVisible(itemIndex)
+        self.__apduEventSink.addCommand(commandStr, args)
     
     def handleAPDUResponse(self, responseStr, transtime, args=tuple()):
         """Handle controller's apdu response event, to display apdu result informations;"""
-        wx.CallAfter(self.__handleAPDUResponse, responseStr, transtime, args)
+        self.__apduEventSink.addResponse(responseStr, transtime, args)
 
     def _Log(self, msg, level=wx.LOG_Message):
         """Display log with levels"""
@@ -851,6 +849,9 @@ class pyResManDialog (pyResManDialogBase):
 
     def __handleScriptEnd(self, status):
         self._buttonScriptRun.SetLabel('Start')
+        recordCount, flushCount, renderTime = self.__apduEventSink.getStatistics()
+        if flushCount > 0:
+            self._Log('APDU display: %d records in %d updates, %s per record.' %(recordCount, flushCount, Util.getTimeStr(renderTime)))
 
     def handleScriptEnd(self, status):
         wx.CallAfter(self.__handleScriptEnd, status)
@@ -922,21 +923,21 @@ class pyResManDialog (pyResManDialogBase):
         wx.CallAfter(self.__handleLoadScriptBegin)
     
     def __handleLoadScriptItem(self, scriptItemStr):
-        itemIndex = self._listctrlScriptList.GetItemCount()
-        scriptItem = ListItem()
-        scriptItem.SetId(itemIndex)
-        scriptItem.SetColumn(0)
-        scriptItem.SetText('%d' % (itemIndex))
-        self._listctrlScriptList.InsertItem(scriptItem)
-        
-        scriptItem.SetId(itemIndex)
-        scriptItem.SetColumn(1)
-        scriptItem.SetText(scriptItemStr)
-        self._listctrlScriptList.SetItem(scriptItem)
+        self._listctrlScriptList.getStore().append(Util.s2vs(scriptItemStr))
+        self._listctrlScriptList.updateItemCount()
     
     def handleLoadScriptItem(self, scriptItemStr):
         wx.CallAfter(self.__handleLoadScriptItem, scriptItemStr)
     
+    def __handleLoadScriptItems(self, scriptItemStrs):
+        store = self._listctrlScriptList.getStore()
+        for scriptItemStr in scriptItemStrs:
+            store.append(Util.s2vs(scriptItemStr))
+        self._listctrlScriptList.updateItemCount()
+    
+    def handleLoadScriptItems(self, scriptItemStrs):
+        wx.CallAfter(self.__handleLoadScriptItems, scriptItemStrs)
+    
     def handleLoadScriptEnd(self):
         pass
     
@@ -1384,15 +1385,7 @@ class pyResManDialog (pyResManDialogBase):
     
     def _buttonCloneCardOnButtonClick(self, event):
         try:
-            card_data = []
-            for row_index in range(self._gridCardData.GetNumberRows()):
-                row_data = ''
-                for col_index in range(self._gridCardData.GetNumberCols()):
-                    cell_value = self._gridCardData.GetCellValue(row_index, col_index)
-                    if len(cell_value) == 0:
-                        cell_value = '00'
-                    row_data += chr(int(cell_value, 0x10))
-                card_data.append(row_data)
+            card_data = [str(self._gridCardData.getImage())]
             key_a = self._getMifareKeyA()
             self.__controller.mifareCloneCard(card_data, key_a)
         except Exception, e:
@@ -1404,11 +1397,7 @@ class pyResManDialog (pyResManDialogBase):
             return
         file_path_name = saveFileDialog.GetPath()
 
-        card_data = ''
-        for row_index in range(self._gridCardData.GetNumberRows()):
-            for col_index in range(self._gridCardData.GetNumberCols()):
-                card_data += chr(int(self._gridCardData.GetCellValue(row_index, col_index), 0x10))
-        self.__controller.mifareSaveData(card_data, file_path_name)
+        self.__controller.mifareSaveData(str(self._gridCardData.getImage()), file_path_name)
     
     def _buttonLoadCardDataOnButtonClick(self, event):
         # Open file dialog;
@@ -1420,14 +1409,11 @@ class pyResManDialog (pyResManDialogBase):
         # Read card data from file;
         with open(file_path_name, 'rb') as f:
             card_data = f.read()
-        if len(card_data) != 1024:
+        layout = MifareLayout.layoutForImageSize(len(card_data))
+        if layout == None:
             self._Log('Invalid card data.', wx.LOG_Error)
             return
-        
-        # Set card data to Grid;
-        for row_index in range(self._gridCardData.GetNumberRows()):
-            for col_index in range(self._gridCardData.GetNumberCols()):
-                self._gridCardData.SetCellValue(row_index, col_index, '%02X' % (ord(card_data[row_index * 0x10 + col_index])))
+        self._gridCardData.setImage(layout, card_data)
         self._Log('Card data has been loaded from file: %s.' % (file_path_name), wx.LOG_Info)
         return
     
@@ -1473,16 +1459,20 @@ class pyResManDialog (pyResManDialogBase):
             self._Log(getErrorString(data[0]), wx.LOG_Error)
             return
         
-        if action_type == 0:
+        if action_type == MIFARE_ACTION_DUMPED:
             self._Log("Dump card succeeded.", wx.LOG_Info)
-        elif action_type == 1:
+        elif action_type == MIFARE_ACTION_WRITE:
             block_index = data
             self._Log("Write block succeeded: %d." % (block_index), wx.LOG_Info)
-        elif action_type == 2:
+        elif action_type == MIFARE_ACTION_READ:
             block_index = data[0]
             block_data = data[1]
-            for i in range(0x10):
-                self._gridCardData.SetCellValue(block_index, i, "%02X" % (ord(block_data[i])))
+            self._gridCardData.setBlock(block_index, block_data)
+        elif action_type == MIFARE_ACTION_LAYOUT:
+            self.SetMifareLayout(data)
+            self._Log("Card layout: %s." % (data.name), wx.LOG_Info)
+        elif action_type == MIFARE_ACTION_CARD:
+            self._Log("%s." % (data), wx.LOG_Info if data.ok else wx.LOG_Error)
         else:
             self._Log("Invalid mifare response type: %d." % (action_type), wx.LOG_Error)
         
@@ -1598,13 +1588,13 @@ class pyResManDialog (pyResManDialogBase):
         self._Log('Max num of keys: %02X' %(max_num_of_keys), wx.LOG_Message)
         
     def handleDESFireResponse(self, command_type, response):
-        if command_type == DESFireEx.GET_VERSION:
+        if command_type == DESFireCommands.GET_VERSION:
             self.__outputDESFireVersion(response)
-        elif command_type == DESFireEx.GET_APPLICATION_IDS:
+        elif command_type == DESFireCommands.GET_APPLICATION_IDS:
             self.__outputDESFireApplications(response)
-        elif command_type == DESFireEx.GET_FILE_IDS:
+        elif command_type == DESFireCommands.GET_FILE_IDS:
             self.__outputDESFireFileIDs(response)
-        elif command_type == DESFireEx.GET_FILE_SETTINGS:
+        elif command_type == DESFireCommands.GET_FILE_SETTINGS:
             self.__outputDESFireFileSettings(response)
         elif command_type == GET_KEY_SETTINGS:
             self.__outputDESFireKeySettings(response)
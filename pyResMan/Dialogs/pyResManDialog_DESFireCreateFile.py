@@ -11,7 +11,7 @@ Modified on 2017-03-28
 from pyResMan.BaseDialogs.pyResManDESFireDialogBase_CreateFile import DESFireDialogBase_CreateFile
 from pyResMan.Util import IDOK, IDCANCEL
 from pyResMan.Util import HexValidator
-from pyResMan.DESFireEx import DESFireEx, CREATE_STDDATAFILE,\
+from pyResMan.DESFireCommands import CREATE_STDDATAFILE,\
     CREATE_BACKUPDATAFILE, CREATE_VALUE_FILE, CREATE_LINEAR_RECORD_FILE,\
     CREATE_CYCLIC_RECORD_FILE
 
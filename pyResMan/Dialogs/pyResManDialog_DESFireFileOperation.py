@@ -5,7 +5,7 @@ Created on 2017/04/19
 '''
 from pyResMan.BaseDialogs.pyResManDESFireDialogBase_FileOperation import DESFireDialogBase_FileOperation
 from pyResMan.Util import IDOK, IDCANCEL, Util
-from pyResMan.DESFireEx import READ_DATA, WRITE_DATA, CREDIT, DEBIT,\
+from pyResMan.DESFireCommands import READ_DATA, WRITE_DATA, CREDIT, DEBIT,\
     LIMITED_CREDIT, WRITE_RECORD, READ_RECORDS
 
 class DESFireDialog_FileOperation(DESFireDialogBase_FileOperation):
@@ -0,0 +1,51 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-10
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import importlib
+import threading
+
+_importLock = threading.Lock()
+
+
+class LazyModule(object):
+    '''
+    Stands for a module which is imported on the first attribute access;
+    '''
+
+    def __init__(self, name):
+        self.__name = name
+        self.__module = None
+
+    def load(self):
+        """Import the module if it is not imported yet, and return it;"""
+        if self.__module == None:
+            with _importLock:
+                if self.__module == None:
+                    self.__module = importlib.import_module(self.__name)
+        return self.__module
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
+class LazyCallable(object):
+    '''
+    Stands for a class or function of a module; The module is imported on the first call;
+    '''
+
+    def __init__(self, moduleName, name):
+        self.__module = LazyModule(moduleName)
+        self.__name = name
+
+    def load(self):
+        return getattr(self.__module, self.__name)
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
@@ -0,0 +1,459 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-12
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import timeit
+from pyResMan import DebuggerUtils
+from pyResMan.Util import LOG_Info, LOG_Warning
+from pyResMan.MifareLayout import layoutForSAK, READ_SIZE
+from pyResMan.R502Session import RF_LOST_ERRORS, CARD_LOST_ERRORS, ERROR_AUTHENTICATION_FAILED
+
+# action_type of handleMifareResponse;
+MIFARE_ACTION_DUMPED = 0
+MIFARE_ACTION_WRITE = 1
+MIFARE_ACTION_READ = 2
+MIFARE_ACTION_LAYOUT = 3
+MIFARE_ACTION_CARD = 4
+
+# Errors after which the card is no longer selected or authenticated (see R502Session);
+# A failed authentication halts the card too, but it is not retried, since the key is wrong;
+SESSION_LOST_ERRORS = RF_LOST_ERRORS + CARD_LOST_ERRORS
+
+# A sector is retried at most this many times after the session is lost;
+SESSION_RETRY_COUNT = 1
+
+
+class MifareStatistics(object):
+    '''
+    Counters of one Mifare job;
+    '''
+
+    def __init__(self):
+        self.blocksRead = 0
+        self.blocksFailed = 0
+        self.selections = 0
+        self.authentications = 0
+        self.roundTrips = 0
+        self.wallTime = 0.0
+
+    def toDict(self):
+        return dict(self.__dict__)
+
+    def __str__(self):
+        return '%d blocks read, %d failed, %d selections, %d authentications, %d round-trips, %.1f ms' %(
+            self.blocksRead, self.blocksFailed, self.selections, self.authentications, self.roundTrips, self.wallTime * 1000)
+
+
+class MifareDumpEngine(object):
+    '''
+    Reads a Mifare card sector by sector: the card is selected once, each sector is authenticated once and all of its blocks
+    are read in the same session; The card is selected again only when the session is lost;
+    selectCard() shall return (True, uid, sak) if the card is selected; getRoundTrips() shall return the number of apdus sent so far;
+    If keySearch (a MifareKeySearch) is given, its candidate keys are tried on each sector instead of the key of dump();
+    sessionLost(error) is called when a command fails with the error and the card is no longer selected, so selectCard()
+    can tell whether the card is still selected;
+    '''
+
+    def __init__(self, libsc, selectCard, handler, getRoundTrips=None, keySearch=None, sessionLost=None):
+        self.__libsc = libsc
+        self.__selectCard = selectCard
+        self.__sessionLost = sessionLost
+        self.__handler = handler
+        self.__getRoundTrips = getRoundTrips
+        self.__keySearch = keySearch
+        self.__layout = None
+
+    def getLayout(self):
+        """Return the MifareLayout of the last dump;"""
+        return self.__layout
+
+    def dump(self, key, key_type=0, layout=None, blocks=None, onBlock=None):
+        """Read all sectors, or only the sectors of the blocks in blocks; The layout is detected from the SAK if it is None;
+        If onBlock is None, the layout is delivered (unless blocks is given) with handler.handleMifareResponse(MIFARE_ACTION_LAYOUT, 0, layout),
+        the blocks with handler.handleMifareResponse(MIFARE_ACTION_READ, 0, (block, data)) and the errors with handler.handleException;
+        Otherwise onBlock(block, data) is called for each block, data is None if the block can not be read; Return a MifareStatistics;"""
+        statistics = MifareStatistics()
+        roundTripsStart = self.__getRoundTrips() if self.__getRoundTrips != None else 0
+        timeStart = timeit.default_timer()
+        try:
+            self.__uid = None
+            self.__sak = None
+            self.__selected = False
+            if layout == None:
+                self.__select(statistics)
+                layout = layoutForSAK(self.__sak)
+                if layout == None:
+                    raise Exception('Unknown Mifare card, SAK: %02X.' %(self.__sak))
+            self.__layout = layout
+            self.__onBlock = onBlock
+            # A dump of some blocks only completes an earlier dump of the same layout;
+            if (onBlock == None) and (blocks == None):
+                self.__handler.handleMifareResponse(MIFARE_ACTION_LAYOUT, 0, layout)
+            if blocks != None:
+                blocks = set(blocks)
+            for sector in range(layout.sectorCount):
+                self.__dumpSector(sector, layout, key, key_type, blocks, statistics)
+        finally:
+            statistics.wallTime = timeit.default_timer() - timeStart
+            if self.__getRoundTrips != None:
+                statistics.roundTrips = self.__getRoundTrips() - roundTripsStart
+        return statistics
+
+    def __select(self, statistics):
+        statistics.selections += 1
+        ok, uid, sak = self.__selectCard()
+        if not ok:
+            raise Exception('Select card failed.')
+        self.__sak = sak
+        if uid != self.__uid:
+            self.__handler.handleLog('Card selected: %s' %(''.join('%02X' %(ord(b)) for b in uid)), LOG_Info)
+            self.__uid = uid
+        self.__selected = True
+
+    def __lose(self, error):
+        self.__selected = False
+        if self.__sessionLost != None:
+            self.__sessionLost(error)
+
+    def __deliver(self, block_number, data):
+        if self.__onBlock != None:
+            self.__onBlock(block_number, data)
+        elif data != None:
+            self.__handler.handleMifareResponse(MIFARE_ACTION_READ, 0, (block_number, data))
+
+    def __fail(self, message, block_numbers):
+        if self.__onBlock == None:
+            self.__handler.handleException(Exception(message))
+            return
+        for block_number in block_numbers:
+            self.__onBlock(block_number, None)
+
+    def __authenticate(self, sector, block_number, candidates, reads, statistics):
+        """Try the (key_type, key) candidates until one opens the sector, the blocks in reads are read in the same apdus;
+        Return the error, the key and the list of (error, data) of the reads;"""
+        error = ERROR_AUTHENTICATION_FAILED
+        uid = self.__uid
+        index = 0
+        while index < len(candidates):
+            if not self.__selected:
+                self.__select(statistics)
+                if (self.__uid != uid) and (self.__keySearch != None):
+                    # Another card is in the field, e.g. the card was swapped while it was still selected in the session;
+                    uid = self.__uid
+                    candidates = self.__keySearch.candidates(uid, sector)
+                    index = 0
+            key_type, key = candidates[index]
+            index += 1
+            statistics.authentications += 1
+            results = self.__libsc.M1_read_blocks(reads, (block_number, key_type, key, self.__uid))
+            error = results[0][0]
+            if error == 0x00:
+                if self.__keySearch != None:
+                    self.__keySearch.found(self.__uid, sector, key_type, key)
+                return error, (key_type, key), results[1 : ]
+            # The card is halted after a failed authentication;
+            self.__lose(error)
+            if error != ERROR_AUTHENTICATION_FAILED:
+                break
+            if self.__keySearch != None:
+                self.__keySearch.failed(self.__uid, sector, key_type, key)
+        return error, None, []
+
+    def __dumpSector(self, sector, layout, key, key_type, wanted, statistics):
+        blocks = layout.sectorBlocks(sector)
+        # One READ returns several Ultralight pages;
+        bpr = layout.blocksPerRead
+        pending = [b for b in blocks[ : : bpr] if (wanted == None) or (len(wanted.intersection(range(b, b + bpr))) > 0)]
+        if len(pending) == 0:
+            return
+        self.__handler.handleLog('Read sector data, sector: %d.' %(sector))
+        retries = SESSION_RETRY_COUNT
+        authenticated = not layout.needsAuthentication()
+        sectorKey = None
+        while len(pending) > 0:
+            if not self.__selected:
+                self.__select(statistics)
+            if not authenticated:
+                if sectorKey != None:
+                    candidates = [sectorKey]
+                elif self.__keySearch != None:
+                    candidates = self.__keySearch.candidates(self.__uid, sector)
+                else:
+                    candidates = [(key_type, key)]
+                error, sectorKey, results = self.__authenticate(sector, blocks[0], candidates, pending, statistics)
+                if error != 0x00:
+                    if (error in SESSION_LOST_ERRORS) and (retries > 0):
+                        retries -= 1
+                        continue
+                    failed = range(pending[0], blocks[-1] + 1)
+                    self.__fail('Authenticate sector %d failed, %s' %(sector, DebuggerUtils.getErrorString(error)), failed)
+                    statistics.blocksFailed += len(failed)
+                    return
+                authenticated = True
+            else:
+                results = self.__libsc.M1_read_blocks(pending)
+            # The reads stop at the first error;
+            for error, data in results:
+                block_number = pending[0]
+                if error != 0x00:
+                    break
+                blockSize = layout.blockSize
+                for i in range(min(bpr, blocks[-1] - block_number + 1)):
+                    self.__deliver(block_number + i, data[i * blockSize : (i + 1) * blockSize])
+                    statistics.blocksRead += 1
+                pending.pop(0)
+            else:
+                continue
+            self.__lose(error)
+            authenticated = not layout.needsAuthentication()
+            if (error in SESSION_LOST_ERRORS) and (retries > 0):
+                retries -= 1
+                continue
+            failed = range(block_number, min(block_number + bpr, blocks[-1] + 1))
+            self.__fail('Read block %d failed, %s' %(block_number, DebuggerUtils.getErrorString(error)), failed)
+            statistics.blocksFailed += len(failed)
+            pending.pop(0)
+
+
+class MifareCloneStatistics(object):
+    '''
+    Counters of one Mifare clone;
+    '''
+
+    def __init__(self):
+        self.blocksWritten = 0
+        self.blocksSkipped = 0
+        self.blocksFailed = 0
+        self.blocksVerified = 0
+        self.verifyFailed = 0
+        self.writeTime = 0.0
+        # Estimated time of the blocks skipped by the differential clone, None if no block was written to measure it;
+        self.timeSaved = None
+        self.roundTrips = 0
+        self.wallTime = 0.0
+
+    def toDict(self):
+        return dict(self.__dict__)
+
+    def __str__(self):
+        saved = (', %.1f ms saved' %(self.timeSaved * 1000)) if self.timeSaved != None else ''
+        return '%d blocks written, %d skipped, %d failed, %d verified, %d verify failed%s, %d round-trips, %.1f ms' %(
+            self.blocksWritten, self.blocksSkipped, self.blocksFailed, self.blocksVerified, self.verifyFailed,
+            saved, self.roundTrips, self.wallTime * 1000)
+
+
+class MifareCloneEngine(object):
+    '''
+    Writes a card image to a Mifare card; Key A of every trailer is replaced by the key;
+    In differential mode the card is read first (sector by sector), only the blocks which differ from the image are written,
+    and the written blocks are read back to verify them;
+    setupCard() shall prepare the card for writing and return None if it fails, see MifareDumpEngine for the other arguments;
+    The card is read with the keys of keySearch, if it is given;
+    '''
+
+    def __init__(self, libsc, selectCard, setupCard, handler, getRoundTrips=None, keySearch=None, sessionLost=None):
+        self.__libsc = libsc
+        self.__selectCard = selectCard
+        self.__sessionLost = sessionLost
+        self.__setupCard = setupCard
+        self.__handler = handler
+        self.__getRoundTrips = getRoundTrips
+        self.__keySearch = keySearch
+
+    def __expected(self, layout, block_number, block_data, key):
+        if layout.isTrailer(block_number):
+            return key + block_data[6 : ]
+        return block_data
+
+    def __same(self, layout, block_number, expected, data):
+        """Compare the expected block data with the data read from the card; Key A of a trailer can not be read;"""
+        if data == None:
+            return False
+        if layout.isTrailer(block_number):
+            return expected[6 : ] == data[6 : ]
+        return expected == data
+
+    def __read(self, key, layout, blocks):
+        """Return {block: data} of the blocks, data is None if the block can not be read;"""
+        blocksData = {}
+        reader = MifareDumpEngine(self.__libsc, self.__selectCard, self.__handler, keySearch=self.__keySearch, sessionLost=self.__sessionLost)
+        reader.dump(key, 0, layout, blocks, blocksData.__setitem__)
+        return blocksData
+
+    def clone(self, blocks, key, layout, differential=False):
+        """Write the block data list to the card; Return a MifareCloneStatistics;"""
+        if len(blocks) != layout.blockCount:
+            raise Exception('Invalid card data for %s: %d blocks.' %(layout.name, len(blocks)))
+        statistics = MifareCloneStatistics()
+        roundTripsStart = self.__getRoundTrips() if self.__getRoundTrips != None else 0
+        timeStart = timeit.default_timer()
+        try:
+            expected = [self.__expected(layout, i, block_data, key) for i, block_data in enumerate(blocks)]
+            changed = range(layout.blockCount)
+            if differential:
+                target = self.__read(key, layout, None)
+                changed = [i for i in changed if not self.__same(layout, i, expected[i], target.get(i))]
+                statistics.blocksSkipped = layout.blockCount - len(changed)
+                self.__handler.handleLog('%d blocks differ from the card data.' %(len(changed)), LOG_Info)
+            if len(changed) == 0:
+                return statistics
+
+            if self.__setupCard() == None:
+                statistics.blocksFailed = len(changed)
+                return statistics
+            written = []
+            # Ultralight pages are written with the 16 bytes compatibility write, only the first 4 bytes are written;
+            pending = [(block_number, expected[block_number].ljust(READ_SIZE, '\x00')) for block_number in changed]
+            while len(pending) > 0:
+                writeStart = timeit.default_timer()
+                # The writes stop at the first error, the blocks after it are sent again;
+                errors = self.__libsc.M1_write_blocks(pending)
+                statistics.writeTime += timeit.default_timer() - writeStart
+                for error in errors:
+                    block_number = pending.pop(0)[0]
+                    if error != 0:
+                        statistics.blocksFailed += 1
+                        self.__handler.handleException(Exception('Write block %d failed, %s' %(block_number, DebuggerUtils.getErrorString(error))))
+                    else:
+                        statistics.blocksWritten += 1
+                        written.append(block_number)
+                        self.__handler.handleMifareResponse(MIFARE_ACTION_WRITE, error, block_number)
+            # The skipped blocks would have taken the measured write time per block;
+            if (statistics.blocksSkipped > 0) and (statistics.blocksWritten > 0):
+                statistics.timeSaved = statistics.writeTime / (statistics.blocksWritten + statistics.blocksFailed) * statistics.blocksSkipped
+
+            if differential and (len(written) > 0):
+                readBack = self.__read(key, layout, written)
+                for block_number in written:
+                    if self.__same(layout, block_number, expected[block_number], readBack.get(block_number)):
+                        statistics.blocksVerified += 1
+                    else:
+                        statistics.verifyFailed += 1
+                        self.__handler.handleException(Exception('Verify block %d failed.' %(block_number)))
+        finally:
+            statistics.wallTime = timeit.default_timer() - timeStart
+            if self.__getRoundTrips != None:
+                statistics.roundTrips = self.__getRoundTrips() - roundTripsStart
+        return statistics
+
+
+class MifareBulkEngine(object):
+    '''
+    Dumps and clones a Mifare card with the bulk commands of the R502 firmware: the reader reads or writes the whole card,
+    and the card data is transferred in rows of 16 bytes, MIFARE_BULK_MAX_ROWS rows per apdu;
+    scDebugger is the R502SpyLibrary of the reader; See MifareDumpEngine for the other arguments;
+    '''
+
+    def __init__(self, scDebugger, handler, getRoundTrips=None):
+        self.__scDebugger = scDebugger
+        self.__handler = handler
+        self.__getRoundTrips = getRoundTrips
+        self.__layout = None
+
+    def isSupported(self):
+        """Return True if the reader firmware supports the bulk commands;"""
+        ok, data = self.__scDebugger.mifareReadCardData2(0, 0)
+        return ok
+
+    def __sectors(self, bitmap, layout):
+        return [sector for sector in range(layout.sectorCount) if (sector / 8 < len(bitmap)) and (ord(bitmap[sector / 8]) & (1 << (sector % 8)))]
+
+    def readCardData(self, rowCount=None):
+        """Return the card data of the reader; Without rowCount, rows are read until the end of the card data;"""
+        scDebugger = self.__scDebugger
+        maxRows = scDebugger.MIFARE_BULK_MAX_ROWS
+        data = []
+        row = 0
+        while (rowCount == None) or (row < rowCount):
+            count = maxRows if rowCount == None else min(maxRows, rowCount - row)
+            ok, rows = scDebugger.mifareReadCardData2(row, count)
+            if not ok:
+                if rowCount == None:
+                    break
+                raise Exception('Read card data of the reader failed, %s' %(DebuggerUtils.getErrorString(ord(rows))))
+            data.append(rows)
+            row += count
+            if (rowCount == None) and ((len(rows) < count * 0x10) or (row >= 0x100)):
+                break
+        return ''.join(data)
+
+    def getLayout(self):
+        """Return the MifareLayout of the last dump;"""
+        return self.__layout
+
+    def dump(self, key, key_type=0):
+        """Dump the card to the reader and read the card data; The layout and the blocks are delivered to the handler as by MifareDumpEngine;
+        Return (MifareStatistics, sectors which can not be read), or None if the reader can not dump the card;"""
+        statistics = MifareStatistics()
+        roundTripsStart = self.__getRoundTrips() if self.__getRoundTrips != None else 0
+        timeStart = timeit.default_timer()
+        try:
+            ok, result = self.__scDebugger.mifareDumpCard2(key_type, key)
+            if not ok:
+                self.__handler.handleLog('Dump card by the reader failed, %s' %(DebuggerUtils.getErrorString(ord(result))), LOG_Warning)
+                return None
+            sak, rowCount, bitmap = result
+            layout = layoutForSAK(sak)
+            if (layout == None) or (rowCount * 0x10 != layout.imageSize):
+                self.__handler.handleLog('Dump card by the reader failed, unknown card, SAK: %02X.' %(sak), LOG_Warning)
+                return None
+            self.__layout = layout
+            statistics.selections = 1
+            blocks = layout.splitImage(self.readCardData(rowCount))
+            failedSectors = self.__sectors(bitmap, layout)
+            self.__handler.handleMifareResponse(MIFARE_ACTION_LAYOUT, 0, layout)
+            for sector in range(layout.sectorCount):
+                if sector in failedSectors:
+                    statistics.blocksFailed += len(layout.sectorBlocks(sector))
+                    continue
+                for block_number in layout.sectorBlocks(sector):
+                    statistics.blocksRead += 1
+                    self.__handler.handleMifareResponse(MIFARE_ACTION_READ, 0, (block_number, blocks[block_number]))
+            return statistics, failedSectors
+        finally:
+            statistics.wallTime = timeit.default_timer() - timeStart
+            if self.__getRoundTrips != None:
+                statistics.roundTrips = self.__getRoundTrips() - roundTripsStart
+
+    def clone(self, blocks, key, layout):
+        """Load the block data list to the reader and write it to the card; The written blocks are delivered to the handler;
+        Return (MifareCloneStatistics, sectors which can not be written), or None if the reader can not clone the card;"""
+        statistics = MifareCloneStatistics()
+        roundTripsStart = self.__getRoundTrips() if self.__getRoundTrips != None else 0
+        timeStart = timeit.default_timer()
+        try:
+            image = ''.join(blocks)
+            rowCount = len(image) / 0x10
+            # One row less than a read, the apdu data is at most 255 bytes;
+            rowsPerLoad = self.__scDebugger.MIFARE_BULK_MAX_ROWS - 1
+            for row in range(0, rowCount, rowsPerLoad):
+                ok, result = self.__scDebugger.mifareLoadCardData2(row, image[row * 0x10 : (row + rowsPerLoad) * 0x10])
+                if not ok:
+                    self.__handler.handleLog('Load card data to the reader failed, %s' %(DebuggerUtils.getErrorString(ord(result))), LOG_Warning)
+                    return None
+            writeStart = timeit.default_timer()
+            ok, result = self.__scDebugger.mifareCloneCard2(key, rowCount)
+            statistics.writeTime = timeit.default_timer() - writeStart
+            if not ok:
+                self.__handler.handleLog('Clone card by the reader failed, %s' %(DebuggerUtils.getErrorString(ord(result))), LOG_Warning)
+                return None
+            failedSectors = self.__sectors(result, layout)
+            for sector in range(layout.sectorCount):
+                if sector in failedSectors:
+                    statistics.blocksFailed += len(layout.sectorBlocks(sector))
+                    self.__handler.handleException(Exception('Write sector %d failed.' %(sector)))
+                    continue
+                for block_number in layout.sectorBlocks(sector):
+                    statistics.blocksWritten += 1
+                    self.__handler.handleMifareResponse(MIFARE_ACTION_WRITE, 0, block_number)
+            return statistics, failedSectors
+        finally:
+            statistics.wallTime = timeit.default_timer() - timeStart
+            if self.__getRoundTrips != None:
+                statistics.roundTrips = self.__getRoundTrips() - roundTripsStart
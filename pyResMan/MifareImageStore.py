@@ -0,0 +1,270 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-19
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import os
+import mmap
+import time
+import zlib
+import struct
+import threading
+from pyResMan import MifareLayout
+from pyResMan.MifareEngine import MIFARE_ACTION_LAYOUT, MIFARE_ACTION_READ
+
+DEFAULT_IMAGE_STORE_PATH_NAME = os.path.join(os.path.expanduser('~'), '.pyResMan', 'mifare_images.dat')
+
+# File header: magic, version, 3 reserved bytes;
+FILE_MAGIC = 'PRMI'
+FILE_VERSION = 1
+_FILE_HEADER = struct.Struct('<4sB3x')
+
+# Record header: magic, record size (header included), crc32 of the record body, timestamp, layout, uid length, key count,
+# image size; The body is the uid, the keys (sector, key type and key, 8 bytes each) and the image;
+RECORD_MAGIC = 'MIMG'
+_RECORD_HEADER = struct.Struct('<4sIidBBBxI')
+_RECORD_KEY = struct.Struct('<BB6s')
+
+
+def imageUID(layout, image):
+    """Return the UID stored in the card image: the 4 byte NUID of block 0, or the 7 byte UID of the Ultralight pages 0 and 1;"""
+    if layout.hasTrailers:
+        return str(image[0 : 4])
+    return str(image[0 : 3] + image[4 : 8])
+
+
+class MifareImage(object):
+    '''
+    One card image of the store and its metadata; keys is the list of (sector, key_type, key) which opened the sectors;
+    '''
+
+    def __init__(self, number, uid, layout, timestamp, keys, image):
+        self.number = number
+        self.uid = uid
+        self.layout = layout
+        self.timestamp = timestamp
+        self.keys = keys
+        self.image = image
+
+    def getBlocks(self):
+        return self.layout.splitImage(str(self.image))
+
+    def toDict(self):
+        return {
+            'number' : self.number,
+            'uid' : ''.join('%02X' %(ord(b)) for b in self.uid),
+            'layout' : self.layout.name,
+            'timestamp' : self.timestamp,
+            'keys' : [(sector, key_type, ''.join('%02X' %(ord(b)) for b in key)) for sector, key_type, key in self.keys],
+        }
+
+
+class MifareImageStore(object):
+    '''
+    Append-only file of card images; The file is mapped to memory, the records are indexed by number (in the order they are
+    appended) and by UID; Images are compared and searched in the mapped file, without reading them to strings first;
+    A record cut by a crash while it is appended is removed when the file is opened;
+    '''
+
+    def __init__(self, pathName):
+        self.__pathName = pathName
+        self.__lock = threading.Lock()
+        # (image offset, image size, uid, layout, timestamp, keys offset, key count) of each record;
+        self.__records = []
+        self.__uids = {}
+        self.__map = None
+        self.__mapSize = 0
+        self.__open()
+
+    def getPathName(self):
+        return self.__pathName
+
+    def __open(self):
+        dirName = os.path.dirname(self.__pathName)
+        if (len(dirName) > 0) and (not os.path.isdir(dirName)):
+            os.makedirs(dirName)
+        if (not os.path.isfile(self.__pathName)) or (os.path.getsize(self.__pathName) == 0):
+            with open(self.__pathName, 'wb') as f:
+                f.write(_FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+        self.__file = open(self.__pathName, 'r+b')
+        try:
+            self.__load()
+        except Exception:
+            self.close()
+            raise
+
+    def __load(self):
+        header = self.__file.read(_FILE_HEADER.size)
+        if len(header) != _FILE_HEADER.size:
+            raise ValueError('Invalid image store file: %s.' %(self.__pathName))
+        magic, version = _FILE_HEADER.unpack(header)
+        if (magic != FILE_MAGIC) or (version != FILE_VERSION):
+            raise ValueError('Invalid image store file: %s.' %(self.__pathName))
+        self.__remap()
+        m = self.__map
+        size = self.__mapSize
+        offset = _FILE_HEADER.size
+        while offset + _RECORD_HEADER.size <= size:
+            magic, recordSize, crc, timestamp, layoutIndex, uidLength, keyCount, imageSize = _RECORD_HEADER.unpack_from(m, offset)
+            bodyOffset = offset + _RECORD_HEADER.size
+            if (magic != RECORD_MAGIC) or (recordSize != _RECORD_HEADER.size + uidLength + keyCount * _RECORD_KEY.size + imageSize) or \
+                    (offset + recordSize > size) or (zlib.crc32(m[bodyOffset : offset + recordSize]) != crc) or \
+                    (layoutIndex >= len(MifareLayout.LAYOUTS)):
+                break
+            self.__index(offset, layoutIndex, timestamp, uidLength, keyCount, imageSize)
+            offset += recordSize
+        if offset != size:
+            # Remove the record which was not completely written;
+            self.__unmap()
+            self.__file.truncate(offset)
+            self.__remap()
+
+    def __index(self, offset, layoutIndex, timestamp, uidLength, keyCount, imageSize):
+        uidOffset = offset + _RECORD_HEADER.size
+        keysOffset = uidOffset + uidLength
+        imageOffset = keysOffset + keyCount * _RECORD_KEY.size
+        uid = self.__map[uidOffset : keysOffset] if self.__map != None else ''
+        self.__uids.setdefault(uid, []).append(len(self.__records))
+        self.__records.append((imageOffset, imageSize, uid, MifareLayout.LAYOUTS[layoutIndex], timestamp, keysOffset, keyCount))
+
+    def __unmap(self):
+        if self.__map != None:
+            self.__map.close()
+            self.__map = None
+            self.__mapSize = 0
+
+    def __remap(self):
+        """Map the whole file; It is mapped again after records are appended;"""
+        self.__unmap()
+        self.__file.seek(0, os.SEEK_END)
+        size = self.__file.tell()
+        self.__map = mmap.mmap(self.__file.fileno(), size, access=mmap.ACCESS_READ)
+        self.__mapSize = size
+
+    def __getMap(self):
+        if (len(self.__records) > 0) and (self.__records[-1][0] + self.__records[-1][1] > self.__mapSize):
+            self.__remap()
+        return self.__map
+
+    def close(self):
+        with self.__lock:
+            self.__unmap()
+            if self.__file != None:
+                self.__file.close()
+                self.__file = None
+
+    def __len__(self):
+        return len(self.__records)
+
+    def append(self, layout, image, uid=None, keys=tuple(), timestamp=None):
+        """Append a card image; uid is read from the image if it is None; keys is a list of (sector, key_type, key);
+        Return the number of the record;"""
+        if len(image) != layout.imageSize:
+            raise Exception('Invalid card data size for %s: %d.' %(layout.name, len(image)))
+        if uid == None:
+            uid = imageUID(layout, image)
+        if timestamp == None:
+            timestamp = time.time()
+        body = uid + ''.join(_RECORD_KEY.pack(sector, key_type, key) for sector, key_type, key in keys) + str(image)
+        header = _RECORD_HEADER.pack(RECORD_MAGIC, _RECORD_HEADER.size + len(body), zlib.crc32(body), timestamp,
+                                     MifareLayout.LAYOUTS.index(layout), len(uid), len(keys), len(image))
+        with self.__lock:
+            f = self.__file
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            f.write(header + body)
+            f.flush()
+            imageOffset = offset + len(header) + len(uid) + len(keys) * _RECORD_KEY.size
+            self.__uids.setdefault(uid, []).append(len(self.__records))
+            self.__records.append((imageOffset, len(image), uid, layout, timestamp, imageOffset - len(keys) * _RECORD_KEY.size, len(keys)))
+            return len(self.__records) - 1
+
+    def getUIDs(self):
+        return self.__uids.keys()
+
+    def findUID(self, uid):
+        """Return the numbers of the records of the UID, oldest first;"""
+        return list(self.__uids.get(uid, []))
+
+    def getImage(self, number):
+        """Return the card image of the record as a bytearray;"""
+        imageOffset, imageSize = self.__records[number][0 : 2]
+        with self.__lock:
+            return bytearray(self.__getMap()[imageOffset : imageOffset + imageSize])
+
+    def getRecord(self, number):
+        """Return the MifareImage of the record;"""
+        imageOffset, imageSize, uid, layout, timestamp, keysOffset, keyCount = self.__records[number]
+        with self.__lock:
+            m = self.__getMap()
+            keys = [_RECORD_KEY.unpack_from(m, keysOffset + i * _RECORD_KEY.size) for i in xrange(keyCount)]
+            image = bytearray(m[imageOffset : imageOffset + imageSize])
+        return MifareImage(number, uid, layout, timestamp, keys, image)
+
+    def diff(self, number1, number2):
+        """Return the blocks which differ between the images of two records of the same layout;"""
+        imageOffset1, imageSize1, _, layout1 = self.__records[number1][0 : 4]
+        imageOffset2, imageSize2, _, layout2 = self.__records[number2][0 : 4]
+        if layout1 != layout2:
+            raise Exception('Can not compare a %s image with a %s image.' %(layout1.name, layout2.name))
+        blockSize = layout1.blockSize
+        with self.__lock:
+            m = self.__getMap()
+            if m[imageOffset1 : imageOffset1 + imageSize1] == m[imageOffset2 : imageOffset2 + imageSize2]:
+                return []
+            return [block for block, offset in enumerate(xrange(0, imageSize1, blockSize))
+                    if m[imageOffset1 + offset : imageOffset1 + offset + blockSize] != m[imageOffset2 + offset : imageOffset2 + offset + blockSize]]
+
+    def search(self, data, layout=None):
+        """Return (number, offset) of every place the data is found in the images (of the layout, or of all layouts);"""
+        results = []
+        with self.__lock:
+            m = self.__getMap()
+            for number, record in enumerate(self.__records):
+                imageOffset, imageSize = record[0 : 2]
+                if (layout != None) and (record[3] != layout):
+                    continue
+                end = imageOffset + imageSize
+                offset = m.find(data, imageOffset, end)
+                while offset != -1:
+                    results.append((number, offset - imageOffset))
+                    offset = m.find(data, offset + 1, end)
+        return results
+
+
+class MifareImageRecorder(object):
+    '''
+    Wraps an event handler and keeps the card image of the blocks read by a dump; The other methods are forwarded to the
+    wrapped handler;
+    '''
+
+    def __init__(self, handler):
+        self.__handler = handler
+        self.layout = None
+        self.image = None
+        self.__blocksRead = None
+
+    def handleMifareResponse(self, action_type, result, data):
+        if result == 0:
+            if action_type == MIFARE_ACTION_LAYOUT:
+                self.layout = data
+                self.image = bytearray(data.imageSize)
+                self.__blocksRead = bytearray(data.blockCount)
+            elif (action_type == MIFARE_ACTION_READ) and (self.layout != None):
+                block_number, block_data = data
+                offset = block_number * self.layout.blockSize
+                self.image[offset : offset + len(block_data)] = block_data
+                self.__blocksRead[block_number] = 1
+        self.__handler.handleMifareResponse(action_type, result, data)
+
+    def isComplete(self):
+        """Return True if every block of the card is read;"""
+        return (self.__blocksRead != None) and (self.__blocksRead.count('\x01') == len(self.__blocksRead))
+
+    def __getattr__(self, name):
+        return getattr(self.__handler, name)
@@ -0,0 +1,179 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-14
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import os
+import json
+import tempfile
+import threading
+from pyResMan.Util import Util
+
+KEY_TYPE_A = 0
+KEY_TYPE_B = 1
+
+# Well known keys, tried after the keys given by the user;
+DEFAULT_KEYS = [Util.s2vs(key) for key in (
+    'FFFFFFFFFFFF',
+    'A0A1A2A3A4A5',
+    'D3F7D3F7D3F7',
+    '000000000000',
+    'B0B1B2B3B4B5',
+    '4D3A99C351DD',
+    '1A982C7E459A',
+    'AABBCCDDEEFF',
+    '714C5C886E97',
+    '587EE5F9350F',
+    'A0478CC39091',
+    '533CB6C723F6',
+    '8FD0A4F256E9',
+)]
+
+DEFAULT_KEY_CACHE_PATH_NAME = os.path.join(os.path.expanduser('~'), '.pyResMan', 'mifare_keys.json')
+
+KEY_CACHE_VERSION = 1
+
+
+def loadKeyFile(pathName):
+    """Read the keys of a key file, one hex key per line; Empty lines and lines starting with '#' are skipped;"""
+    keys = []
+    with open(pathName, 'rb') as f:
+        for lineIndex, line in enumerate(f):
+            line = Util.removespace(line)
+            if (len(line) == 0) or line.startswith('#'):
+                continue
+            try:
+                key = Util.s2vs(line)
+            except ValueError:
+                key = ''
+            if len(key) != 6:
+                raise ValueError('Invalid key at line %d: %s.' %(lineIndex + 1, line))
+            keys.append(key)
+    return keys
+
+
+class MifareKeyCache(object):
+    '''
+    Keys found on the cards, indexed by UID and sector, and the number of sectors each key opened;
+    The cache is saved to a json file;
+    '''
+
+    def __init__(self, pathName=None):
+        """pathName is the cache file, None to keep the cache in memory only;"""
+        self.__pathName = pathName
+        self.__lock = threading.Lock()
+        self.__cards = {}
+        self.__hits = {}
+        self.__modified = False
+        if (pathName != None) and os.path.isfile(pathName):
+            self.__load()
+
+    def getPathName(self):
+        return self.__pathName
+
+    def __load(self):
+        with open(self.__pathName, 'rb') as f:
+            values = json.load(f)
+        if values.get('version') != KEY_CACHE_VERSION:
+            raise ValueError('Invalid key cache file: %s.' %(self.__pathName))
+        for uid, sectors in values['cards'].iteritems():
+            self.__cards[str(uid)] = dict((int(sector), (key_type, Util.s2vs(key))) for sector, (key_type, key) in sectors.iteritems())
+        for key, count in values['hits'].iteritems():
+            self.__hits[Util.s2vs(key)] = count
+
+    def save(self):
+        """Save the cache file if the cache is modified;"""
+        if (self.__pathName == None) or (not self.__modified):
+            return
+        with self.__lock:
+            values = {
+                'version' : KEY_CACHE_VERSION,
+                'cards' : dict((uid, dict((str(sector), (key_type, Util.vs2s(key))) for sector, (key_type, key) in sectors.iteritems()))
+                               for uid, sectors in self.__cards.iteritems()),
+                'hits' : dict((Util.vs2s(key), count) for key, count in self.__hits.iteritems()),
+            }
+            self.__modified = False
+        dirName = os.path.dirname(self.__pathName)
+        if (len(dirName) > 0) and (not os.path.isdir(dirName)):
+            os.makedirs(dirName)
+        # Write a temporary file and rename it, so the cache file is never left half written;
+        fd, tempPathName = tempfile.mkstemp(suffix='.tmp', dir=dirName if len(dirName) > 0 else None)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                json.dump(values, f, sort_keys=True)
+            if os.path.exists(self.__pathName):
+                os.remove(self.__pathName)
+            os.rename(tempPathName, self.__pathName)
+        except Exception:
+            if os.path.exists(tempPathName):
+                os.remove(tempPathName)
+            raise
+
+    def getKey(self, uid, sector):
+        """Return (key_type, key) found on the sector of the card, None if there is none;"""
+        with self.__lock:
+            return self.__cards.get(Util.vs2s(uid), {}).get(sector)
+
+    def getHits(self, key):
+        return self.__hits.get(key, 0)
+
+    def putKey(self, uid, sector, key_type, key):
+        with self.__lock:
+            sectors = self.__cards.setdefault(Util.vs2s(uid), {})
+            if sectors.get(sector) == (key_type, key):
+                return
+            sectors[sector] = (key_type, key)
+            self.__hits[key] = self.__hits.get(key, 0) + 1
+            self.__modified = True
+
+    def removeKey(self, uid, sector):
+        """Forget the key of the sector, e.g. when it does not open the sector any more;"""
+        with self.__lock:
+            if self.__cards.get(Util.vs2s(uid), {}).pop(sector, None) != None:
+                self.__modified = True
+
+
+class MifareKeySearch(object):
+    '''
+    Candidate keys of the sectors of a card: the key of the operation (firstKey) first, then the key cached for the card and
+    sector, then the other keys by the number of sectors they opened, then in the given order; Every key is tried as key A
+    first, then as key B;
+    '''
+
+    def __init__(self, keys, cache=None, firstKey=None):
+        # Remove duplicate keys, keeping the first;
+        self.__keys = []
+        for key in ([firstKey] if firstKey != None else []) + list(keys):
+            if key not in self.__keys:
+                self.__keys.append(key)
+        self.__firstKey = firstKey
+        self.__cache = cache if cache != None else MifareKeyCache()
+
+    def getCache(self):
+        return self.__cache
+
+    def candidates(self, uid, sector):
+        """Return the list of (key_type, key) to try on the sector;"""
+        cache = self.__cache
+        firstKey = self.__firstKey
+        keys = sorted(self.__keys, key=lambda key: (key != firstKey, -cache.getHits(key)))
+        candidates = [(KEY_TYPE_A, key) for key in keys] + [(KEY_TYPE_B, key) for key in keys]
+        cached = cache.getKey(uid, sector)
+        if (cached != None) and (cached != (KEY_TYPE_A, firstKey)):
+            if cached in candidates:
+                candidates.remove(cached)
+            candidates.insert(0 if firstKey == None else 1, cached)
+        return candidates
+
+    def found(self, uid, sector, key_type, key):
+        self.__cache.putKey(uid, sector, key_type, key)
+
+    def failed(self, uid, sector, key_type, key):
+        """The key did not open the sector;"""
+        if self.__cache.getKey(uid, sector) == (key_type, key):
+            self.__cache.removeKey(uid, sector)
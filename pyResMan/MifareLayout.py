@@ -0,0 +1,102 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-13
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+# Size of the data returned by one Mifare READ command;
+READ_SIZE = 16
+
+
+class MifareLayout(object):
+    '''
+    Memory layout of a Mifare card: sectors, blocks and sector trailers;
+    Blocks are numbered from 0 across all sectors; The last block of a sector is its trailer if the card has trailers;
+    Ultralight pages are modelled as 4 byte blocks of one sector without trailer and authentication;
+    '''
+
+    def __init__(self, name, sectorSizes, blockSize=16, hasTrailers=True, sak=None):
+        self.name = name
+        self.blockSize = blockSize
+        self.hasTrailers = hasTrailers
+        self.sak = sak
+        self.__firstBlocks = []
+        self.__sectors = []
+        blockCount = 0
+        for sector, sectorSize in enumerate(sectorSizes):
+            self.__firstBlocks.append(blockCount)
+            self.__sectors.extend([sector] * sectorSize)
+            blockCount += sectorSize
+        self.__sectorSizes = tuple(sectorSizes)
+        self.blockCount = blockCount
+        self.sectorCount = len(sectorSizes)
+        self.imageSize = blockCount * blockSize
+        # Blocks returned by one READ command;
+        self.blocksPerRead = max(READ_SIZE / blockSize, 1)
+
+    def __repr__(self):
+        return 'MifareLayout(%s)' %(self.name)
+
+    def needsAuthentication(self):
+        return self.hasTrailers
+
+    def sectorOf(self, block):
+        return self.__sectors[block]
+
+    def firstBlock(self, sector):
+        return self.__firstBlocks[sector]
+
+    def sectorBlocks(self, sector):
+        """Return the block numbers of the sector, the trailer included;"""
+        first = self.__firstBlocks[sector]
+        return range(first, first + self.__sectorSizes[sector])
+
+    def trailerOf(self, sector):
+        """Return the trailer block of the sector, None if the card has no trailers;"""
+        if not self.hasTrailers:
+            return None
+        return self.__firstBlocks[sector] + self.__sectorSizes[sector] - 1
+
+    def isTrailer(self, block):
+        return self.hasTrailers and (block == self.trailerOf(self.__sectors[block]))
+
+    def trailers(self):
+        if not self.hasTrailers:
+            return []
+        return [self.trailerOf(sector) for sector in range(self.sectorCount)]
+
+    def splitImage(self, image):
+        """Split a card image into the list of block data;"""
+        if len(image) != self.imageSize:
+            raise Exception('Invalid card data size for %s: %d.' %(self.name, len(image)))
+        blockSize = self.blockSize
+        return [image[i * blockSize : (i + 1) * blockSize] for i in range(self.blockCount)]
+
+
+MIFARE_MINI = MifareLayout('Mifare Mini', [4] * 5, sak=0x09)
+MIFARE_1K = MifareLayout('Mifare Classic 1K', [4] * 16, sak=0x08)
+# The last 8 sectors of a 4K card have 16 blocks each;
+MIFARE_4K = MifareLayout('Mifare Classic 4K', [4] * 32 + [16] * 8, sak=0x18)
+MIFARE_ULTRALIGHT = MifareLayout('Mifare Ultralight', [16], blockSize=4, hasTrailers=False, sak=0x00)
+
+LAYOUTS = (MIFARE_MINI, MIFARE_1K, MIFARE_4K, MIFARE_ULTRALIGHT)
+
+
+def layoutForSAK(sak):
+    """Return the layout of the card with this SAK, None if it is not a Mifare Classic / Ultralight card;"""
+    for layout in LAYOUTS:
+        if layout.sak == sak:
+            return layout
+    return None
+
+
+def layoutForImageSize(size):
+    """Return the layout of a card image with this size, None if there is none;"""
+    for layout in LAYOUTS:
+        if layout.imageSize == size:
+            return layout
+    return None
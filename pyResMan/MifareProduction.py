@@ -0,0 +1,184 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-18
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import time
+import timeit
+import threading
+from collections import deque
+from pyResMan.Util import LOG_Info, LOG_Warning
+from pyResMan.MifareEngine import MIFARE_ACTION_CARD
+
+# Seconds between two polls of the field;
+DEFAULT_POLL_INTERVAL = 0.2
+# Cards per minute are counted over this many seconds;
+RATE_WINDOW = 60.0
+
+
+def uidString(uid):
+    return ''.join('%02X' %(ord(b)) for b in uid)
+
+
+class MifareCardResult(object):
+    '''
+    Result of the job on one card of a production run;
+    '''
+
+    def __init__(self, index, uid, ok, seconds, message=''):
+        self.index = index
+        self.uid = uid
+        self.ok = ok
+        self.seconds = seconds
+        self.message = message
+
+    def toDict(self):
+        return {'index' : self.index, 'uid' : uidString(self.uid), 'ok' : self.ok, 'seconds' : self.seconds, 'message' : self.message}
+
+    def __str__(self):
+        return 'Card %d %s: %s in %.1f ms%s' %(self.index, uidString(self.uid), 'done' if self.ok else 'FAILED', self.seconds * 1000,
+                                               ', %s' %(self.message) if len(self.message) > 0 else '')
+
+
+class MifareProductionStatistics(object):
+    '''
+    Counters of a production run; They are updated by the worker of the reader and read by the viewer at any time;
+    '''
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__recent = deque()
+        self.__startTime = timeit.default_timer()
+        self.__stopTime = None
+        self.cardsDone = 0
+        self.cardsFailed = 0
+        self.duplicates = 0
+        self.jobTime = 0.0
+
+    def record(self, result):
+        with self.__lock:
+            if result.ok:
+                self.cardsDone += 1
+            else:
+                self.cardsFailed += 1
+            self.jobTime += result.seconds
+            now = timeit.default_timer()
+            self.__recent.append(now)
+            self.__expire(now)
+
+    def duplicate(self):
+        with self.__lock:
+            self.duplicates += 1
+
+    def stop(self):
+        with self.__lock:
+            self.__stopTime = timeit.default_timer()
+
+    def __expire(self, now):
+        while (len(self.__recent) > 0) and (self.__recent[0] < now - RATE_WINDOW):
+            self.__recent.popleft()
+
+    def getElapsedTime(self):
+        return (self.__stopTime if self.__stopTime != None else timeit.default_timer()) - self.__startTime
+
+    def cardsPerMinute(self):
+        """Return the cards finished per minute over the last RATE_WINDOW seconds (or since the start);"""
+        with self.__lock:
+            now = self.__stopTime if self.__stopTime != None else timeit.default_timer()
+            self.__expire(now)
+            window = min(RATE_WINDOW, now - self.__startTime)
+            if window <= 0.0:
+                return 0.0
+            return len(self.__recent) * 60.0 / window
+
+    def failureRate(self):
+        """Return the failed cards / all cards, 0.0 before the first card;"""
+        with self.__lock:
+            count = self.cardsDone + self.cardsFailed
+            return float(self.cardsFailed) / count if count > 0 else 0.0
+
+    def toDict(self):
+        return {
+            'cardsDone' : self.cardsDone,
+            'cardsFailed' : self.cardsFailed,
+            'duplicates' : self.duplicates,
+            'cardsPerMinute' : self.cardsPerMinute(),
+            'failureRate' : self.failureRate(),
+            'jobTime' : self.jobTime,
+            'elapsedTime' : self.getElapsedTime(),
+        }
+
+    def __str__(self):
+        return '%d cards done, %d failed (%.1f%%), %d duplicates rejected, %.1f cards/min, %.1f s' %(
+            self.cardsDone, self.cardsFailed, self.failureRate() * 100, self.duplicates, self.cardsPerMinute(), self.getElapsedTime())
+
+
+class MifareProductionLoop(object):
+    '''
+    Polls the field and runs the job on every new card, until it is stopped or count cards are done;
+    pollCard() of run() shall return (True, uid, sak) if a card is in the field and selected, (False, error, None) otherwise;
+    job(uid, sak) of run() shall return (ok, message) or raise an exception; A card is done once, it must leave the field before
+    the next card is taken; A card seen earlier in the run is rejected as a duplicate if rejectDuplicates is True;
+    '''
+
+    def __init__(self, handler, interval=DEFAULT_POLL_INTERVAL, count=0, rejectDuplicates=True):
+        self.__handler = handler
+        self.__interval = interval
+        self.__count = count
+        self.__rejectDuplicates = rejectDuplicates
+        self.__stopFlag = False
+        self.statistics = MifareProductionStatistics()
+
+    def stop(self):
+        self.__stopFlag = True
+
+    def run(self, pollCard, job):
+        """Run the loop; Return the MifareProductionStatistics;"""
+        statistics = self.statistics
+        seen = set()
+        current = None
+        self.__handler.handleLog('Production started, waiting for cards.', LOG_Info)
+        try:
+            while not self.__stopFlag:
+                if (self.__count > 0) and (statistics.cardsDone + statistics.cardsFailed >= self.__count):
+                    break
+                ok, uid, sak = pollCard()
+                if (not ok) or (uid == current):
+                    # Wait for a card, or for the card to leave the field;
+                    if not ok:
+                        current = None
+                    time.sleep(self.__interval)
+                    continue
+                current = uid
+                if uid in seen:
+                    statistics.duplicate()
+                    if self.__rejectDuplicates:
+                        self.__handler.handleLog('Card %s rejected, it is already done.' %(uidString(uid)), LOG_Warning)
+                        continue
+                seen.add(uid)
+                self.__runJob(job, uid, sak)
+                # The job may change the UID (block 0 of a UID changeable card), the card stays the current card;
+                ok, uid, sak = pollCard()
+                if ok:
+                    current = uid
+                    seen.add(uid)
+        finally:
+            statistics.stop()
+            self.__handler.handleLog('Production stopped: %s.' %(statistics), LOG_Info)
+        return statistics
+
+    def __runJob(self, job, uid, sak):
+        statistics = self.statistics
+        timeStart = timeit.default_timer()
+        try:
+            ok, message = job(uid, sak)
+        except Exception, e:
+            ok, message = False, str(e)
+        result = MifareCardResult(statistics.cardsDone + statistics.cardsFailed + 1, uid, ok, timeit.default_timer() - timeStart, message)
+        statistics.record(result)
+        self.__handler.handleMifareResponse(MIFARE_ACTION_CARD, 0, result)
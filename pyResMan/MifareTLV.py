@@ -6,6 +6,8 @@ Created on 2017/3/15
 @copyright: JavaCardOS Technologies. All rights reserved.
 '''
 
+import struct
+
 _TAG_BLOCK_NUMBER = '\x01'
 _TAG_BLOCK_DATA = '\x02'
 _TAG_INCDEC_OPERAND = '\x03'
@@ -29,12 +31,30 @@ COMMAND_TAG_DESFIRE_COMMAND = '\x20'
 
 _TAG_ERROR = '\x80'
 
+_RESPONSE_TAG = 0x7F
+_TAG_ERROR_VALUE = ord(_TAG_ERROR)
+_TAG_BLOCK_DATA_VALUE = ord(_TAG_BLOCK_DATA)
+_TAG_DESFIRE_DATA_VALUE = ord(_TAG_DESFIRE_DATA)
+
+# Read the fields in place, str / bytearray / buffer / memoryview alike;
+_unpack_header = struct.Struct('BBB').unpack_from
+_unpack_status = struct.Struct('BBBBBB').unpack_from
+_unpack_tag = struct.Struct('BB').unpack_from
+_unpack_byte = struct.Struct('B').unpack_from
+
+# Size limits of a batch apdu, see MifareCommandBatch;
+BATCH_MAX_COMMAND_SIZE = 0xFF
+BATCH_MAX_RESPONSE_SIZE = 0xFE
+# Size of a response tlv with the error only;
+_RESPONSE_HEADER_SIZE = 6
+
 class MifareCommandTLV(object):
     '''
     @brief Class to build mifare command tlv data;
     '''
     def __init__(self, command_tag):
         self.__data = ''
+        self.__rw_len = 0
         self.command_tag = command_tag
     
     def set_block_number(self, n):
@@ -57,63 +77,165 @@ class MifareCommandTLV(object):
     
     def set_rw_len(self, rw_len):
         self.__data += (_TAG_RW_LEN + '\x01' + chr(rw_len))
+        self.__rw_len = rw_len
     
     def set_command(self, cmd):
         self.__data += (_TAG_DESFIRE_DATA + chr(len(cmd)) + cmd)
     
     def serialize(self):
         return '\xFF' + self.command_tag + chr(len(self.__data)) + self.__data
+    
+    def get_response_size(self):
+        '''
+        @brief Return the maximum size of the response tlv;
+        '''
+        if self.command_tag == COMMAND_TAG_READ_BLOCK:
+            return _RESPONSE_HEADER_SIZE + 2 + self.__rw_len
+        if self.command_tag == COMMAND_TAG_DESFIRE_COMMAND:
+            return BATCH_MAX_RESPONSE_SIZE
+        return _RESPONSE_HEADER_SIZE
+
+
+class MifareCommandBatch(object):
+    '''
+    @brief Class to pack mifare command tlvs into as few apdus (frames) as possible;
+    A frame is the command tlvs one after another, its response is the response tlvs one after another;
+    The reader stops at the first command which fails, so a response has fewer tlvs than its frame if a command failed;
+    '''
+    def __init__(self):
+        self.__frames = []
+        self.__command_size = BATCH_MAX_COMMAND_SIZE
+        self.__response_size = BATCH_MAX_RESPONSE_SIZE
+        self.__count = 0
+    
+    def add(self, command_tlv):
+        command = command_tlv.serialize()
+        response_size = command_tlv.get_response_size()
+        if (self.__command_size + len(command) > BATCH_MAX_COMMAND_SIZE) or (self.__response_size + response_size > BATCH_MAX_RESPONSE_SIZE):
+            self.__frames.append([])
+            self.__command_size = 0
+            self.__response_size = 0
+        self.__frames[-1].append(command)
+        self.__command_size += len(command)
+        self.__response_size += response_size
+        self.__count += 1
+    
+    def __len__(self):
+        return self.__count
+    
+    def get_frames(self):
+        '''
+        @brief Return the list of frames, each is a list of serialized command tlvs;
+        '''
+        return self.__frames
+
+
+def _to_str(value):
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    return str(value)
+
+
+class MifareTLVError(Exception):
+    '''
+    Invalid mifare response tlv data;
+    '''
+    pass
 
 
 class MifareResponseTLV(object):
     '''
     Class to parse mifare response tlv data;
+    data is a str, bytearray, buffer or memoryview; The response starts at offset, and data may hold more after it (see split_responses);
+    The values are not copied when parsing, they are sliced out of data when they are read;
     '''
-    def __init__(self, data):
+    # A response is parsed for every Mifare and DESFire command;
+    __slots__ = ('__data', '__offset', '__error', '__block_data', '__desfire_data', 'size')
+
+    def __init__(self, data, offset=0):
         self.__data = data
+        self.__offset = offset
         self.__error = 0
-        self.__block_data = ''
-        self.__desfire_data = ''
+        # (start, end) of the values in data, None if there is none;
+        self.__block_data = None
+        self.__desfire_data = None
+        self.size = 0
         self.parse()
 
     def parse(self):
-        if ord(self.__data[0]) != 0x7F:
-            raise Exception('Invalid response tag.')
-        
-        tlv_data_len = ord(self.__data[2])
-        offset = 3
-        while True:
-            tag = ord(self.__data[offset])
-            value_len = ord(self.__data[offset + 1])
-            if tag == ord(_TAG_ERROR):
+        data = self.__data
+        start = self.__offset
+        available = len(data) - start
+        if available >= 6:
+            # The header and the error tlv, which comes first in the responses of the reader;
+            tag, _, tlv_data_len, value_tag, value_len, value = _unpack_status(data, start)
+        elif available >= 3:
+            tag, _, tlv_data_len = _unpack_header(data, start)
+            value_tag = None
+        else:
+            raise MifareTLVError('Response too short: %d bytes.' %(available))
+        if tag != _RESPONSE_TAG:
+            raise MifareTLVError('Invalid response tag: %02X.' %(tag))
+        if 3 + tlv_data_len > available:
+            raise MifareTLVError('Response truncated: %d bytes of %d.' %(available - 3, tlv_data_len))
+        offset = start + 3
+        end = offset + tlv_data_len
+        if (value_tag == _TAG_ERROR_VALUE) and (value_len == 0x01) and (tlv_data_len >= 3):
+            self.__error = value
+            offset += 3
+        while offset < end:
+            if end - offset < 2:
+                raise MifareTLVError('Tag truncated at offset %d.' %(offset))
+            tag, value_len = _unpack_tag(data, offset)
+            offset += 2
+            value_end = offset + value_len
+            if value_end > end:
+                raise MifareTLVError('Value of tag %02X truncated.' %(tag))
+            if tag == _TAG_ERROR_VALUE:
                 if value_len != 0x01:
-                    raise Exception('Invalid error length.')
-                self.__error = self.__data[offset + 2]
-                offset += 3
-            elif tag == ord(_TAG_BLOCK_DATA):
-                offset += 1
-                value_len = ord(self.__data[offset])
-                offset += 1
-                self.__block_data = self.__data[offset : offset + value_len]
-                offset += value_len
-            elif tag == ord(_TAG_DESFIRE_DATA):
-                offset += 1
-                value_len = ord(self.__data[offset])
-                offset += 1
-                self.__desfire_data = self.__data[offset : offset + value_len]
-                offset += value_len
+                    raise MifareTLVError('Invalid error length: %d.' %(value_len))
+                self.__error = _unpack_byte(data, offset)[0]
+            elif tag == _TAG_BLOCK_DATA_VALUE:
+                self.__block_data = (offset, value_end)
+            elif tag == _TAG_DESFIRE_DATA_VALUE:
+                self.__desfire_data = (offset, value_end)
             else:
-                raise Exception('Invalid tag value.')
-            
-            if offset >= tlv_data_len:
-                break;
+                raise MifareTLVError('Unknown tag: %02X.' %(tag))
+            offset = value_end
+        self.size = end - start
     
     def get_error(self):
-        return ord(self.__error)
+        return self.__error
+    
+    def has_block_data(self):
+        return self.__block_data != None
     
     def get_block_data(self):
-        return self.__block_data
+        field = self.__block_data
+        if field == None:
+            return ''
+        value = self.__data[field[0] : field[1]]
+        return value if type(value) is str else _to_str(value)
+    
+    def has_desfire_data(self):
+        return self.__desfire_data != None
     
     def get_desfire_data(self):
-        return self.__desfire_data
-    
\ No newline at end of file
+        field = self.__desfire_data
+        if field == None:
+            return ''
+        value = self.__data[field[0] : field[1]]
+        return value if type(value) is str else _to_str(value)
+
+
+def split_responses(data):
+    '''
+    @brief Parse the response of a batch frame; Return the list of MifareResponseTLV;
+    '''
+    responses = []
+    offset = 0
+    while offset < len(data):
+        response = MifareResponseTLV(data, offset)
+        responses.append(response)
+        offset += response.size
+    return responses
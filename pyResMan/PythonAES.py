@@ -0,0 +1,170 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-21
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import struct
+
+BLOCK_SIZE = 16
+
+_BLOCK = struct.Struct('>4I')
+
+
+def _xtime(a):
+    a <<= 1
+    if a & 0x100:
+        a ^= 0x11B
+    return a
+
+
+def _multiply(a, b):
+    result = 0
+    while b:
+        if b & 1:
+            result ^= a
+        a = _xtime(a)
+        b >>= 1
+    return result
+
+
+def _tables():
+    """Return the S-box, the inverse S-box, the round tables of encryption and decryption and the round constants;"""
+    # Walk the multiplicative group with the generator 3 to invert each element;
+    sbox = [0x63] * 256
+    p = 1
+    q = 1
+    while True:
+        p ^= _xtime(p) & 0xFF
+        q ^= q << 1
+        q ^= q << 2
+        q ^= q << 4
+        q &= 0xFF
+        if q & 0x80:
+            q ^= 0x09
+        x = q ^ ((q << 1) | (q >> 7)) ^ ((q << 2) | (q >> 6)) ^ ((q << 3) | (q >> 5)) ^ ((q << 4) | (q >> 4))
+        sbox[p] = (x ^ 0x63) & 0xFF
+        if p == 1:
+            break
+    inverse = [0] * 256
+    for i in xrange(256):
+        inverse[sbox[i]] = i
+
+    te = [[0] * 256 for i in xrange(4)]
+    td = [[0] * 256 for i in xrange(4)]
+    for i in xrange(256):
+        s = sbox[i]
+        t = (_multiply(s, 2) << 24) | (s << 16) | (s << 8) | _multiply(s, 3)
+        s = inverse[i]
+        u = (_multiply(s, 14) << 24) | (_multiply(s, 9) << 16) | (_multiply(s, 13) << 8) | _multiply(s, 11)
+        for j in xrange(4):
+            te[j][i] = t
+            td[j][i] = u
+            t = (t >> 8) | ((t & 0xFF) << 24)
+            u = (u >> 8) | ((u & 0xFF) << 24)
+
+    rcon = []
+    r = 1
+    for i in xrange(10):
+        rcon.append(r << 24)
+        r = _xtime(r)
+    return sbox, inverse, te, td, rcon
+
+_SBOX, _INVERSE_SBOX, _TE, _TD, _RCON = _tables()
+
+
+class PythonAES(object):
+    '''
+    AES (128, 192 or 256 bit key) in pure Python, the fallback when no crypto library is installed;
+    encrypt() and decrypt() process the data block by block (ECB);
+    '''
+
+    def __init__(self, key):
+        if len(key) not in (16, 24, 32):
+            raise Exception('Invalid key length.')
+        self.__rounds = len(key) / 4 + 6
+        self.__encryptKeys = self.__expandKey(key)
+        self.__decryptKeys = self.__inverseKeys(self.__encryptKeys)
+
+    def __expandKey(self, key):
+        sbox = _SBOX
+        nk = len(key) / 4
+        w = list(struct.unpack('>%dI' %(nk), key))
+        for i in xrange(nk, 4 * (self.__rounds + 1)):
+            t = w[i - 1]
+            if i % nk == 0:
+                t = (sbox[(t >> 16) & 0xFF] << 24) | (sbox[(t >> 8) & 0xFF] << 16) | (sbox[t & 0xFF] << 8) | sbox[t >> 24]
+                t ^= _RCON[i / nk - 1]
+            elif (nk > 6) and (i % nk == 4):
+                t = (sbox[t >> 24] << 24) | (sbox[(t >> 16) & 0xFF] << 16) | (sbox[(t >> 8) & 0xFF] << 8) | sbox[t & 0xFF]
+            w.append(w[i - nk] ^ t)
+        return [w[r * 4 : r * 4 + 4] for r in xrange(self.__rounds + 1)]
+
+    def __inverseKeys(self, keys):
+        """Return the round keys of the equivalent inverse cipher;"""
+        sbox = _SBOX
+        td0, td1, td2, td3 = _TD
+        inverse = [keys[self.__rounds]]
+        for r in xrange(self.__rounds - 1, 0, -1):
+            inverse.append([td0[sbox[w >> 24]] ^ td1[sbox[(w >> 16) & 0xFF]] ^ td2[sbox[(w >> 8) & 0xFF]] ^ td3[sbox[w & 0xFF]] for w in keys[r]])
+        inverse.append(keys[0])
+        return inverse
+
+    def __encryptBlock(self, s0, s1, s2, s3):
+        te0, te1, te2, te3 = _TE
+        keys = self.__encryptKeys
+        k = keys[0]
+        s0 ^= k[0]
+        s1 ^= k[1]
+        s2 ^= k[2]
+        s3 ^= k[3]
+        for r in xrange(1, self.__rounds):
+            k = keys[r]
+            t0 = te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xFF] ^ te2[(s2 >> 8) & 0xFF] ^ te3[s3 & 0xFF] ^ k[0]
+            t1 = te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xFF] ^ te2[(s3 >> 8) & 0xFF] ^ te3[s0 & 0xFF] ^ k[1]
+            t2 = te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xFF] ^ te2[(s0 >> 8) & 0xFF] ^ te3[s1 & 0xFF] ^ k[2]
+            t3 = te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xFF] ^ te2[(s1 >> 8) & 0xFF] ^ te3[s2 & 0xFF] ^ k[3]
+            s0, s1, s2, s3 = t0, t1, t2, t3
+        sbox = _SBOX
+        k = keys[self.__rounds]
+        return ((sbox[s0 >> 24] << 24) | (sbox[(s1 >> 16) & 0xFF] << 16) | (sbox[(s2 >> 8) & 0xFF] << 8) | sbox[s3 & 0xFF]) ^ k[0], \
+               ((sbox[s1 >> 24] << 24) | (sbox[(s2 >> 16) & 0xFF] << 16) | (sbox[(s3 >> 8) & 0xFF] << 8) | sbox[s0 & 0xFF]) ^ k[1], \
+               ((sbox[s2 >> 24] << 24) | (sbox[(s3 >> 16) & 0xFF] << 16) | (sbox[(s0 >> 8) & 0xFF] << 8) | sbox[s1 & 0xFF]) ^ k[2], \
+               ((sbox[s3 >> 24] << 24) | (sbox[(s0 >> 16) & 0xFF] << 16) | (sbox[(s1 >> 8) & 0xFF] << 8) | sbox[s2 & 0xFF]) ^ k[3]
+
+    def __decryptBlock(self, s0, s1, s2, s3):
+        td0, td1, td2, td3 = _TD
+        keys = self.__decryptKeys
+        k = keys[0]
+        s0 ^= k[0]
+        s1 ^= k[1]
+        s2 ^= k[2]
+        s3 ^= k[3]
+        for r in xrange(1, self.__rounds):
+            k = keys[r]
+            t0 = td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xFF] ^ td2[(s2 >> 8) & 0xFF] ^ td3[s1 & 0xFF] ^ k[0]
+            t1 = td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xFF] ^ td2[(s3 >> 8) & 0xFF] ^ td3[s2 & 0xFF] ^ k[1]
+            t2 = td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xFF] ^ td2[(s0 >> 8) & 0xFF] ^ td3[s3 & 0xFF] ^ k[2]
+            t3 = td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xFF] ^ td2[(s1 >> 8) & 0xFF] ^ td3[s0 & 0xFF] ^ k[3]
+            s0, s1, s2, s3 = t0, t1, t2, t3
+        sbox = _INVERSE_SBOX
+        k = keys[self.__rounds]
+        return ((sbox[s0 >> 24] << 24) | (sbox[(s3 >> 16) & 0xFF] << 16) | (sbox[(s2 >> 8) & 0xFF] << 8) | sbox[s1 & 0xFF]) ^ k[0], \
+               ((sbox[s1 >> 24] << 24) | (sbox[(s0 >> 16) & 0xFF] << 16) | (sbox[(s3 >> 8) & 0xFF] << 8) | sbox[s2 & 0xFF]) ^ k[1], \
+               ((sbox[s2 >> 24] << 24) | (sbox[(s1 >> 16) & 0xFF] << 16) | (sbox[(s0 >> 8) & 0xFF] << 8) | sbox[s3 & 0xFF]) ^ k[2], \
+               ((sbox[s3 >> 24] << 24) | (sbox[(s2 >> 16) & 0xFF] << 16) | (sbox[(s1 >> 8) & 0xFF] << 8) | sbox[s0 & 0xFF]) ^ k[3]
+
+    def __crypt(self, data, cryptBlock):
+        if len(data) % BLOCK_SIZE != 0:
+            raise Exception('Invalid data length.')
+        return ''.join(_BLOCK.pack(*cryptBlock(*_BLOCK.unpack_from(data, offset))) for offset in xrange(0, len(data), BLOCK_SIZE))
+
+    def encrypt(self, data):
+        return self.__crypt(data, self.__encryptBlock)
+
+    def decrypt(self, data):
+        return self.__crypt(data, self.__decryptBlock)
@@ -26,6 +26,25 @@ class R502Device(Device):
         # Get APDU response;
         return low_response[0 : -2]
 
+    def transmit_sc_batch(self, sc_commands):
+        '''
+        Send several TLV commands in one apdu (P1 = 0x01), see MifareCommandBatch;
+        Return the response TLVs, None if the reader does not support batches;
+        '''
+        cla = 0x8E
+        lc = len(sc_commands)
+        low_command = '%s\x00\x01\x00%s' %(chr(cla), chr(lc)) + sc_commands
+        low_response = self._low_interface.transmit(low_command)
+        if low_response[-2 : ] != '\x90\x00':
+            return None
+        return low_response[0 : -2]
+
+    def transmit(self, command):
+        '''
+        Send a native command (str) and return the response (str), without converting them to lists of ints;
+        '''
+        return self._low_interface.transmit(command)
+
     def transceive(self, cmd_bytes):
         resp = self._low_interface.transmit(''.join('%s' %(chr(b)) for b in cmd_bytes))
         return [ord(c) for c in resp]
@@ -0,0 +1,58 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-17
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+# Errors after which the RF field of the reader is in an unknown state (see DebuggerUtils);
+RF_LOST_ERRORS = (0x04, 0x05)
+# Errors after which the card is no longer selected or authenticated;
+CARD_LOST_ERRORS = (0x1B, 0x42, 0x60, 0x61, 0x64)
+# The card is halted after a failed authentication;
+ERROR_AUTHENTICATION_FAILED = 0x41
+
+
+class R502Session(object):
+    '''
+    State of the RF field of the R502 SPY reader and of the Mifare card in the field, as left by the commands sent so far;
+    None means unknown; R502SpyLibrary keeps it up to date, commands sent another way (e.g. with LibSC) shall report
+    their errors with handleError;
+    '''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget everything, e.g. after an apdu which was not sent by R502SpyLibrary;"""
+        self.rfOn = None
+        self.rfMode = None
+        self.cardLost()
+
+    def cardLost(self):
+        """The card is no longer selected, e.g. it is halted, removed or woken up again;"""
+        self.uid = None
+        self.sak = None
+        self.selected = False
+        self.authenticatedBlock = None
+
+    def cardSelected(self, uid, sak):
+        self.uid = uid
+        self.sak = sak
+        self.selected = True
+        self.authenticatedBlock = None
+
+    def handleError(self, error):
+        """Update the state after a command failed with the R502 error code;"""
+        if error in RF_LOST_ERRORS:
+            self.reset()
+        elif (error in CARD_LOST_ERRORS) or (error == ERROR_AUTHENTICATION_FAILED):
+            self.cardLost()
+
+    def __str__(self):
+        return 'RF %s, mode %s, card %s' %({None : 'unknown', True : 'on', False : 'off'}[self.rfOn],
+                                           'unknown' if self.rfMode == None else '%02X' %(self.rfMode),
+                                           ''.join('%02X' %(ord(b)) for b in self.uid) if self.selected else 'not selected')
@@ -6,6 +6,8 @@ Created on 2016-05-07
 @copyright: JavaCardOS Technologies. All rights reserved.
 '''
 
+from pyResMan.R502Session import R502Session
+
 class ISO7816(object):
     OFFSET_CLA = 0
     OFFSET_INS = 0
@@ -49,6 +51,12 @@ class R502SpyLibrary(object):
     INS_MIFARE_DUMP                 = 0xA5
     INS_MIFARE_CLONE                = 0x5A
     INS_MIFARE_READ_CARD_DATA       = 0xAA
+    
+    # P2 of the bulk commands, operate on the card or on the card data of the reader;
+    MIFARE_BULK_P2_CARD             = 0x80
+    MIFARE_BULK_P2_BUFFER           = 0x00
+    # Rows of 16 bytes read by one INS_MIFARE_READ_CARD_DATA (Le = 0 for 256 bytes);
+    MIFARE_BULK_MAX_ROWS            = 0x10
 
     RF_AUTO_MODE_MANUAL  = 0x00
     RF_AUTO_MODE_AUTO    = 0x01
@@ -58,41 +66,122 @@ class R502SpyLibrary(object):
         Constructor
         '''
         self.__scInterface = scinterface
+        self.__session = R502Session()
+    
+    def getSession(self):
+        return self.__session
+    
+    def __result(self, rsp):
+        '''
+        @return: True and response data / False and the error code; The session is updated after an error.
+        '''
+        if rsp[-2 : ] == '\x90\x00':
+            return True, rsp[ : -2]
+        self.__session.handleError(ord(rsp[0]))
+        return False, rsp[0]
     
     def __checkSCInterface(self):
         if self.__scInterface == None:
             raise Exception('Smartcard interface is not assigned.')
     
     def init(self):
+        self.__session.reset()
         self.rfOn()
         self.rfManaul()
     
+    def setupField(self):
+        '''
+        @brief: Switch the RF field on in manual mode; Nothing is sent if the session says it already is.
+        '''
+        if self.__session.rfOn != True:
+            self.rfOn()
+        if self.__session.rfMode != self.RF_AUTO_MODE_MANUAL:
+            self.rfManaul()
+    
+    def selectCard(self):
+        '''
+        @brief: Wake up and select the Mifare card (cascade level 1); Nothing is sent if the card is selected in the same session.
+        @return: True, uid and SAK / False, the error code and None.
+        '''
+        self.setupField()
+        session = self.__session
+        if session.selected:
+            return True, session.uid, session.sak
+        self.claWUPA2(chr(0x52))
+        ok, uid = self.claAnticollision2(chr(0x93), chr(0x20))
+        if not ok:
+            return False, uid, None
+        ok, data = self.claSelect2(chr(0x93), chr(0x70), uid)
+        if not ok:
+            return False, data, None
+        return True, uid, session.sak
+    
+    def pollCard(self):
+        '''
+        @brief: Look for a card in the field, even if a card is selected in the session; The card found is selected.
+        @return: True, uid and SAK / False, the error code and None.
+        '''
+        self.__session.cardLost()
+        return self.selectCard()
+    
+    def activateCard(self, fsdi=8):
+        '''
+        @brief: Wake up and select the card (all cascade levels), then activate its ISO14443-4 protocol with RATS (CID 0).
+        @return: True and the ATS / False and the error code.
+        '''
+        self.setupField()
+        self.claWUPA2(chr(0x52))
+        for sel in (0x93, 0x95, 0x97):
+            ok, uid = self.claAnticollision2(chr(sel), chr(0x20))
+            if not ok:
+                return False, uid
+            ok, sak = self.claSelect2(chr(sel), chr(0x70), uid)
+            if not ok:
+                return False, sak
+            # The cascade bit is set until the UID is complete;
+            if (len(sak) == 0) or ((ord(sak[0]) & 0x04) == 0):
+                break
+        return self.claRATS('\xE0%s' %(chr((fsdi & 0x0F) << 4)))
+    
     def rfOn(self):
         cmd = '%s%s\x00\x00\x00' %(chr(self.CLA_RF), chr(self.INS_RF_ON))
         rsp = self.__scInterface.transmit(cmd)
         if rsp != '\x90\x00':
+            self.__session.reset()
             return False, ''
+        self.__session.rfOn = True
         return True, ''
     
     def rfOff(self):
         cmd = '%s%s\x00\x00\x00' %(chr(self.CLA_RF), chr(self.INS_RF_OFF))
         rsp = self.__scInterface.transmit(cmd)
+        self.__session.cardLost()
         if rsp != '\x90\x00':
+            self.__session.reset()
             return False, ''
+        self.__session.rfOn = False
         return True, ''
     
     def rfAuto(self):
         cmd = '%s%s%s\x00\x00' %(chr(self.CLA_RF), chr(self.INS_RF_AUTO), chr(self.RF_AUTO_MODE_AUTO))
         rsp = self.__scInterface.transmit(cmd)
+        # The reader polls the cards in auto mode;
+        self.__session.cardLost()
         if rsp != chr(self.RF_AUTO_MODE_AUTO) + '\x90\x00':
+            self.__session.reset()
             return False, ''
+        self.__session.rfMode = self.RF_AUTO_MODE_AUTO
         return True, ''
     
     def rfManaul(self):
         cmd = '%s%s%s\x00\x00' %(chr(self.CLA_RF), chr(self.INS_RF_AUTO), chr(self.RF_AUTO_MODE_MANUAL))
         rsp = self.__scInterface.transmit(cmd)
         if rsp != chr(self.RF_AUTO_MODE_MANUAL) + '\x90\x00':
+            self.__session.reset()
             return False, ''
+        if self.__session.rfMode != self.RF_AUTO_MODE_MANUAL:
+            self.__session.cardLost()
+        self.__session.rfMode = self.RF_AUTO_MODE_MANUAL
         return True, ''
     
     def claREQA(self, commandValue):
@@ -100,54 +189,52 @@ class R502SpyLibrary(object):
             raise Exception('Invalid command value.')
         cmd = '%s%s%s\x00\x00' %(chr(self.CLA_RF), chr(self.INS_RF_REQA), commandValue[0])
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        self.__session.cardLost()
+        return self.__result(rsp)
     
     def claWUPA(self, commandValue):
         if len(commandValue) != 1:
             raise Exception('Invalid command value.')
         cmd = '%s%s%s\x00\x00' %(chr(self.CLA_RF), chr(self.INS_RF_WUPA), commandValue[0])
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        self.__session.cardLost()
+        return self.__result(rsp)
     
     def claAnticollision(self, commandValue):
         if len(commandValue) != 2:
             raise Exception('Invalid command value.')
         cmd = '%s%s%s%s\x00' %(chr(self.CLA_RF), chr(self.INS_RF_ANTI), commandValue[0], commandValue[1])
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        self.__session.cardLost()
+        return self.__result(rsp)
         
     def claSelect(self, commandValue):
         if len(commandValue) != 6:
             raise Exception('Invalid command value.')
         cmd = '%s%s%s%s\x05%s' %(chr(self.CLA_RF), chr(self.INS_RF_SEL), commandValue[0], commandValue[1], commandValue[2 : ])
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        result = self.__result(rsp)
+        if result[0]:
+            self.__session.cardSelected(commandValue[2 : ], ord(result[1][0]) if len(result[1]) > 0 else None)
+        else:
+            self.__session.cardLost()
+        return result
     
     def claRATS(self, commandValue):
         if (len(commandValue) != 2) or (commandValue[0] != '\xE0'):
             raise Exception('Invalid command value.')
         cmd = '%s%s%s\x00\x00' %(chr(self.CLA_RF), chr(self.INS_RF_RATS), commandValue[1])
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        self.__session.cardLost()
+        return self.__result(rsp)
     
     def claHLTA(self, commandValue):
         if (len(commandValue) != 2) or (commandValue != '\x50\x00'):
             raise Exception('Invalid command value.')
         cmd = '%s%s\x00\x00\x00' %(chr(self.CLA_RF), chr(self.INS_RF_HLTA))
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        self.__session.cardLost()
+        return self.__result(rsp)
     
     def claPPS(self, commandValue):
         commandLength = len(commandValue)
@@ -155,9 +242,7 @@ class R502SpyLibrary(object):
             raise Exception('Invalid command value.')
         cmd = '%s%s\x00\x00%s%s' %(chr(self.CLA_RF), chr(self.INS_RF_PPS), chr(commandLength), commandValue)
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
     
     def clbREQB(self):
         raise NotImplementedError()
@@ -181,58 +266,45 @@ class R502SpyLibrary(object):
         commandLength = len(commandValue)
         cmd = '%s%s\x00\x00%s%s' %(chr(self.CLA_RF), chr(self.INS_RF_APDU), chr(commandLength), commandValue)
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
 
     def mifareAuthentication(self, commandValue):
         cmd = '%s%s%s\x00%s%s' %(chr(self.CLA_MIFARE), commandValue[0], commandValue[1], chr(len(commandValue) - 2), commandValue[2 :])
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        result = self.__result(rsp)
+        if result[0]:
+            self.__session.authenticatedBlock = ord(commandValue[1])
+        return result
     
     def mifareBlockRead(self, commandValue):
         cmd = '%s%s%s\x00\x10' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_BLOCK_READ), commandValue[1])
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
     
     def mifareBlockWrite(self, commandValue):
         cmd = '%s%s%s\x00%s%s' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_BLOCK_WRITE), commandValue[1], chr(len(commandValue) - 2), commandValue[2 :])
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
     
     def mifareIncrement(self, commandValue):
         cmd = '%s%s%s\x00\x04%s' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_INCREMENT), commandValue[1], commandValue[2 : ])
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
     
     def mifareDecrement(self, commandValue):
         cmd = '%s%s%s\x00\x04%s' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_DECREMENT), commandValue[1], commandValue[2 : ])
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
     
     def mifareRestore(self, commandValue):
         cmd = '%s%s%s\x00\x00' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_RESTORE), commandValue[1])
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
     
     def mifareTransfer(self, commandValue):
         cmd = '%s%s%s\x00\x00' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_TRANSFER), commandValue[1])
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
 
     '''
         ISO14443-3 command;
@@ -244,9 +316,8 @@ class R502SpyLibrary(object):
         '''
         cmd = '%s%s%s\x00\x00' %(chr(self.CLA_RF), chr(self.INS_RF_REQA), req_value)
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        self.__session.cardLost()
+        return self.__result(rsp)
     
     def claWUPA2(self, req_value):
         '''
@@ -255,9 +326,8 @@ class R502SpyLibrary(object):
         '''
         cmd = '%s%s%s\x00\x00' %(chr(self.CLA_RF), chr(self.INS_RF_WUPA), req_value)
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        self.__session.cardLost()
+        return self.__result(rsp)
     
     def claAnticollision2(self, sel, nvb):
         '''
@@ -266,9 +336,8 @@ class R502SpyLibrary(object):
         '''
         cmd = '%s%s%s%s\x00' %(chr(self.CLA_RF), chr(self.INS_RF_ANTI), sel, nvb)
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        self.__session.cardLost()
+        return self.__result(rsp)
         
     def claSelect2(self, sel, nvb, uid):
         '''
@@ -277,9 +346,12 @@ class R502SpyLibrary(object):
         '''
         cmd = '%s%s%s%s\x04%s' %(chr(self.CLA_RF), chr(self.INS_RF_SEL), sel, nvb, uid)
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        result = self.__result(rsp)
+        if result[0]:
+            self.__session.cardSelected(uid, ord(result[1][0]) if len(result[1]) > 0 else None)
+        else:
+            self.__session.cardLost()
+        return result
 
     def claHLTA2(self):
         '''
@@ -288,9 +360,8 @@ class R502SpyLibrary(object):
         '''
         cmd = '%s%s\x00\x00\x00' %(chr(self.CLA_RF), chr(self.INS_RF_HLTA))
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        self.__session.cardLost()
+        return self.__result(rsp)
 
     '''
         ### Methods version 2; ###
@@ -309,9 +380,10 @@ class R502SpyLibrary(object):
         
         cmd = '%s%s%s\x00%s%s' %(chr(self.CLA_MIFARE), chr(0x60 + keyType), chr(blockNumber), chr(len(key) + len(uid)), key + uid)
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        result = self.__result(rsp)
+        if result[0]:
+            self.__session.authenticatedBlock = blockNumber
+        return result
 
     def mifareBlockRead2(self, blockNumber):
         '''
@@ -320,9 +392,7 @@ class R502SpyLibrary(object):
         '''
         cmd = '%s%s%s\x00\x10' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_BLOCK_READ), chr(blockNumber))
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
 
     def mifareBlockWrite2(self, blockNumber, value):
         '''
@@ -334,9 +404,7 @@ class R502SpyLibrary(object):
         
         cmd = '%s%s%s\x00%s%s' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_BLOCK_WRITE), chr(blockNumber), chr(len(value)), value)
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
 
     def mifareIncrement2(self, blockNumber, incValue):
         '''
@@ -345,9 +413,7 @@ class R502SpyLibrary(object):
         '''
         cmd = '%s%s%s\x00\x04%s' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_INCREMENT), chr(blockNumber), incValue)
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
 
     def mifareDecrement2(self, blockNumber, decValue):
         '''
@@ -356,9 +422,7 @@ class R502SpyLibrary(object):
         '''
         cmd = '%s%s%s\x00\x04%s' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_DECREMENT), chr(blockNumber), decValue)
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
     
     def mifareRestore2(self, blockNumber):
         '''
@@ -367,9 +431,7 @@ class R502SpyLibrary(object):
         '''
         cmd = '%s%s%s\x00\x00' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_RESTORE), chr(blockNumber))
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
     
     def mifareTransfer2(self, blockNumber):
         '''
@@ -378,9 +440,7 @@ class R502SpyLibrary(object):
         '''
         cmd = '%s%s%s\x00\x00' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_TRANSFER), chr(blockNumber))
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        return self.__result(rsp)
     
     def mifareDumpCard(self):
         '''
@@ -389,9 +449,8 @@ class R502SpyLibrary(object):
         '''
         cmd = '%s%s\x00\x00\x00' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_DUMP))
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
-        return False, rsp[0]
+        self.__session.cardLost()
+        return self.__result(rsp)
 
     def mifareCloneCard(self):
         '''
@@ -400,6 +459,58 @@ class R502SpyLibrary(object):
         '''
         cmd = '%s%s\x00\x00\x00' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_CLONE))
         rsp = self.__scInterface.transmit(cmd)
-        if rsp[-2 : ] == '\x90\x00':
-            return True, rsp[ : -2]
+        self.__session.cardLost()
+        return self.__result(rsp)
+
+    '''
+        ### Bulk methods; The card data is kept in the reader, addressed in rows of 16 bytes; ###
+    '''
+    def mifareDumpCard2(self, keyType, key):
+        '''
+        @brief: Select the card and read all of its sectors with the key into the card data of the reader.
+        @return: True and (SAK, row count, bitmap of the sectors which can not be read) / False and the error code.
+        '''
+        if keyType not in [0, 1]:
+            raise Exception('Invalid key type.')
+        if len(key) != 6:
+            raise Exception('Wrong key length.')
+        cmd = '%s%s%s%s%s%s' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_DUMP), chr(keyType), chr(self.MIFARE_BULK_P2_CARD), chr(len(key)), key)
+        rsp = self.__scInterface.transmit(cmd)
+        self.__session.cardLost()
+        if (rsp[-2 : ] == '\x90\x00') and (len(rsp) >= 5):
+            return True, (ord(rsp[0]), (ord(rsp[1]) << 8) | ord(rsp[2]), rsp[3 : -2])
         return False, rsp[0]
+
+    def mifareReadCardData2(self, row, rowCount):
+        '''
+        @brief: Read rowCount (0 to MIFARE_BULK_MAX_ROWS) rows of the card data of the reader.
+        @return: True and response data / False and the error code.
+        '''
+        if (rowCount < 0) or (rowCount > self.MIFARE_BULK_MAX_ROWS):
+            raise Exception('Invalid row count.')
+        cmd = '%s%s%s%s%s' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_READ_CARD_DATA), chr(row), chr(rowCount), chr((rowCount * 0x10) & 0xFF))
+        rsp = self.__scInterface.transmit(cmd)
+        return self.__result(rsp)
+
+    def mifareLoadCardData2(self, row, data):
+        '''
+        @brief: Write rows of the card data of the reader; data is at most MIFARE_BULK_MAX_ROWS - 1 rows.
+        @return: True and response data / False and the error code.
+        '''
+        if (len(data) % 0x10 != 0) or (len(data) > 0xF0):
+            raise Exception('Wrong data length.')
+        cmd = '%s%s%s%s%s%s' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_CLONE), chr(row), chr(self.MIFARE_BULK_P2_BUFFER), chr(len(data)), data)
+        rsp = self.__scInterface.transmit(cmd)
+        return self.__result(rsp)
+
+    def mifareCloneCard2(self, key, rowCount):
+        '''
+        @brief: Write rowCount rows of the card data of the reader to the (magic) card; Key A of every trailer is replaced by the key.
+        @return: True and bitmap of the sectors which can not be written / False and the error code.
+        '''
+        if len(key) != 6:
+            raise Exception('Wrong key length.')
+        cmd = '%s%s%s%s%s%s' %(chr(self.CLA_MIFARE), chr(R502SpyLibrary.INS_MIFARE_CLONE), chr(rowCount & 0xFF), chr(self.MIFARE_BULK_P2_CARD | (rowCount >> 8)), chr(len(key)), key)
+        rsp = self.__scInterface.transmit(cmd)
+        self.__session.cardLost()
+        return self.__result(rsp)
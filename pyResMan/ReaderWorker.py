@@ -0,0 +1,247 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-2
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import threading
+import itertools
+import traceback
+import Queue
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# The stop request is queued ahead of every command;
+_PRIORITY_STOP = -1
+
+
+class CommandFuture(object):
+    '''
+    Result of one command submitted to a ReaderWorker;
+    '''
+
+    STATE_PENDING = 0
+    STATE_RUNNING = 1
+    STATE_FINISHED = 2
+    STATE_CANCELLED = 3
+
+    def __init__(self, name, errorHandler=None, exceptionHandler=None):
+        """errorHandler(future, e) is called if a done callback raises an exception; exceptionHandler(future, e) is
+        called if the command raises an exception, before the future is finished;"""
+        self.name = name
+        self.__errorHandler = errorHandler
+        self.__exceptionHandler = exceptionHandler
+        self.__stopRequested = False
+        self.__state = CommandFuture.STATE_PENDING
+        self.__result = None
+        self.__exception = None
+        self.__callbacks = []
+        self.__condition = threading.Condition()
+
+    def done(self):
+        """Return True if the command finished or was cancelled;"""
+        with self.__condition:
+            return self.__state in (CommandFuture.STATE_FINISHED, CommandFuture.STATE_CANCELLED)
+
+    def running(self):
+        with self.__condition:
+            return self.__state == CommandFuture.STATE_RUNNING
+
+    def cancelled(self):
+        with self.__condition:
+            return self.__state == CommandFuture.STATE_CANCELLED
+
+    def stopRequested(self):
+        with self.__condition:
+            return self.__stopRequested
+
+    def cancel(self):
+        """Cancel the command if it is not started yet; A running command is requested to stop, it stops at its next
+        ReaderWorker.runPending(); Return True if cancelled;"""
+        with self.__condition:
+            if self.__state == CommandFuture.STATE_CANCELLED:
+                return True
+            if self.__state == CommandFuture.STATE_RUNNING:
+                self.__stopRequested = True
+                return False
+            if self.__state != CommandFuture.STATE_PENDING:
+                return False
+            self.__state = CommandFuture.STATE_CANCELLED
+            self.__condition.notify_all()
+        self.__invokeCallbacks()
+        return True
+
+    def result(self, timeout=None):
+        """Wait for the command and return its result, or raise its exception;"""
+        self.__wait(timeout)
+        if self.__exception != None:
+            raise self.__exception
+        return self.__result
+
+    def exception(self, timeout=None):
+        """Wait for the command and return its exception (None if succeeded);"""
+        self.__wait(timeout)
+        return self.__exception
+
+    def addDoneCallback(self, callback):
+        """Call callback(future) when the command is done; Called at once if already done;"""
+        with self.__condition:
+            if self.__state not in (CommandFuture.STATE_FINISHED, CommandFuture.STATE_CANCELLED):
+                self.__callbacks.append(callback)
+                return
+        callback(self)
+
+    def setRunning(self):
+        """Called by the worker; Return False if the command has been cancelled;"""
+        with self.__condition:
+            if self.__state == CommandFuture.STATE_CANCELLED:
+                return False
+            self.__state = CommandFuture.STATE_RUNNING
+            return True
+
+    def setResult(self, result):
+        with self.__condition:
+            self.__result = result
+            self.__state = CommandFuture.STATE_FINISHED
+            self.__condition.notify_all()
+        self.__invokeCallbacks()
+
+    def setException(self, e):
+        if self.__exceptionHandler != None:
+            try:
+                self.__exceptionHandler(self, e)
+            except Exception:
+                traceback.print_exc()
+        with self.__condition:
+            self.__exception = e
+            self.__state = CommandFuture.STATE_FINISHED
+            self.__condition.notify_all()
+        self.__invokeCallbacks()
+
+    def __wait(self, timeout):
+        with self.__condition:
+            if self.__state not in (CommandFuture.STATE_FINISHED, CommandFuture.STATE_CANCELLED):
+                self.__condition.wait(timeout)
+            if self.__state == CommandFuture.STATE_CANCELLED:
+                raise Exception('Command cancelled: %s.' %(self.name))
+            if self.__state != CommandFuture.STATE_FINISHED:
+                raise Exception('Command timeout: %s.' %(self.name))
+
+    def __invokeCallbacks(self):
+        callbacks = self.__callbacks
+        self.__callbacks = []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception, e:
+                if self.__errorHandler != None:
+                    self.__errorHandler(self, e)
+                else:
+                    traceback.print_exc()
+
+
+class ReaderWorker(object):
+    '''
+    One long-lived thread per reader, which owns the reader handle and runs the queued commands one by one;
+    Commands with a lower priority value run first; Commands with the same priority run in the submission order;
+    A command is not interrupted by the commands queued while it runs, unless it calls runPending() between its steps:
+    the batches of apdus do, so an interactive command waits for one apdu of a running script, not for the whole script;
+    '''
+
+    def __init__(self, readername, errorHandler=None):
+        """errorHandler(future, e) is called if a done callback of a command raises an exception;"""
+        self.__readername = readername
+        self.__errorHandler = errorHandler
+        # Priority and future of the running command (the innermost one in runPending);
+        self.__running = None
+        self.__queue = Queue.PriorityQueue()
+        self.__sequence = itertools.count()
+        self.__stopped = False
+        self.__lock = threading.Lock()
+        self.__thread = threading.Thread(target=self.__run, name='Reader worker thread: %s' %(readername))
+        self.__thread.setDaemon(True)
+        self.__thread.start()
+
+    def getReaderName(self):
+        return self.__readername
+
+    def isCurrentThread(self):
+        """Return True if it is called from the worker thread;"""
+        return threading.current_thread() is self.__thread
+
+    def submit(self, target, args=tuple(), priority=PRIORITY_NORMAL, name=None, exceptionHandler=None):
+        """Queue target(*args) and return a CommandFuture for its result; exceptionHandler(future, e) is called on the
+        worker thread if target raises an exception;"""
+        if name == None:
+            name = getattr(target, '__name__', 'command')
+        future = CommandFuture(name, self.__errorHandler, exceptionHandler)
+        with self.__lock:
+            if self.__stopped:
+                raise Exception('Reader worker is stopped: %s.' %(self.__readername))
+            self.__queue.put((priority, next(self.__sequence), future, target, args))
+        return future
+
+    def stop(self, wait=True):
+        """Stop the worker after the running command; The pending commands are cancelled;"""
+        with self.__lock:
+            if self.__stopped:
+                return
+            self.__stopped = True
+            self.__queue.put((_PRIORITY_STOP, next(self.__sequence), None, None, None))
+        if wait and not self.isCurrentThread():
+            self.__thread.join()
+
+    def runPending(self):
+        """Called by the running command on the worker thread between its steps: run the commands queued with a higher
+        priority first; Return False if the running command shall stop: it was cancelled or the worker is stopping;"""
+        if (not self.isCurrentThread()) or (self.__running == None):
+            raise Exception('runPending is called out of a running command.')
+        priority, future = self.__running
+        while True:
+            try:
+                item = self.__queue.get_nowait()
+            except Queue.Empty:
+                break
+            if (item[2] == None) or (item[0] >= priority):
+                # The stop request, or a command which runs after this one;
+                self.__queue.put(item)
+                break
+            self.__execute(item)
+            self.__running = (priority, future)
+        with self.__lock:
+            stopped = self.__stopped
+        return (not stopped) and (not future.stopRequested())
+
+    def __execute(self, item):
+        priority, sequence, future, target, args = item
+        if not future.setRunning():
+            return
+        self.__running = (priority, future)
+        try:
+            future.setResult(target(*args))
+        except Exception, e:
+            future.setException(e)
+        finally:
+            self.__running = None
+
+    def __run(self):
+        while True:
+            item = self.__queue.get()
+            if item[2] == None:
+                break
+            self.__execute(item)
+
+        # Cancel the commands which are not run;
+        while True:
+            try:
+                priority, sequence, future, target, args = self.__queue.get_nowait()
+            except Queue.Empty:
+                break
+            if future != None:
+                future.cancel()
@@ -0,0 +1,244 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-5
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import os
+import mmap
+import struct
+import hashlib
+import tempfile
+from pyResMan.Util import Util
+
+# Compiled script file: header, then one record per APDU or invalid line (kind, 2 bytes big-endian length, then the APDU
+# bytes or the error message of the line);
+SCRIPT_CACHE_MAGIC = 'PRMS'
+SCRIPT_CACHE_VERSION = 2
+# magic, version, script mtime, script size, record count;
+_HEADER = struct.Struct('>4sBdQI')
+_RECORD = struct.Struct('>BH')
+_RECORD_APDU = 0
+_RECORD_INVALID_LINE = 1
+
+# Lines starting with these are comments;
+SCRIPT_COMMENT_PREFIXES = ('#', '//')
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'pyResManScriptCache')
+
+# Bytes read from the script file at a time, and script items delivered to the viewer at a time;
+SCRIPT_READ_CHUNK_SIZE = 64 * 1024
+SCRIPT_ITEMS_BATCH_SIZE = 256
+
+
+class ScriptLineError(ValueError):
+    '''
+    Invalid line of a script;
+    '''
+
+    def __init__(self, lineNumber, message):
+        ValueError.__init__(self, message)
+        self.lineNumber = lineNumber
+
+
+class CompiledScript(object):
+    '''
+    APDUs of one compiled script, read from the memory-mapped cache file; The cache is keyed by the path of the script
+    and checked against its mtime and size (see isValidFor), the content of the script is not hashed;
+    The records are split once, on the first iteration, and the same list is iterated by the later loops;
+    '''
+
+    def __init__(self, cachePathName, scriptPathName):
+        self.__cachePathName = cachePathName
+        self.__scriptPathName = scriptPathName
+        self.__file = open(cachePathName, 'rb')
+        try:
+            self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.__file.close()
+            raise
+        try:
+            magic, version, self.__mtime, self.__size, self.__count = _HEADER.unpack_from(self.__map, 0)
+            self.__items = None
+        except struct.error:
+            magic, version = None, None
+        if (magic != SCRIPT_CACHE_MAGIC) or (version != SCRIPT_CACHE_VERSION):
+            self.close()
+            raise ValueError('Invalid script cache file: %s.' %(cachePathName))
+
+    def getScriptPathName(self):
+        return self.__scriptPathName
+
+    def getCachePathName(self):
+        return self.__cachePathName
+
+    def isValidFor(self, mtime, size):
+        """Return True if the cache was compiled from the script with this mtime and size; An edit which keeps both is
+        not detected, the content is not compared;"""
+        return (self.__mtime == mtime) and (self.__size == size)
+
+    def __len__(self):
+        return self.__count
+
+    def getItems(self):
+        """Return the list of the APDUs (value strings) and the ScriptLineError of the invalid lines, in the script order;"""
+        if self.__items == None:
+            data = self.__map
+            unpack_from = _RECORD.unpack_from
+            offset = _HEADER.size
+            items = []
+            for _ in xrange(self.__count):
+                kind, length = unpack_from(data, offset)
+                offset += _RECORD.size
+                if kind == _RECORD_APDU:
+                    items.append(data[offset : offset + length])
+                else:
+                    lineNumber, message = data[offset : offset + length].split(' ', 1)
+                    items.append(ScriptLineError(int(lineNumber), message))
+                offset += length
+            self.__items = items
+        return self.__items
+
+    def __iter__(self):
+        """Iterate the APDUs as value strings, and the ScriptLineError of the invalid lines;"""
+        return iter(self.getItems())
+
+    def close(self):
+        if self.__map != None:
+            self.__map.close()
+            self.__map = None
+        if self.__file != None:
+            self.__file.close()
+            self.__file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+
+def parseScriptLine(lineNumber, scriptLine):
+    """Decode one hex APDU line of a script; Return None for a blank line or a comment; Raise ScriptLineError with the
+    line number if the line is invalid;"""
+    line = scriptLine.strip()
+    if (len(line) == 0) or line.startswith(SCRIPT_COMMENT_PREFIXES):
+        return None
+    try:
+        apdu = Util.s2vs(line)
+    except ValueError:
+        raise ScriptLineError(lineNumber, 'Invalid APDU at line %d: %s.' %(lineNumber, line))
+    if len(apdu) > 0xFFFF:
+        raise ScriptLineError(lineNumber, 'APDU too long at line %d.' %(lineNumber))
+    return apdu
+
+
+def parseScriptLines(scriptLines):
+    """Decode the hex APDU lines of a script; Blank lines and comments are skipped; An invalid line gives a ScriptLineError
+    at its place in the list, the runner reports it and goes on with the next APDU;"""
+    items = []
+    for lineIndex, scriptLine in enumerate(scriptLines):
+        try:
+            apdu = parseScriptLine(lineIndex + 1, scriptLine)
+        except ScriptLineError, e:
+            items.append(e)
+            continue
+        if apdu != None:
+            items.append(apdu)
+    return items
+
+
+def getCachePathName(scriptPathName, cacheDir=None):
+    """Return the cache file of the script file, named after the SHA-1 of its absolute path name;"""
+    if cacheDir == None:
+        cacheDir = DEFAULT_CACHE_DIR
+    return os.path.join(cacheDir, hashlib.sha1(os.path.abspath(scriptPathName)).hexdigest() + '.bin')
+
+
+def compileScript(scriptPathName, cacheDir=None):
+    """Return the CompiledScript of the script file; The cache is looked up by the path, mtime and size of the script,
+    and the script is read and parsed only if there is no valid cache for it;"""
+    if cacheDir == None:
+        cacheDir = DEFAULT_CACHE_DIR
+
+    stat = os.stat(scriptPathName)
+    cachePathName = getCachePathName(scriptPathName, cacheDir)
+    if os.path.isfile(cachePathName):
+        try:
+            compiledScript = CompiledScript(cachePathName, scriptPathName)
+            if compiledScript.isValidFor(stat.st_mtime, stat.st_size):
+                return compiledScript
+            compiledScript.close()
+        except Exception:
+            pass
+
+    with open(scriptPathName, 'rb') as scriptFile:
+        stat = os.fstat(scriptFile.fileno())
+        content = scriptFile.read()
+    items = parseScriptLines(content.splitlines())
+    if not os.path.isdir(cacheDir):
+        os.makedirs(cacheDir)
+
+    # Write a temporary file and rename it, so other runs never map a partial cache file;
+    fd, tempPathName = tempfile.mkstemp(suffix='.tmp', dir=cacheDir)
+    try:
+        with os.fdopen(fd, 'wb') as cacheFile:
+            cacheFile.write(_HEADER.pack(SCRIPT_CACHE_MAGIC, SCRIPT_CACHE_VERSION, stat.st_mtime, stat.st_size, len(items)))
+            for item in items:
+                if isinstance(item, ScriptLineError):
+                    record = '%d %s' %(item.lineNumber, item.args[0])
+                    cacheFile.write(_RECORD.pack(_RECORD_INVALID_LINE, len(record)))
+                else:
+                    record = item
+                    cacheFile.write(_RECORD.pack(_RECORD_APDU, len(record)))
+                cacheFile.write(record)
+        if os.path.exists(cachePathName):
+            os.remove(cachePathName)
+        os.rename(tempPathName, cachePathName)
+    except Exception:
+        if os.path.exists(tempPathName):
+            os.remove(tempPathName)
+        raise
+
+    return CompiledScript(cachePathName, scriptPathName)
+
+
+def iterScriptLines(scriptPathName, chunkSize=SCRIPT_READ_CHUNK_SIZE):
+    """Yield the lines of the script file, reading chunkSize bytes at a time;"""
+    with open(scriptPathName, 'rb') as scriptFile:
+        rest = ''
+        while True:
+            chunk = scriptFile.read(chunkSize)
+            if len(chunk) == 0:
+                break
+            lines = (rest + chunk).split('\n')
+            rest = lines.pop()
+            for line in lines:
+                yield line
+        if len(rest) > 0:
+            yield rest
+
+
+def iterScriptItems(scriptPathName, batchSize=SCRIPT_ITEMS_BATCH_SIZE, chunkSize=SCRIPT_READ_CHUNK_SIZE, handleInvalidLine=None):
+    """Yield the hex APDU lines (without spaces) of the script file in lists of at most batchSize items; Blank lines and
+    comments are skipped; Invalid lines (see parseScriptLine) are skipped too, handleInvalidLine(ScriptLineError) is called
+    for each of them;"""
+    batch = []
+    for lineIndex, line in enumerate(iterScriptLines(scriptPathName, chunkSize)):
+        try:
+            if parseScriptLine(lineIndex + 1, line) == None:
+                continue
+        except ScriptLineError, e:
+            if handleInvalidLine != None:
+                handleInvalidLine(e)
+            continue
+        batch.append(Util.removespace(line))
+        if len(batch) >= batchSize:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
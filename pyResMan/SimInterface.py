@@ -0,0 +1,1111 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-6
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import os
+import time
+import random
+import threading
+from pyResMan.SCInterface import SCInterface
+from pyResMan.R502SpyLibrary import R502SpyLibrary
+from pyResMan import MifareTLV
+from pyResMan import MifareLayout
+from pyResMan import DESFireFrames
+from pyResMan import DESFireCrypto
+
+SIM_READER_NAME = 'R502 SPY Simulator 0'
+
+CLA_R502_TLV = 0x8E
+CLA_DESFIRE = 0x90
+
+# R502 error codes (see DebuggerUtils);
+ERROR_NONE = 0x00
+ERROR_UNKNOWN_COMMAND = 0x06
+ERROR_CARD_NOT_PRESENT = 0x1B
+ERROR_M1_AUTHENTICATION_FAILED = 0x41
+ERROR_M1_NOT_AUTHENTICATED = 0x42
+ERROR_M1_WRITE_FAILED = 0x43
+ERROR_VALUE = 0x44
+ERROR_INVALID_PARAMETER = 0x4B
+
+SW_OK = '\x90\x00'
+SW_R502_ERROR = '\x6F\x00'
+
+# DESFire status codes;
+DF_OPERATION_OK = 0x00
+DF_NO_CHANGES = 0x0C
+DF_ILLEGAL_COMMAND_CODE = 0x1C
+DF_INTEGRITY_ERROR = 0x1E
+DF_NO_SUCH_KEY = 0x40
+DF_LENGTH_ERROR = 0x7E
+DF_PERMISSION_DENIED = 0x9D
+DF_PARAMETER_ERROR = 0x9E
+DF_APPLICATION_NOT_FOUND = 0xA0
+DF_AUTHENTICATION_ERROR = 0xAE
+DF_ADDITIONAL_FRAME = 0xAF
+DF_BOUNDARY_ERROR = 0xBE
+DF_COUNT_ERROR = 0xCE
+DF_DUPLICATE_ERROR = 0xDE
+DF_FILE_NOT_FOUND = 0xF0
+
+DF_MAX_FRAME_SIZE = 59
+
+
+def _le(value, size):
+    return ''.join(chr((value >> (8 * i)) & 0xFF) for i in range(size))
+
+def _from_le(data):
+    value = 0
+    for i in range(len(data)):
+        value |= ord(data[i]) << (8 * i)
+    return value
+
+
+class SimMifareClassic(object):
+    '''
+    Simulated Mifare Classic card (Mini, 1K or 4K layout); Authentication does not run crypto1, only the keys are compared;
+    '''
+
+    ATQA = '\x04\x00'
+    DEFAULT_TRAILER = '\xFF' * 6 + '\xFF\x07\x80\x69' + '\xFF' * 6
+
+    def __init__(self, uid='\x01\x02\x03\x04', layout=MifareLayout.MIFARE_1K):
+        if len(uid) != 4:
+            raise Exception('Wrong uid length.')
+        if not layout.hasTrailers:
+            raise Exception('Not a Mifare Classic layout: %s.' %(layout.name))
+        self.uid = uid
+        self.layout = layout
+        self.SAK = chr(layout.sak)
+        self.BLOCK_COUNT = layout.blockCount
+        bcc = 0
+        for c in uid:
+            bcc ^= ord(c)
+        self.blocks = []
+        for block_number in range(self.BLOCK_COUNT):
+            if block_number == 0:
+                block = uid + chr(bcc) + self.SAK + self.ATQA[::-1] + '\x00' * 8
+            elif layout.isTrailer(block_number):
+                block = self.DEFAULT_TRAILER
+            else:
+                block = '\x00' * 16
+            self.blocks.append(bytearray(block))
+        self.reset()
+
+    def reset(self):
+        """Card state after the field is switched on;"""
+        self.halted = False
+        self.selected = False
+        self.authenticated_sector = None
+        self.backdoor = False
+        self.transfer_buffer = None
+
+    def getUID(self):
+        return self.uid
+
+    def anticollision(self, sel):
+        if sel != 0x93:
+            return None
+        return self.uid
+
+    def authenticate(self, block_number, key_type, key, uid):
+        if uid != self.uid or block_number >= self.BLOCK_COUNT:
+            self.authenticated_sector = None
+            return ERROR_M1_AUTHENTICATION_FAILED
+        sector = self.layout.sectorOf(block_number)
+        trailer = self.blocks[self.layout.trailerOf(sector)]
+        card_key = str(trailer[0 : 6]) if key_type == 0 else str(trailer[10 : 16])
+        if card_key != key:
+            self.authenticated_sector = None
+            return ERROR_M1_AUTHENTICATION_FAILED
+        self.authenticated_sector = sector
+        return ERROR_NONE
+
+    def __checkAccess(self, block_number):
+        if block_number >= self.BLOCK_COUNT:
+            return ERROR_INVALID_PARAMETER
+        if self.backdoor:
+            return ERROR_NONE
+        if self.authenticated_sector != self.layout.sectorOf(block_number):
+            return ERROR_M1_NOT_AUTHENTICATED
+        return ERROR_NONE
+
+    def readBlock(self, block_number):
+        error = self.__checkAccess(block_number)
+        if error != ERROR_NONE:
+            return error, ''
+        data = self.blocks[block_number]
+        if self.layout.isTrailer(block_number):
+            # Key A is never readable;
+            data = bytearray(6) + data[6 : ]
+        return ERROR_NONE, str(data)
+
+    def writeBlock(self, block_number, data):
+        error = self.__checkAccess(block_number)
+        if error != ERROR_NONE:
+            return error
+        if len(data) != 16:
+            return ERROR_M1_WRITE_FAILED
+        if block_number == 0 and not self.backdoor:
+            return ERROR_M1_WRITE_FAILED
+        self.blocks[block_number] = bytearray(data)
+        if block_number == 0:
+            self.uid = str(self.blocks[0][0 : 4])
+        return ERROR_NONE
+
+    def __valueOf(self, block_number):
+        block = self.blocks[block_number]
+        value = block[0 : 4]
+        inverted = bytearray((~b) & 0xFF for b in value)
+        if block[4 : 8] != inverted or block[8 : 12] != value:
+            return None
+        return _from_le(str(value))
+
+    def valueOperation(self, block_number, operation, operand=0):
+        error = self.__checkAccess(block_number)
+        if error != ERROR_NONE:
+            return error
+        value = self.__valueOf(block_number)
+        if value == None:
+            return ERROR_VALUE
+        if operation == 'increment':
+            value = (value + operand) & 0xFFFFFFFF
+        elif operation == 'decrement':
+            value = (value - operand) & 0xFFFFFFFF
+        self.transfer_buffer = value
+        return ERROR_NONE
+
+    def transfer(self, block_number):
+        error = self.__checkAccess(block_number)
+        if error != ERROR_NONE:
+            return error
+        if self.transfer_buffer == None:
+            return ERROR_VALUE
+        value = _le(self.transfer_buffer, 4)
+        inverted = ''.join(chr((~ord(c)) & 0xFF) for c in value)
+        address = self.blocks[block_number][12]
+        self.blocks[block_number] = bytearray(value + inverted + value + chr(address) + chr((~address) & 0xFF) + chr(address) + chr((~address) & 0xFF))
+        self.transfer_buffer = None
+        return ERROR_NONE
+
+
+class _SimDESFireFile(object):
+
+    def __init__(self, file_type, com_set, access_rights):
+        self.file_type = file_type
+        self.com_set = com_set
+        self.access_rights = access_rights
+        self.data = None
+        self.lower_limit = 0
+        self.upper_limit = 0
+        self.value = 0
+        self.limited_credit_enabled = 0
+        self.record_size = 0
+        self.max_num_of_records = 0
+        self.records = []
+
+    def settings(self):
+        settings = chr(self.file_type) + chr(self.com_set) + _le(self.access_rights, 2)
+        if self.file_type in (0x00, 0x01):
+            settings += _le(len(self.data), 3)
+        elif self.file_type == 0x02:
+            settings += _le(self.lower_limit, 4) + _le(self.upper_limit, 4) + _le(self.value, 4) + chr(self.limited_credit_enabled)
+        else:
+            settings += _le(self.record_size, 3) + _le(self.max_num_of_records, 3) + _le(len(self.records), 3)
+        return settings
+
+
+class _SimDESFireApplication(object):
+
+    def __init__(self, key_settings, num_of_keys):
+        self.key_settings = key_settings
+        self.num_of_keys = num_of_keys
+        # Bits 6 and 7 of the number of keys are the key type (DES / 2K3DES, 3K3DES or AES);
+        self.key_type = num_of_keys & 0xC0
+        key_size = 24 if self.key_type == DESFireCrypto.KEY_TYPE_3K3DES else 16
+        self.keys = ['\x00' * key_size] * max(1, num_of_keys & 0x0F)
+        self.files = {}
+
+
+class SimDESFire(object):
+    '''
+    Simulated DESFire EV1 PICC (native command set); Data is written at once (CommitTransaction / AbortTransaction are
+    accepted but do nothing);
+    After an ISO or AES authentication the commands are CMACed and the data files are read and written in their
+    communication mode; ChangeKey is emulated only in that case;
+    '''
+
+    ATQA = '\x44\x03'
+    SAK = '\x20'
+
+    def __init__(self, uid='\x04\x11\x22\x33\x44\x55\x66', fsci=5, free_memory=8192):
+        if len(uid) != 7:
+            raise Exception('Wrong uid length.')
+        self.uid = uid
+        self.fsci = fsci
+        self.free_memory = free_memory
+        self.apps = { 0x000000 : _SimDESFireApplication(0x0F, 1) }
+        self.reset()
+
+    def reset(self):
+        self.halted = False
+        self.selected = False
+        self.current_aid = 0x000000
+        self.authenticated_key = None
+        self.__pending_response = ''
+        self.__pending_command = None
+        self.__auth_state = None
+        self.__current_ins = None
+        self.__session = None
+        self.__secure_command = None
+
+    def getUID(self):
+        return self.uid
+
+    def anticollision(self, sel):
+        if sel == 0x93:
+            return '\x88' + self.uid[0 : 3]
+        elif sel == 0x95:
+            return self.uid[3 : 7]
+        return None
+
+    def getATS(self):
+        return chr(0x06) + chr(0x70 | (self.fsci & 0x0F)) + '\x77\x81\x02\x80'
+
+    def getFSC(self):
+        return DESFireFrames.FSC_TABLE[min(self.fsci, len(DESFireFrames.FSC_TABLE) - 1)]
+
+    def process(self, command):
+        """Process one native DESFire command; Return the native response (status + data);"""
+        ins = ord(command[0])
+        data = command[1 : ]
+        self.__current_ins = ins
+
+        if ins == DF_ADDITIONAL_FRAME:
+            if self.__auth_state != None:
+                return self.__authenticateContinue(data)
+            if self.__secure_command != None:
+                return self.__secureContinue(data)
+            if self.__pending_command != None:
+                return self.__writeContinue(data)
+            if len(self.__pending_response) > 0:
+                return self.__respond(self.__pending_response)
+            return chr(DF_ILLEGAL_COMMAND_CODE)
+
+        # Any other command aborts the pending frames;
+        self.__pending_response = ''
+        self.__pending_command = None
+        self.__secure_command = None
+        self.__auth_state = None
+
+        handler = self.__handlers().get(ins)
+        if handler == None:
+            return chr(DF_ILLEGAL_COMMAND_CODE)
+        if (self.__session != None) and (ins not in (0x0A, 0x1A, 0xAA, 0x5A, 0xC4)):
+            return self.__secureCommand(ins, data)
+        try:
+            return handler(data)
+        except IndexError:
+            return chr(DF_LENGTH_ERROR)
+
+    def __handlers(self):
+        return {
+              0x0A : self.__authenticate
+            , 0x1A : self.__authenticateEV1
+            , 0xAA : self.__authenticateEV1
+            , 0xC4 : self.__changeKey
+            , 0x60 : self.__getVersion
+            , 0x6E : self.__freeMemory
+            , 0x45 : self.__getKeySettings
+            , 0x6A : self.__getApplicationIDs
+            , 0x5A : self.__selectApplication
+            , 0xCA : self.__createApplication
+            , 0xDA : self.__deleteApplication
+            , 0xFC : self.__formatPICC
+            , 0x6F : self.__getFileIDs
+            , 0xF5 : self.__getFileSettings
+            , 0xCD : self.__createDataFile
+            , 0xCB : self.__createDataFile
+            , 0xCC : self.__createValueFile
+            , 0xC1 : self.__createRecordFile
+            , 0xC0 : self.__createRecordFile
+            , 0xDF : self.__deleteFile
+            , 0xBD : self.__readData
+            , 0x3D : self.__writeData
+            , 0x6C : self.__getValue
+            , 0x0C : self.__credit
+            , 0xDC : self.__debit
+            , 0x1C : self.__limitedCredit
+            , 0x3B : self.__writeRecord
+            , 0xBB : self.__readRecords
+            , 0xEB : self.__clearRecordFile
+            , 0xC7 : self.__commitTransaction
+            , 0xA7 : self.__abortTransaction
+        }
+
+    def __respond(self, data):
+        """Send response data, split into frames with ADDITIONAL_FRAME status;"""
+        if len(data) > DF_MAX_FRAME_SIZE:
+            self.__pending_response = data[DF_MAX_FRAME_SIZE : ]
+            return chr(DF_ADDITIONAL_FRAME) + data[0 : DF_MAX_FRAME_SIZE]
+        self.__pending_response = ''
+        return chr(DF_OPERATION_OK) + data
+
+    def __app(self):
+        return self.apps[self.current_aid]
+
+    def __file(self, file_no):
+        return self.__app().files.get(file_no)
+
+    def __cipher(self, key):
+        return DESFireCrypto.getCipher(key)
+
+    def __endSession(self):
+        self.authenticated_key = None
+        self.__session = None
+
+    def __authenticate(self, data):
+        key_no = ord(data[0])
+        app = self.__app()
+        if key_no >= len(app.keys):
+            return chr(DF_NO_SUCH_KEY)
+        self.__endSession()
+        if app.key_type != DESFireCrypto.KEY_TYPE_DES:
+            return chr(DF_AUTHENTICATION_ERROR)
+        random_b = os.urandom(8)
+        cipher = self.__cipher(app.keys[key_no])
+        self.__auth_state = (key_no, cipher, random_b, None)
+        return chr(DF_ADDITIONAL_FRAME) + cipher.encryptECB(random_b)
+
+    def __authenticateEV1(self, data):
+        key_no = ord(data[0])
+        app = self.__app()
+        if key_no >= len(app.keys):
+            return chr(DF_NO_SUCH_KEY)
+        self.__endSession()
+        if (self.__current_ins == 0xAA) != (app.key_type == DESFireCrypto.KEY_TYPE_AES):
+            return chr(DF_AUTHENTICATION_ERROR)
+        cipher = DESFireCrypto.keyCipher(app.key_type, app.keys[key_no])
+        random_b = os.urandom(DESFireCrypto.randomSize(app.key_type))
+        encrypted = cipher.encrypt(random_b)
+        self.__auth_state = (key_no, cipher, random_b, encrypted[-cipher.blockSize : ])
+        return chr(DF_ADDITIONAL_FRAME) + encrypted
+
+    def __authenticateContinue(self, data):
+        key_no, cipher, random_b, iv = self.__auth_state
+        self.__auth_state = None
+        if iv != None:
+            return self.__authenticateContinueEV1(key_no, cipher, random_b, iv, data)
+        if len(data) != 16:
+            return chr(DF_LENGTH_ERROR)
+        # Legacy DESFire: the PCD deciphers in CBC send mode, the PICC enciphers to recover;
+        d1 = data[0 : 8]
+        d2 = data[8 : 16]
+        random_a = cipher.encryptECB(d1)
+        shifted_b = ''.join(chr(ord(x) ^ ord(y)) for x, y in zip(cipher.encryptECB(d2), d1))
+        if shifted_b != random_b[1 : ] + random_b[0]:
+            return chr(DF_AUTHENTICATION_ERROR)
+        self.authenticated_key = key_no
+        return chr(DF_OPERATION_OK) + cipher.encryptECB(random_a[1 : ] + random_a[0])
+
+    def __authenticateContinueEV1(self, key_no, cipher, random_b, iv, data):
+        size = len(random_b)
+        if len(data) != size * 2:
+            return chr(DF_LENGTH_ERROR)
+        plain = cipher.decrypt(data, iv)
+        random_a = plain[0 : size]
+        if plain[size : ] != DESFireCrypto.rotateLeft(random_b):
+            return chr(DF_AUTHENTICATION_ERROR)
+        app = self.__app()
+        session_key = DESFireCrypto.sessionKey(app.key_type, app.keys[key_no], random_a, random_b)
+        self.__session = DESFireCrypto.DESFireSession(app.key_type, key_no, session_key)
+        self.authenticated_key = key_no
+        return chr(DF_OPERATION_OK) + cipher.encrypt(DESFireCrypto.rotateLeft(random_a), data[-cipher.blockSize : ])
+
+    def __changeKey(self, data):
+        session = self.__session
+        if session == None:
+            return chr(DF_PERMISSION_DENIED)
+        key_no = ord(data[0]) & 0x0F
+        app = self.__app()
+        if key_no >= len(app.keys):
+            return chr(DF_NO_SUCH_KEY)
+        command = chr(0xC4) + data[0]
+        key = app.keys[key_no]
+        size = len(key) + (1 if app.key_type == DESFireCrypto.KEY_TYPE_AES else 0)
+        try:
+            plain = session.decrypt(data[1 : ])
+        except Exception:
+            self.__endSession()
+            return chr(DF_LENGTH_ERROR)
+        cryptogram = plain[0 : size]
+        if key_no == session.keyNo:
+            new_key = cryptogram[0 : len(key)]
+            valid = DESFireCrypto.crc32(command + cryptogram) == plain[size : size + 4]
+        else:
+            new_key = ''.join(chr(ord(a) ^ ord(b)) for a, b in zip(cryptogram, key))
+            valid = (DESFireCrypto.crc32(command + cryptogram) == plain[size : size + 4]) and \
+                (DESFireCrypto.crc32(new_key) == plain[size + 4 : size + 8])
+        if not valid:
+            self.__endSession()
+            return chr(DF_INTEGRITY_ERROR)
+        app.keys[key_no] = new_key
+        if key_no == session.keyNo:
+            # Changing the key of the authentication ends the session, the response is not CMACed;
+            self.__endSession()
+            return chr(DF_OPERATION_OK)
+        return chr(DF_OPERATION_OK) + session.wrapResponse('', DF_OPERATION_OK)
+
+    def __secureCommand(self, ins, data):
+        """Collect a command of the session, check (or decipher) it, process it and CMAC (or encipher) the response;"""
+        mode = DESFireCrypto.COMM_PLAIN
+        length = 0
+        size = len(data)
+        if (ins in (0x3D, 0x3B, 0xBD, 0xBB)) and (len(data) >= 7):
+            f = self.__file(ord(data[0]))
+            if f != None:
+                mode = f.com_set & 0x03
+            if ins in (0x3D, 0x3B):
+                length = _from_le(data[4 : 7])
+                if mode == DESFireCrypto.COMM_ENCIPHERED:
+                    blockSize = self.__session.cipher.blockSize
+                    size = 7 + (length + 4 + blockSize - 1) / blockSize * blockSize
+                elif mode == DESFireCrypto.COMM_MACED:
+                    size = 7 + length + DESFireCrypto.CMAC_SIZE
+                else:
+                    size = 7 + length
+        self.__secure_command = (ins, '', mode, length, size)
+        return self.__secureContinue(data)
+
+    def __secureContinue(self, data):
+        ins, received, mode, length, size = self.__secure_command
+        received += data
+        if len(received) < size:
+            self.__secure_command = (ins, received, mode, length, size)
+            return chr(DF_ADDITIONAL_FRAME)
+        self.__secure_command = None
+        if len(received) > size:
+            self.__endSession()
+            return chr(DF_LENGTH_ERROR)
+
+        session = self.__session
+        write = ins in (0x3D, 0x3B)
+        header = 7 if write else len(received)
+        try:
+            received = received[0 : header] + session.unwrapCommand(chr(ins) + received[0 : header], received[header : ],
+                                                                   mode if write else DESFireCrypto.COMM_PLAIN, length)
+        except Exception:
+            self.__endSession()
+            return chr(DF_INTEGRITY_ERROR)
+
+        try:
+            response = self.__handlers()[ins](received)
+        except IndexError:
+            response = chr(DF_LENGTH_ERROR)
+        status = ord(response[0])
+        if status == DF_ADDITIONAL_FRAME:
+            # The whole response is CMACed (or enciphered), then split into frames again;
+            response += self.__pending_response
+            status = DF_OPERATION_OK
+        if status != DF_OPERATION_OK:
+            self.__endSession()
+            return chr(status)
+        return self.__respond(session.wrapResponse(response[1 : ], status, DESFireCrypto.COMM_PLAIN if write else mode))
+
+    def __getVersion(self, data):
+        hardware = '\x04\x01\x01\x01\x00\x18\x05'
+        software = '\x04\x01\x01\x01\x04\x18\x05'
+        production = self.uid + '\xBA\x54\x43\x21\x10' + '\x12\x17'
+        self.__pending_response = software + production
+        return chr(DF_ADDITIONAL_FRAME) + hardware
+
+    def __freeMemory(self, data):
+        return chr(DF_OPERATION_OK) + _le(self.free_memory, 3)
+
+    def __getKeySettings(self, data):
+        app = self.__app()
+        return chr(DF_OPERATION_OK) + chr(app.key_settings) + chr(app.num_of_keys)
+
+    def __getApplicationIDs(self, data):
+        if self.current_aid != 0x000000:
+            return chr(DF_PERMISSION_DENIED)
+        aids = [aid for aid in sorted(self.apps.keys()) if aid != 0x000000]
+        return self.__respond(''.join(_le(aid, 3) for aid in aids))
+
+    def __selectApplication(self, data):
+        aid = _from_le(data[0 : 3])
+        if aid not in self.apps:
+            return chr(DF_APPLICATION_NOT_FOUND)
+        self.current_aid = aid
+        self.__endSession()
+        return chr(DF_OPERATION_OK)
+
+    def __createApplication(self, data):
+        if self.current_aid != 0x000000:
+            return chr(DF_PERMISSION_DENIED)
+        aid = _from_le(data[0 : 3])
+        if aid in self.apps:
+            return chr(DF_DUPLICATE_ERROR)
+        if len(self.apps) > 28:
+            return chr(DF_COUNT_ERROR)
+        self.apps[aid] = _SimDESFireApplication(ord(data[3]), ord(data[4]))
+        return chr(DF_OPERATION_OK)
+
+    def __deleteApplication(self, data):
+        aid = _from_le(data[0 : 3])
+        if aid == 0x000000 or aid not in self.apps:
+            return chr(DF_APPLICATION_NOT_FOUND)
+        del self.apps[aid]
+        if self.current_aid == aid:
+            self.current_aid = 0x000000
+        return chr(DF_OPERATION_OK)
+
+    def __formatPICC(self, data):
+        if self.current_aid != 0x000000:
+            return chr(DF_PERMISSION_DENIED)
+        self.apps = { 0x000000 : self.apps[0x000000] }
+        return chr(DF_OPERATION_OK)
+
+    def __getFileIDs(self, data):
+        if self.current_aid == 0x000000:
+            return chr(DF_PERMISSION_DENIED)
+        return chr(DF_OPERATION_OK) + ''.join(chr(file_no) for file_no in sorted(self.__app().files.keys()))
+
+    def __getFileSettings(self, data):
+        f = self.__file(ord(data[0]))
+        if f == None:
+            return chr(DF_FILE_NOT_FOUND)
+        return chr(DF_OPERATION_OK) + f.settings()
+
+    def __addFile(self, file_no, f):
+        if self.current_aid == 0x000000:
+            return chr(DF_PERMISSION_DENIED)
+        files = self.__app().files
+        if file_no in files:
+            return chr(DF_DUPLICATE_ERROR)
+        files[file_no] = f
+        return chr(DF_OPERATION_OK)
+
+    def __createDataFile(self, data):
+        file_type = 0x00 if self.__current_ins == 0xCD else 0x01
+        f = _SimDESFireFile(file_type, ord(data[1]), _from_le(data[2 : 4]))
+        f.data = bytearray(_from_le(data[4 : 7]))
+        return self.__addFile(ord(data[0]), f)
+
+    def __createValueFile(self, data):
+        f = _SimDESFireFile(0x02, ord(data[1]), _from_le(data[2 : 4]))
+        f.lower_limit = _from_le(data[4 : 8])
+        f.upper_limit = _from_le(data[8 : 12])
+        f.value = _from_le(data[12 : 16])
+        f.limited_credit_enabled = ord(data[16])
+        return self.__addFile(ord(data[0]), f)
+
+    def __createRecordFile(self, data):
+        file_type = 0x03 if self.__current_ins == 0xC1 else 0x04
+        f = _SimDESFireFile(file_type, ord(data[1]), _from_le(data[2 : 4]))
+        f.record_size = _from_le(data[4 : 7])
+        f.max_num_of_records = _from_le(data[7 : 10])
+        return self.__addFile(ord(data[0]), f)
+
+    def __deleteFile(self, data):
+        files = self.__app().files
+        file_no = ord(data[0])
+        if file_no not in files:
+            return chr(DF_FILE_NOT_FOUND)
+        del files[file_no]
+        return chr(DF_OPERATION_OK)
+
+    def __readData(self, data):
+        f = self.__file(ord(data[0]))
+        if f == None or f.file_type not in (0x00, 0x01):
+            return chr(DF_FILE_NOT_FOUND)
+        offset = _from_le(data[1 : 4])
+        length = _from_le(data[4 : 7])
+        if length == 0:
+            length = len(f.data) - offset
+        if offset + length > len(f.data):
+            return chr(DF_BOUNDARY_ERROR)
+        return self.__respond(str(f.data[offset : offset + length]))
+
+    def __writeData(self, data):
+        f = self.__file(ord(data[0]))
+        if f == None or f.file_type not in (0x00, 0x01):
+            return chr(DF_FILE_NOT_FOUND)
+        offset = _from_le(data[1 : 4])
+        length = _from_le(data[4 : 7])
+        if offset + length > len(f.data):
+            return chr(DF_BOUNDARY_ERROR)
+        self.__pending_command = (f, offset, length, '', False)
+        return self.__writeContinue(data[7 : ])
+
+    def __writeRecord(self, data):
+        f = self.__file(ord(data[0]))
+        if f == None or f.file_type not in (0x03, 0x04):
+            return chr(DF_FILE_NOT_FOUND)
+        offset = _from_le(data[1 : 4])
+        length = _from_le(data[4 : 7])
+        if offset + length > f.record_size:
+            return chr(DF_BOUNDARY_ERROR)
+        self.__pending_command = (f, offset, length, '', True)
+        return self.__writeContinue(data[7 : ])
+
+    def __writeContinue(self, data):
+        f, offset, length, received, is_record = self.__pending_command
+        received += data
+        if len(received) < length:
+            self.__pending_command = (f, offset, length, received, is_record)
+            return chr(DF_ADDITIONAL_FRAME)
+        self.__pending_command = None
+        if len(received) > length:
+            return chr(DF_LENGTH_ERROR)
+        if is_record:
+            if len(f.records) >= f.max_num_of_records:
+                if f.file_type == 0x03:
+                    return chr(DF_BOUNDARY_ERROR)
+                f.records.pop(0)
+            record = bytearray(f.record_size)
+            record[offset : offset + length] = received
+            f.records.append(record)
+        else:
+            f.data[offset : offset + length] = received
+        return chr(DF_OPERATION_OK)
+
+    def __valueFile(self, data):
+        f = self.__file(ord(data[0]))
+        if f == None or f.file_type != 0x02:
+            return None
+        return f
+
+    def __getValue(self, data):
+        f = self.__valueFile(data)
+        if f == None:
+            return chr(DF_FILE_NOT_FOUND)
+        return chr(DF_OPERATION_OK) + _le(f.value, 4)
+
+    def __credit(self, data):
+        f = self.__valueFile(data)
+        if f == None:
+            return chr(DF_FILE_NOT_FOUND)
+        value = f.value + _from_le(data[1 : 5])
+        if value > f.upper_limit:
+            return chr(DF_BOUNDARY_ERROR)
+        f.value = value
+        return chr(DF_OPERATION_OK)
+
+    def __debit(self, data):
+        f = self.__valueFile(data)
+        if f == None:
+            return chr(DF_FILE_NOT_FOUND)
+        value = f.value - _from_le(data[1 : 5])
+        if value < f.lower_limit:
+            return chr(DF_BOUNDARY_ERROR)
+        f.value = value
+        return chr(DF_OPERATION_OK)
+
+    def __limitedCredit(self, data):
+        f = self.__valueFile(data)
+        if f == None:
+            return chr(DF_FILE_NOT_FOUND)
+        if not f.limited_credit_enabled:
+            return chr(DF_PERMISSION_DENIED)
+        return self.__credit(data)
+
+    def __readRecords(self, data):
+        f = self.__file(ord(data[0]))
+        if f == None or f.file_type not in (0x03, 0x04):
+            return chr(DF_FILE_NOT_FOUND)
+        # Offset is counted from the latest record, zero count means all records;
+        offset = _from_le(data[1 : 4])
+        count = _from_le(data[4 : 7])
+        records = list(reversed(f.records))
+        if offset >= len(records) and len(records) > 0:
+            return chr(DF_BOUNDARY_ERROR)
+        if count == 0:
+            count = len(records) - offset
+        if offset + count > len(records):
+            return chr(DF_BOUNDARY_ERROR)
+        selected = records[offset : offset + count]
+        return self.__respond(''.join(str(record) for record in reversed(selected)))
+
+    def __clearRecordFile(self, data):
+        f = self.__file(ord(data[0]))
+        if f == None or f.file_type not in (0x03, 0x04):
+            return chr(DF_FILE_NOT_FOUND)
+        f.records = []
+        return chr(DF_OPERATION_OK)
+
+    def __commitTransaction(self, data):
+        return chr(DF_OPERATION_OK)
+
+    def __abortTransaction(self, data):
+        return chr(DF_OPERATION_OK)
+
+
+class SimInterface(SCInterface):
+    '''
+    In-process virtual reader, used in place of GPInterface to run the controller without a PC/SC stack and card;
+    It answers the R502 SPY commands (CLA_RF / CLA_MIFARE / 0x8E TLV), the wrapped DESFire commands and
+    other ISO7816 commands; latency and jitter (in seconds) are added to every transmit;
+    mifareBulk=False simulates a reader firmware without the bulk Mifare commands (dump / read card data / clone);
+    tlvBatch=False simulates a reader firmware which runs one TLV command per apdu;
+    maxFrameSize is the largest ISO14443-4 frame the simulated reader sends, wrapped DESFire commands are also limited
+    to the FSC of the card;
+    '''
+
+    def __init__(self, card=None, latency=0.0, jitter=0.0, seed=None, mifareBulk=True, tlvBatch=True, maxFrameSize=256):
+        '''
+        Constructor
+        '''
+        self.card = card if card != None else SimMifareClassic()
+        self.latency = latency
+        self.mifareBulk = mifareBulk
+        self.tlvBatch = tlvBatch
+        self.maxFrameSize = maxFrameSize
+        self.jitter = jitter
+        self.transmitCount = 0
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__readername = None
+        self.__rfOn = True
+        self.__rfMode = R502SpyLibrary.RF_AUTO_MODE_AUTO
+        # Card data of the bulk Mifare commands;
+        self.__cardData = bytearray()
+
+    def listreaders(self):
+        return [SIM_READER_NAME]
+
+    def connect(self, readername, protocol):
+        if readername not in self.listreaders():
+            raise Exception('Reader not found: %s.' %(readername))
+        self.__readername = readername
+
+    def disconnect(self):
+        self.__readername = None
+
+    def insertCard(self, card):
+        self.card = card
+        self.card.reset()
+
+    def removeCard(self):
+        self.card = None
+
+    def transmit(self, cmd):
+        if self.__readername == None:
+            raise Exception('Smart card not connected.')
+        with self.__lock:
+            self.transmitCount += 1
+            delay = self.latency
+            if self.jitter > 0:
+                delay += self.__random.uniform(-self.jitter, self.jitter)
+            if delay > 0:
+                time.sleep(delay)
+            return self.__dispatch(cmd)
+
+    def __dispatch(self, cmd):
+        if len(cmd) < 4:
+            return '\x67\x00'
+        cla = ord(cmd[0])
+        if cla == R502SpyLibrary.CLA_RF:
+            return self.__processRF(cmd)
+        elif cla == R502SpyLibrary.CLA_MIFARE:
+            return self.__processMifare(cmd)
+        elif cla == CLA_R502_TLV:
+            if ord(cmd[2]) == 0x01:
+                return self.__processTLVBatch(cmd[5 : ])
+            return self.__processTLV(cmd[5 : ]) + SW_OK
+        elif cla == CLA_DESFIRE:
+            return self.__processWrappedDESFire(cmd)
+        return self.__processISO7816(cmd)
+
+    def __error(self, error):
+        return chr(error) + SW_R502_ERROR
+
+    def __activeCard(self):
+        """Return the card in the field, None if there is no card or the field is off;"""
+        if not self.__rfOn:
+            return None
+        return self.card
+
+    def __processRF(self, cmd):
+        ins = ord(cmd[1])
+        p1 = ord(cmd[2])
+        data = cmd[5 : ]
+        if ins == R502SpyLibrary.INS_RF_ON:
+            if not self.__rfOn and self.card != None:
+                self.card.reset()
+            self.__rfOn = True
+            return SW_OK
+        elif ins == R502SpyLibrary.INS_RF_OFF:
+            self.__rfOn = False
+            return SW_OK
+        elif ins == R502SpyLibrary.INS_RF_AUTO:
+            self.__rfMode = p1
+            return chr(p1) + SW_OK
+
+        card = self.__activeCard()
+        if card == None:
+            return self.__error(ERROR_CARD_NOT_PRESENT)
+        if ins == R502SpyLibrary.INS_RF_WUPA:
+            # REQA only wakes up the cards which are not halted;
+            if p1 == 0x26 and card.halted:
+                return self.__error(ERROR_CARD_NOT_PRESENT)
+            card.reset()
+            return card.ATQA + SW_OK
+        elif ins == R502SpyLibrary.INS_RF_ANTI:
+            uid = card.anticollision(p1)
+            if uid == None:
+                return self.__error(ERROR_INVALID_PARAMETER)
+            return uid + SW_OK
+        elif ins == R502SpyLibrary.INS_RF_SEL:
+            uid = card.anticollision(p1)
+            if uid == None or not data.startswith(uid):
+                return self.__error(ERROR_CARD_NOT_PRESENT)
+            card.selected = True
+            if p1 == 0x93 and len(card.getUID()) > 4:
+                # Cascade bit, UID not complete;
+                return '\x04' + SW_OK
+            return card.SAK + SW_OK
+        elif ins == R502SpyLibrary.INS_RF_HLTA:
+            card.halted = True
+            card.selected = False
+            return SW_OK
+        elif ins == R502SpyLibrary.INS_RF_RATS:
+            if not isinstance(card, SimDESFire):
+                return self.__error(ERROR_UNKNOWN_COMMAND)
+            return card.getATS() + SW_OK
+        elif ins == R502SpyLibrary.INS_RF_PPS:
+            return data[0 : 1] + SW_OK
+        elif ins == R502SpyLibrary.INS_RF_APDU:
+            return self.__processBlock(card, data)
+        return self.__error(ERROR_UNKNOWN_COMMAND)
+
+    def __processBlock(self, card, block):
+        """ISO14443-4 block transmission;"""
+        if len(block) == 0:
+            return self.__error(ERROR_INVALID_PARAMETER)
+        pcb = ord(block[0])
+        if (pcb & 0xC0) == 0x00:
+            # I-block;
+            inf = block[1 : ]
+            if isinstance(card, SimDESFire) and len(inf) > 0 and ord(inf[0]) != CLA_DESFIRE:
+                rsp = card.process(inf)
+            else:
+                rsp = self.__dispatch(inf)
+            return block[0] + rsp + SW_OK
+        elif (pcb & 0xC0) == 0xC0:
+            # S-block, answer DESELECT / WTX;
+            return block + SW_OK
+        # R-block;
+        return chr((pcb & 0x01) | 0xA2) + SW_OK
+
+    def __processMifareBulk(self, cmd):
+        """INS_MIFARE_DUMP / INS_MIFARE_READ_CARD_DATA / INS_MIFARE_CLONE, see R502SpyLibrary;"""
+        if not self.mifareBulk:
+            return self.__error(ERROR_UNKNOWN_COMMAND)
+        ins = ord(cmd[1])
+        p1 = ord(cmd[2])
+        p2 = ord(cmd[3])
+        data = cmd[5 : ]
+        if ins == R502SpyLibrary.INS_MIFARE_READ_CARD_DATA:
+            if p2 > R502SpyLibrary.MIFARE_BULK_MAX_ROWS or (p1 + p2) * 16 > len(self.__cardData):
+                return self.__error(ERROR_INVALID_PARAMETER)
+            return str(self.__cardData[p1 * 16 : (p1 + p2) * 16]) + SW_OK
+        if ins == R502SpyLibrary.INS_MIFARE_CLONE and (p2 & R502SpyLibrary.MIFARE_BULK_P2_CARD) == 0:
+            if len(data) % 16 != 0:
+                return self.__error(ERROR_INVALID_PARAMETER)
+            end = p1 * 16 + len(data)
+            if end > len(self.__cardData):
+                self.__cardData.extend(bytearray(end - len(self.__cardData)))
+            self.__cardData[p1 * 16 : end] = bytearray(data)
+            return SW_OK
+
+        card = self.__activeCard()
+        if not isinstance(card, SimMifareClassic):
+            return self.__error(ERROR_CARD_NOT_PRESENT)
+        layout = card.layout
+        if len(data) != 6:
+            return self.__error(ERROR_INVALID_PARAMETER)
+        failed = bytearray((layout.sectorCount + 7) / 8)
+        card.reset()
+        card.selected = True
+        if ins == R502SpyLibrary.INS_MIFARE_DUMP:
+            self.__cardData = bytearray(layout.imageSize)
+            for sector in range(layout.sectorCount):
+                blocks = layout.sectorBlocks(sector)
+                error = card.authenticate(blocks[0], p1, data, card.getUID())
+                for block_number in blocks:
+                    if error == ERROR_NONE:
+                        error, block_data = card.readBlock(block_number)
+                    if error != ERROR_NONE:
+                        failed[sector / 8] |= 1 << (sector % 8)
+                        break
+                    self.__cardData[block_number * 16 : (block_number + 1) * 16] = bytearray(block_data)
+            card.authenticated_sector = None
+            rows = len(self.__cardData) / 16
+            return card.SAK + chr(rows >> 8) + chr(rows & 0xFF) + str(failed) + SW_OK
+        # Clone, with the backdoor of magic cards;
+        rows = p1 | ((p2 & 0x7F) << 8)
+        if rows > min(len(self.__cardData) / 16, layout.blockCount):
+            return self.__error(ERROR_INVALID_PARAMETER)
+        card.backdoor = True
+        try:
+            for block_number in range(rows):
+                block_data = str(self.__cardData[block_number * 16 : (block_number + 1) * 16])
+                if layout.isTrailer(block_number):
+                    block_data = data + block_data[6 : ]
+                if card.writeBlock(block_number, block_data) != ERROR_NONE:
+                    sector = layout.sectorOf(block_number)
+                    failed[sector / 8] |= 1 << (sector % 8)
+        finally:
+            card.backdoor = False
+        return str(failed) + SW_OK
+
+    def __processMifare(self, cmd):
+        if ord(cmd[1]) in (R502SpyLibrary.INS_MIFARE_DUMP, R502SpyLibrary.INS_MIFARE_READ_CARD_DATA, R502SpyLibrary.INS_MIFARE_CLONE):
+            return self.__processMifareBulk(cmd)
+        card = self.__activeCard()
+        if not isinstance(card, SimMifareClassic):
+            return self.__error(ERROR_CARD_NOT_PRESENT)
+        ins = ord(cmd[1])
+        block_number = ord(cmd[2])
+        data = cmd[5 : ]
+        if ins in (R502SpyLibrary.INS_MIFARE_AUTHENTICATIONA, R502SpyLibrary.INS_MIFARE_AUTHENTICATIONB):
+            error = card.authenticate(block_number, ins - R502SpyLibrary.INS_MIFARE_AUTHENTICATIONA, data[0 : 6], data[6 : 10])
+            rsp = ''
+        elif ins == R502SpyLibrary.INS_MIFARE_BLOCK_READ:
+            error, rsp = card.readBlock(block_number)
+        elif ins == R502SpyLibrary.INS_MIFARE_BLOCK_WRITE:
+            error = card.writeBlock(block_number, data)
+            rsp = ''
+        elif ins == R502SpyLibrary.INS_MIFARE_INCREMENT:
+            error = card.valueOperation(block_number, 'increment', _from_le(data[0 : 4]))
+            rsp = ''
+        elif ins == R502SpyLibrary.INS_MIFARE_DECREMENT:
+            error = card.valueOperation(block_number, 'decrement', _from_le(data[0 : 4]))
+            rsp = ''
+        elif ins == R502SpyLibrary.INS_MIFARE_RESTORE:
+            error = card.valueOperation(block_number, 'restore')
+            rsp = ''
+        elif ins == R502SpyLibrary.INS_MIFARE_TRANSFER:
+            error = card.transfer(block_number)
+            rsp = ''
+        else:
+            error = ERROR_UNKNOWN_COMMAND
+        if error != ERROR_NONE:
+            return self.__error(error)
+        return rsp + SW_OK
+
+    def __processTLV(self, command):
+        """Process one R502 TLV command (sent with CLA 0x8E); Return the TLV response;"""
+        if len(command) < 3 or command[0] != '\xFF':
+            return self.__tlvResponse(ERROR_INVALID_PARAMETER)
+        command_tag = command[1]
+        values = {}
+        body = command[3 : 3 + ord(command[2])]
+        offset = 0
+        while offset + 2 <= len(body):
+            value_len = ord(body[offset + 1])
+            values[body[offset]] = body[offset + 2 : offset + 2 + value_len]
+            offset += 2 + value_len
+
+        card = self.__activeCard()
+        if command_tag == MifareTLV.COMMAND_TAG_DESFIRE_COMMAND:
+            if not isinstance(card, SimDESFire):
+                return self.__tlvResponse(ERROR_CARD_NOT_PRESENT)
+            return self.__tlvResponse(ERROR_NONE, desfire_data=card.process(values.get(MifareTLV._TAG_DESFIRE_DATA, '')))
+        if not isinstance(card, SimMifareClassic):
+            return self.__tlvResponse(ERROR_CARD_NOT_PRESENT)
+
+        block_number = ord(values.get(MifareTLV._TAG_BLOCK_NUMBER, '\x00'))
+        if command_tag == MifareTLV.COMMAND_TAG_AUTHENTICATION:
+            key_type = ord(values.get(MifareTLV._TAG_KEY_TYPE, '\x00'))
+            error = card.authenticate(block_number, key_type, values.get(MifareTLV._TAG_KEY_VALUE, ''), values.get(MifareTLV._TAG_UID, ''))
+        elif command_tag == MifareTLV.COMMAND_TAG_READ_BLOCK:
+            error, block_data = card.readBlock(block_number)
+            if error == ERROR_NONE:
+                return self.__tlvResponse(error, block_data=block_data)
+        elif command_tag == MifareTLV.COMMAND_TAG_WRITE_BLOCK:
+            error = card.writeBlock(block_number, values.get(MifareTLV._TAG_BLOCK_DATA, ''))
+        elif command_tag == MifareTLV.COMMAND_TAG_INCREMENT:
+            error = card.valueOperation(block_number, 'increment', _from_le(values.get(MifareTLV._TAG_INCDEC_OPERAND, '')))
+        elif command_tag == MifareTLV.COMMAND_TAG_DECREMENT:
+            error = card.valueOperation(block_number, 'decrement', _from_le(values.get(MifareTLV._TAG_INCDEC_OPERAND, '')))
+        elif command_tag == MifareTLV.COMMAND_TAG_RESTORE:
+            error = card.valueOperation(block_number, 'restore')
+        elif command_tag == MifareTLV.COMMAND_TAG_TRANSFER:
+            error = card.transfer(block_number)
+        elif command_tag == MifareTLV.COMMAND_TAG_SETUP:
+            # Magic card backdoor, allows writing every block without authentication;
+            card.backdoor = True
+            error = ERROR_NONE
+        else:
+            error = ERROR_UNKNOWN_COMMAND
+        return self.__tlvResponse(error)
+
+    def __processTLVBatch(self, commands):
+        """Process the TLV commands of a batch (P1 = 0x01) until one fails; Return the TLV responses;"""
+        if not self.tlvBatch:
+            return self.__error(ERROR_UNKNOWN_COMMAND)
+        responses = []
+        offset = 0
+        while offset + 3 <= len(commands):
+            end = offset + 3 + ord(commands[offset + 2])
+            response = self.__processTLV(commands[offset : end])
+            responses.append(response)
+            offset = end
+            # The response starts with the error tlv;
+            if ord(response[5]) != ERROR_NONE:
+                break
+        return ''.join(responses) + SW_OK
+
+    def __tlvResponse(self, error, block_data=None, desfire_data=None):
+        body = MifareTLV._TAG_ERROR + '\x01' + chr(error)
+        if block_data != None:
+            body += MifareTLV._TAG_BLOCK_DATA + chr(len(block_data)) + block_data
+        if desfire_data != None:
+            body += MifareTLV._TAG_DESFIRE_DATA + chr(len(desfire_data)) + desfire_data
+        return '\x7F\x00' + chr(len(body)) + body
+
+    def __processWrappedDESFire(self, cmd):
+        """ISO7816 wrapped DESFire command: 90 INS 00 00 [Lc data] 00;"""
+        card = self.__activeCard()
+        if not isinstance(card, SimDESFire):
+            return '\x6A\x82'
+        # The frame (PCB, CID and CRC added) does not reach the card if it is larger than the reader or the card can handle;
+        if len(cmd) + 4 > min(self.maxFrameSize, card.getFSC()):
+            return self.__error(ERROR_INVALID_PARAMETER)
+        native = cmd[1]
+        if len(cmd) > 5:
+            native += cmd[5 : 5 + ord(cmd[4])]
+        rsp = card.process(native)
+        return rsp[1 : ] + '\x91' + rsp[0]
+
+    def __processISO7816(self, cmd):
+        """Minimal ISO7816-4 responder for APDU scripts;"""
+        ins = ord(cmd[1])
+        le = 0
+        if len(cmd) == 5:
+            le = ord(cmd[4]) or 0x100
+        elif len(cmd) > 5:
+            lc = ord(cmd[4])
+            if len(cmd) not in (5 + lc, 6 + lc):
+                return '\x67\x00'
+            if len(cmd) == 6 + lc:
+                le = ord(cmd[-1]) or 0x100
+        if ord(cmd[0]) == 0xFF and ins == 0xCA:
+            # PC/SC pseudo APDU: get UID;
+            card = self.__activeCard()
+            if card == None:
+                return '\x6A\x81'
+            return card.getUID() + SW_OK
+        if ins == 0x84:
+            return os.urandom(le if le > 0 else 8) + SW_OK
+        if ins in (0xB0, 0xC0, 0xCA):
+            return '\x00' * le + SW_OK
+        return SW_OK
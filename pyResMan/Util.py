@@ -8,9 +8,23 @@ Created on 2015-10-30
 @copyright: JavaCardOS Technologies. All rights reserved.
 '''
 
+import binascii
+
 IDOK = 1
 IDCANCEL = 2
 
+# Log levels of handleLog(), the same values as wx.LOG_*;
+LOG_Error = 1
+LOG_Warning = 2
+LOG_Message = 3
+LOG_Info = 5
+
+# Hex text of every byte value, indexed by the value;
+_HEX_TABLE = tuple('%02X' %(v) for v in xrange(0x100))
+
+_SPACE_CHARS = ' \t\r\n'
+_UNICODE_SPACE_TABLE = dict((ord(c), None) for c in _SPACE_CHARS)
+
 class Util(object):
     '''
     Util functions;
@@ -20,11 +34,9 @@ class Util(object):
     
     @staticmethod
     def removespace(s):
-        s = s.replace(' ', '')
-        s = s.replace('\t', '')
-        s = s.replace('\r', '')
-        s = s.replace('\n', '')
-        return s
+        if isinstance(s, unicode):
+            return s.translate(_UNICODE_SPACE_TABLE)
+        return s.translate(None, _SPACE_CHARS)
     
     @staticmethod
     def c2v(c):
@@ -42,39 +54,38 @@ class Util(object):
     @staticmethod
     def s2vl(s):
         """Convert string to value list; Argument s is the input string; ("00A4040000" => {0x00, 0xA4, 0x04, 0x00, 0x00})"""
-        s = Util.removespace(s)
-        if (len(s) & 1) != 0:
-            raise ValueError()
-        for c in s:
-            if c not in Util.HEXCHARS:
-                raise ValueError()
-        vl = []
-        for i in xrange(0, len(s) / 2):
-            vl.append(Util.c2v(s[i * 2]) << 4 | Util.c2v(s[i * 2 + 1]))
-        return vl
+        return list(bytearray(Util.s2vs(s)))
+
+    @staticmethod
+    def s2ba(s):
+        """Convert string to bytearray; ("00A4040000" => bytearray('\x00\xA4\x04\x00\x00'))"""
+        return bytearray(Util.s2vs(s))
 
     @staticmethod
     def s2vs(s):
+        """Convert string to value string in one pass; ("00A4040000" => '\x00\xA4\x04\x00\x00')"""
         s = Util.removespace(s)
+        if isinstance(s, unicode):
+            # Non-ascii chars raise UnicodeEncodeError, which is a ValueError;
+            s = s.encode('ascii')
         if (len(s) & 1) != 0:
             raise ValueError()
-        for c in s:
-            if c not in Util.HEXCHARS:
-                raise ValueError()
-        vs = ''
-        for i in xrange(0, len(s) / 2):
-            vs += chr(Util.c2v(s[i * 2]) << 4 | Util.c2v(s[i * 2 + 1]))
-        return vs
+        try:
+            return binascii.unhexlify(s)
+        except TypeError:
+            raise ValueError()
     
     @staticmethod
     def vl2s(vl, pad=''):
         """Convert value list to string; ({0x00, 0xA4, 0x04, 0x00, 0x00} => "00A4040000")"""
-        return pad.join("%02X" %(v) for v in vl)
+        return pad.join([_HEX_TABLE[v] for v in vl])
 
     @staticmethod
     def vs2s(vs, pad=''):
-        """Convert value list to string; ('\x00\xA4\x04\x00\x00' => "00A4040000")"""
-        return pad.join("%02X" %(ord(v)) for v in vs)
+        """Convert value string (or bytearray) to string; ('\x00\xA4\x04\x00\x00' => "00A4040000")"""
+        if pad == '':
+            return binascii.hexlify(vs).upper()
+        return pad.join([_HEX_TABLE[v] for v in bytearray(vs)])
 
     @staticmethod
     def getTimeStr(tv):
@@ -146,12 +157,12 @@ class Util(object):
     @staticmethod
     def ishexstr(s):
         s = Util.removespace(s)
-        ishexstr = True
-        for c in s:
-            if not Util.ishexchar_c(c):
-                ishexstr = False
-                break
-        return ishexstr
+        if isinstance(s, unicode):
+            try:
+                s = s.encode('ascii')
+            except UnicodeEncodeError:
+                return False
+        return len(s.translate(None, Util.HEXCHARS)) == 0
     
     @staticmethod
     def bytes3_to_byte_array(value):
@@ -176,56 +187,61 @@ class Util(object):
         return reg
 
 
-import wx
+try:
+    import wx
+except ImportError:
+    # The command line runner works without wxPython;
+    wx = None
 
-class HexValidator(wx.PyValidator):
-    """Validate Hex strings"""
-    def __init__(self):
-        """Initialize the validator
 
-        """
-        super(HexValidator, self).__init__()
+if wx != None:
+    class HexValidator(wx.PyValidator):
+        """Validate Hex strings"""
+        def __init__(self):
+            """Initialize the validator
 
-        # Event Handlers
-        self.Bind(wx.EVT_CHAR, self.OnChar)
+            """
+            super(HexValidator, self).__init__()
 
-    def Clone(self):
-        """Clones the current validator
-        @return: clone of this object
+            # Event Handlers
+            self.Bind(wx.EVT_CHAR, self.OnChar)
 
-        """
-        return HexValidator()
+        def Clone(self):
+            """Clones the current validator
+            @return: clone of this object
 
-#     def Validate(self, win):
-#         """Validate an window value
-#         @param win: window to validate
-# 
-#         """
-#         for char in val:
-#             if char not in Util.HEXCHARS:
-#                 return False
-#         else:
-#             return True
+            """
+            return HexValidator()
 
-    def OnChar(self, event):
-        """Process values as they are entered into the control
-        @param event: event that called this handler
+    #     def Validate(self, win):
+    #         """Validate an window value
+    #         @param win: window to validate
+    # 
+    #         """
+    #         for char in val:
+    #             if char not in Util.HEXCHARS:
+    #                 return False
+    #         else:
+    #             return True
 
-        """
-        key = event.GetKeyCode()
-        if event.CmdDown() or key < wx.WXK_SPACE or key == wx.WXK_DELETE or \
-           key > 255 or chr(key) in Util.HEXCHARS:
-            event.Skip()
-            return
+        def OnChar(self, event):
+            """Process values as they are entered into the control
+            @param event: event that called this handler
 
-        if not wx.Validator_IsSilent():
-            wx.Bell()
+            """
+            key = event.GetKeyCode()
+            if event.CmdDown() or key < wx.WXK_SPACE or key == wx.WXK_DELETE or \
+               key > 255 or chr(key) in Util.HEXCHARS:
+                event.Skip()
+                return
 
-        return
+            if not wx.Validator_IsSilent():
+                wx.Bell()
+
+            return
     
-    def TransferFromWindow(self, *args, **kwargs):
-        return True
+        def TransferFromWindow(self, *args, **kwargs):
+            return True
     
-    def TransferToWindow(self, *args, **kwargs):
-        return True
-
+        def TransferToWindow(self, *args, **kwargs):
+            return True
@@ -7,7 +7,7 @@ Created on 2017/3/19
 '''
 
 from pyResMan.MifareTLV import MifareCommandTLV, MifareResponseTLV,\
-    COMMAND_TAG_DECREMENT, COMMAND_TAG_DESFIRE_COMMAND
+    COMMAND_TAG_DECREMENT, COMMAND_TAG_DESFIRE_COMMAND, MifareCommandBatch, split_responses
 from pyResMan.MifareTLV import COMMAND_TAG_AUTHENTICATION, COMMAND_TAG_READ_BLOCK, COMMAND_TAG_WRITE_BLOCK, COMMAND_TAG_INCREMENT\
                                , COMMAND_TAG_DECREMENT, COMMAND_TAG_RESTORE, COMMAND_TAG_TRANSFER, COMMAND_TAG_SETUP
 
@@ -24,6 +24,29 @@ class LibSC(object):
         @return: error_code, block_data
         '''
         self.__interface = interface
+        # Whether the reader runs several commands in one apdu, detected on first use;
+        self.__batch_supported = None
+    
+    def __authentication_tlv(self, block_number, key_type, key, uid):
+        command_tlv = MifareCommandTLV(COMMAND_TAG_AUTHENTICATION)
+        command_tlv.set_block_number(block_number)
+        command_tlv.set_key_type(key_type)
+        command_tlv.set_key_value(key)
+        command_tlv.set_uid(uid)
+        return command_tlv
+    
+    def __read_block_tlv(self, block_number):
+        command_tlv = MifareCommandTLV(COMMAND_TAG_READ_BLOCK)
+        command_tlv.set_block_number(block_number)
+        command_tlv.set_rw_len(0x10)
+        return command_tlv
+    
+    def __write_block_tlv(self, block_number, block_data):
+        command_tlv = MifareCommandTLV(COMMAND_TAG_WRITE_BLOCK)
+        command_tlv.set_block_number(block_number)
+        command_tlv.set_block_data(block_data)
+        command_tlv.set_rw_len(len(block_data))
+        return command_tlv
     
     def M1_authentication(self, block_number, key_type, key, uid):
         '''
@@ -34,12 +57,7 @@ class LibSC(object):
         @param uid: card uid.
         @return: error_code, 0 if succeeded.
         '''
-        command_tlv = MifareCommandTLV(COMMAND_TAG_AUTHENTICATION)
-        command_tlv.set_block_number(block_number)
-        command_tlv.set_key_type(key_type)
-        command_tlv.set_key_value(key)
-        command_tlv.set_uid(uid)
-        command = command_tlv.serialize()
+        command = self.__authentication_tlv(block_number, key_type, key, uid).serialize()
         response = self.__interface.transmit_sc_command(command)
         response_tlv = MifareResponseTLV(response)
         return response_tlv.get_error()
@@ -50,10 +68,7 @@ class LibSC(object):
         @param block_number: block number.
         @return: error_code, 0 if succeeded; block_data
         '''
-        command_tlv = MifareCommandTLV(COMMAND_TAG_READ_BLOCK)
-        command_tlv.set_block_number(block_number)
-        command_tlv.set_rw_len(0x10)
-        command = command_tlv.serialize()
+        command = self.__read_block_tlv(block_number).serialize()
         response = self.__interface.transmit_sc_command(command)
         response_tlv = MifareResponseTLV(response)
         return response_tlv.get_error(), response_tlv.get_block_data()
@@ -65,19 +80,72 @@ class LibSC(object):
         @param block_data: block data to write.
         @return error_code, 0 if succeeded.
         '''
-        print(block_number)
-        print(len(block_data))
-        for i in range(len(block_data)):
-            print('%02X' %(ord(block_data[i]))),
-        command_tlv = MifareCommandTLV(COMMAND_TAG_WRITE_BLOCK)
-        command_tlv.set_block_number(block_number)
-        command_tlv.set_block_data(block_data)
-        command_tlv.set_rw_len(len(block_data))
-        command = command_tlv.serialize()
+        command = self.__write_block_tlv(block_number, block_data).serialize()
         response = self.__interface.transmit_sc_command(command)
         response_tlv = MifareResponseTLV(response)
         return response_tlv.get_error()
     
+    def M1_batch_supported(self):
+        '''
+        @brief: Check whether the reader runs several commands in one apdu; The reader is asked with an empty batch on first use.
+        @return: True if supported.
+        '''
+        if self.__batch_supported == None:
+            transmit_sc_batch = getattr(self.__interface, 'transmit_sc_batch', None)
+            self.__batch_supported = (transmit_sc_batch != None) and (transmit_sc_batch('') == '')
+        return self.__batch_supported
+    
+    def M1_transmit_batch(self, batch):
+        '''
+        @brief: Send the commands of a MifareCommandBatch, one apdu per frame; Without reader support, the commands are sent one by one.
+        @param batch: MifareCommandBatch.
+        @return: list of MifareResponseTLV, in the order of the commands; It ends at the first command which fails.
+        '''
+        responses = []
+        for frame in batch.get_frames():
+            if self.M1_batch_supported():
+                response = self.__interface.transmit_sc_batch(''.join(frame))
+                if response == None:
+                    raise Exception('Batch command failed.')
+                frame_responses = split_responses(response)
+                if len(frame_responses) == 0:
+                    raise Exception('Invalid batch response.')
+            else:
+                frame_responses = []
+                for command in frame:
+                    frame_responses.append(MifareResponseTLV(self.__interface.transmit_sc_command(command)))
+                    if frame_responses[-1].get_error() != 0:
+                        break
+            responses.extend(frame_responses)
+            if (len(frame_responses) < len(frame)) or (frame_responses[-1].get_error() != 0):
+                break
+        return responses
+    
+    def M1_read_blocks(self, block_numbers, authentication=None):
+        '''
+        @brief: Mifare read the data of several blocks, in as few apdus as possible.
+        @param block_numbers: block numbers.
+        @param authentication: None, or (block_number, key_type, key, uid) to authenticate before the reads.
+        @return: list of (error_code, block_data), the authentication first; It ends at the first error.
+        '''
+        batch = MifareCommandBatch()
+        if authentication != None:
+            batch.add(self.__authentication_tlv(*authentication))
+        for block_number in block_numbers:
+            batch.add(self.__read_block_tlv(block_number))
+        return [(response_tlv.get_error(), response_tlv.get_block_data()) for response_tlv in self.M1_transmit_batch(batch)]
+    
+    def M1_write_blocks(self, blocks):
+        '''
+        @brief: Mifare write several blocks, in as few apdus as possible.
+        @param blocks: list of (block_number, block_data).
+        @return: list of error_code; It ends at the first error.
+        '''
+        batch = MifareCommandBatch()
+        for block_number, block_data in blocks:
+            batch.add(self.__write_block_tlv(block_number, block_data))
+        return [response_tlv.get_error() for response_tlv in self.M1_transmit_batch(batch)]
+    
     def M1_increment(self, block_number, inc_operand):
         '''
         @brief: Mifare increment block data.
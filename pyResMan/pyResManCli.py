@@ -0,0 +1,632 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-9
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+
+Command line runner of pyResManController, without wxPython;
+Usage: python -m pyResMan.pyResManCli [options] <command> [arguments]
+'''
+
+import os
+import sys
+import json
+import argparse
+import time
+import threading
+from datetime import datetime
+from pyResMan.Util import Util, LOG_Error, LOG_Warning, LOG_Message, LOG_Info
+from pyResMan.pyResManController import pyResManController, pyResManControllerEventHandler, APDUItem
+from pyResMan import DebuggerUtils
+from pyResMan import DESFireCommands
+from pyResMan.APDULatency import LatencyRecorder, KEY_FIELDS
+from pyResMan import MifareLayout
+from pyResMan.MifareEngine import MIFARE_ACTION_WRITE, MIFARE_ACTION_READ, MIFARE_ACTION_LAYOUT, MIFARE_ACTION_CARD
+from pyResMan.MifareProduction import DEFAULT_POLL_INTERVAL
+from pyResMan import MifareKeys
+from pyResMan.MifareImageStore import MifareImageStore, DEFAULT_IMAGE_STORE_PATH_NAME
+from pyResMan.DESFireInventory import DEFAULT_INVENTORY_PATH_NAME
+
+LOG_LEVEL_NAMES = {
+    LOG_Error : 'error',
+    LOG_Warning : 'warning',
+    LOG_Message : 'message',
+    LOG_Info : 'info',
+}
+
+DESFIRE_RESPONSE_NAMES = {
+    DESFireCommands.GET_VERSION : 'version',
+    DESFireCommands.GET_APPLICATION_IDS : 'application_ids',
+    DESFireCommands.GET_FILE_IDS : 'file_ids',
+    DESFireCommands.GET_FILE_SETTINGS : 'file_settings',
+    DESFireCommands.GET_KEY_SETTINGS : 'key_settings',
+    DESFireCommands.GET_VALUE : 'value',
+    DESFireCommands.READ_DATA : 'data',
+    DESFireCommands.READ_RECORDS : 'records',
+    DESFireCommands.INVENTORY : 'inventory',
+}
+
+DESFIRE_AUTHENTICATE_COMMANDS = {
+    'des' : DESFireCommands.AUTHENTICATE,
+    'iso' : DESFireCommands.AUTHENTICATE_ISO,
+    'aes' : DESFireCommands.AUTHENTICATE_AES,
+}
+
+# Protocol values of pyResManReader;
+PROTOCOLS = {
+    'T0' : 0x00000001,
+    'T1' : 0x00000002,
+    'T0T1' : 0x00000003,
+}
+
+MIFARE_LAYOUTS = {
+    'mini' : MifareLayout.MIFARE_MINI,
+    '1k' : MifareLayout.MIFARE_1K,
+    '4k' : MifareLayout.MIFARE_4K,
+    'ultralight' : MifareLayout.MIFARE_ULTRALIGHT,
+}
+
+# Simulated cards of --simulator;
+SIMULATOR_CARDS = ('mifare', 'mifare-mini', 'mifare-4k', 'desfire')
+
+
+def _jsonValue(value):
+    """Convert a handler argument to a JSON value; Byte strings which are not printable text are converted to hex strings;"""
+    if isinstance(value, bytearray):
+        return Util.vs2s(value)
+    elif isinstance(value, str):
+        for c in value:
+            if not Util.isprint_char(c):
+                return Util.vs2s(value)
+        return value
+    elif isinstance(value, dict):
+        return dict((str(k), _jsonValue(v)) for k, v in value.iteritems())
+    elif isinstance(value, (list, tuple)):
+        return [_jsonValue(v) for v in value]
+    return value
+
+
+class CliEventHandler(pyResManControllerEventHandler):
+    '''
+    Writes the controller's events to the output, as text lines or as JSON lines;
+    '''
+
+    def __init__(self, output=sys.stdout, jsonOutput=False, verbose=False):
+        self.__output = output
+        self.__jsonOutput = jsonOutput
+        self.__verbose = verbose
+        self.__lock = threading.Lock()
+        self.__command = None
+        self.errorCount = 0
+        self.mifareBlocks = {}
+        self.mifareLayout = None
+        self.debuggerCommandsInfo = None
+
+    def emit(self, event, text, **fields):
+        with self.__lock:
+            if self.__jsonOutput:
+                fields['event'] = event
+                self.__output.write(json.dumps(fields, sort_keys=True) + '\n')
+            else:
+                self.__output.write(text + '\n')
+            self.__output.flush()
+
+    def __error(self, message):
+        self.errorCount += 1
+        self.emit('error', 'Error: %s' %(message), message=message)
+
+    def handleCardInserted(self, *args):
+        self.emit('card', 'Card inserted.', status='inserted')
+
+    def handleCardRemoved(self, *args):
+        self.emit('card', 'Card removed.', status='removed')
+
+    def handleReaderAdded(self, *args):
+        pass
+
+    def handleReaderRemoved(self, *args):
+        pass
+
+    def handleAPDUCommand(self, cmd, args=tuple()):
+        self.__command = Util.removespace(cmd)
+
+    def handleAPDUResponse(self, rsp, transtime, args=tuple()):
+        response = Util.removespace(rsp)
+        self.emit('apdu', '> %s\n< %s (%s)' %(self.__command, response, Util.getTimeStr(transtime)),
+                  command=self.__command, response=response, time=transtime)
+        self.__command = None
+
+    def handleScriptBegin(self, status):
+        pass
+
+    def handleScriptEnd(self, status):
+        pass
+
+    def handleLog(self, msg, level=LOG_Message):
+        if level == LOG_Error:
+            self.__error(msg)
+            return
+        if (level == LOG_Message) and (not self.__verbose):
+            return
+        self.emit('log', msg, level=LOG_LEVEL_NAMES.get(level, 'message'), message=msg)
+
+    def handleException(self, e):
+        self.__error(str(e))
+
+    def handleLoadScriptBegin(self):
+        pass
+
+    def handleLoadScriptItem(self, args):
+        pass
+
+    def handleLoadScriptItems(self, args):
+        pass
+
+    def handleLoadScriptEnd(self):
+        pass
+
+    def handleLoadDebuggerScriptBegin(self):
+        self.debuggerCommandsInfo = None
+
+    def handleLoadDebuggerScriptEnd(self, commandsInfo):
+        self.debuggerCommandsInfo = commandsInfo
+
+    def handleActionBegin(self, action):
+        pass
+
+    def handleActionEnd(self, action):
+        pass
+
+    def handleKeyChanged(self):
+        pass
+
+    def handleDebuggerProcessing(self, cmdinfo):
+        pass
+
+    def handleDebuggerResponse(self, response, cmdinfo):
+        commandIndex, commandName, commandValue = cmdinfo
+        if response[0]:
+            self.emit('debugger', '%d %s %s: OK %s' %(commandIndex, commandName, Util.vs2s(commandValue), Util.vs2s(response[1])),
+                      index=commandIndex, name=commandName, value=Util.vs2s(commandValue), ok=True, response=Util.vs2s(response[1]))
+        else:
+            errorcode = ord(response[1])
+            errorString = DebuggerUtils.getErrorString(errorcode)
+            self.errorCount += 1
+            self.emit('debugger', '%d %s %s: Error %s (0x%02X)' %(commandIndex, commandName, Util.vs2s(commandValue), errorString, errorcode),
+                      index=commandIndex, name=commandName, value=Util.vs2s(commandValue), ok=False, error=errorcode, message=errorString)
+
+    def handleMifareResponse(self, action_type, result, data):
+        if result:
+            self.__error(DebuggerUtils.getErrorString(data[0]))
+        elif action_type == MIFARE_ACTION_LAYOUT:
+            self.mifareLayout = data
+            self.emit('mifare', 'Card layout: %s.' %(data.name), action='layout', layout=data.name, blocks=data.blockCount)
+        elif action_type == MIFARE_ACTION_WRITE:
+            self.emit('mifare', 'Block %d written.' %(data), action='write', block=data)
+        elif action_type == MIFARE_ACTION_READ:
+            block_index, block_data = data
+            self.mifareBlocks[block_index] = block_data
+            self.emit('mifare', 'Block %02d: %s' %(block_index, Util.vs2s(block_data, ' ')), action='read', block=block_index, data=Util.vs2s(block_data))
+        elif action_type == MIFARE_ACTION_CARD:
+            self.emit('mifare', '%s.' %(data), action='card', **data.toDict())
+
+    def handleDESFireResponse(self, command_type, response):
+        name = DESFIRE_RESPONSE_NAMES.get(command_type, '%02X' %(command_type))
+        value = _jsonValue(response)
+        self.emit('desfire', '%s: %s' %(name, json.dumps(value, sort_keys=True)), type=name, response=value)
+
+
+def loadLatency(pathName):
+    """Load the LatencyRecorder saved in the file; Return an empty one if the file does not exist;"""
+    if not os.path.isfile(pathName):
+        return LatencyRecorder()
+    with open(pathName, 'rb') as f:
+        return LatencyRecorder.fromDict(json.load(f))
+
+
+def saveLatency(recorder, pathName):
+    with open(pathName, 'wb') as f:
+        json.dump(recorder.toDict(), f, sort_keys=True)
+
+
+def dumpLatency(handler, recorder, groupBy=KEY_FIELDS):
+    """Emit one line per histogram, the slowest p99 first;"""
+    for summary in recorder.getSummaries(groupBy):
+        name = ' '.join('%s=%s' %(field, summary[field]) for field in groupBy)
+        handler.emit('latency', '%s: count %d, p50 %s, p95 %s, p99 %s, max %s, %.1f apdu/s' %(name, summary['count'],
+                     Util.getTimeStr(summary['p50']), Util.getTimeStr(summary['p95']), Util.getTimeStr(summary['p99']),
+                     Util.getTimeStr(summary['max']), summary['throughput']), **summary)
+
+
+def mifareImages(handler, pathName, operation, numbers=tuple(), data=None, outputPathName=None):
+    """Query the Mifare card image store: list, show, diff, search or export;"""
+    store = MifareImageStore(pathName)
+    try:
+        if operation == 'list':
+            for number in xrange(len(store)):
+                values = store.getRecord(number).toDict()
+                handler.emit('image', '%d: %s %s, %d keys, %s' %(number, values['uid'], values['layout'], len(values['keys']),
+                             datetime.fromtimestamp(values['timestamp']).strftime('%c')), **values)
+        elif operation == 'show':
+            image = store.getRecord(numbers[0])
+            handler.emit('image', json.dumps(image.toDict(), sort_keys=True), **image.toDict())
+            for block, block_data in enumerate(image.getBlocks()):
+                handler.emit('block', 'Block %02d: %s' %(block, Util.vs2s(block_data, ' ')), block=block, data=Util.vs2s(block_data))
+        elif operation == 'diff':
+            blocks = store.diff(numbers[0], numbers[1])
+            handler.emit('diff', 'Blocks which differ: %s.' %(', '.join('%d' %(block) for block in blocks)) if len(blocks) > 0 else 'The images are the same.', blocks=blocks)
+        elif operation == 'search':
+            for number, offset in store.search(data):
+                layout = store.getRecord(number).layout
+                handler.emit('found', 'Image %d, offset %d (block %d).' %(number, offset, offset / layout.blockSize), number=number, offset=offset)
+        elif operation == 'export':
+            with open(outputPathName, 'wb') as f:
+                f.write(store.getImage(numbers[0]))
+    finally:
+        store.close()
+
+
+class CliRunner(object):
+    '''
+    Connects the controller to a reader and runs one command line job;
+    '''
+
+    def __init__(self, handler, readername=None, protocol=PROTOCOLS['T0T1'], simulator=None):
+        """simulator is None or one of SIMULATOR_CARDS, to use the simulated reader with that card;"""
+        self.__handler = handler
+        scInterface = None
+        if simulator != None:
+            from pyResMan import SimInterface
+            if simulator == 'desfire':
+                scInterface = SimInterface.SimInterface(SimInterface.SimDESFire())
+            elif simulator == 'mifare-mini':
+                scInterface = SimInterface.SimInterface(SimInterface.SimMifareClassic(layout=MifareLayout.MIFARE_MINI))
+            elif simulator == 'mifare-4k':
+                scInterface = SimInterface.SimInterface(SimInterface.SimMifareClassic(layout=MifareLayout.MIFARE_4K))
+            else:
+                scInterface = SimInterface.SimInterface(SimInterface.SimMifareClassic())
+        self.__controller = pyResManController(handler, scInterface)
+        self.__readername = readername
+        self.__protocol = protocol
+
+    def getController(self):
+        return self.__controller
+
+    def listReaders(self):
+        return self.__controller.getReaderList()
+
+    def connect(self):
+        readername = self.__readername
+        if readername == None:
+            readernames = self.listReaders()
+            if len(readernames) == 0:
+                raise Exception('No reader found.')
+            readername = readernames[0]
+        # Mode is not used by the controller;
+        self.__controller.connect(readername, self.__protocol, None)
+
+    def disconnect(self):
+        self.__controller.disconnect()
+
+    def wait(self, future):
+        """Wait for a controller action; Exceptions which are not handled by the action are reported by the controller,
+        a cancelled action is reported here;"""
+        try:
+            return future.result()
+        except Exception, e:
+            if future.cancelled():
+                self.__handler.handleException(e)
+
+    def transmit(self, apdus, autoGetResponse):
+        apduItems = [APDUItem(apdu, ()) for apdu in apdus]
+        self.wait(self.__controller.transmitAPDUItems(apduItems, autoGetResponse, 1))
+
+    def runScript(self, scriptPathName, loopCount, autoGetResponse):
+        self.wait(self.__controller.runScript(scriptPathName, loopCount, autoGetResponse))
+
+    def runDebuggerScript(self, scriptPathName):
+        self.wait(self.__controller.loadDebuggerScript(scriptPathName))
+        commandsInfo = self.__handler.debuggerCommandsInfo
+        if commandsInfo == None:
+            return
+        commands = [(i, commandName, Util.s2vs(commandValue)) for i, (commandName, commandValue) in enumerate(commandsInfo)]
+        self.__controller.clearDebuggerVariables()
+        self.wait(self.__controller.debuggerCommands(commands))
+
+    def setMifareKeys(self, keysPathName=None, keyCachePathName=None, noKeyCache=False):
+        """Use the keys of the key file (after the well known keys), and the key cache file;"""
+        controller = self.__controller
+        if keysPathName != None:
+            controller.setMifareKeys(MifareKeys.loadKeyFile(keysPathName) + MifareKeys.DEFAULT_KEYS)
+        if noKeyCache:
+            controller.setMifareKeyCachePathName(None)
+        elif keyCachePathName != None:
+            controller.setMifareKeyCachePathName(keyCachePathName)
+
+    def setMifareBulkEnabled(self, enabled):
+        self.__controller.setMifareBulkEnabled(enabled)
+
+    def setMifareImageStore(self, pathName=None, noImageStore=False):
+        if noImageStore:
+            self.__controller.setMifareImageStorePathName(None)
+        elif pathName != None:
+            self.__controller.setMifareImageStorePathName(pathName)
+
+    def setDESFireInventory(self, pathName=None, noInventoryFile=False):
+        if noInventoryFile:
+            self.__controller.setDESFireInventoryPathName(None)
+        elif pathName != None:
+            self.__controller.setDESFireInventoryPathName(pathName)
+
+    def mifareDump(self, key_a, outputPathName=None, layout=None):
+        """Dump the card; layout is a MifareLayout, or None to detect it;"""
+        self.__handler.mifareBlocks.clear()
+        self.__handler.mifareLayout = None
+        self.wait(self.__controller.mifareDumpCard(key_a, layout))
+        blocks = self.__handler.mifareBlocks
+        layout = self.__handler.mifareLayout
+        if outputPathName != None:
+            if (layout == None) or (len(blocks) != layout.blockCount):
+                raise Exception('Dump is not complete, %d blocks read.' %(len(blocks)))
+            with open(outputPathName, 'wb') as f:
+                f.write(''.join(blocks[i] for i in xrange(layout.blockCount)))
+
+    def mifareClone(self, inputPathName, key_a, differential=False):
+        with open(inputPathName, 'rb') as f:
+            card_data = f.read()
+        layout = MifareLayout.layoutForImageSize(len(card_data))
+        if layout == None:
+            raise Exception('Invalid card data.')
+        self.wait(self.__controller.mifareCloneCard(layout.splitImage(card_data), key_a, differential))
+
+    def mifareProduction(self, inputPathName, key_a, differential=False, interval=DEFAULT_POLL_INTERVAL, count=0, rejectDuplicates=True):
+        """Clone the card data file to every new card, until count cards are done or Ctrl+C is pressed;"""
+        with open(inputPathName, 'rb') as f:
+            card_data = f.read()
+        layout = MifareLayout.layoutForImageSize(len(card_data))
+        if layout == None:
+            raise Exception('Invalid card data.')
+        controller = self.__controller
+        future = controller.mifareProductionStart(layout.splitImage(card_data), key_a, differential, interval, count, rejectDuplicates)
+        try:
+            while not future.done():
+                time.sleep(0.1)
+        except KeyboardInterrupt:
+            controller.mifareProductionStop()
+        self.wait(future)
+        statistics = controller.getMifareProductionStatistics()
+        self.__handler.emit('production', 'Production: %s.' %(statistics), **statistics.toDict())
+
+    def desfire(self, operation, key, aid, file_no, offset, length, outputPathName=None, auth='des', key_no=0, full=False):
+        """key is the key to authenticate with, to the application if aid is given or to the PICC otherwise;
+        full reads every application of the inventory again, instead of the changed ones only;"""
+        controller = self.__controller
+        authenticate = lambda: self.wait(controller.desfireAuthenticate(Util.s2vl(key), DESFIRE_AUTHENTICATE_COMMANDS[auth], key_no))
+        if (key != None) and (aid == None):
+            authenticate()
+        if operation == 'version':
+            self.wait(controller.desfireGetVersion())
+            return
+        if operation == 'apps':
+            self.wait(controller.desfireGetApplicationIDs())
+            return
+        if operation == 'calibrate':
+            self.wait(controller.desfireCalibrateFrameSize())
+            return
+        if operation == 'inventory':
+            self.wait(controller.desfireGetInventory(not full))
+            return
+        if aid == None:
+            raise Exception('Application id is required.')
+        self.wait(controller.desfireSelectApplication(aid))
+        if key != None:
+            authenticate()
+        if operation == 'files':
+            self.wait(controller.desfireGetFileIDs())
+            return
+        if file_no == None:
+            raise Exception('File number is required.')
+        if operation == 'settings':
+            self.wait(controller.desfireGetFileSettings(file_no))
+        elif operation == 'read':
+            if outputPathName != None:
+                self.wait(controller.desfireReadDataToFile(file_no, offset, length, outputPathName))
+            else:
+                self.wait(controller.desfireReadData(file_no, offset, length))
+        elif operation == 'records':
+            self.wait(controller.desfireReadRecords(file_no, offset, length))
+        elif operation == 'value':
+            self.wait(controller.desfireGetValue(file_no))
+
+
+def _hexArgument(length=None):
+    def parse(text):
+        try:
+            value = Util.s2vs(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError('Invalid hex string: %s.' %(text))
+        if (length != None) and (len(value) != length):
+            raise argparse.ArgumentTypeError('Shall be %d bytes long: %s.' %(length, text))
+        return value
+    return parse
+
+
+def _intArgument(text):
+    return int(text, 0)
+
+
+def _addMifareKeyArguments(command):
+    command.add_argument('-k', '--key-a', type=_hexArgument(6), default='FFFFFFFFFFFF', help='key tried first on every sector')
+    command.add_argument('--keys', help='file of keys to try on the sectors, one hex key per line')
+    command.add_argument('--key-cache', help='file of the keys found per card and sector, default: %s' %(MifareKeys.DEFAULT_KEY_CACHE_PATH_NAME))
+    command.add_argument('--no-key-cache', action='store_true', help='do not read or save the key cache file')
+
+
+def createArgumentParser():
+    parser = argparse.ArgumentParser(prog='pyResManCli', description='Run pyResMan jobs without GUI.')
+    parser.add_argument('-r', '--reader', help='reader name, the first reader by default')
+    parser.add_argument('-p', '--protocol', choices=sorted(PROTOCOLS.keys()), default='T0T1')
+    parser.add_argument('--simulator', choices=SIMULATOR_CARDS, help='use the simulated R502 SPY reader with this card')
+    parser.add_argument('--json', action='store_true', help='write JSON lines')
+    parser.add_argument('-v', '--verbose', action='store_true', help='write progress messages')
+    parser.add_argument('--latency', action='store_true', help='write the apdu latency histograms after the job')
+    parser.add_argument('--latency-file', help='add the apdu latency histograms of the job to this file')
+    commands = parser.add_subparsers(dest='command')
+
+    commands.add_parser('readers', help='list readers')
+
+    command = commands.add_parser('transmit', help='transmit APDUs')
+    command.add_argument('apdus', nargs='+')
+    command.add_argument('--auto-get-response', action='store_true')
+
+    command = commands.add_parser('script', help='run an APDU script file')
+    command.add_argument('path')
+    command.add_argument('-n', '--loop', type=int, default=1)
+    command.add_argument('--auto-get-response', action='store_true')
+
+    command = commands.add_parser('debugger-script', help='run a debugger script file')
+    command.add_argument('path')
+
+    command = commands.add_parser('mifare-dump', help='dump a Mifare card')
+    _addMifareKeyArguments(command)
+    command.add_argument('-c', '--card', choices=sorted(MIFARE_LAYOUTS.keys()), help='card type, detected from the SAK by default')
+    command.add_argument('-o', '--output', help='save the card data to this file')
+    command.add_argument('--no-bulk', action='store_true', help='read block by block, even if the reader can dump the card')
+    command.add_argument('--image-store', help='file the dumped card images are appended to, default: %s' %(DEFAULT_IMAGE_STORE_PATH_NAME))
+    command.add_argument('--no-image-store', action='store_true', help='do not append the card image to the image store')
+
+    command = commands.add_parser('mifare-clone', help='write a card data file to a Mifare card')
+    command.add_argument('path')
+    _addMifareKeyArguments(command)
+    command.add_argument('-d', '--diff', action='store_true', help='write only the blocks which differ from the card, and verify them')
+    command.add_argument('--no-bulk', action='store_true', help='write block by block, even if the reader can clone the card')
+
+    command = commands.add_parser('mifare-production', help='write a card data file to every new Mifare card put on the reader')
+    command.add_argument('path')
+    _addMifareKeyArguments(command)
+    command.add_argument('-d', '--diff', action='store_true', help='write only the blocks which differ from the card, and verify them')
+    command.add_argument('-n', '--count', type=int, default=0, help='stop after this many cards, default: run until Ctrl+C')
+    command.add_argument('--interval', type=float, default=DEFAULT_POLL_INTERVAL, help='seconds between two polls of the field, default: %(default)s')
+    command.add_argument('--allow-duplicates', action='store_true', help='write a card again if it comes back to the reader')
+    command.add_argument('--no-bulk', action='store_true', help='write block by block, even if the reader can clone the card')
+
+    command = commands.add_parser('mifare-images', help='query the Mifare card image store')
+    command.add_argument('operation', choices=('list', 'show', 'diff', 'search', 'export'))
+    command.add_argument('numbers', nargs='*', type=int, help='image numbers: one for show and export, two for diff')
+    command.add_argument('--image-store', default=DEFAULT_IMAGE_STORE_PATH_NAME, help='image store file, default: %(default)s')
+    command.add_argument('--data', type=_hexArgument(), help='hex data to search')
+    command.add_argument('-o', '--output', help='export the card image to this file')
+
+    command = commands.add_parser('desfire', help='DESFire operations')
+    command.add_argument('operation', choices=('version', 'apps', 'calibrate', 'inventory', 'files', 'settings', 'read', 'records', 'value'))
+    command.add_argument('-k', '--key', help='authenticate with this key (hex) first')
+    command.add_argument('--auth', choices=sorted(DESFIRE_AUTHENTICATE_COMMANDS.keys()), default='des', help='authentication of the key: legacy DES, ISO (2K3DES / 3K3DES) or AES, default: %(default)s')
+    command.add_argument('--key-no', type=_intArgument, default=0, help='number of the key, default: %(default)s')
+    command.add_argument('-a', '--aid', type=_intArgument)
+    command.add_argument('-f', '--file', type=_intArgument)
+    command.add_argument('--offset', type=_intArgument, default=0)
+    command.add_argument('--length', type=_intArgument, default=0)
+    command.add_argument('-o', '--output', help='write the data read to this file while it is read')
+    command.add_argument('--full', action='store_true', help='inventory: read every application again, not only those changed since the last inventory')
+    command.add_argument('--inventory-file', help='file of the cached inventory of each card, default: %s' %(DEFAULT_INVENTORY_PATH_NAME))
+    command.add_argument('--no-inventory-file', action='store_true', help='do not read or save the inventory file')
+
+    command = commands.add_parser('latency', help='dump the apdu latency histograms of the latency file')
+    command.add_argument('--by', default=','.join(KEY_FIELDS), help='group by these fields, default: %(default)s')
+    command.add_argument('--reset', action='store_true', help='clear the latency file after the dump')
+    return parser
+
+
+def main(argv=None):
+    args = createArgumentParser().parse_args(argv)
+    handler = CliEventHandler(sys.stdout, args.json, args.verbose)
+
+    if args.command == 'latency':
+        if args.latency_file == None:
+            handler.handleException(Exception('The latency file is required.'))
+            return 2
+        try:
+            dumpLatency(handler, loadLatency(args.latency_file), [field.strip() for field in args.by.split(',') if field.strip()])
+            if args.reset and os.path.isfile(args.latency_file):
+                os.remove(args.latency_file)
+        except Exception, e:
+            handler.handleException(e)
+            return 2
+        return 0
+
+    if args.command == 'mifare-images':
+        required = {'show' : 1, 'export' : 1, 'diff' : 2}.get(args.operation, 0)
+        if (len(args.numbers) != required) or ((args.operation == 'search') and (args.data == None)) or \
+                ((args.operation == 'export') and (args.output == None)):
+            handler.handleException(Exception('Invalid arguments of %s.' %(args.operation)))
+            return 2
+        try:
+            mifareImages(handler, args.image_store, args.operation, args.numbers, args.data, args.output)
+        except Exception, e:
+            handler.handleException(e)
+            return 2
+        return 0
+
+    runner = CliRunner(handler, args.reader, PROTOCOLS[args.protocol], args.simulator)
+
+    if args.command == 'readers':
+        for readername in runner.listReaders():
+            handler.emit('reader', readername, name=readername)
+        return 0
+
+    try:
+        runner.connect()
+    except Exception, e:
+        handler.handleException(e)
+        return 2
+
+    try:
+        if args.command == 'transmit':
+            runner.transmit(args.apdus, args.auto_get_response)
+        elif args.command == 'script':
+            runner.runScript(args.path, args.loop, args.auto_get_response)
+        elif args.command == 'debugger-script':
+            runner.runDebuggerScript(args.path)
+        elif args.command == 'mifare-dump':
+            runner.setMifareKeys(args.keys, args.key_cache, args.no_key_cache)
+            runner.setMifareBulkEnabled(not args.no_bulk)
+            runner.setMifareImageStore(args.image_store, args.no_image_store)
+            runner.mifareDump(args.key_a, args.output, MIFARE_LAYOUTS.get(args.card))
+        elif args.command == 'mifare-clone':
+            runner.setMifareKeys(args.keys, args.key_cache, args.no_key_cache)
+            runner.setMifareBulkEnabled(not args.no_bulk)
+            runner.mifareClone(args.path, args.key_a, args.diff)
+        elif args.command == 'mifare-production':
+            runner.setMifareKeys(args.keys, args.key_cache, args.no_key_cache)
+            runner.setMifareBulkEnabled(not args.no_bulk)
+            runner.mifareProduction(args.path, args.key_a, args.diff, args.interval, args.count, not args.allow_duplicates)
+        elif args.command == 'desfire':
+            runner.setDESFireInventory(args.inventory_file, args.no_inventory_file)
+            runner.desfire(args.operation, args.key, args.aid, args.file, args.offset, args.length, args.output, args.auth, args.key_no, args.full)
+    except Exception, e:
+        handler.handleException(e)
+    finally:
+        try:
+            runner.disconnect()
+        except Exception, e:
+            handler.handleException(e)
+
+    recorder = runner.getController().getLatencyRecorder()
+    if args.latency:
+        dumpLatency(handler, recorder)
+    if args.latency_file != None:
+        try:
+            total = loadLatency(args.latency_file)
+            total.merge(recorder)
+            saveLatency(total, args.latency_file)
+        except Exception, e:
+            handler.handleException(e)
+
+    return 1 if handler.errorCount > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
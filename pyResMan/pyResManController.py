@@ -8,22 +8,61 @@ Created on 2015-10-30
 @copyright: JavaCardOS Technologies. All rights reserved.
 '''
 
-from pyResManReader import pyResManReader, ICardMonitorEventHandler, IReaderMonitorEventHandler
-from Util import Util
+from Util import Util, LOG_Error, LOG_Warning, LOG_Info
 import threading
 import timeit
-from pyGlobalPlatform import globalplatformlib as gp
-import wx
 import os
-from GPInterface import GPInterface
-from R502SpyLibrary import R502SpyLibrary
-from DebuggerScriptFile import DebuggerScriptFile
-from pyResMan.R502Device import R502Device
-from pyResMan.pyLibSC import LibSC
+import io
 from pyResMan import DebuggerUtils
-from pyResMan import DESFireEx
-from pyResMan.DESFireEx import GET_FILE_SETTINGS, GET_KEY_SETTINGS, GET_VALUE,\
+from pyResMan import DESFireCommands
+from pyResMan.DESFireCommands import GET_FILE_SETTINGS, GET_KEY_SETTINGS, GET_VALUE,\
     READ_DATA, READ_RECORDS
+from pyResMan import ScriptCache
+from pyResMan.LazyImport import LazyModule, LazyCallable
+from pyResMan.APDULatency import LatencyRecorder, LatencyRecordingInterface
+from pyResMan.ReaderWorker import ReaderWorker, PRIORITY_HIGH, PRIORITY_NORMAL,\
+    PRIORITY_LOW
+
+# The subsystems are imported on first use, so basic APDU exchange does not load GlobalPlatform, DESFire or debugger modules;
+gp = LazyModule('pyGlobalPlatform.globalplatformlib')
+pyResManReaderModule = LazyModule('pyResMan.pyResManReader')
+GPInterface = LazyCallable('pyResMan.GPInterface', 'GPInterface')
+R502SpyLibrary = LazyCallable('pyResMan.R502SpyLibrary', 'R502SpyLibrary')
+DebuggerScriptFile = LazyCallable('pyResMan.DebuggerScriptFile', 'DebuggerScriptFile')
+R502Device = LazyCallable('pyResMan.R502Device', 'R502Device')
+LibSC = LazyCallable('pyResMan.pyLibSC', 'LibSC')
+DESFireEx = LazyCallable('pyResMan.DESFireEx', 'DESFireEx')
+MifareLayout = LazyModule('pyResMan.MifareLayout')
+mifareEngineModule = LazyModule('pyResMan.MifareEngine')
+MifareDumpEngine = LazyCallable('pyResMan.MifareEngine', 'MifareDumpEngine')
+MifareCloneEngine = LazyCallable('pyResMan.MifareEngine', 'MifareCloneEngine')
+MifareBulkEngine = LazyCallable('pyResMan.MifareEngine', 'MifareBulkEngine')
+mifareProductionModule = LazyModule('pyResMan.MifareProduction')
+MifareProductionLoop = LazyCallable('pyResMan.MifareProduction', 'MifareProductionLoop')
+mifareImageStoreModule = LazyModule('pyResMan.MifareImageStore')
+MifareImageStore = LazyCallable('pyResMan.MifareImageStore', 'MifareImageStore')
+MifareImageRecorder = LazyCallable('pyResMan.MifareImageStore', 'MifareImageRecorder')
+imageUID = LazyCallable('pyResMan.MifareImageStore', 'imageUID')
+mifareKeysModule = LazyModule('pyResMan.MifareKeys')
+MifareKeyCache = LazyCallable('pyResMan.MifareKeys', 'MifareKeyCache')
+MifareKeySearch = LazyCallable('pyResMan.MifareKeys', 'MifareKeySearch')
+desfireFramesModule = LazyModule('pyResMan.DESFireFrames')
+DESFireFrameCalibration = LazyCallable('pyResMan.DESFireFrames', 'DESFireFrameCalibration')
+fscFromATS = LazyCallable('pyResMan.DESFireFrames', 'fscFromATS')
+frameDataFromFSC = LazyCallable('pyResMan.DESFireFrames', 'frameDataFromFSC')
+probeFrameData = LazyCallable('pyResMan.DESFireFrames', 'probeFrameData')
+desfireInventoryModule = LazyModule('pyResMan.DESFireInventory')
+DESFireInventory = LazyCallable('pyResMan.DESFireInventory', 'DESFireInventory')
+DESFireInventoryCache = LazyCallable('pyResMan.DESFireInventory', 'DESFireInventoryCache')
+
+# Stands for the default file of a cache or store, which is defined by the module of the cache or store;
+DEFAULT_PATH_NAME = object()
+
+def _pathName(pathName, module, defaultName):
+    """Return the path name, or the default path name of the module if it is DEFAULT_PATH_NAME;"""
+    if pathName is DEFAULT_PATH_NAME:
+        return getattr(module, defaultName)
+    return pathName
 
 class APDUItem(object):
     """Class for APDU item data;"""
@@ -42,40 +81,166 @@ class APDUItem(object):
 class pyResManController(object):
     """The controller of reResManDialog;"""
 
-    def __init__(self, handler):
-        """""Constructor"""
+    def __init__(self, handler, scInterface=None):
+        """""Constructor; scInterface replaces the PC/SC interface, e.g. a SimInterface for tests without reader;"""
         self.__readername = None
-        self.__reader = pyResManReader()
         self.__handler = handler
-        self.__reader.addReaderMonitorHandler(self)
-        self.__reader.monitorReaders()
-        self.__runScriptThread = None
-        self.__gpInterface = GPInterface()
-        self.__scDebugger = R502SpyLibrary(self.__gpInterface)
-        self.__r502_device = R502Device(self.__gpInterface)
-        self.__libsc = LibSC(self.__r502_device)
-        self.__desfire = DESFireEx.DESFireEx(self.__r502_device)
-        
-        gp.enableTraceMode(1)
+        self.__reader = None
+        if scInterface == None:
+            self.__reader = pyResManReaderModule.pyResManReader()
+            self.__reader.addReaderMonitorHandler(self)
+            self.__reader.monitorReaders()
+        self.__runScriptFuture = None
+        self.__transmitAPDUItemsFuture = None
+        self.__debuggerCommandsFuture = None
+        self.__stopFlag = False
+        self.__loadScriptId = 0
+        self.__workers = {}
+        self.__workersLock = threading.Lock()
+        # Every apdu sent to the reader is timed, including those of the R502, Mifare and DESFire libraries;
+        self.__latencyRecorder = LatencyRecorder()
+        self.__scInterface = scInterface
+        # Created on first use, see the properties below;
+        self.__gpInterfaceInstance = None
+        self.__scDebuggerInstance = None
+        self.__r502DeviceInstance = None
+        self.__libscInstance = None
+        self.__desfireInstance = None
         
         self.__debuggerVariables = {}
+        self.__mifareStatistics = None
+        # None for the DEFAULT_KEYS of MifareKeys;
+        self.__mifareKeys = None
+        self.__mifareKeyCachePathName = DEFAULT_PATH_NAME
+        self.__mifareKeyCache = None
+        self.__mifareImageStorePathName = DEFAULT_PATH_NAME
+        self.__mifareImageStore = None
+        # Whether the firmware of each reader supports the bulk Mifare commands, detected on first use;
+        self.__mifareBulkSupport = {}
+        self.__mifareBulkEnabled = True
+        self.__mifareProductionLoop = None
+        # ATS of the DESFire card, read by the frame calibration or the RATS debugger command;
+        self.__desfireATS = None
+        self.__desfireCalibrationPathName = DEFAULT_PATH_NAME
+        self.__desfireCalibration = None
+        self.__desfireInventoryPathName = DEFAULT_PATH_NAME
+        self.__desfireInventory = None
+    
+    @property
+    def __gpInterface(self):
+        if self.__gpInterfaceInstance == None:
+            scInterface = self.__scInterface
+            if scInterface == None:
+                scInterface = GPInterface()
+                gp.enableTraceMode(1)
+            self.__gpInterfaceInstance = LatencyRecordingInterface(scInterface, self.__latencyRecorder)
+        return self.__gpInterfaceInstance
+    
+    @property
+    def __scDebugger(self):
+        if self.__scDebuggerInstance == None:
+            self.__scDebuggerInstance = R502SpyLibrary(self.__gpInterface)
+        return self.__scDebuggerInstance
+    
+    @property
+    def __r502_device(self):
+        if self.__r502DeviceInstance == None:
+            self.__r502DeviceInstance = R502Device(self.__gpInterface)
+        return self.__r502DeviceInstance
+    
+    @property
+    def __libsc(self):
+        if self.__libscInstance == None:
+            self.__libscInstance = LibSC(self.__r502_device)
+        return self.__libscInstance
+    
+    @property
+    def __desfire(self):
+        if self.__desfireInstance == None:
+            self.__desfireInstance = DESFireEx(self.__r502_device)
+        return self.__desfireInstance
     
     def getReaderList(self):
+        if self.__reader == None:
+            return self.__gpInterface.listreaders()
         return self.__reader.getReaderList()
     
     def getReaderName(self):
         return self.__readername
     
+    def getLatencyRecorder(self):
+        """Return the LatencyRecorder with the round-trip times of all apdus sent by the controller;"""
+        return self.__latencyRecorder
+    
+    def getLatencySummaries(self, groupBy=('reader', 'cla', 'ins', 'sw')):
+        """Return the p50/p95/p99/max round-trip times and throughput, grouped by the key fields; See LatencyRecorder.getSummaries;"""
+        return self.__latencyRecorder.getSummaries(groupBy)
+    
+    def clearLatency(self):
+        self.__latencyRecorder.clear()
+    
+    def __getWorker(self, readername):
+        """Get the worker of the reader, create it if not exists;"""
+        with self.__workersLock:
+            worker = self.__workers.get(readername)
+            if worker == None:
+                worker = ReaderWorker(readername, self.__handleCallbackException)
+                self.__workers[readername] = worker
+            return worker
+
+    def __handleCallbackException(self, future, e):
+        self.__handler.handleLog('Callback of %s, exception: %s' %(future.name, e), LOG_Error)
+
+    def __handleActionException(self, future, e):
+        # Nobody reads the futures of the GUI actions, so their exceptions are reported here;
+        self.__handler.handleException(e)
+
+    def __runPending(self):
+        """Called between the apdus of a batch: run the commands of a higher priority queued meanwhile (e.g. a transmit);
+        Return False if the batch is stopped;"""
+        return self.__getWorker(self.__readername).runPending()
+
+    def __stopWorker(self, readername):
+        with self.__workersLock:
+            worker = self.__workers.pop(readername, None)
+        if worker != None:
+            worker.stop()
+
+    def __submit(self, target, args=tuple(), priority=PRIORITY_NORMAL, reportException=True):
+        """Queue one action to the worker of current reader; Return the future of the action; An exception which the
+        action does not handle is reported to the handler, unless reportException is False (the caller reads it from
+        the future);"""
+        exceptionHandler = self.__handleActionException if reportException else None
+        return self.__getWorker(self.__readername).submit(target, args, priority, exceptionHandler=exceptionHandler)
+
+    def __connect(self, readername, protocol):
+        self.__gpInterface.connect(str(readername), protocol)
+        self.__desfireATS = None
+        self.__desfireForgetCard()
+        if readername.find('R502 SPY') != -1:
+            self.__scDebugger.init()
+
     def connect(self, readername, protocol, mode):
         """ Connect to the reader. """
         self.__readername = readername
         self.__handler.handleLog('Connect to %s.' %(readername))
-        self.__gpInterface.connect(str(readername), protocol)
-        if self.__readername.find('R502 SPY') != -1:
-            self.__scDebugger.init()
+        # The reader handle is only used by the worker thread of the reader;
+        self.__submit(self.__connect, (readername, protocol), PRIORITY_HIGH, reportException=False).result()
+
+    def __mifareCardLost(self):
+        """The card was inserted or removed: the RF session no longer holds a selected card;"""
+        if self.__scDebuggerInstance != None:
+            self.__scDebuggerInstance.getSession().cardLost()
 
     def handleCardEvent(self, eventType, args):
         readername = args[0]
+        # The session is used by the commands on the worker thread, so it is reset there, between two commands;
+        if (self.__scDebuggerInstance != None) and (self.__readername != None):
+            self.__submit(self.__mifareCardLost, priority=PRIORITY_HIGH)
+        self.__desfireATS = None
+        if (self.__desfireInstance != None) and (self.__readername != None):
+            self.__submit(self.__desfireForgetCard, priority=PRIORITY_HIGH)
+        ICardMonitorEventHandler = pyResManReaderModule.ICardMonitorEventHandler
         if eventType == ICardMonitorEventHandler.MONITOR_EVENT_INSERT:
             self.__handler.handleCardInserted(readername)
         elif eventType == ICardMonitorEventHandler.MONITOR_EVENT_REMOVE:
@@ -84,6 +249,7 @@ class pyResManController(object):
             self.__reader.stopCardMonitor()
 
     def handleReaderEvent(self, eventType, args):
+        IReaderMonitorEventHandler = pyResManReaderModule.IReaderMonitorEventHandler
         if eventType == IReaderMonitorEventHandler.MONITOR_EVENT_ADDED:
             for readername in args:
                 self.__handler.handleReaderAdded(readername)
@@ -92,14 +258,23 @@ class pyResManController(object):
                 self.__handler.handleReaderRemoved(readername)
 
     def monitorCard(self):
+        if self.__reader == None:
+            return
         self.__reader.addCardMonitorHandler(self)
         self.__reader.monitorCard(self.__readername)
 
-    def disconnect(self):
+    def __disconnect(self):
         if self.__readername.find('R502 SPY') != -1:
             self.__scDebugger.rfAuto()
             self.__scDebugger.rfOn()
         self.__gpInterface.disconnect()
+
+    def disconnect(self):
+        self.__stopFlag = True
+        try:
+            self.__submit(self.__disconnect, priority=PRIORITY_HIGH, reportException=False).result()
+        finally:
+            self.__stopWorker(self.__readername)
         try:
             self.__reader.removeCardMonitorHandler(self)
             self.__reader.stopCardMonitor()
@@ -107,23 +282,28 @@ class pyResManController(object):
             pass
     
     def __transmit_impl(self, cmd, t0AutoGetResponse, handlerArgs):
-        commandValue = Util.s2vs(cmd)
-        
-        self.__handler.handleAPDUCommand("".join("%02X " %(ord(vb)) for vb in commandValue), handlerArgs)
+        self.__transmitValue(Util.s2vs(cmd), t0AutoGetResponse, handlerArgs)
+
+    def __transmitValue(self, commandValue, t0AutoGetResponse, handlerArgs):
+        """Transmit one apdu which is already decoded to value string;"""
+        self.__handler.handleAPDUCommand(Util.vs2s(commandValue, ' ') + ' ', handlerArgs)
+        if self.__scDebuggerInstance != None:
+            # The apdu may be an R502 SPY command too;
+            self.__scDebuggerInstance.getSession().reset()
         timeStart = timeit.default_timer()
-        rsp = self.__gpInterface.transmit(Util.s2vs(cmd))
+        rsp = self.__gpInterface.transmit(commandValue)
         timeStop = timeit.default_timer()
         transtime = timeStop - timeStart
-        self.__handler.handleAPDUResponse("".join("%02X " %(ord(vb)) for vb in rsp), transtime, handlerArgs)
+        self.__handler.handleAPDUResponse(Util.vs2s(rsp, ' ') + ' ', transtime, handlerArgs)
         
         if t0AutoGetResponse and (rsp[0] == '\x61') and (len(handlerArgs) == 0):
             cmd = '\x00\xC0\x00\x00' + rsp[1]
-            self.__handler.handleAPDUCommand("".join("%02X " %(ord(vb)) for vb in cmd))
+            self.__handler.handleAPDUCommand(Util.vs2s(cmd, ' ') + ' ')
             timeStart = timeit.default_timer()
-            rsp = gp.sendApdu(cmd)
+            rsp = self.__gpInterface.transmit(cmd)
             timeStop = timeit.default_timer()
             transtime = timeStop - timeStart
-            self.__handler.handleAPDUResponse("".join("%02X " %(ord(vb)) for vb in rsp), transtime)
+            self.__handler.handleAPDUResponse(Util.vs2s(rsp, ' ') + ' ', transtime)
 
     def __transmit(self, cmd, t0AutoGetResponse, handlerArgs):
         """Thread method to transmit an apdu;"""
@@ -133,9 +313,8 @@ class pyResManController(object):
             self.__handler.handleException(e)
     
     def transmit(self, commandText, autoGetResponse, handlerArgs=tuple()):
-        """Create one thread to transmit apdu;"""
-        transmitThread = threading.Thread(target=self.__transmit, args=(commandText, autoGetResponse, handlerArgs), name="Transmit thread")
-        transmitThread.start()
+        """Queue one apdu to transmit; Return the future of the action;"""
+        return self.__submit(self.__transmit, (commandText, autoGetResponse, handlerArgs), PRIORITY_HIGH)
     
     def __transmitAPDUItems(self, apduItems, autoGetResponse, loopCount):
         """Thread method to transmit apdu items;"""
@@ -144,54 +323,68 @@ class pyResManController(object):
             for loopIndex in xrange(loopCount):
                 self.__handler.handleLog('Transmit APDUs, loop: %d / %d' %(loopIndex + 1, loopCount))
                 for apduItem in apduItems:
+                    if not self.__runPending():
+                        self.__handler.handleLog('Transmit APDUs stopped.')
+                        return
                     self.__transmit_impl(apduItem.getCommand(), autoGetResponse, apduItem.getTransArgs())
         except Exception, e:
             self.__handler.handleException(e)
     
     def transmitAPDUItems(self, apduItems, autoGetResponse, loopCount):
-        """Create one thread to Transmit apdu items"""
-        self.transmitThread = threading.Thread(target=self.__transmitAPDUItems, args=(apduItems, autoGetResponse, loopCount), name="Transmit APDU items thread")
-        self.transmitThread.start()
+        """Queue apdu items to transmit, stopScript() stops them; Return the future of the action;"""
+        self.__transmitAPDUItemsFuture = self.__submit(self.__transmitAPDUItems, (apduItems, autoGetResponse, loopCount), PRIORITY_LOW)
+        return self.__transmitAPDUItemsFuture
 
     def __runScript(self, scriptPathName, loopCount, t0AutoGetResponse):
         """Thread method to run script;"""
 
         self.__handler.handleScriptBegin(scriptPathName);
         
-        self.__stopFlag = False
         
+        compiledScript = None
         try:
+            # Parse the script only once (or never, if it is cached) for all the loops;
+            compiledScript = ScriptCache.compileScript(scriptPathName)
             for i in xrange(loopCount):
-                if self.__stopFlag:
+                if self.__stopFlag or (not self.__runPending()):
                     break
                 
                 self.__handler.handleLog("Run script on loop: %d/%d" %(i + 1, loopCount))
-                with open(scriptPathName, 'r') as scriptFile:
-                    while (True):
-                        if self.__stopFlag:
-                            break
-                        
-                        scriptLine = scriptFile.readline()
-                        if len(scriptLine) == 0:
-                            break
-                        self.__transmit(scriptLine, t0AutoGetResponse, tuple())
+                for commandValue in compiledScript:
+                    if self.__stopFlag or (not self.__runPending()):
+                        break
+                    if isinstance(commandValue, ScriptCache.ScriptLineError):
+                        # The invalid line is reported at its place on every loop, and the script goes on;
+                        self.__handler.handleException(commandValue)
+                        continue
+                    try:
+                        self.__transmitValue(commandValue, t0AutoGetResponse, tuple())
+                    except Exception, e:
+                        self.__handler.handleException(e)
         except Exception, e:
             self.__handler.handleException(e)
+        finally:
+            if compiledScript != None:
+                compiledScript.close()
 
         self.__handler.handleScriptEnd(scriptPathName);
-        self.__runScriptThread = None
     
     def runningScript(self):
-        """Return status of script run thread"""
-        return (self.__runScriptThread != None)
+        """Return status of script run action"""
+        return (self.__runScriptFuture != None) and (not self.__runScriptFuture.done())
 
     def stopScript(self):
+        """Stop the script or the apdu items, queued or running;"""
         self.__stopFlag = True
+        for future in (self.__runScriptFuture, self.__transmitAPDUItemsFuture):
+            if future != None:
+                future.cancel()
     
     def runScript(self, scriptPathName, loopCount, t0AutoGetResponse):
-        """Create one thread to run script;"""
-        self.__runScriptThread = threading.Thread(target=self.__runScript, args=(scriptPathName, loopCount, t0AutoGetResponse), name="Run script thread")
-        self.__runScriptThread.start()
+        """Queue the script to run; Return the future of the action;"""
+        self.__stopFlag = False
+        self.__runScriptFuture = self.__submit(self.__runScript, (scriptPathName, loopCount, t0AutoGetResponse), PRIORITY_LOW)
+        return self.__runScriptFuture
     
     def __doMutualAuth(self, scp, scpi, sencKey, smacKey, dekKey):
         
@@ -208,27 +401,26 @@ class pyResManController(object):
             
             if (scp in (1, 2)):
                 if (len(sencKey) != 16) or (len(smacKey) != 16) or (len(dekKey) != 16):
-                    self.__handler.handleLog('The key of SCP01 shall be 16 bytes long.', wx.LOG_Warning)
+                    self.__handler.handleLog('The key of SCP01 shall be 16 bytes long.', LOG_Warning)
                     return
             elif scp == 3:
                 keyLen1 = len(sencKey)
                 keyLen2 = len(smacKey)
                 keyLen3 = len(dekKey)
                 if (keyLen1 not in (16, 24, 32)) or (keyLen2 not in (16, 24, 32)) or (keyLen3 not in (16, 24, 32)):
-                    self.__handler.handleLog('The key of SCP03 shall be (16 or 24 or 32) bytes long.', wx.LOG_Warning)
+                    self.__handler.handleLog('The key of SCP03 shall be (16 or 24 or 32) bytes long.', LOG_Warning)
                     return
             
             kvn = 0
             self.__gpInterface.establishSecurityChannel(sencKey, smacKey, dekKey, kvn, scp, scpi)
-            self.__handler.handleLog('doMutualAuth(): Succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('doMutualAuth(): Succeeded.', LOG_Info)
         except Exception, e:
             self.__handler.handleException(e)
 
         self.__handler.handleActionEnd("do mutual authentication")
     
     def doMutualAuth(self, scp, scpi, sencKey, smacKey, dekKey):
-        self.__doMutualAuthThread = threading.Thread(target=self.__doMutualAuth, args=(scp, scpi, sencKey, smacKey, dekKey), name="Do mutual auth thread")
-        self.__doMutualAuthThread.start()
+        return self.__submit(self.__doMutualAuth, (scp, scpi, sencKey, smacKey, dekKey))
 
     def __readCapFileInfo(self, capFilePath):
         self.__handler.handleActionBegin("read cap file information")
@@ -239,29 +431,27 @@ class pyResManController(object):
             capFileInfo = gp.readExecutableLoadFileParameters(capFilePath)
             
             self.__handler.handleCapFileInfo(capFileInfo)
-            self.__handler.handleLog('readCapFileInfo(): Succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('readCapFileInfo(): Succeeded.', LOG_Info)
         except Exception, e:
             self.__handler.handleException(e)
         self.__handler.handleActionEnd("read cap file information")
     
     def readCapFileInfo(self, capFilePath):
-        self.__readCapFileInfoThread = threading.Thread(target=self.__readCapFileInfo, args=(capFilePath, ), name="Read cap file information thread")
-        self.__readCapFileInfoThread.start()
+        return self.__submit(self.__readCapFileInfo, (capFilePath, ))
 
     def __loadCapFile(self, capFilePath):
         try:
             self.__handler.handleLog('loadCapFile(): Start ...')
             self.__gpInterface.installForLoad(capFilePath)
             self.__gpInterface.load(capFilePath)
-            self.__handler.handleLog('loadCapFile(): Succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('loadCapFile(): Succeeded.', LOG_Info)
         except Exception, e:
             self.__handler.handleException(e)
 
         self.__handler.handleCardContentChanged()
 
     def loadCapFile(self, capFilePath):
-        self.__loadCapFileThread = threading.Thread(target=self.__loadCapFile, args=(capFilePath, ), name="Load cap file thread")
-        self.__loadCapFileThread.start()
+        return self.__submit(self.__loadCapFile, (capFilePath, ))
     
     def __installApplet(self, packageAID, moduleAID, appletAID, privileges, installParameters):
         self.__handler.handleActionBegin("install application")
@@ -269,7 +459,7 @@ class pyResManController(object):
         try:
             self.__handler.handleLog('installApplet(): Start ...')
             self.__gpInterface.installForInstallAndMakeSelectable(packageAID, moduleAID, appletAID, privileges, installParameters)
-            self.__handler.handleLog('installApplet(): Succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('installApplet(): Succeeded.', LOG_Info)
         except Exception, e:
             self.__handler.handleException(e)
 
@@ -277,8 +467,7 @@ class pyResManController(object):
         self.__handler.handleCardContentChanged()
     
     def installApplet(self, packageAID, moduleAID, appletAID, privileges, installParameters):
-        self.__installAppletThread = threading.Thread(target=self.__installApplet, args=(packageAID, moduleAID, appletAID, privileges, installParameters), name="Install applet thread")
-        self.__installAppletThread.start()
+        return self.__submit(self.__installApplet, (packageAID, moduleAID, appletAID, privileges, installParameters))
     
     def __getStatus(self):
         self.__handler.handleActionBegin("get status")
@@ -291,32 +480,31 @@ class pyResManController(object):
             try:
                 status80 = self.__gpInterface.getStatus(0x80)
             except Exception, e:
-                self.__handler.handleLog('GetStatus(0x80): ' + e.message, wx.LOG_Error)
+                self.__handler.handleLog('GetStatus(0x80): ' + e.message, LOG_Error)
                 pass
             try:
                 status40 = self.__gpInterface.getStatus(0x40)
             except Exception, e:
-                self.__handler.handleLog('GetStatus(0x40): ' + e.message, wx.LOG_Error)
+                self.__handler.handleLog('GetStatus(0x40): ' + e.message, LOG_Error)
                 pass
             try:
                 status20 = self.__gpInterface.getStatus(0x20)
             except Exception, e:
-                self.__handler.handleLog('GetStatus(0x20): ' + e.message, wx.LOG_Error)
+                self.__handler.handleLog('GetStatus(0x20): ' + e.message, LOG_Error)
                 pass
             try:
                 status10 = self.__gpInterface.getStatus(0x10)
             except Exception, e:
-                self.__handler.handleLog('GetStatus(0x10): ' + e.message, wx.LOG_Error)
+                self.__handler.handleLog('GetStatus(0x10): ' + e.message, LOG_Error)
                 pass
             self.__handler.handleStatus({ 0x80 : status80, 0x40 : status40, 0x20 : status20, 0x10 : status10})
-            self.__handler.handleLog('getStatus: succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('getStatus: succeeded.', LOG_Info)
         except Exception, e:
             self.__handler.handleException(e)
         self.__handler.handleActionEnd("get status")
     
     def getStatus(self):
-        self.__getStatusThread = threading.Thread(target=self.__getStatus, args=(), name="Get status thread")
-        self.__getStatusThread.start()
+        return self.__submit(self.__getStatus)
         
     def __selectApplication(self, instanceAID):
         self.__handler.handleActionBegin("select application")
@@ -324,15 +512,14 @@ class pyResManController(object):
         try:
             self.__handler.handleLog('selectApplication: Start ...')
             self.__gpInterface.selectApplication(instanceAID)
-            self.__handler.handleLog('selectApplication: succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('selectApplication: succeeded.', LOG_Info)
         except Exception, e:
             self.__handler.handleException(e)
 
         self.__handler.handleActionEnd("select application")
         
     def selectApplication(self, instanceAID):
-        self.__selectApplicationThread = threading.Thread(target=self.__selectApplication, args=(instanceAID, ), name="Select application thread")
-        self.__selectApplicationThread.start()
+        return self.__submit(self.__selectApplication, (instanceAID, ))
     
     def __deleteApplication(self, appAID):
         self.__handler.handleActionBegin("delete application")
@@ -340,7 +527,7 @@ class pyResManController(object):
         try:
             self.__handler.handleLog('deleteApplication: Start ...')
             self.__gpInterface.deleteApplication((appAID, ))
-            self.__handler.handleLog('deleteApplication: succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('deleteApplication: succeeded.', LOG_Info)
         except Exception, e:
             self.__handler.handleException(e)
 
@@ -348,38 +535,42 @@ class pyResManController(object):
         self.__handler.handleCardContentChanged()
 
     def deleteApplication(self, appAID):
-        self.__deleteApplicationThread = threading.Thread(target=self.__deleteApplication, args=(appAID, ), name="Delete application thread")
-        self.__deleteApplicationThread.start()
+        return self.__submit(self.__deleteApplication, (appAID, ))
     
-    def __loadScript(self, scriptPathName):
+    def __loadScript(self, scriptPathName, loadScriptId):
         if not os.path.exists(scriptPathName):
-            self.__handler.handleLog('Script file not exists. %s' %(scriptPathName), wx.LOG_Error)
+            self.__handler.handleLog('Script file not exists. %s' %(scriptPathName), LOG_Error)
             return
         
         self.__handler.handleLoadScriptBegin()
         try:
             self.__handler.handleLog('Load script: %s' %(scriptPathName))
             
-            scriptLines = []
-            with open(scriptPathName, 'r') as scriptFile:
-                scriptLines = scriptFile.readlines()
-            
-            for scriptLine in scriptLines:
-                scriptLine = Util.removespace(scriptLine)
-                if len(scriptLine) > 0 and  Util.ishexstr(scriptLine):
-                    self.__handler.handleLoadScriptItem(scriptLine)
+            # Deliver the items in batches as the file is read, so the first items can be run before the whole file is loaded;
+            for scriptItems in ScriptCache.iterScriptItems(scriptPathName, handleInvalidLine=self.__handleInvalidScriptLine):
+                if loadScriptId != self.__loadScriptId:
+                    # Another script is being loaded;
+                    break
+                self.__handler.handleLoadScriptItems(scriptItems)
             
         except Exception, e:
             self.__handler.handleException(e)
         self.__handler.handleLoadScriptEnd()
 
+    def __handleInvalidScriptLine(self, e):
+        self.__handler.handleLog('Script line skipped. %s' %(e), LOG_Warning)
+
     def loadScript(self, scriptPathName):
-        self.__loadScriptThread = threading.Thread(target=self.__loadScript, args=(scriptPathName, ), name="Load script thread")
-        self.__loadScriptThread.start()
+        """Load the script in a new thread; Loading does not use the reader, so it does not wait for the reader worker;"""
+        self.__loadScriptId += 1
+        loadScriptThread = threading.Thread(target=self.__loadScript, args=(scriptPathName, self.__loadScriptId), name='Load script thread')
+        loadScriptThread.setDaemon(True)
+        loadScriptThread.start()
+        return loadScriptThread
     
     def __loadDebuggerScript(self, scriptPathName):
         if not os.path.exists(scriptPathName):
-            self.__handler.handleLog('Debugger script file not exists. %s' %(scriptPathName), wx.LOG_Error)
+            self.__handler.handleLog('Debugger script file not exists. %s' %(scriptPathName), LOG_Error)
             return
         
         try:
@@ -396,18 +587,16 @@ class pyResManController(object):
             self.__handler.handleException(e)
     
     def loadDebuggerScript(self, scriptPathName):
-        self.__loadDebuggerScriptThread = threading.Thread(target=self.__loadDebuggerScript, args=(scriptPathName, ), name="Load debugger script thread")
-        self.__loadDebuggerScriptThread.start()
+        return self.__submit(self.__loadDebuggerScript, (scriptPathName, ))
     
     def __saveDebuggerScript(self, scriptPathName, commandsInfo):
-        self.__handler.handleLog('Save debugger script ...', wx.LOG_Info)
+        self.__handler.handleLog('Save debugger script ...', LOG_Info)
         scriptFile = DebuggerScriptFile(scriptPathName)
         scriptFile.save(commandsInfo)
-        self.__handler.handleLog('Debugger script is saved to file: %s.' %(scriptPathName), wx.LOG_Info)
+        self.__handler.handleLog('Debugger script is saved to file: %s.' %(scriptPathName), LOG_Info)
 
     def saveDebuggerScript(self, scriptPathName, commandsInfo):
-        self.__saveDebuggerScriptThread = threading.Thread(target=self.__saveDebuggerScript, args=(scriptPathName, commandsInfo), name="Save debugger script thread")
-        self.__saveDebuggerScriptThread.start()
+        return self.__submit(self.__saveDebuggerScript, (scriptPathName, commandsInfo))
     
     def __getKeyTemplateInfo(self):
         self.__handler.handleActionBegin("get key template information")
@@ -416,15 +605,14 @@ class pyResManController(object):
             self.__handler.handleLog('getKeyTemplateInfo: Start ...')
             kits = self.__gpInterface.getKeyInformationTemplates()
             self.__handler.handleKeyInformationTemplates(kits)
-            self.__handler.handleLog('getKeyTemplateInfo: succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('getKeyTemplateInfo: succeeded.', LOG_Info)
         except Exception, e:
             self.__handler.handleException(e)
 
         self.__handler.handleActionEnd("get key template information")
     
     def getKeyTemplateInfo(self):
-        self.__getkeyTemplateInfoThread = threading.Thread(target=self.__getKeyTemplateInfo, args=(), name="Get key template information thread")
-        self.__getkeyTemplateInfoThread.start() 
+        return self.__submit(self.__getKeyTemplateInfo)
             
     def __putKey(self, oldKVN, newKVN, key1, key2, key3):
         self.__handler.handleActionBegin("put key")
@@ -432,7 +620,7 @@ class pyResManController(object):
         try:
             self.__handler.handleLog('putKey: Start ...')
             self.__gpInterface.putSCKey(oldKVN, newKVN, key1, key2, key3)
-            self.__handler.handleLog('putKey: succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('putKey: succeeded.', LOG_Info)
         except Exception, e:
             self.__handler.handleException(e)
         
@@ -440,10 +628,8 @@ class pyResManController(object):
         self.__handler.handleKeyChanged()
 
     def putKey(self, oldKVN, newKVN, key1, key2, key3):
-        if wx.CANCEL == wx.MessageBox('Make sure your new key has been stored well!', caption='Put key', style=wx.ICON_WARNING|wx.OK|wx.CANCEL|wx.CANCEL_DEFAULT):
-            return
-        self.__putKeyThread = threading.Thread(target=self.__putKey, args=(oldKVN, newKVN, key1, key2, key3), name="Put key thread")
-        self.__putKeyThread.start()
+        """Queue put key action; The viewer shall confirm it with the user before;"""
+        return self.__submit(self.__putKey, (oldKVN, newKVN, key1, key2, key3))
     
     def __deleteKey(self, keysInfo):
         self.__handler.handleActionBegin("delete key")
@@ -454,7 +640,7 @@ class pyResManController(object):
             try:
                 self.__handler.handleLog('deleteKey(%02X, %02X): Start ...' %(kvn, keyIndex))
                 self.__gpInterface.deleteKey(kvn, keyIndex)
-                self.__handler.handleLog('deleteKey(%02X, %02X): succeeded.' %(kvn, keyIndex), wx.LOG_Info)
+                self.__handler.handleLog('deleteKey(%02X, %02X): succeeded.' %(kvn, keyIndex), LOG_Info)
             except Exception, e:
                 self.__handler.handleException(e)
 
@@ -462,10 +648,8 @@ class pyResManController(object):
         self.__handler.handleKeyChanged()
 
     def deleteKey(self, keysInfo):
-        if wx.CANCEL == wx.MessageBox('Are you sure to do this operation?', caption='Delete key', style=wx.ICON_WARNING|wx.OK|wx.CANCEL|wx.CANCEL_DEFAULT):
-            return
-        self.__deleteKeyThread = threading.Thread(target=self.__deleteKey, args=(keysInfo, ), name="Delete key thread")
-        self.__deleteKeyThread.start()
+        """Queue delete key action; The viewer shall confirm it with the user before;"""
+        return self.__submit(self.__deleteKey, (keysInfo, ))
     
     def __debuggerCommand(self, commandIndex, commandName, commandValue):
         self.__debuggerRunOneCommand(commandIndex, commandName, commandValue)
@@ -504,6 +688,8 @@ class pyResManController(object):
             rsp = self.__scDebugger.claSelect(commandValue)
         elif commandName == 'RATS':
             rsp = self.__scDebugger.claRATS(commandValue)
+            if rsp[0]:
+                self.__desfireATS = rsp[1]
         elif commandName == 'HLTA':
             rsp = self.__scDebugger.claHLTA(commandValue)
         elif commandName == 'PPS':
@@ -554,6 +740,9 @@ class pyResManController(object):
     def __debuggerCommands(self, commands):
         try:
             for command in commands:
+                if not self.__runPending():
+                    self.__handler.handleLog('Debugger commands stopped.')
+                    return
                 commandIndex = command[0]
                 commandName = command[1]
                 commandValue = command[2]
@@ -563,19 +752,17 @@ class pyResManController(object):
             self.__handler.handleException(str(e))
     
     def debuggerCommand(self, commandIndex, commandName, commandValue):
-        self.__debuggerCommandThread = threading.Thread(target=self.__debuggerCommand, args=(commandIndex, commandName, commandValue), name="Debugger command thread")
-        self.__debuggerCommandThread.start()
+        return self.__submit(self.__debuggerCommand, (commandIndex, commandName, commandValue))
     
     def debuggerCommands(self, commands):
-        self.__debuggerCommandsThread = threading.Thread(target=self.__debuggerCommands, args=(commands, ), name="Debugger commands thread")
-        self.__debuggerCommandsThread.start()
+        self.__debuggerCommandsFuture = self.__submit(self.__debuggerCommands, (commands, ))
+        return self.__debuggerCommandsFuture
     
     def debuggerCommandsStop(self):
-        try:
-            del self.__debuggerCommandsThread
-            self.__debuggerCommandsThread = None
-        except:
-            pass
+        """Stop the debugger commands, queued or running;"""
+        if self.__debuggerCommandsFuture != None:
+            self.__debuggerCommandsFuture.cancel()
+            self.__debuggerCommandsFuture = None
     
     def clearDebuggerVariables(self):
         self.__debuggerVariables.clear()
@@ -584,27 +771,21 @@ class pyResManController(object):
         self.__debuggerVariables[name] = value
     
     def __mifareSelectCard(self):
-        # Select the card;
-        self.__scDebugger.rfOn()
-        self.__scDebugger.rfManaul()
-        self.__scDebugger.claWUPA2(chr(0x52))
-        error, uid = self.__scDebugger.claAnticollision2(chr(0x93), chr(0x20))
-        error, data = self.__scDebugger.claSelect2(chr(0x93), chr(0x70), uid)
-        return error, uid
+        # Select the card, unless it is still selected;
+        return self.__scDebugger.selectCard()
+
+    def __mifareSessionLost(self, error):
+        # A LibSC command failed, the card is no longer selected;
+        session = self.__scDebugger.getSession()
+        session.handleError(error)
+        session.cardLost()
 
     def __mifareSetup(self):
-        self.__scDebugger.rfOn()
-        self.__scDebugger.rfManaul()
-        self.__scDebugger.claWUPA2(chr(0x52))
-        error, data = self.__scDebugger.claAnticollision2(chr(0x93), chr(0x20))
+        error, data, sak = self.__scDebugger.selectCard()
         if not error:
-            self.__handler.handleException(Exception(data))
+            self.__handler.handleException(Exception(DebuggerUtils.getErrorString(ord(data))))
             return
         uid = data
-        error, data = self.__scDebugger.claSelect2(chr(0x93), chr(0x70), uid)
-        if not error:
-            self.__handler.handleException(Exception(data))
-            return
         self.__scDebugger.claHLTA2()
         error = self.__libsc.M1_setup()
         if error != 0:
@@ -612,106 +793,222 @@ class pyResManController(object):
             return
         return error, uid
         
-    def __mifareDumpCard(self, key_a):
-        # Read card data;
-        result = True
-        need_select = True
-        for block_index in range(64):
-            self.__handler.handleLog('Read block data, block: %d.' %(block_index))
-            if need_select:
-                # Select the card;
-                try:
-                    error, uid = self.__mifareSelectCard()
-                    if not error:
-                        self.__handler.handleException(Exception('Select card failed, %s' %(DebuggerUtils.getErrorString(error))))
-                        return
-                    else:
-                        self.__handler.handleLog('Card selected: %s' %(''.join('%02X' %(ord(b)) for b in uid)), wx.LOG_Info)
-                        need_select = False
-                except Exception, e:
-                    self.__handler.handleException(e)
-                    continue
-
-            error = self.__libsc.M1_authentication(block_index, 0, key_a, uid)
-            if error == 0x00:
-                error, data = self.__libsc.M1_read_block(block_index)
-                if error == 0x00:
-                    self.__handler.handleMifareResponse(2, error, (block_index, data))
-                    need_select = False
-                else:
-                    self.__handler.handleException(Exception('Authenticate failed, %s' %(DebuggerUtils.getErrorString(error))))
-                    result = False
-                    need_select = True
-            else:
-                self.__handler.handleException(Exception('Authenticate failed, %s' %(DebuggerUtils.getErrorString(error))))
-                result = False
-                need_select = True
-        if result:
-            self.__handler.handleLog('Dump card data succeeded.', wx.LOG_Info)
-    
-    def __mifareCloneCard(self, card_data, key_a):
-        # Prepare;
+    def __getMifareKeyCache(self):
+        if self.__mifareKeyCache == None:
+            self.__mifareKeyCache = MifareKeyCache(_pathName(self.__mifareKeyCachePathName, mifareKeysModule, 'DEFAULT_KEY_CACHE_PATH_NAME'))
+        return self.__mifareKeyCache
+    
+    def __saveMifareKeyCache(self):
+        try:
+            self.__getMifareKeyCache().save()
+        except Exception, e:
+            self.__handler.handleLog('Save Mifare key cache failed: %s' %(e), LOG_Warning)
+    
+    def __mifareKeySearch(self, key=None):
+        """Return the MifareKeySearch of the key (tried first) and the configured keys;"""
+        keys = self.__mifareKeys
+        if keys == None:
+            keys = mifareKeysModule.DEFAULT_KEYS
+        return MifareKeySearch(keys, self.__getMifareKeyCache(), key)
+    
+    def __getMifareImageStore(self):
+        if (self.__mifareImageStore == None) and (self.__mifareImageStorePathName != None):
+            self.__mifareImageStore = MifareImageStore(_pathName(self.__mifareImageStorePathName, mifareImageStoreModule, 'DEFAULT_IMAGE_STORE_PATH_NAME'))
+        return self.__mifareImageStore
+    
+    def __storeMifareImage(self, layout, image):
+        """Append the dumped card image to the image store, with the keys which opened its sectors;"""
+        try:
+            store = self.__getMifareImageStore()
+            if store == None:
+                return
+            uid = imageUID(layout, image)
+            cache = self.__getMifareKeyCache()
+            keys = []
+            if layout.needsAuthentication():
+                for sector in range(layout.sectorCount):
+                    found = cache.getKey(uid, sector)
+                    if found != None:
+                        keys.append((sector, found[0], found[1]))
+            number = store.append(layout, image, uid, keys)
+            self.__handler.handleLog('Card image stored: %d.' %(number), LOG_Info)
+        except Exception, e:
+            self.__handler.handleLog('Store Mifare card image failed: %s' %(e), LOG_Warning)
+    
+    def __mifareBulkEngine(self, handler=None):
+        """Return the MifareBulkEngine of the reader, None if the reader does not support the bulk commands;"""
+        readername = self.__readername
+        if (not self.__mifareBulkEnabled) or (readername == None) or (readername.find('R502 SPY') == -1):
+            return None
+        engine = MifareBulkEngine(self.__scDebugger, handler if handler != None else self.__handler, self.__gpInterface.getTransmitCount)
+        supported = self.__mifareBulkSupport.get(readername)
+        if supported == None:
+            supported = engine.isSupported()
+            self.__mifareBulkSupport[readername] = supported
+            if not supported:
+                self.__handler.handleLog('The reader does not support the bulk Mifare commands.', LOG_Info)
+        return engine if supported else None
+    
+    def __mifareBulkDumpCard(self, key_a, handler):
+        """Dump the card with the bulk commands, and the sectors the reader can not read block by block;
+        Return the MifareStatistics, None if the card is not dumped;"""
+        bulkEngine = self.__mifareBulkEngine(handler)
+        if bulkEngine == None:
+            return None
+        result = bulkEngine.dump(key_a)
+        if result == None:
+            return None
+        statistics, failedSectors = result
+        if len(failedSectors) > 0:
+            # The reader tried key_a only, try the other keys on the failed sectors;
+            layout = bulkEngine.getLayout()
+            failedBlocks = [block_number for sector in failedSectors for block_number in layout.sectorBlocks(sector)]
+            engine = MifareDumpEngine(self.__libsc, self.__mifareSelectCard, handler, self.__gpInterface.getTransmitCount, self.__mifareKeySearch(key_a), self.__mifareSessionLost)
+            sectorStatistics = engine.dump(key_a, 0, layout, failedBlocks)
+            statistics.blocksRead += sectorStatistics.blocksRead
+            statistics.blocksFailed = sectorStatistics.blocksFailed
+            statistics.selections += sectorStatistics.selections
+            statistics.authentications += sectorStatistics.authentications
+            statistics.roundTrips += sectorStatistics.roundTrips
+            statistics.wallTime += sectorStatistics.wallTime
+        return statistics
+    
+    def __mifareDumpCard(self, key_a, layout):
+        # The blocks read are kept for the image store;
+        recorder = MifareImageRecorder(self.__handler)
         try:
-            self.__mifareSetup()
+            statistics = None
+            if layout == None:
+                statistics = self.__mifareBulkDumpCard(key_a, recorder)
+            if statistics == None:
+                # Read card data, one authentication per sector;
+                engine = MifareDumpEngine(self.__libsc, self.__mifareSelectCard, recorder, self.__gpInterface.getTransmitCount, self.__mifareKeySearch(key_a), self.__mifareSessionLost)
+                statistics = engine.dump(key_a, 0, layout)
+            self.__saveMifareKeyCache()
         except Exception, e:
             self.__handler.handleException(e)
             return
-
-        # Write data to the card;
-        for row_index in range(0, len(card_data)):
-            block_data = card_data[row_index]
-            if row_index in (3, 7, 11, 15, 19, 23, 27, 31, 35, 39, 43, 47, 51, 55, 59, 63):
-                block_data = key_a + block_data[6:]
-            error = self.__libsc.M1_write_block(row_index, block_data)
-            if error != 0:
-                self.__handler.handleException(Exception(DebuggerUtils.getErrorString(error)))
-            else:
-                self.__handler.handleMifareResponse(1, error, row_index)
+        self.__mifareStatistics = statistics
+        self.__handler.handleLog('Dump card data: %s.' %(statistics), LOG_Info)
+        if statistics.blocksFailed == 0:
+            self.__handler.handleLog('Dump card data succeeded.', LOG_Info)
+        if recorder.isComplete():
+            self.__storeMifareImage(recorder.layout, recorder.image)
+    
+    def __mifareCloneBlocks(self, blocks, key_a, layout, differential, keySearch):
+        """Write the block data list to the card; Return the MifareCloneStatistics;"""
+        if not differential:
+            # The reader writes the whole card;
+            bulkEngine = self.__mifareBulkEngine()
+            if bulkEngine != None:
+                result = bulkEngine.clone(blocks, key_a, layout)
+                if result != None:
+                    return result[0]
+        engine = MifareCloneEngine(self.__libsc, self.__mifareSelectCard, self.__mifareSetup, self.__handler,
+                                   self.__gpInterface.getTransmitCount, keySearch, self.__mifareSessionLost)
+        return engine.clone(blocks, key_a, layout, differential)
+    
+    def __mifareCardImage(self, card_data):
+        """Return the layout and the block data list of the card data;"""
+        image = ''.join(card_data)
+        layout = MifareLayout.layoutForImageSize(len(image))
+        if layout == None:
+            raise Exception('Invalid card data size: %d.' %(len(image)))
+        return layout, layout.splitImage(image)
+    
+    def __mifareCloneCard(self, card_data, key_a, differential):
+        try:
+            layout, blocks = self.__mifareCardImage(card_data)
+            # Write data to the card;
+            statistics = self.__mifareCloneBlocks(blocks, key_a, layout, differential, self.__mifareKeySearch(key_a))
+            self.__saveMifareKeyCache()
+        except Exception, e:
+            self.__handler.handleException(e)
+            return
+        self.__handler.handleLog('Clone card data: %s.' %(statistics), LOG_Info)
+    
+    def __mifareRunProduction(self, loop, card_data, key_a, differential):
+        # Everything but the card is prepared once for the run;
+        try:
+            layout, blocks = self.__mifareCardImage(card_data)
+        except Exception, e:
+            self.__handler.handleException(e)
+            return
+        keySearch = self.__mifareKeySearch(key_a)
+        
+        def cloneCard(uid, sak):
+            cardLayout = MifareLayout.layoutForSAK(sak)
+            if (cardLayout != None) and (cardLayout != layout):
+                return False, 'the card is a %s' %(cardLayout.name)
+            statistics = self.__mifareCloneBlocks(blocks, key_a, layout, differential, keySearch)
+            # Halt the card, so it is found again by the next poll until it leaves the field;
+            self.__scDebugger.claHLTA2()
+            return (statistics.blocksFailed == 0) and (statistics.verifyFailed == 0), str(statistics)
+        
+        try:
+            loop.run(self.__scDebugger.pollCard, cloneCard)
+        except Exception, e:
+            self.__handler.handleException(e)
+        finally:
+            self.__saveMifareKeyCache()
+    
+    def __mifareReadCardData(self):
+        # Read the card data of the last dump from the reader;
+        try:
+            bulkEngine = self.__mifareBulkEngine()
+            if bulkEngine == None:
+                raise Exception('The reader does not support reading the card data.')
+            image = bulkEngine.readCardData()
+            layout = MifareLayout.layoutForImageSize(len(image))
+            if layout == None:
+                raise Exception('Invalid card data size: %d.' %(len(image)))
+            self.__handler.handleMifareResponse(mifareEngineModule.MIFARE_ACTION_LAYOUT, 0, layout)
+            for block_number, block_data in enumerate(layout.splitImage(image)):
+                self.__handler.handleMifareResponse(mifareEngineModule.MIFARE_ACTION_READ, 0, (block_number, block_data))
+        except Exception, e:
+            self.__handler.handleException(e)
     
     def __mifareReadSaveData(self, data, file_path_name):
         with open(file_path_name, 'wb') as f:
             f.write(data)
-            self.__handler.handleLog('Mifare card data saved.', wx.LOG_Info)
+            self.__handler.handleLog('Mifare card data saved.', LOG_Info)
     
     def __mifareFixBrickedUID(self):
         try:
-            self.__mifareSetup()
+            if self.__mifareSetup() == None:
+                # The error is reported;
+                return
             error = self.__libsc.M1_write_block(0, '\x01\x02\x03\x04\x04\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00')
             if error != 0:
                 self.__handler.handleException(Exception(DebuggerUtils.getErrorString(error)))
             else:
-                self.__handler.handleLog('Mifare card bricked UID is fixed.', wx.LOG_Info)
+                self.__handler.handleLog('Mifare card bricked UID is fixed.', LOG_Info)
         except Exception, e:
             self.__handler.handleException(e)
             return
     
     def __mifareChangeUID(self, new_uid):
         # Read data of block 0;
+        blocksData = {}
         try:
-            error, data = self.__mifareSelectCard()
-            if not error:
-                self.__handler.handleException(Exception('Select card failed, %s' %(DebuggerUtils.getErrorString(error))))
-                return
+            engine = MifareDumpEngine(self.__libsc, self.__mifareSelectCard, self.__handler, keySearch=self.__mifareKeySearch(), sessionLost=self.__mifareSessionLost)
+            engine.dump(None, 0, None, (0, ), blocksData.__setitem__)
+            self.__saveMifareKeyCache()
         except Exception, e:
             self.__handler.handleException(e)
             return
         
-        uid = data
-        self.__handler.handleLog('Card selected: %s' %(''.join('%02X' %(ord(b)) for b in uid)), wx.LOG_Info)
-        error = self.__scDebugger.mifareAuthentication2(0, 0, '\xFF\xFF\xFF\xFF\xFF\xFF', uid)
-        if not error:
-            self.__handler.handleException(Exception('Authenticate failed, %s' %(DebuggerUtils.getErrorString(error))))
-            return
-        
-        error, data = self.__libsc.M1_read_block(0)
-        if error != 0:
-            self.__handler.handleException(Exception(DebuggerUtils.getErrorString(error)))
+        block_data = blocksData.get(0)
+        if block_data == None:
+            self.__handler.handleException(Exception('Read block 0 failed, no key opens sector 0.'))
             return
-        block_data = data
+        uid = block_data[0 : 4]
         
         # Write data to block 0;
         try:
-            self.__mifareSetup()
+            if self.__mifareSetup() == None:
+                # The error is reported;
+                return
         except Exception, e:
             self.__handler.handleException(e)
             return
@@ -724,361 +1021,499 @@ class pyResManController(object):
         if error != 0:
             self.__handler.handleException(Exception(DebuggerUtils.getErrorString(error)))
         else:
-            self.__handler.handleLog('Mifare card UID changed, from: %s, to: %s.' %(''.join('%02X' %(ord(b)) for b in uid), ''.join('%02X' %(ord(b)) for b in new_uid)), wx.LOG_Info)
+            self.__handler.handleLog('Mifare card UID changed, from: %s, to: %s.' %(''.join('%02X' %(ord(b)) for b in uid), ''.join('%02X' %(ord(b)) for b in new_uid)), LOG_Info)
     
     def __desfireSendCommand(self, cmd):
         error, resp  = self.__libsc.DESFire_send_command(cmd)
         if error != 0:
-            self.__handler.handleLog(DebuggerUtils.getErrorString(error), wx.LOG_Error)
+            self.__handler.handleLog(DebuggerUtils.getErrorString(error), LOG_Error)
         else:
             self.__handler.handleLog(''.join('%02X' %(ord(c)) for c in resp))
         
-    def mifareDumpCard(self, key_a):
-        self.__mifareCommandThread = threading.Thread(target=self.__mifareDumpCard, args=(key_a, ))
-        self.__mifareCommandThread.start()
-    
-    def mifareCloneCard(self, card_data, key_a):
-        self.__mifareCommandThread = threading.Thread(target=self.__mifareCloneCard, args=(card_data, key_a, ))
-        self.__mifareCommandThread.start()
+    def mifareDumpCard(self, key_a, layout=None):
+        """Dump the card; layout is a MifareLayout, or None to detect it from the SAK;"""
+        return self.__submit(self.__mifareDumpCard, (key_a, layout, ))
+    
+    def setMifareKeys(self, keys):
+        """Set the keys tried on the Mifare sectors, after the key given to the operation;"""
+        self.__mifareKeys = list(keys)
+    
+    def setMifareKeyCachePathName(self, pathName):
+        """Set the file of the Mifare key cache, None to keep the keys in memory only;"""
+        self.__mifareKeyCachePathName = pathName
+        self.__mifareKeyCache = None
+    
+    def getMifareKeyCache(self):
+        return self.__getMifareKeyCache()
+    
+    def setMifareImageStorePathName(self, pathName):
+        """Set the file of the Mifare card image store, None to not store the dumped images;"""
+        if self.__mifareImageStore != None:
+            self.__mifareImageStore.close()
+        self.__mifareImageStorePathName = pathName
+        self.__mifareImageStore = None
+    
+    def getMifareImageStore(self):
+        """Return the MifareImageStore, None if the image store is disabled;"""
+        return self.__getMifareImageStore()
+    
+    def setMifareBulkEnabled(self, enabled):
+        """Enable or disable the bulk Mifare commands of the R502 SPY reader for dump and clone;"""
+        self.__mifareBulkEnabled = enabled
+    
+    def getMifareStatistics(self):
+        """Return the MifareStatistics of the last Mifare dump, None if there is none;"""
+        return self.__mifareStatistics
+    
+    def mifareCloneCard(self, card_data, key_a, differential=False):
+        """Write the card data; In differential mode only the blocks which differ from the card are written and verified;"""
+        return self.__submit(self.__mifareCloneCard, (card_data, key_a, differential, ))
+    
+    def mifareProductionStart(self, card_data, key_a, differential=False, interval=None, count=0, rejectDuplicates=True):
+        """Clone the card data to every new card put on the reader, until mifareProductionStop() is called or count cards are done;
+        interval is the seconds between two polls, None for DEFAULT_POLL_INTERVAL; Return the future of the action;"""
+        if interval == None:
+            interval = mifareProductionModule.DEFAULT_POLL_INTERVAL
+        loop = MifareProductionLoop(self.__handler, interval, count, rejectDuplicates)
+        self.__mifareProductionLoop = loop
+        return self.__submit(self.__mifareRunProduction, (loop, card_data, key_a, differential, ), PRIORITY_LOW)
+    
+    def mifareProductionStop(self):
+        if self.__mifareProductionLoop != None:
+            self.__mifareProductionLoop.stop()
+    
+    def getMifareProductionStatistics(self):
+        """Return the MifareProductionStatistics of the current or last production run, None if there is none;"""
+        if self.__mifareProductionLoop == None:
+            return None
+        return self.__mifareProductionLoop.statistics
     
     def mifareReadCardData(self):
-        self.__mifareCommandThread = threading.Thread(target=self.__mifareReadCardData)
-        self.__mifareCommandThread.start()
+        return self.__submit(self.__mifareReadCardData)
     
     def mifareSaveData(self, card_data, file_path_name):
-        self.__mifareCommandThread = threading.Thread(target=self.__mifareReadSaveData, args = (card_data, file_path_name, ))
-        self.__mifareCommandThread.start()
+        return self.__submit(self.__mifareReadSaveData, (card_data, file_path_name, ))
     
     def mifareFixBrickedUID(self):
-        self.__mifareCommandThread = threading.Thread(target=self.__mifareFixBrickedUID)
-        self.__mifareCommandThread.start()
+        return self.__submit(self.__mifareFixBrickedUID)
     
     def mifareChangeUID(self, uid):
-        self.__mifareCommandThread = threading.Thread(target=self.__mifareChangeUID, args=(uid, ))
-        self.__mifareCommandThread.start()
+        return self.__submit(self.__mifareChangeUID, (uid, ))
     
-    def __desfireAuthenticate(self, key):
+    def __desfireAuthenticate(self, key, command, key_no):
         try:
-            self.__desfire.authenticate(0, key)
-            self.__handler.handleLog('DESFire authenticated.', wx.LOG_Info)
+            if command == DESFireCommands.AUTHENTICATE_AES:
+                self.__desfire.authenticate_aes(key_no, key)
+            elif command == DESFireCommands.AUTHENTICATE_ISO:
+                self.__desfire.authenticate_iso(key_no, key)
+            else:
+                self.__desfire.authenticate(key_no, key)
+            self.__handler.handleLog('DESFire authenticated.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog(str(e), wx.LOG_Error)
+            self.__handler.handleLog(str(e), LOG_Error)
     
-    def desfireAuthenticate(self, key):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireAuthenticate, args=(key, ))
-        self.__desfireCommandThread.start()
+    def desfireAuthenticate(self, key, command=DESFireCommands.AUTHENTICATE, key_no=0):
+        """Authenticate with the key; command is AUTHENTICATE (legacy DES), AUTHENTICATE_ISO (2K3DES or 3K3DES) or
+        AUTHENTICATE_AES; After an ISO or AES authentication the commands are CMACed and the data files are read and
+        written in their communication mode;"""
+        return self.__submit(self.__desfireAuthenticate, (key, command, key_no, ))
 
     def __desfireGetVersion(self):
         version_info = self.__desfire.get_version()
-        self.__handler.handleDESFireResponse(DESFireEx.GET_VERSION, version_info)
+        self.__handler.handleDESFireResponse(DESFireCommands.GET_VERSION, version_info)
     
     def desfireGetVersion(self):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireGetVersion)
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireGetVersion)
 
     def __desfireFormatPICC(self):
         try:
             self.__desfire.format()
-            self.__handler.handleLog('DESFire format PICC succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire format PICC succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire format PICC, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire format PICC, exception: %s' %(e), LOG_Error)
         
     def desfireFormatPICC(self):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireFormatPICC)
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireFormatPICC)
     
     def __desfireGetApplicationIDs(self):
         try:
             app_ids = self.__desfire.get_applications()
-            self.__handler.handleDESFireResponse(DESFireEx.GET_APPLICATION_IDS, app_ids)
-            self.__handler.handleLog('DESFire get application ids succeeded.', wx.LOG_Info)
+            self.__handler.handleDESFireResponse(DESFireCommands.GET_APPLICATION_IDS, app_ids)
+            self.__handler.handleLog('DESFire get application ids succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire get application ids, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire get application ids, exception: %s' %(e), LOG_Error)
 
     def desfireGetApplicationIDs(self):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireGetApplicationIDs)
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireGetApplicationIDs)
     
     def __desfireDeleteApplication(self, app_id):
         try:
             self.__desfire.delete_application(app_id)
-            self.__handler.handleLog('DESFire delete application succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire delete application succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire delete application, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire delete application, exception: %s' %(e), LOG_Error)
         # Refresh application list;
         self.__desfireGetApplicationIDs()
 
     def desfireDeleteApplication(self, app_id):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireDeleteApplication, args=(app_id, ))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireDeleteApplication, (app_id, ))
     
     def __desfireSelectApplication(self, app_id):
         try:
             self.__desfire.select_application(app_id)
-            self.__handler.handleLog('DESFire select application: %06X selected.' %(app_id), wx.LOG_Info)
+            self.__handler.handleLog('DESFire select application: %06X selected.' %(app_id), LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire select application, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire select application, exception: %s' %(e), LOG_Error)
 
     def desfireSelectApplication(self, app_id):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireSelectApplication, args=(app_id, ))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireSelectApplication, (app_id, ))
     
     def __desfireCreateApplication(self, aid, key_settings, num_of_keys):
         try:
             self.__desfire.create_application(aid, key_settings, num_of_keys)
-            self.__handler.handleLog('DESFire create application succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire create application succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire create application, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire create application, exception: %s' %(e), LOG_Error)
         # Refresh application list;
         self.__desfireGetApplicationIDs()
 
     def desfireCreateApplication(self, aid, key_settings, num_of_keys):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireCreateApplication, args=(aid, key_settings, num_of_keys))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireCreateApplication, (aid, key_settings, num_of_keys))
     
     def __desfireGetFileIDs(self):
         try:
             file_ids = self.__desfire.get_file_ids()
-            self.__handler.handleDESFireResponse(DESFireEx.GET_FILE_IDS, file_ids)
-            self.__handler.handleLog('DESFire get file ids succeeded.', wx.LOG_Info)
+            self.__handler.handleDESFireResponse(DESFireCommands.GET_FILE_IDS, file_ids)
+            self.__handler.handleLog('DESFire get file ids succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire get file ids, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire get file ids, exception: %s' %(e), LOG_Error)
 
     def desfireGetFileIDs(self):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireGetFileIDs)
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireGetFileIDs)
     
     def __desfireCreateStdDataFile(self, file_no, com_set, access_rights, file_size):
         try:
             self.__desfire.create_std_data_file(file_no, com_set, access_rights, file_size)
-            self.__handler.handleLog('DESFire create std data file succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire create std data file succeeded.', LOG_Info)
             self.__desfireGetFileIDs()
         except Exception, e:
-            self.__handler.handleLog('DESFire create std data file, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire create std data file, exception: %s' %(e), LOG_Error)
         
     def desfireCreateStdDataFile(self, file_no, com_set, access_rights, file_size):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireCreateStdDataFile, args=(file_no, com_set, access_rights, file_size))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireCreateStdDataFile, (file_no, com_set, access_rights, file_size))
     
     def __desfireCreateBackupDataFile(self, file_no, com_set, access_rights, file_size):
         try:
             self.__desfire.create_backup_data_file(file_no, com_set, access_rights, file_size)
-            self.__handler.handleLog('DESFire create backup data file succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire create backup data file succeeded.', LOG_Info)
             self.__desfireGetFileIDs()
         except Exception, e:
-            self.__handler.handleLog('DESFire create backup data file, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire create backup data file, exception: %s' %(e), LOG_Error)
     
     def desfireCreateBackupDataFile(self, file_no, com_set, access_rights, file_size):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireCreateBackupDataFile, args=(file_no, com_set, access_rights, file_size))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireCreateBackupDataFile, (file_no, com_set, access_rights, file_size))
     
     def __desfireCreateValueFile(self, file_no, com_set, access_rights, lower_limit, upper_limit, value, limit_debit_enabled):
         try:
             self.__desfire.create_value_file(file_no, com_set, access_rights, lower_limit, upper_limit, value, limit_debit_enabled)
-            self.__handler.handleLog('DESFire create value file succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire create value file succeeded.', LOG_Info)
             self.__desfireGetFileIDs()
         except Exception, e:
-            self.__handler.handleLog('DESFire create value file, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire create value file, exception: %s' %(e), LOG_Error)
     
     def desfireCreateValueFile(self, file_no, com_set, access_rights, lower_limit, upper_limit, value, limit_debit_enabled):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireCreateValueFile, args=(file_no, com_set, access_rights, lower_limit, upper_limit, value, limit_debit_enabled))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireCreateValueFile, (file_no, com_set, access_rights, lower_limit, upper_limit, value, limit_debit_enabled))
 
     def __desfireCreateLinearRecordFile(self, file_no, com_set, access_rights, record_size, max_num_of_records):
         try:
             self.__desfire.create_linear_record_file(file_no, com_set, access_rights, record_size, max_num_of_records)
-            self.__handler.handleLog('DESFire create linear record file succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire create linear record file succeeded.', LOG_Info)
             self.__desfireGetFileIDs()
         except Exception, e:
-            self.__handler.handleLog('DESFire create linear record file, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire create linear record file, exception: %s' %(e), LOG_Error)
     
     def desfireCreateLinearRecordFile(self, file_no, com_set, access_rights, record_size, max_num_of_records):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireCreateLinearRecordFile, args=(file_no, com_set, access_rights, record_size, max_num_of_records))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireCreateLinearRecordFile, (file_no, com_set, access_rights, record_size, max_num_of_records))
     
     def __desfireCreateCyclicRecordFile(self, file_no, com_set, access_rights, record_size, max_num_of_records):
         try:
             self.__desfire.create_cyclic_record_file(file_no, com_set, access_rights, record_size, max_num_of_records)
-            self.__handler.handleLog('DESFire create cyclic record file succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire create cyclic record file succeeded.', LOG_Info)
             self.__desfireGetFileIDs()
         except Exception, e:
-            self.__handler.handleLog('DESFire create cyclic record file, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire create cyclic record file, exception: %s' %(e), LOG_Error)
     
     def desfireCreateCyclicRecordFile(self, file_no, com_set, access_rights, record_size, max_num_of_records):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireCreateCyclicRecordFile, args=(file_no, com_set, access_rights, record_size, max_num_of_records))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireCreateCyclicRecordFile, (file_no, com_set, access_rights, record_size, max_num_of_records))
     
     def __desfireDeleteFile(self, file_no):
         try:
             self.__desfire.delete_file(file_no)
-            self.__handler.handleLog('DESFire delete file succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire delete file succeeded.', LOG_Info)
             self.__desfireGetFileIDs()
         except Exception, e:
-            self.__handler.handleLog('DESFire delete file, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire delete file, exception: %s' %(e), LOG_Error)
     
     def desfireDeleteFile(self, file_no):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireDeleteFile, args=(file_no, ))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireDeleteFile, (file_no, ))
     
     def __desfireGetFileSettings(self, file_no):
         try:
             file_settings = self.__desfire.get_file_settings(file_no)
             file_settings.update({ 'file_no': file_no })
             self.__handler.handleDESFireResponse(GET_FILE_SETTINGS, file_settings)
-            self.__handler.handleLog('DESFire get file settings succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire get file settings succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire get file settings, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire get file settings, exception: %s' %(e), LOG_Error)
     
     def desfireGetFileSettings(self, file_no):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireGetFileSettings, args=(file_no, ))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireGetFileSettings, (file_no, ))
 
     def __desfireChangeKey(self, key, new_key):
         try:
             self.__desfire.change_key(0, 0, key, new_key)
-            self.__handler.handleLog('DESFire change key succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire change key succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire change key, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire change key, exception: %s' %(e), LOG_Error)
         
     def desfireChangeKey(self, key, new_key):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireChangeKey, args=(key, new_key, ))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireChangeKey, (key, new_key, ))
 
     def __desfireGetKeySettings(self):
         try:
             key_settings, max_num_of_keys = self.__desfire.get_key_settings()
             self.__handler.handleDESFireResponse(GET_KEY_SETTINGS, (key_settings, max_num_of_keys))
-            self.__handler.handleLog('DESFire change key succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire change key succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire change key, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire change key, exception: %s' %(e), LOG_Error)
         
     def desfireGetKeySettings(self):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireGetKeySettings)
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireGetKeySettings)
     
     def __desfireGetValue(self, file_id):
         try:
             value = self.__desfire.get_value(file_id)
             self.__handler.handleDESFireResponse(GET_VALUE, (file_id, value))
-            self.__handler.handleLog('DESFire get value succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire get value succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire get value, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire get value, exception: %s' %(e), LOG_Error)
     
     def desfireGetValue(self, file_id):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireGetValue, args=(file_id, ))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireGetValue, (file_id, ))
         
     def __desfireClearRecordFile(self, file_id):
         try:
             self.__desfire.clear_record_file(file_id)
-            self.__handler.handleLog('DESFire clear record file succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire clear record file succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire clear record file, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire clear record file, exception: %s' %(e), LOG_Error)
     
     def desfireClearRecordFile(self, file_id):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireClearRecordFile, args=(file_id, ))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireClearRecordFile, (file_id, ))
         
     def __desfireCommitTransaction(self):
         try:
             self.__desfire.commit_transaction()
-            self.__handler.handleLog('DESFire commit transaction succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire commit transaction succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire commit transaction, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire commit transaction, exception: %s' %(e), LOG_Error)
     
     def desfireCommitTransaction(self):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireCommitTransaction)
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireCommitTransaction)
     
     def __desfireAbortTransaction(self):
         try:
             self.__desfire.abort_transaction()
-            self.__handler.handleLog('DESFire abort transaction succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire abort transaction succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire abort transaction, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire abort transaction, exception: %s' %(e), LOG_Error)
     
     def desfireAbortTransaction(self):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireAbortTransaction)
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireAbortTransaction)
 
-    def __desfireReadData(self, file_id, offset, length):
+    def __desfireReadData(self, file_id, offset, length, pathName):
         try:
-            data = self.__desfire.read_data(file_id, offset, length)
-            self.__handler.handleDESFireResponse(READ_DATA, data)
-            self.__handler.handleLog('DESFire read data succeeded.', wx.LOG_Info)
+            if pathName == None:
+                f = io.BytesIO()
+                statistics = self.__desfire.read_data_to_file(file_id, offset, length, f)
+                self.__handler.handleDESFireResponse(READ_DATA, list(bytearray(f.getvalue())))
+            else:
+                # The data is written to the file while it is read;
+                with open(pathName, 'wb') as f:
+                    statistics = self.__desfire.read_data_to_file(file_id, offset, length, f)
+            self.__handler.handleLog('DESFire read data succeeded: %s.' %(statistics), LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire read data, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire read data, exception: %s' %(e), LOG_Error)
     
     def desfireReadData(self, file_id, offset, length):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireReadData, args=(file_id, offset, length))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireReadData, (file_id, offset, length, None))
+    
+    def desfireReadDataToFile(self, file_id, offset, length, pathName):
+        """Read the data file to the file pathName, without keeping the whole data in memory;"""
+        return self.__submit(self.__desfireReadData, (file_id, offset, length, pathName))
+    
+    def __desfireReadDataInto(self, file_id, offset, length, buffer, buffer_offset, on_frame):
+        try:
+            statistics = self.__desfire.read_data_into(file_id, offset, length, buffer, buffer_offset, on_frame)
+        except Exception, e:
+            self.__handler.handleLog('DESFire read data, exception: %s' %(e), LOG_Error)
+            return None
+        self.__handler.handleLog('DESFire read data succeeded: %s.' %(statistics), LOG_Info)
+        return statistics
+    
+    def desfireReadDataInto(self, file_id, offset, length, buffer, buffer_offset=0, on_frame=None):
+        """Read the data file into the bytearray buffer from buffer_offset; on_frame(statistics) is called by the worker after each frame;
+        The result of the future is the TransferStatistics of the read, None if it failed;"""
+        return self.__submit(self.__desfireReadDataInto, (file_id, offset, length, buffer, buffer_offset, on_frame))
+    
+    def __getDESFireCalibration(self):
+        if self.__desfireCalibration == None:
+            self.__desfireCalibration = DESFireFrameCalibration(_pathName(self.__desfireCalibrationPathName, desfireFramesModule, 'DEFAULT_CALIBRATION_PATH_NAME'))
+        return self.__desfireCalibration
+    
+    def __desfireFrameData(self):
+        """Return the native data per frame: from the FSC of the card if its ATS is known, limited by the calibration of the reader;"""
+        frameData = desfireFramesModule.DEFAULT_FRAME_DATA
+        if self.__desfireATS != None:
+            frameData = frameDataFromFSC(fscFromATS(self.__desfireATS))
+        readerFrameData = self.__getDESFireCalibration().getFrameData(self.__readername)
+        if readerFrameData != None:
+            frameData = min(frameData, readerFrameData)
+        return frameData
+    
+    def __desfireCalibrateFrameSize(self):
+        try:
+            # Read the FSC of the card, then measure the frames which reach the card through the reader;
+            ok, ats = self.__scDebugger.activateCard()
+            if not ok:
+                raise Exception('Activate the card failed: %s.' %(DebuggerUtils.getErrorString(ord(ats))))
+            self.__desfireATS = ats
+            self.__desfire.card_activated()
+            frameData = probeFrameData(self.__r502_device.transmit)
+            if frameData < desfireFramesModule.MIN_FRAME_DATA:
+                raise Exception('No probe frame reached the card.')
+            calibration = self.__getDESFireCalibration()
+            calibration.putFrameData(self.__readername, frameData)
+            calibration.save()
+        except Exception, e:
+            self.__handler.handleLog('DESFire frame calibration, exception: %s' %(e), LOG_Error)
+            return None
+        self.__handler.handleLog('DESFire frame calibration: FSC %d, frames of %d bytes reach the card, %d bytes per frame.'
+                                 %(fscFromATS(ats), frameData, self.__desfireFrameData()), LOG_Info)
+        return frameData
+    
+    def desfireCalibrateFrameSize(self):
+        """Measure the largest DESFire frame the reader carries to the card and save it for the reader;
+        The card is activated again, select the application after the calibration; The result of the future is the
+        native data per frame, None if the calibration failed;"""
+        return self.__submit(self.__desfireCalibrateFrameSize)
+    
+    def setDESFireCalibrationPathName(self, pathName):
+        """Set the file of the DESFire frame calibration, None to keep it in memory only;"""
+        self.__desfireCalibrationPathName = pathName
+        self.__desfireCalibration = None
+    
+    def __getDESFireInventory(self):
+        if self.__desfireInventory == None:
+            self.__desfireInventory = DESFireInventory(self.__desfire, DESFireInventoryCache(_pathName(self.__desfireInventoryPathName, desfireInventoryModule, 'DEFAULT_INVENTORY_PATH_NAME')))
+        return self.__desfireInventory
+    
+    def __desfireForgetCard(self):
+        """Forget the DESFire card when the card may be another one; The applications it changed are noted in its cached inventory;"""
+        desfire = self.__desfireInstance
+        if desfire == None:
+            return
+        try:
+            if (desfire.uid != None) and (len(desfire.touched_applications) > 0):
+                self.__getDESFireInventory().forgetCard()
+                return
+        except Exception, e:
+            self.__handler.handleLog('DESFire inventory, exception: %s' %(e), LOG_Error)
+        desfire.forget_card()
+    
+    def __desfireGetInventory(self, refresh):
+        try:
+            tree, statistics = self.__getDESFireInventory().walk(refresh)
+        except Exception, e:
+            self.__handler.handleLog('DESFire inventory, exception: %s' %(e), LOG_Error)
+            return None
+        self.__handler.handleDESFireResponse(DESFireCommands.INVENTORY, tree)
+        self.__handler.handleLog('DESFire inventory succeeded: %s.' %(statistics), LOG_Info)
+        return tree
+    
+    def desfireGetInventory(self, refresh=True):
+        """Walk the whole DESFire card (version, free memory, applications, key settings and file settings) in one action;
+        refresh reads again only the applications changed since the last walk, see DESFireInventory; The walk ends the
+        authentication; The result of the future is the inventory tree, None if the walk failed;"""
+        return self.__submit(self.__desfireGetInventory, (refresh, ))
+    
+    def setDESFireInventoryPathName(self, pathName):
+        """Set the file of the cached DESFire inventories, None to keep them in memory only;"""
+        self.__desfireInventoryPathName = pathName
+        self.__desfireInventory = None
     
     def __desfireWriteData(self, file_id, offset, length, data):
         try:
-            self.__desfire.write_data(file_id, offset, length, data)
-            self.__handler.handleLog('DESFire write data succeeded.', wx.LOG_Info)
+            self.__desfire.set_frame_data(self.__desfireFrameData())
+            statistics = self.__desfire.write_data(file_id, offset, length, data)
+            self.__handler.handleLog('DESFire write data succeeded: %s.' %(statistics), LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire write data, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire write data, exception: %s' %(e), LOG_Error)
     
     def desfireWriteData(self, file_id, offset, length, data):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireWriteData, args=(file_id, offset, length, data))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireWriteData, (file_id, offset, length, data))
         
     def __desfireCredit(self, file_id, value):
         try:
             self.__desfire.credit(file_id, value)
-            self.__handler.handleLog('DESFire credit succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire credit succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire credit, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire credit, exception: %s' %(e), LOG_Error)
     
     def desfireCredit(self, file_id, value):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireCredit, args=(file_id, value))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireCredit, (file_id, value))
         
     def __desfireDebit(self, file_id, value):
         try:
             self.__desfire.debit(file_id, value)
-            self.__handler.handleLog('DESFire debit succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire debit succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire debit, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire debit, exception: %s' %(e), LOG_Error)
     
     def desfireDebit(self, file_id, value):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireDebit, args=(file_id, value))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireDebit, (file_id, value))
         
     def __desfireLimitedCredit(self, file_id, value):
         try:
             self.__desfire.limited_credit(file_id, value)
-            self.__handler.handleLog('DESFire limited credit succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire limited credit succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire limited credit, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire limited credit, exception: %s' %(e), LOG_Error)
     
     def desfireLimitedCredit(self, file_id, value):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireLimitedCredit, args=(file_id, value))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireLimitedCredit, (file_id, value))
     
     def __desfireWriteRecord(self, file_id, offset, length, data):
         try:
-            self.__desfire.write_record(file_id, offset, length, data)
-            self.__handler.handleLog('DESFire write record succeeded.', wx.LOG_Info)
+            self.__desfire.set_frame_data(self.__desfireFrameData())
+            statistics = self.__desfire.write_record(file_id, offset, length, data)
+            self.__handler.handleLog('DESFire write record succeeded: %s.' %(statistics), LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire write record, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire write record, exception: %s' %(e), LOG_Error)
     
     def desfireWriteRecord(self, file_id, offset, length, data):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireWriteRecord, args=(file_id, offset, length, data))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireWriteRecord, (file_id, offset, length, data))
         
     def __desfireReadRecords(self, file_id, offset, length):
         try:
             data = self.__desfire.read_records(file_id, offset, length)
             self.__handler.handleDESFireResponse(READ_RECORDS, data)
-            self.__handler.handleLog('DESFire read records succeeded.', wx.LOG_Info)
+            self.__handler.handleLog('DESFire read records succeeded.', LOG_Info)
         except Exception, e:
-            self.__handler.handleLog('DESFire read records, exception: %s' %(e), wx.LOG_Error)
+            self.__handler.handleLog('DESFire read records, exception: %s' %(e), LOG_Error)
     
     def desfireReadRecords(self, file_id, offset, length):
-        self.__desfireCommandThread = threading.Thread(target=self.__desfireReadRecords, args=(file_id, offset, length))
-        self.__desfireCommandThread.start()
+        return self.__submit(self.__desfireReadRecords, (file_id, offset, length))
     
 class pyResManControllerEventHandler(object):
     '''
@@ -1127,6 +1562,9 @@ class pyResManControllerEventHandler(object):
     def handleLoadScriptItem(self, args):
         pass
     
+    def handleLoadScriptItems(self, args):
+        pass
+    
     def handleLoadScriptEnd(self):
         pass
     
@@ -113,9 +113,9 @@ setup(
     # "scripts" keyword. Entry points provide cross-platform support and allow
     # pip to create the appropriate form of executable for the target platform.
     entry_points={
-        # 'console_scripts': [
-            # 'sample=sample:main',
-        # ],
+        'console_scripts': [
+            'pyResManCli=pyResMan.pyResManCli:main',
+        ],
     },
 
     ext_modules = [
@@ -0,0 +1,60 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-22
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import unittest
+
+from pyResMan.APDURecordStore import APDURecordStore, GROWING_CAPACITY, RECORD_LOADED, RECORD_SENT, RECORD_DONE
+
+
+class APDURecordStoreTest(unittest.TestCase):
+
+    def testRing(self):
+        store = APDURecordStore(3)
+        for i in xrange(5):
+            self.assertEqual(i, store.append('%02X' %(i)))
+        self.assertEqual(3, len(store))
+        self.assertEqual(['02', '03', '04'], [store.getCommand(row) for row in xrange(len(store))])
+        self.assertEqual(2, store.rowToSequence(0))
+        self.assertEqual(-1, store.sequenceToRow(1))
+        self.assertEqual(4, store.getLastSequence())
+        # The response of a dropped record is ignored;
+        self.assertEqual(-1, store.setResponse(0, '9000', 0.1))
+        self.assertRaises(IndexError, store.getRecord, 3)
+
+    def testStates(self):
+        store = APDURecordStore(10)
+        sequence = store.append('00A40400')
+        self.assertEqual(RECORD_LOADED, store.getRecord(0)[1])
+        self.assertEqual(0, store.setCommand(sequence, '00A40400', 1.0))
+        self.assertEqual(RECORD_SENT, store.getRecord(0)[1])
+        self.assertEqual(0, store.setResponse(sequence, '9000', 0.5))
+        self.assertEqual((sequence, RECORD_DONE, '00A40400', '9000', 0.5, 1.0), store.getRecord(0))
+
+    def testGrowing(self):
+        # A script list keeps every command, even beyond the capacity of the apdu list;
+        store = APDURecordStore(None)
+        self.assertEqual(None, store.getCapacity())
+        count = GROWING_CAPACITY * 5 + 3
+        for i in xrange(count):
+            store.append(i)
+        self.assertEqual(count, len(store))
+        self.assertEqual(range(count), [store.getCommand(row) for row in xrange(count)])
+        self.assertEqual(7, store.setResponse(7, '9000', 0.5))
+        self.assertEqual('9000', store.getRecord(7)[3])
+        store.clear()
+        self.assertEqual(0, len(store))
+        self.assertEqual(0, store.append('00'))
+
+    def testInvalidCapacity(self):
+        self.assertRaises(Exception, APDURecordStore, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-22
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+from pyResMan import SimInterface
+from pyResMan.pyResManCli import CliEventHandler
+from pyResMan.pyResManController import pyResManController
+
+
+class ControllerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output = StringIO.StringIO()
+        self.handler = CliEventHandler(self.output, False, False)
+        self.scInterface = SimInterface.SimInterface()
+        self.controller = pyResManController(self.handler, self.scInterface)
+        self.controller.connect(SimInterface.SIM_READER_NAME, 3, None)
+        self.tempDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.controller.disconnect()
+        shutil.rmtree(self.tempDir)
+
+    def testUnhandledException(self):
+        # The action does not catch the exception, it is reported to the handler;
+        pathName = os.path.join(tempfile.gettempdir(), 'nonexistent', 'dir', 'script.txt')
+        future = self.controller.saveDebuggerScript(pathName, [])
+        self.assertRaises(IOError, future.result, 5)
+        self.assertEqual(self.handler.errorCount, 1)
+        self.assertTrue('No such file or directory' in self.output.getvalue(), self.output.getvalue())
+
+    def testRunScriptWithInvalidLine(self):
+        scriptPathName = os.path.join(self.tempDir, 'script.txt')
+        with open(scriptPathName, 'wb') as f:
+            f.write('# select\n00A4040000\nHELLO\n00A4040000\n')
+        transmitCount = self.scInterface.transmitCount
+        self.controller.runScript(scriptPathName, 2, False).result(5)
+        # The invalid line is reported on each loop, the other APDUs are sent;
+        self.assertEqual(self.handler.errorCount, 2)
+        self.assertEqual(self.output.getvalue().count('Invalid APDU at line 3: HELLO.'), 2)
+        self.assertEqual(self.scInterface.transmitCount - transmitCount, 4)
+
+    def testMifareSetupFailed(self):
+        # Without a card the setup fails, and block 0 is not written;
+        self.scInterface.removeCard()
+        self.controller.mifareFixBrickedUID().result(5)
+        self.assertEqual(self.handler.errorCount, 1, self.output.getvalue())
+
+    def testConnectException(self):
+        # The caller of connect gets the exception, it is not reported twice;
+        self.assertRaises(Exception, self.controller.connect, 'No such reader', 3, None)
+        self.assertEqual(self.handler.errorCount, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
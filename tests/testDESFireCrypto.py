@@ -0,0 +1,181 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-22
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import zlib
+import unittest
+
+from pyResMan import DESFireCrypto
+from pyResMan import SimInterface
+from pyResMan.R502Device import R502Device
+from pyResMan.DESFireEx import DESFireEx
+from pyResMan.DESFireCrypto import DESFireSession, KEY_TYPE_DES, KEY_TYPE_3K3DES, KEY_TYPE_AES, COMM_PLAIN, COMM_MACED, \
+    COMM_ENCIPHERED
+
+KEY = '\x00' * 16
+# The CRC32 of these data and the status 00 ends (in little endian) with 00, so it looks like padding;
+DATA = ''.join(chr(i) for i in xrange(10))
+CRC = '\x00\x98\x07\xb2'
+
+# NIST SP 800-38B, appendix D: the messages and the CMAC of AES-128 and of three key TDEA;
+MESSAGE = (
+    '6bc1bee22e409f96e93d7e117393172a'
+    'ae2d8a571e03ac9c9eb76fac45af8e51'
+    '30c81c46a35ce411e5fbc1191a0a52ef'
+    'f69f2445df4f9b17ad2b417be66c3710').decode('hex')
+AES_KEY = '2b7e151628aed2a6abf7158809cf4f3c'.decode('hex')
+AES_VECTORS = (
+    (0, 'bb1d6929e95937287fa37d129b756746'),
+    (16, '070a16b46b4d4144f79bdd9dd04a287c'),
+    (40, 'dfa66747de9ae63030ca32611497c827'),
+    (64, '51f0bebf7e3b9d92fc49741779363cfe'),
+)
+TDEA_KEY = '8aa83bf8cbda10620bc1bf19fbb6cd58bc313d4a371ca8b5'.decode('hex')
+TDEA_VECTORS = (
+    (0, 'b7a688e122ffaf95'),
+    (8, '8e8f293136283797'),
+    (20, '743ddbe0ce2dc2ed'),
+    (32, '33e6b1092400eae5'),
+)
+
+
+class CMACTest(unittest.TestCase):
+
+    def testSubkeys(self):
+        session = DESFireSession(KEY_TYPE_AES, 0, AES_KEY)
+        self.assertEqual(session.subkeys, ['fbeed618357133667c85e08f7236a8de'.decode('hex'), 'f7ddac306ae266ccf90bc11ee46d513b'.decode('hex')])
+
+    def testAES(self):
+        for length, cmac in AES_VECTORS:
+            session = DESFireSession(KEY_TYPE_AES, 0, AES_KEY)
+            self.assertEqual(session.cmac(MESSAGE[0 : length]).encode('hex'), cmac)
+
+    def testTDEA(self):
+        for length, cmac in TDEA_VECTORS:
+            session = DESFireSession(KEY_TYPE_3K3DES, 0, TDEA_KEY)
+            self.assertEqual(session.cmac(MESSAGE[0 : length]).encode('hex'), cmac)
+
+    def testUpdate(self):
+        # The data may arrive in pieces of any size;
+        for size in (1, 5, 16, 17):
+            session = DESFireSession(KEY_TYPE_AES, 0, AES_KEY)
+            cmac = DESFireCrypto.DESFireCMAC(session)
+            for offset in xrange(0, 64, size):
+                cmac.update(MESSAGE[offset : offset + size])
+            self.assertEqual(cmac.final().encode('hex'), AES_VECTORS[-1][1])
+            # The CMAC is the IV of the next command;
+            self.assertEqual(session.iv.encode('hex'), AES_VECTORS[-1][1])
+
+
+class CRCTest(unittest.TestCase):
+
+    def testCRC32(self):
+        # The CRC32 of IEEE 802.3 without the final complement, little endian;
+        self.assertEqual(DESFireCrypto.crc32('123456789'), '\xd9\xc6\x0b\x34')
+        self.assertEqual(DESFireCrypto.crc32(''), '\xff\xff\xff\xff')
+        self.assertEqual(DESFireCrypto.crc32('56789', zlib.crc32('1234')), DESFireCrypto.crc32('123456789'))
+
+
+class SessionTest(unittest.TestCase):
+
+    RANDOM_A = ''.join(chr(i) for i in xrange(0x00, 0x10))
+    RANDOM_B = ''.join(chr(i) for i in xrange(0x10, 0x20))
+
+    def testSessionKeys(self):
+        a = self.RANDOM_A
+        b = self.RANDOM_B
+        self.assertEqual(DESFireCrypto.sessionKey(KEY_TYPE_AES, '\x00' * 16, a, b).encode('hex'), '00010203101112130c0d0e0f1c1d1e1f')
+        self.assertEqual(DESFireCrypto.sessionKey(KEY_TYPE_3K3DES, '\x00' * 24, a, b).encode('hex'),
+                         '000102031011121306070809161718190c0d0e0f1c1d1e1f')
+        # A DES key of which the halves are the same (parity bits aside) gives a single DES session key;
+        self.assertEqual(DESFireCrypto.sessionKey(KEY_TYPE_DES, '\x00' * 8 + '\x01' * 8, a[0 : 8], b[0 : 8]).encode('hex'),
+                         '0001020310111213' * 2)
+        self.assertEqual(DESFireCrypto.sessionKey(KEY_TYPE_DES, '\x00' * 8 + '\x02' * 8, a[0 : 8], b[0 : 8]).encode('hex'),
+                         '00010203101112130405060714151617')
+
+    def testSingleDES(self):
+        self.assertTrue(DESFireCrypto.isSingleDES('\x00' * 8))
+        self.assertTrue(DESFireCrypto.isSingleDES('\x00' * 8 + '\x01' * 8))
+        self.assertFalse(DESFireCrypto.isSingleDES('\x00' * 8 + '\x02' * 8))
+
+    def testWrap(self):
+        for keyType, key in ((KEY_TYPE_DES, '\x00' * 16), (KEY_TYPE_3K3DES, TDEA_KEY), (KEY_TYPE_AES, AES_KEY)):
+            pcd = DESFireSession(keyType, 0, key)
+            picc = DESFireSession(keyType, 0, key)
+            for mode in (COMM_PLAIN, COMM_MACED, COMM_ENCIPHERED):
+                data = pcd.wrapCommand('\x3D\x01', DATA, mode)
+                self.assertEqual(picc.unwrapCommand('\x3D\x01', data, mode, len(DATA)), DATA)
+                response = picc.wrapResponse(DATA, 0x00, mode)
+                self.assertEqual(pcd.unwrapResponse(response, 0x00, mode, len(DATA)), DATA)
+                self.assertEqual(pcd.iv, picc.iv)
+
+    def testInvalidCMAC(self):
+        pcd = DESFireSession(KEY_TYPE_AES, 0, AES_KEY)
+        picc = DESFireSession(KEY_TYPE_AES, 0, AES_KEY)
+        response = picc.wrapResponse(DATA, 0x00, COMM_MACED)
+        self.assertRaises(Exception, pcd.unwrapResponse, response[0 : -1] + chr(ord(response[-1]) ^ 1), 0x00, COMM_MACED)
+
+
+class EncipheredResponseTest(unittest.TestCase):
+
+    def testCRCEndingWithZero(self):
+        self.assertEqual(CRC, DESFireCrypto.crc32(DATA + '\x00'))
+        picc = DESFireSession(KEY_TYPE_AES, 0, KEY)
+        pcd = DESFireSession(KEY_TYPE_AES, 0, KEY)
+        response = picc.wrapResponse(DATA, 0x00, COMM_ENCIPHERED)
+        self.assertEqual(DATA + CRC + '\x00\x00', pcd.decrypt(response))
+        pcd.iv = '\x00' * 16
+        self.assertEqual(DATA, pcd.unwrapResponse(response, 0x00, COMM_ENCIPHERED, len(DATA)))
+
+    def testLengthRequired(self):
+        pcd = DESFireSession(KEY_TYPE_AES, 0, KEY)
+        self.assertRaises(Exception, pcd.beginResponse, COMM_ENCIPHERED, None)
+
+    def testInvalidPadding(self):
+        picc = DESFireSession(KEY_TYPE_AES, 0, KEY)
+        pcd = DESFireSession(KEY_TYPE_AES, 0, KEY)
+        response = picc.wrapResponse(DATA, 0x00, COMM_ENCIPHERED)
+        # Two bytes less than sent: the CRC would be followed by data, not by zeros;
+        self.assertRaises(Exception, pcd.unwrapResponse, response, 0x00, COMM_ENCIPHERED, len(DATA) - 2)
+
+    def testEncipheredReads(self):
+        scInterface = SimInterface.SimInterface(SimInterface.SimDESFire())
+        scInterface.connect(SimInterface.SIM_READER_NAME, 3)
+        desfire = DESFireEx(R502Device(scInterface))
+        desfire.create_application(0x000001, 0x0F, 0x81)
+        desfire.select_application(0x000001)
+        desfire.authenticate_aes(0)
+        desfire.create_linear_record_file(1, 0x03, 0x0000, 10, 5)
+        desfire.write_record(1, 0, 10, range(10))
+        desfire.commit_transaction()
+        desfire.create_std_data_file(2, 0x03, 0x0000, 10)
+        desfire.write_data(2, 0, 10, range(10))
+        # The length of the whole file or of every record is not sent, it is taken from the file settings;
+        self.assertEqual(range(10), desfire.read_records(1, 0, 0))
+        self.assertEqual(range(10), desfire.read_data(2, 0, 0))
+        self.assertEqual(range(2, 10), desfire.read_data(2, 2, 0))
+
+
+
+class BackendTest(unittest.TestCase):
+
+    def tearDown(self):
+        DESFireCrypto.setBackend()
+
+    def testBackendNames(self):
+        # pyDes has no AES, the AES ciphers of its backend are PythonAES;
+        DESFireCrypto.setBackend('pyDes')
+        self.assertEqual(DESFireCrypto.getBackendName(), 'pyDes')
+        self.assertEqual(DESFireCrypto.getBackendName(DESFireCrypto.CIPHER_AES), 'PythonAES')
+        cipher = DESFireCrypto.getCipher(AES_KEY, DESFireCrypto.CIPHER_AES)
+        self.assertEqual(cipher.decrypt(cipher.encrypt(MESSAGE)), MESSAGE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-22
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyResMan import SimInterface
+from pyResMan.R502Device import R502Device
+from pyResMan.DESFireEx import DESFireEx
+from pyResMan.DESFireInventory import DESFireInventory, DESFireInventoryCache, applicationKey, fileKey
+
+
+class CountingInterface(object):
+    '''
+    Counts the apdus sent to the interface;
+    '''
+
+    def __init__(self, scInterface):
+        self.__scInterface = scInterface
+        self.count = 0
+
+    def transmit(self, command):
+        self.count += 1
+        return self.__scInterface.transmit(command)
+
+
+class DESFireInventoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.pathName = os.path.join(self.tempDir, 'desfire_inventory.json')
+        scInterface = SimInterface.SimInterface(SimInterface.SimDESFire())
+        scInterface.connect(SimInterface.SIM_READER_NAME, 3)
+        self.counter = CountingInterface(scInterface)
+        self.desfire = DESFireEx(R502Device(self.counter))
+        for aid in (1, 2, 3):
+            self.desfire.select_application(0)
+            self.desfire.create_application(aid, 0x0F, 1)
+            self.desfire.select_application(aid)
+            for file_no in xrange(4):
+                self.desfire.create_std_data_file(file_no, 0, 0xEEEE, 32)
+        self.inventory = DESFireInventory(self.desfire, DESFireInventoryCache(self.pathName))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def walk(self, refresh=True):
+        self.counter.count = 0
+        tree, statistics = self.inventory.walk(refresh)
+        return tree, statistics, self.counter.count
+
+    def testWalk(self):
+        tree, statistics, apdus = self.walk()
+        self.assertEqual((statistics.read, statistics.cached), (3, 0))
+        self.assertEqual(sorted(tree['applications'].keys()), [applicationKey(aid) for aid in (1, 2, 3)])
+        files = tree['applications'][applicationKey(2)]['files']
+        self.assertEqual(sorted(files.keys()), [fileKey(file_no) for file_no in xrange(4)])
+        self.assertEqual(files[fileKey(1)]['file_size'], 32)
+        self.assertEqual(tree['uid'], '04112233445566')
+        # The selected application is selected again;
+        self.assertEqual(self.desfire.app_id, 3)
+        self.assertTrue(apdus > 0)
+
+    def testRefresh(self):
+        self.walk()
+        # Nothing changed, no command is sent;
+        tree, statistics, apdus = self.walk()
+        self.assertEqual((statistics.read, statistics.cached, apdus), (0, 3, 0))
+
+        self.desfire.select_application(2)
+        self.desfire.write_data(1, 0, 4, [1, 2, 3, 4])
+        tree, statistics, apdus = self.walk()
+        self.assertEqual((statistics.read, statistics.cached), (1, 2))
+        self.assertTrue(apdus > 0)
+
+        self.desfire.select_application(0)
+        self.desfire.create_application(9, 0x0F, 1)
+        tree, statistics, apdus = self.walk()
+        self.assertTrue(applicationKey(9) in tree['applications'])
+        self.assertEqual((statistics.read, statistics.cached), (1, 3))
+
+        tree, statistics, apdus = self.walk(False)
+        self.assertEqual((statistics.read, statistics.cached), (4, 0))
+
+    def testForgetCard(self):
+        self.walk()
+        self.desfire.select_application(3)
+        self.desfire.delete_file(0)
+        self.inventory.forgetCard()
+        # The change is kept in the inventory file, so the next session reads the application again;
+        self.inventory = DESFireInventory(self.desfire, DESFireInventoryCache(self.pathName))
+        tree, statistics, apdus = self.walk()
+        self.assertEqual((statistics.read, statistics.cached), (1, 2))
+        self.assertEqual(sorted(tree['applications'][applicationKey(3)]['files'].keys()), [fileKey(file_no) for file_no in (1, 2, 3)])
+        self.assertFalse('stale' in tree)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-22
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import StringIO
+import unittest
+
+from pyResMan import SimInterface
+from pyResMan.pyResManCli import CliEventHandler
+from pyResMan.pyResManController import pyResManController
+from pyResMan.MifareEngine import MifareCloneStatistics
+
+KEY = '\xFF' * 6
+
+
+class MifareCloneTest(unittest.TestCase):
+
+    def setUp(self):
+        self.card = SimInterface.SimMifareClassic()
+        self.output = StringIO.StringIO()
+        self.controller = pyResManController(CliEventHandler(self.output, False, False), SimInterface.SimInterface(self.card))
+        self.controller.setMifareKeyCachePathName(None)
+        self.controller.setMifareImageStorePathName(None)
+        self.controller.connect(SimInterface.SIM_READER_NAME, 3, None)
+
+    def tearDown(self):
+        self.controller.disconnect()
+
+    def cloneLog(self, blocks, differential):
+        self.output.truncate(0)
+        self.controller.mifareCloneCard(blocks, KEY, differential).result(10)
+        lines = [line for line in self.output.getvalue().splitlines() if line.startswith('Clone card data: ')]
+        self.assertEqual(len(lines), 1)
+        return lines[0]
+
+    def testDifferential(self):
+        blocks = [str(block) for block in self.card.blocks]
+        # Nothing is written, so no time saved is reported;
+        log = self.cloneLog(blocks, True)
+        self.assertTrue(log.startswith('Clone card data: 0 blocks written, 64 skipped, 0 failed'), log)
+        self.assertFalse('saved' in log, log)
+
+        blocks[4] = '\x11' * 16
+        log = self.cloneLog(blocks, True)
+        self.assertTrue(log.startswith('Clone card data: 1 blocks written, 63 skipped, 0 failed, 1 verified, 0 verify failed, '), log)
+        self.assertTrue('ms saved' in log, log)
+        self.assertEqual(str(self.card.blocks[4]), '\x11' * 16)
+
+    def testStatistics(self):
+        statistics = MifareCloneStatistics()
+        self.assertFalse('saved' in str(statistics))
+        statistics.timeSaved = 0.0125
+        self.assertTrue('12.5 ms saved' in str(statistics))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-22
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyResMan.MifareKeys import MifareKeyCache, MifareKeySearch, KEY_TYPE_A, KEY_TYPE_B, loadKeyFile
+
+UID = '\x01\x02\x03\x04'
+KEY1 = '\xFF' * 6
+KEY2 = '\xA0\xA1\xA2\xA3\xA4\xA5'
+KEY3 = '\xD3\xF7\xD3\xF7\xD3\xF7'
+KEY_OPERATION = '\x11' * 6
+
+
+class MifareKeySearchTest(unittest.TestCase):
+
+    def testOrder(self):
+        search = MifareKeySearch([KEY1, KEY2, KEY1])
+        self.assertEqual(search.candidates(UID, 0), [(KEY_TYPE_A, KEY1), (KEY_TYPE_A, KEY2), (KEY_TYPE_B, KEY1), (KEY_TYPE_B, KEY2)])
+
+    def testHits(self):
+        cache = MifareKeyCache()
+        cache.putKey('\x05\x06\x07\x08', 0, KEY_TYPE_A, KEY3)
+        search = MifareKeySearch([KEY1, KEY2, KEY3], cache)
+        self.assertEqual(search.candidates(UID, 0)[0:3], [(KEY_TYPE_A, KEY3), (KEY_TYPE_A, KEY1), (KEY_TYPE_A, KEY2)])
+
+    def testCachedKey(self):
+        search = MifareKeySearch([KEY1, KEY2])
+        search.found(UID, 1, KEY_TYPE_B, KEY2)
+        self.assertEqual(search.candidates(UID, 1)[0], (KEY_TYPE_B, KEY2))
+        # The key found has one hit;
+        self.assertEqual(search.candidates(UID, 0)[0], (KEY_TYPE_A, KEY2))
+        search.failed(UID, 1, KEY_TYPE_B, KEY2)
+        self.assertEqual(search.candidates(UID, 1)[0], (KEY_TYPE_A, KEY2))
+
+    def testFirstKey(self):
+        # The key of the operation is tried first, even behind keys with more hits and the key cached for the sector;
+        cache = MifareKeyCache()
+        cache.putKey('\x05\x06\x07\x08', 0, KEY_TYPE_A, KEY2)
+        cache.putKey(UID, 1, KEY_TYPE_B, KEY3)
+        search = MifareKeySearch([KEY1, KEY2, KEY3, KEY_OPERATION], cache, KEY_OPERATION)
+        candidates = search.candidates(UID, 1)
+        self.assertEqual(candidates[0:3], [(KEY_TYPE_A, KEY_OPERATION), (KEY_TYPE_B, KEY3), (KEY_TYPE_A, KEY2)])
+        self.assertEqual(len(candidates), 8)
+        self.assertEqual(search.candidates(UID, 0)[0:2], [(KEY_TYPE_A, KEY_OPERATION), (KEY_TYPE_A, KEY2)])
+        search.found(UID, 2, KEY_TYPE_A, KEY_OPERATION)
+        self.assertEqual(search.candidates(UID, 2)[0:2], [(KEY_TYPE_A, KEY_OPERATION), (KEY_TYPE_A, KEY2)])
+
+
+class MifareKeyCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def testHits(self):
+        cache = MifareKeyCache()
+        cache.putKey(UID, 0, KEY_TYPE_A, KEY1)
+        cache.putKey(UID, 0, KEY_TYPE_A, KEY1)
+        cache.putKey(UID, 1, KEY_TYPE_A, KEY1)
+        self.assertEqual(cache.getHits(KEY1), 2)
+        self.assertEqual(cache.getHits(KEY2), 0)
+        cache.removeKey(UID, 0)
+        self.assertEqual(cache.getKey(UID, 0), None)
+        self.assertEqual(cache.getKey(UID, 1), (KEY_TYPE_A, KEY1))
+
+    def testSave(self):
+        pathName = os.path.join(self.tempDir, 'keys', 'mifare_keys.json')
+        cache = MifareKeyCache(pathName)
+        cache.putKey(UID, 3, KEY_TYPE_B, KEY2)
+        cache.save()
+        cache = MifareKeyCache(pathName)
+        self.assertEqual(cache.getKey(UID, 3), (KEY_TYPE_B, KEY2))
+        self.assertEqual(cache.getHits(KEY2), 1)
+
+    def testLoadKeyFile(self):
+        pathName = os.path.join(self.tempDir, 'keys.txt')
+        with open(pathName, 'wb') as f:
+            f.write('# keys\nFFFFFFFFFFFF\n\nA0 A1 A2 A3 A4 A5\n')
+        self.assertEqual(loadKeyFile(pathName), [KEY1, KEY2])
+        with open(pathName, 'wb') as f:
+            f.write('FFFFFFFFFFFF\nFFFF\n')
+        with self.assertRaisesRegexp(ValueError, 'line 2'):
+            loadKeyFile(pathName)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-22
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import unittest
+
+from pyResMan import MifareLayout
+
+
+class MifareLayoutTest(unittest.TestCase):
+
+    def test1K(self):
+        layout = MifareLayout.MIFARE_1K
+        self.assertEqual((layout.blockCount, layout.sectorCount, layout.imageSize), (64, 16, 1024))
+        self.assertEqual(layout.sectorOf(7), 1)
+        self.assertEqual(layout.firstBlock(2), 8)
+        self.assertEqual(layout.sectorBlocks(2), [8, 9, 10, 11])
+        self.assertEqual(layout.trailerOf(15), 63)
+        self.assertTrue(layout.isTrailer(3))
+        self.assertFalse(layout.isTrailer(4))
+        self.assertEqual(len(layout.trailers()), 16)
+        self.assertTrue(layout.needsAuthentication())
+
+    def test4K(self):
+        layout = MifareLayout.MIFARE_4K
+        self.assertEqual((layout.blockCount, layout.sectorCount, layout.imageSize), (256, 40, 4096))
+        # The last 8 sectors have 16 blocks;
+        self.assertEqual(layout.firstBlock(32), 128)
+        self.assertEqual(layout.trailerOf(32), 143)
+        self.assertEqual(layout.sectorOf(143), 32)
+        self.assertEqual(layout.sectorOf(144), 33)
+        self.assertEqual(layout.trailerOf(39), 255)
+        self.assertFalse(layout.isTrailer(142))
+
+    def testUltralight(self):
+        layout = MifareLayout.MIFARE_ULTRALIGHT
+        self.assertEqual((layout.blockCount, layout.imageSize, layout.blocksPerRead), (16, 64, 4))
+        self.assertEqual(layout.trailerOf(0), None)
+        self.assertEqual(layout.trailers(), [])
+        self.assertFalse(layout.isTrailer(15))
+        self.assertFalse(layout.needsAuthentication())
+
+    def testSplitImage(self):
+        layout = MifareLayout.MIFARE_MINI
+        image = ''.join(chr(i) * 16 for i in xrange(layout.blockCount))
+        blocks = layout.splitImage(image)
+        self.assertEqual(len(blocks), 20)
+        self.assertEqual(blocks[19], '\x13' * 16)
+        self.assertRaises(Exception, layout.splitImage, image[0 : -1])
+
+    def testLookup(self):
+        self.assertEqual(MifareLayout.layoutForSAK(0x08), MifareLayout.MIFARE_1K)
+        self.assertEqual(MifareLayout.layoutForSAK(0x18), MifareLayout.MIFARE_4K)
+        self.assertEqual(MifareLayout.layoutForSAK(0x20), None)
+        self.assertEqual(MifareLayout.layoutForImageSize(320), MifareLayout.MIFARE_MINI)
+        self.assertEqual(MifareLayout.layoutForImageSize(64), MifareLayout.MIFARE_ULTRALIGHT)
+        self.assertEqual(MifareLayout.layoutForImageSize(100), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-22
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import unittest
+
+from pyResMan.Util import Util
+from pyResMan.MifareTLV import MifareCommandTLV, MifareCommandBatch, MifareResponseTLV, MifareTLVError, split_responses, \
+    COMMAND_TAG_READ_BLOCK, COMMAND_TAG_WRITE_BLOCK, BATCH_MAX_COMMAND_SIZE, BATCH_MAX_RESPONSE_SIZE
+
+BLOCK_DATA = ''.join(chr(i) for i in xrange(16))
+
+
+def readBlock(block_number):
+    command = MifareCommandTLV(COMMAND_TAG_READ_BLOCK)
+    command.set_block_number(block_number)
+    command.set_rw_len(16)
+    return command
+
+
+class MifareCommandTest(unittest.TestCase):
+
+    def testSerialize(self):
+        command = MifareCommandTLV(COMMAND_TAG_WRITE_BLOCK)
+        command.set_block_number(4)
+        command.set_block_data('\xAA' * 4)
+        self.assertEqual(Util.vs2s(command.serialize()), 'FF03090101040204AAAAAAAA')
+        self.assertEqual(command.get_response_size(), 6)
+        self.assertEqual(readBlock(4).get_response_size(), 6 + 2 + 16)
+
+    def testBatch(self):
+        batch = MifareCommandBatch()
+        for block_number in xrange(64):
+            batch.add(readBlock(block_number))
+        self.assertEqual(len(batch), 64)
+        frames = batch.get_frames()
+        # A frame holds as many reads as the response size allows;
+        perFrame = BATCH_MAX_RESPONSE_SIZE / (6 + 2 + 16)
+        self.assertEqual([len(frame) for frame in frames[0 : -1]], [perFrame] * (len(frames) - 1))
+        self.assertEqual(sum(len(frame) for frame in frames), 64)
+        for frame in frames:
+            self.assertTrue(sum(len(command) for command in frame) <= BATCH_MAX_COMMAND_SIZE)
+            self.assertEqual(frame[0], readBlock(ord(frame[0][-4])).serialize())
+
+    def testBatchCommandSize(self):
+        batch = MifareCommandBatch()
+        for block_number in xrange(20):
+            command = MifareCommandTLV(COMMAND_TAG_WRITE_BLOCK)
+            command.set_block_number(block_number)
+            command.set_block_data(BLOCK_DATA)
+            batch.add(command)
+        for frame in batch.get_frames():
+            self.assertTrue(sum(len(command) for command in frame) <= BATCH_MAX_COMMAND_SIZE)
+        self.assertEqual(sum(len(frame) for frame in batch.get_frames()), 20)
+
+
+class MifareResponseTest(unittest.TestCase):
+
+    def testStatus(self):
+        response = MifareResponseTLV(Util.s2vs('7F0003800100'))
+        self.assertEqual(response.get_error(), 0)
+        self.assertEqual(response.size, 6)
+        self.assertFalse(response.has_block_data())
+        self.assertEqual(response.get_block_data(), '')
+        self.assertEqual(MifareResponseTLV(Util.s2vs('7F0003800141')).get_error(), 0x41)
+
+    def testBlockData(self):
+        data = Util.s2vs('7F0015800100' + '0210') + BLOCK_DATA
+        for value in (data, bytearray(data), memoryview(data)):
+            response = MifareResponseTLV(value)
+            self.assertEqual(response.get_error(), 0)
+            self.assertTrue(response.has_block_data())
+            self.assertEqual(response.get_block_data(), BLOCK_DATA)
+
+    def testDESFireData(self):
+        response = MifareResponseTLV(Util.s2vs('7F000780010008020102'))
+        self.assertTrue(response.has_desfire_data())
+        self.assertEqual(response.get_desfire_data(), '\x01\x02')
+
+    def testSplitResponses(self):
+        data = Util.s2vs('7F0015800100' + '0210') + BLOCK_DATA + Util.s2vs('7F0003800100' + '7F0003800141')
+        responses = split_responses(data)
+        self.assertEqual([response.get_error() for response in responses], [0, 0, 0x41])
+        self.assertEqual(responses[0].get_block_data(), BLOCK_DATA)
+        self.assertEqual(split_responses(''), [])
+
+    def testInvalid(self):
+        for value in ('7F00', '7E0003800100', '7F0005800100', '7F00058001000210', '7F000390FF00', '7F0004800200FF', '7F00028001'):
+            self.assertRaises(MifareTLVError, MifareResponseTLV, Util.s2vs(value))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-22
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import threading
+import unittest
+
+from pyResMan.ReaderWorker import ReaderWorker, CommandFuture, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+
+
+class ReaderWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errors = []
+        self.worker = ReaderWorker('test reader', lambda future, e: self.errors.append((future.name, str(e))))
+        # Hold the worker until the commands of a test are queued;
+        self.gate = threading.Event()
+        self.worker.submit(self.gate.wait, (5, ), PRIORITY_HIGH)
+
+    def tearDown(self):
+        self.gate.set()
+        self.worker.stop()
+
+    def testPriority(self):
+        order = []
+        futures = [
+            self.worker.submit(order.append, ('low', ), PRIORITY_LOW),
+            self.worker.submit(order.append, ('normal 1', ), PRIORITY_NORMAL),
+            self.worker.submit(order.append, ('high', ), PRIORITY_HIGH),
+            self.worker.submit(order.append, ('normal 2', ), PRIORITY_NORMAL),
+        ]
+        self.gate.set()
+        for future in futures:
+            future.result(5)
+        self.assertEqual(['high', 'normal 1', 'normal 2', 'low'], order)
+
+    def testResultAndException(self):
+        def fail():
+            raise ValueError('failed')
+        future = self.worker.submit(lambda: 42)
+        failed = self.worker.submit(fail)
+        self.gate.set()
+        self.assertEqual(42, future.result(5))
+        self.assertRaises(ValueError, failed.result, 5)
+        self.assertTrue(isinstance(failed.exception(), ValueError))
+
+    def testExceptionHandler(self):
+        def fail():
+            raise ValueError('failed')
+        reported = []
+        def exceptionHandler(future, e):
+            # Reported before the future is finished;
+            reported.append((future.name, str(e), future.done()))
+        failed = self.worker.submit(fail, exceptionHandler=exceptionHandler)
+        succeeded = self.worker.submit(lambda: 42, exceptionHandler=exceptionHandler)
+        self.gate.set()
+        self.assertRaises(ValueError, failed.result, 5)
+        self.assertEqual(42, succeeded.result(5))
+        self.assertEqual([('fail', 'failed', False)], reported)
+
+    def testCancelPending(self):
+        order = []
+        future = self.worker.submit(order.append, ('cancelled', ))
+        self.assertTrue(future.cancel())
+        self.assertTrue(future.cancelled())
+        self.gate.set()
+        self.worker.submit(order.append, ('run', )).result(5)
+        self.assertEqual(['run'], order)
+        self.assertRaises(Exception, future.result, 0)
+
+    def testCallbacks(self):
+        called = []
+        def broken(future):
+            raise Exception('broken callback')
+        future = self.worker.submit(lambda: 1, name='command')
+        future.addDoneCallback(called.append)
+        future.addDoneCallback(broken)
+        future.addDoneCallback(called.append)
+        self.gate.set()
+        future.result(5)
+        self.assertEqual([future, future], called)
+        # The exception of a callback is reported, and the other callbacks are still called;
+        self.assertEqual([('command', 'broken callback')], self.errors)
+        # Called at once when the command is done;
+        future.addDoneCallback(called.append)
+        self.assertEqual(3, len(called))
+
+    def testRunPending(self):
+        order = []
+        def batch(count):
+            for i in xrange(count):
+                if not self.worker.runPending():
+                    return i
+                order.append(i)
+                if i == 1:
+                    interactive.append(self.worker.submit(order.append, ('high', ), PRIORITY_HIGH))
+                    self.worker.submit(order.append, ('low', ), PRIORITY_LOW)
+            return count
+        interactive = []
+        future = self.worker.submit(batch, (4, ), PRIORITY_NORMAL)
+        self.gate.set()
+        self.assertEqual(4, future.result(5))
+        # The high priority command runs between two steps of the batch, the low priority one after it;
+        self.assertEqual([0, 1, 'high', 2, 3], order[0 : 5])
+        interactive[0].result(5)
+        self.worker.submit(lambda: None, priority=PRIORITY_LOW).result(5)
+        self.assertEqual('low', order[5])
+
+    def testStopRunning(self):
+        started = threading.Event()
+        resume = threading.Event()
+        def batch():
+            count = 0
+            while self.worker.runPending():
+                count += 1
+                started.set()
+                resume.wait(5)
+            return count
+        future = self.worker.submit(batch)
+        self.gate.set()
+        started.wait(5)
+        # A running command is not cancelled, it is requested to stop;
+        self.assertFalse(future.cancel())
+        resume.set()
+        self.assertEqual(1, future.result(5))
+        self.assertFalse(future.cancelled())
+
+    def testRunPendingOutOfCommand(self):
+        self.assertRaises(Exception, self.worker.runPending)
+
+    def testStop(self):
+        future = self.worker.submit(lambda: 1)
+        self.worker.stop(wait=False)
+        self.gate.set()
+        self.assertRaises(Exception, self.worker.submit, lambda: 2)
+        self.assertRaises(Exception, future.result, 5)
+
+
+class CommandFutureTest(unittest.TestCase):
+
+    def testStates(self):
+        future = CommandFuture('command')
+        self.assertFalse(future.done())
+        self.assertTrue(future.setRunning())
+        self.assertTrue(future.running())
+        future.setResult(1)
+        self.assertTrue(future.done())
+        self.assertEqual(1, future.result())
+        self.assertFalse(future.cancel())
+
+    def testTimeout(self):
+        self.assertRaises(Exception, CommandFuture('command').result, 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-22
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyResMan import ScriptCache
+
+SCRIPT = '00A4040000\n\n00 B0 00 00 10\r\n80CA9F7F00\n'
+
+
+class ScriptCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.tempDir, 'cache')
+        self.scriptPathName = self.writeScript(SCRIPT)
+        self.parseScriptLines = ScriptCache.parseScriptLines
+
+    def tearDown(self):
+        ScriptCache.parseScriptLines = self.parseScriptLines
+        shutil.rmtree(self.tempDir)
+
+    def writeScript(self, content, name='script.txt'):
+        pathName = os.path.join(self.tempDir, name)
+        with open(pathName, 'wb') as f:
+            f.write(content)
+        return pathName
+
+    def testCompile(self):
+        with ScriptCache.compileScript(self.scriptPathName, self.cacheDir) as compiledScript:
+            self.assertEqual(len(compiledScript), 3)
+            self.assertEqual(list(compiledScript), ['\x00\xA4\x04\x00\x00', '\x00\xB0\x00\x00\x10', '\x80\xCA\x9F\x7F\x00'])
+            self.assertEqual(compiledScript.getCachePathName(), ScriptCache.getCachePathName(self.scriptPathName, self.cacheDir))
+
+    def testCacheHit(self):
+        ScriptCache.compileScript(self.scriptPathName, self.cacheDir).close()
+        # A valid cache is used without parsing the script again;
+        def parseScriptLines(scriptLines):
+            raise AssertionError('The script was parsed again.')
+        ScriptCache.parseScriptLines = parseScriptLines
+        with ScriptCache.compileScript(self.scriptPathName, self.cacheDir) as compiledScript:
+            self.assertEqual(len(compiledScript), 3)
+
+    def testCacheMiss(self):
+        ScriptCache.compileScript(self.scriptPathName, self.cacheDir).close()
+        self.writeScript(SCRIPT + '00C0000010\n')
+        with ScriptCache.compileScript(self.scriptPathName, self.cacheDir) as compiledScript:
+            self.assertEqual(len(compiledScript), 4)
+
+    def testInvalidCacheFile(self):
+        os.makedirs(self.cacheDir)
+        with open(ScriptCache.getCachePathName(self.scriptPathName, self.cacheDir), 'wb') as f:
+            f.write('invalid')
+        with ScriptCache.compileScript(self.scriptPathName, self.cacheDir) as compiledScript:
+            self.assertEqual(len(compiledScript), 3)
+
+    def testIterScriptItems(self):
+        batches = list(ScriptCache.iterScriptItems(self.scriptPathName, batchSize=2, chunkSize=4))
+        self.assertEqual(batches, [['00A4040000', '00B0000010'], ['80CA9F7F00']])
+
+    def testComments(self):
+        scriptPathName = self.writeScript('# select\n00A4040000\n  // read\n00B0000010\n', 'comments.txt')
+        with ScriptCache.compileScript(scriptPathName, self.cacheDir) as compiledScript:
+            self.assertEqual(list(compiledScript), ['\x00\xA4\x04\x00\x00', '\x00\xB0\x00\x00\x10'])
+
+    def testInvalidLine(self):
+        # The invalid line is kept at its place, so the runner reports it and goes on with the next APDU;
+        for content in ('00A4040000\n\nHELLO\n00B0000010\n', '00A4040000\n\n00A404000\n00B0000010\n'):
+            scriptPathName = self.writeScript(content, 'invalid.txt')
+            for _ in xrange(2):
+                # Compiled, then read from the cache;
+                with ScriptCache.compileScript(scriptPathName, self.cacheDir) as compiledScript:
+                    items = list(compiledScript)
+                self.assertEqual(len(items), 3)
+                self.assertEqual(items[0], '\x00\xA4\x04\x00\x00')
+                self.assertTrue(isinstance(items[1], ScriptCache.ScriptLineError))
+                self.assertEqual(items[1].lineNumber, 3)
+                self.assertTrue('line 3' in str(items[1]))
+                self.assertEqual(items[2], '\x00\xB0\x00\x00\x10')
+
+    def testLoadInvalidLine(self):
+        # The loader skips the invalid line and reports it;
+        scriptPathName = self.writeScript('# select\n00A4040000\nHELLO\n00B0000010\n', 'invalid.txt')
+        skipped = []
+        batches = list(ScriptCache.iterScriptItems(scriptPathName, handleInvalidLine=skipped.append))
+        self.assertEqual(batches, [['00A4040000', '00B0000010']])
+        self.assertEqual([e.lineNumber for e in skipped], [3])
+        self.assertEqual(list(ScriptCache.iterScriptItems(scriptPathName)), batches)
+
+    def testItemsReused(self):
+        with ScriptCache.compileScript(self.scriptPathName, self.cacheDir) as compiledScript:
+            items = list(compiledScript)
+            # The later loops iterate the same APDU strings;
+            for item, again in zip(items, compiledScript):
+                self.assertTrue(item is again)
+
+    def testOldCacheVersion(self):
+        ScriptCache.compileScript(self.scriptPathName, self.cacheDir).close()
+        cachePathName = ScriptCache.getCachePathName(self.scriptPathName, self.cacheDir)
+        with open(cachePathName, 'r+b') as f:
+            f.seek(4)
+            f.write(chr(ScriptCache.SCRIPT_CACHE_VERSION - 1))
+        with ScriptCache.compileScript(self.scriptPathName, self.cacheDir) as compiledScript:
+            self.assertEqual(len(compiledScript), 3)
+
+if __name__ == '__main__':
+    unittest.main()
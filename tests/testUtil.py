@@ -0,0 +1,60 @@
+# -*- coding:utf8 -*-
+
+'''
+Created on 2017-5-22
+
+@author: javacardos@gmail.com
+@organization: https://www.javacardos.com/
+@copyright: JavaCardOS Technologies. All rights reserved.
+'''
+
+import unittest
+
+from pyResMan.Util import Util
+
+
+class UtilTest(unittest.TestCase):
+
+    def testS2VS(self):
+        self.assertEqual(Util.s2vs('00A4040000'), '\x00\xA4\x04\x00\x00')
+        self.assertEqual(Util.s2vs(' 00 a4\t04 00\r\n00 '), '\x00\xA4\x04\x00\x00')
+        self.assertEqual(Util.s2vs(u'00A4040000'), '\x00\xA4\x04\x00\x00')
+        self.assertEqual(Util.s2vs(''), '')
+
+    def testS2VSInvalid(self):
+        for s in ('00A404000', '00G4', u'00é', 'hello'):
+            self.assertRaises(ValueError, Util.s2vs, s)
+
+    def testS2VL(self):
+        self.assertEqual(Util.s2vl('00A4040000'), [0x00, 0xA4, 0x04, 0x00, 0x00])
+        self.assertEqual(Util.s2ba('FF01'), bytearray('\xFF\x01'))
+
+    def testVS2S(self):
+        self.assertEqual(Util.vs2s('\x00\xA4\x04\x00\x00'), '00A4040000')
+        self.assertEqual(Util.vs2s('\x00\xA4\x04', ' '), '00 A4 04')
+        self.assertEqual(Util.vs2s(bytearray('\xDE\xAD')), 'DEAD')
+        self.assertEqual(Util.vl2s([0x00, 0xA4, 0xFF]), '00A4FF')
+        self.assertEqual(Util.vl2s([0x00, 0xA4], ' '), '00 A4')
+
+    def testRoundTrip(self):
+        vs = ''.join(chr(i) for i in xrange(0x100))
+        self.assertEqual(Util.s2vs(Util.vs2s(vs)), vs)
+        self.assertEqual(Util.s2vs(Util.vs2s(vs, ' ')), vs)
+
+    def testIsHexStr(self):
+        self.assertTrue(Util.ishexstr('00a4 04 00'))
+        self.assertTrue(Util.ishexstr(u'00A4'))
+        self.assertFalse(Util.ishexstr('00G4'))
+        self.assertFalse(Util.ishexstr(u'00é'))
+
+    def testRemoveSpace(self):
+        self.assertEqual(Util.removespace(' 00 A4\t04\r\n'), '00A404')
+        self.assertEqual(Util.removespace(u' 00 A4\t04\r\n'), u'00A404')
+
+    def testC2V(self):
+        self.assertEqual([Util.c2v(c) for c in '09afAF'], [0, 9, 10, 15, 10, 15])
+        self.assertRaises(ValueError, Util.c2v, 'g')
+
+
+if __name__ == '__main__':
+    unittest.main()